@@ -1,4 +1,10 @@
-"""Base analysis class, each child class should implement the analyze function."""
+"""Base analysis class, each child class should implement the analyze function.
+
+Analysis classes can also be written as matchers: feed() gets blocks of
+complete lines of the log and finish() is called at the end of it.
+run_analysis() then streams the log file once for all of them, instead of
+every class scanning its own copy of the whole log held in memory.
+"""
 # Copyright (c) 2015
 #
 # All rights reserved.
@@ -8,6 +14,8 @@
 
 import logging
 import os
+import re
+import traceback
 
 logger = logging.getLogger("bft")
 # no repr
@@ -16,6 +24,11 @@ newline_match = r"\r\n\[([^\]]+)\]"
 # with repr
 newline_re = r"\\r\\n\[[^\]]+\]"
 newline_re_match = r"\\r\\n\[([^\]]+)\]"
+# timestamp at the start of a line
+timestamp_match = r"\[([^\]]+)\]"
+
+# number of characters read at once by run_analysis
+chunk_size = 1 << 20
 
 
 def prepare_log(log):
@@ -36,13 +49,116 @@ def split_results(results):
     return None, results
 
 
+class CommandOutput:
+    """Follow the output of a shell command while a log is streamed.
+
+    The output of a command runs from the prompt line where the command was
+    typed up to the next prompt.
+    """
+
+    def __init__(self, regex, prompt="root@OpenWrt"):
+        """Instance initialisation.
+
+        :param regex: regex matching the prompt and command lines
+        :type regex: str
+        :param prompt: string found on every prompt line
+        :type prompt: str
+        """
+        self.regex = re.compile(regex)
+        self.prompt = prompt
+        self.index = None
+
+    def lines(self, text):
+        """Return the lines of the block which are part of the command output.
+
+        :param text: block of complete lines
+        :type text: str
+        :return: (index, line) pairs, the command line itself has index 0
+        :rtype: generator
+        """
+        pos, end = 0, len(text)
+        while pos < end:
+            found = text.find(self.prompt, pos)
+            stop = end if found < 0 else text.rfind("\n", 0, found) + 1
+            if self.index is not None and pos < stop:
+                lines = text[pos:stop].split("\n")
+                if not lines[-1]:
+                    lines.pop()
+                for line in lines:
+                    yield self.index, line
+                    self.index += 1
+            if found < 0:
+                break
+            pos = text.find("\n", found) + 1 or end
+            self.index = 1 if self.regex.search(text, stop, pos) else None
+
+
+class CommandValue:
+    """Collect the value printed on the line following a command.
+
+    Streaming version of ``command + newline_match + value + newline``.
+    """
+
+    def __init__(self, command, value):
+        """Instance initialisation.
+
+        :param command: regex matching the end of the command line
+        :type command: str
+        :param value: regex of the value printed after the timestamp
+        :type value: str
+        """
+        self.command = re.compile(command + r"\r\n")
+        self.value = re.compile(timestamp_match + value + r"\r\n")
+        self.regex = re.compile(self.command.pattern + self.value.pattern)
+        self.results = []
+        self._pending = False
+
+    def feed(self, text):
+        """Process a block of complete lines.
+
+        :param text: block of complete lines
+        :type text: str
+        """
+        if self._pending:
+            # the command was the last line of the previous block
+            match = self.value.match(text)
+            if match:
+                self.results.append(match.groups())
+        self.results.extend(m.groups() for m in self.regex.finditer(text))
+        last = text.rfind("\n", 0, len(text) - 1) + 1
+        self._pending = self.command.search(text, last) is not None
+
+
 class Analysis:
-    """Base analysis class, each child class should implement the analyze function."""
+    """Base analysis class, each child class should implement the analyze function.
 
-    def analyze(self, console_log, output_dir):
-        """Analyze console log. Yet to be implemented."""
+    Streaming classes implement start(), feed() and finish() instead.
+    """
+
+    def start(self):
+        """Reset the state before a log is fed."""
         pass
 
+    def feed(self, text):
+        """Process a block of complete lines of the log."""
+        pass
+
+    def finish(self, output_dir):
+        """Report the results once the whole log has been fed."""
+        pass
+
+    def analyze(self, console_log, output_dir):
+        """Analyze console log.
+
+        :param console_log: content of the log
+        :type console_log: str
+        :param output_dir: directory where graphs are written
+        :type output_dir: str
+        """
+        self.start()
+        self.feed(console_log)
+        self.finish(output_dir)
+
     def make_graph(
         self, data, ylabel, fname, ts=None, xlabel="seconds", output_dir=None
     ):
@@ -71,3 +187,93 @@ class Analysis:
         plt.clf()
 
         # TODO: save simple CSV file?
+
+
+def is_streaming(cls):
+    """Return True if the class implements the matcher interface."""
+    return cls.analyze is Analysis.analyze and cls.feed is not Analysis.feed
+
+
+def read_blocks(log, size=None):
+    """Read a file by blocks of complete lines.
+
+    :param log: file opened in text mode
+    :type log: file
+    :param size: number of characters read at once, defaults to chunk_size
+    :type size: int
+    :return: blocks of lines, only the last one may lack a line terminator
+    :rtype: generator
+    """
+    rest = ""
+    for block in iter(lambda: log.read(size or chunk_size), ""):
+        cut = block.rfind("\n") + 1
+        if cut:
+            yield rest + block[:cut]
+            rest = block[cut:]
+        else:
+            rest += block
+    if rest:
+        yield rest
+
+
+def run_analysis(fname, classes, output_dir):
+    """Run analysis classes on a log file, reading it only once.
+
+    Streaming classes are fed the file block by block. Classes only
+    implementing analyze() still get the whole log as a string.
+
+    :param fname: path to the log file
+    :type fname: str
+    :param classes: analysis classes to run, by name
+    :type classes: dict
+    :param output_dir: directory where graphs are written
+    :type output_dir: str
+    :return: names of the analyses that failed
+    :rtype: list
+    """
+    failed = []
+    matchers = {}
+    legacy = {}
+    for name in sorted(classes):
+        cls = classes[name]
+        if is_streaming(cls):
+            matchers[name] = cls()
+            matchers[name].start()
+        elif cls.analyze is not Analysis.analyze:
+            legacy[name] = cls()
+
+    def error(name):
+        logger.error(f"Analysis {name} failed")
+        logger.debug(traceback.format_exc())
+        failed.append(name)
+
+    # newline="" keeps the \r\n line terminators the matchers look for
+    with open(fname, newline="", errors="replace") as log:
+        active = list(matchers.items())
+        for text in read_blocks(log):
+            for name, matcher in active:
+                try:
+                    matcher.feed(text)
+                except Exception:
+                    error(name)
+                    # stop feeding it, the loop goes on with the old list
+                    active = [(n, m) for n, m in active if n != name]
+
+    for name, matcher in matchers.items():
+        if name in failed:
+            continue
+        try:
+            matcher.finish(output_dir)
+        except Exception:
+            error(name)
+
+    if legacy:
+        with open(fname, errors="replace") as log:
+            console_log = prepare_log(log.read())
+        for name, obj in legacy.items():
+            try:
+                obj.analyze(console_log, output_dir)
+            except Exception:
+                error(name)
+
+    return failed
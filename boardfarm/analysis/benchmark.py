@@ -0,0 +1,157 @@
+"""Compare the single pass analysis with the per class scans it replaced.
+
+Used by ``bft --analysis <log> --analysis_benchmark``. Before the analysis
+classes were streamed by :func:`boardfarm.analysis.analysis.run_analysis`,
+each class read the whole console log and ran its own regular expressions
+over it (most of them over ``repr()`` of the log). The functions of
+``LEGACY_SCANS`` are those previous scans, graphs left out as they are left
+out of the timed single pass too.
+"""
+# Copyright (c) 2015
+#
+# All rights reserved.
+#
+# This file is distributed under the Clear BSD license.
+# The full text can be found in LICENSE in the root directory.
+
+import collections
+import os
+import re
+import time
+
+from . import analysis
+
+# with repr, as in the previous implementations
+_newline_re = r"\\r\\n\[[^\]]+\]"
+_newline_re_match = r"\\r\\n\[([^\]]+)\]"
+
+
+def _legacy_connections(console_log):
+    regex = (
+        "cat /proc/sys/net/netfilter/nf_conntrack_count"
+        + _newline_re_match
+        + r"(\d+)"
+        + _newline_re
+    )
+    return analysis.split_results(re.findall(regex, repr(console_log)))
+
+
+def _legacy_oom(console_log):
+    return len(re.findall("Out of memory", console_log))
+
+
+def _legacy_panic(console_log):
+    return len(re.findall("Kernel panic", console_log))
+
+
+def _legacy_ps(console_log):
+    regex = "root\\@OpenWrt:[^#]+# ps.*?(?=root@OpenWrt)"
+    data = collections.defaultdict(list)
+    timestamps = collections.defaultdict(list)
+    for ps_dump in re.findall(regex, repr(console_log)):
+        for line in ps_dump.split("\\r\\n")[2:]:
+            line = re.sub(r"](?=[^\s])", "] ", line)
+            e = line.split()
+            if len(e) < 4:
+                continue
+            ts = float(e.pop(0).strip("[]"))
+            pid = e.pop(0)
+            mem = e.pop(0)
+            while e[0] in ["S", "R", "SW", "SW<", "DW", "N", "<", "D", "Z"]:
+                e.pop(0)
+            cmdline = " ".join(e)
+            if cmdline[0] == "[" and cmdline[-1] == "]":
+                cmd = cmdline
+            else:
+                cmd = os.path.basename(cmdline.split()[0])
+            key = pid + "-" + cmd
+            data[key].append(mem)
+            timestamps[key].append(ts)
+    return data, timestamps
+
+
+def _legacy_sb_connections(console_log):
+    connections = (
+        r"redis-cli -s \$s keys \\'conndb...flow\\' \| wc -l"
+        + _newline_re_match
+        + r"(\d+)"
+        + _newline_re
+    )
+    flows = (
+        r"redis-cli -s \$s scard flowdb.flows"
+        + _newline_re_match
+        + r"\(integer\) (\d+)"
+        + _newline_re
+    )
+    return [
+        analysis.split_results(re.findall(regex, repr(console_log)))
+        for regex in (connections, flows)
+    ]
+
+
+def _legacy_slab(console_log):
+    regex = "root\\@OpenWrt:[^#]+# cat /proc/slabinfo.*?(?=root@OpenWrt)"
+    data = collections.defaultdict(list)
+    timestamps = collections.defaultdict(list)
+    for dump in re.findall(regex, repr(console_log)):
+        for line in dump.split("\\r\\n")[3:]:
+            line = re.sub(r"](?=[^\s])", "]", line)
+            e = line.split()
+            if len(e) < 4:
+                continue
+            ts = float(e.pop(0).strip("[]"))
+            key = "slab-" + e.pop(0)
+            data[key].append(e.pop(0))
+            timestamps[key].append(ts)
+    return data, timestamps
+
+
+def _legacy_vmstat(console_log):
+    data = collections.defaultdict(list)
+    timestamps = collections.defaultdict(list)
+    for t, k, v in re.findall(analysis.newline_match + r"nr_(\w+) (\d+)", console_log):
+        data[k].append(int(v))
+        timestamps[k].append(float(t))
+    return data, timestamps
+
+
+# analysis class name to the scan it ran before the single pass
+LEGACY_SCANS = {
+    "ConnectionsAnalysis": _legacy_connections,
+    "OOMAnalysis": _legacy_oom,
+    "PanicAnalysis": _legacy_panic,
+    "PSAnalysis": _legacy_ps,
+    "SbConnectionsAnalysis": _legacy_sb_connections,
+    "SlabAnalysis": _legacy_slab,
+    "VmStatAnalysis": _legacy_vmstat,
+}
+
+
+def benchmark(fname, classes):
+    """Time the single pass analysis against the previous per class scans.
+
+    The classes without a previous scan (e.g. from a plugin) are left out of
+    both timings.
+
+    :param fname: console log file
+    :type fname: str
+    :param classes: name to analysis class, e.g. boardfarm.analysis.classes
+    :type classes: dict
+    :return: seconds taken by the single pass and by the previous scans
+    :rtype: tuple
+    """
+    compared = {n: c for n, c in classes.items() if n in LEGACY_SCANS}
+
+    start = time.time()
+    analysis.run_analysis(fname, compared, None)
+    single_pass = time.time() - start
+
+    start = time.time()
+    for name in sorted(compared):
+        # each class read the whole log before
+        with open(fname, newline="") as f:
+            console_log = analysis.prepare_log(f.read())
+        LEGACY_SCANS[name](console_log)
+    legacy = time.time() - start
+
+    return single_pass, legacy
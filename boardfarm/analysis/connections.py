@@ -5,25 +5,26 @@
 # This file is distributed under the Clear BSD license.
 # The full text can be found in LICENSE in the root directory.
 
-import re
-
 from . import analysis
 
 
 class ConnectionsAnalysis(analysis.Analysis):
     """Look at logs for number of connections and create graph from results."""
 
-    def analyze(self, console_log, output_dir):
-        regex = (
-            "cat /proc/sys/net/netfilter/nf_conntrack_count"
-            + analysis.newline_re_match
-            + r"(\d+)"
-            + analysis.newline_re
-        )
-        timestamps, results = analysis.split_results(
-            re.findall(regex, repr(console_log))
+    def start(self):
+        """Reset the state before a log is fed."""
+        self.counts = analysis.CommandValue(
+            "cat /proc/sys/net/netfilter/nf_conntrack_count", r"(\d+)"
         )
 
+    def feed(self, text):
+        """Collect the number of tracked connections."""
+        self.counts.feed(text)
+
+    def finish(self, output_dir):
+        """Graph the number of connections."""
+        timestamps, results = analysis.split_results(self.counts.results)
+
         if len(timestamps) == len(results) and len(results) > 1:
             self.make_graph(
                 results,
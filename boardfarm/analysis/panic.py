@@ -6,15 +6,22 @@
 # This file is distributed under the Clear BSD license.
 # The full text can be found in LICENSE in the root directory.
 
-import re
-
 from . import analysis
 
 
 class PanicAnalysis(analysis.Analysis):
     """Parse logs for kernel panic events."""
 
-    def analyze(self, console_log, output_dir):
+    def start(self):
+        """Reset the state before a log is fed."""
+        self.found = False
+
+    def feed(self, text):
         """Find kernel panic events from console logs."""
-        if len(re.findall("Kernel panic", console_log)):
+        if not self.found and "Kernel panic" in text:
+            self.found = True
+
+    def finish(self, output_dir):
+        """Report the events found."""
+        if self.found:
             print("ERROR: log had panic")
@@ -11,38 +11,46 @@ import re
 
 from . import analysis
 
+# separate the timestamp from the first column
+_TS_SEP_RE = re.compile(r"](?=[^\s])")
+
 
 class PSAnalysis(analysis.Analysis):
     """Parse top for ps commands, and create graph of process memory usage over time."""
 
-    def analyze(self, console_log, output_dir):
-        """Find and analyze Ps command logs."""
-        regex = "root\\@OpenWrt:[^#]+# ps.*?(?=root@OpenWrt)"
-        results = re.findall(regex, repr(console_log))
+    def start(self):
+        """Reset the state before a log is fed."""
+        self.output = analysis.CommandOutput("root@OpenWrt:[^#]+# ps")
+        self.data = collections.defaultdict(list)
+        self.timestamps = collections.defaultdict(list)
 
-        # now process each time ps was run
-        data = collections.defaultdict(list)
-        timestamps = collections.defaultdict(list)
-        for ps_dump in results:
-            for line in ps_dump.split("\\r\\n")[2:]:
-                line = re.sub(r"](?=[^\s])", "] ", line)
-                e = line.split()
-                if len(e) < 4:
-                    continue
-                ts = float(e.pop(0).strip("[]"))
-                pid = e.pop(0)
-                mem = e.pop(0)
-                while e[0] in ["S", "R", "SW", "SW<", "DW", "N", "<", "D", "Z"]:
-                    e.pop(0)
-                cmdline = " ".join(e)
-                if cmdline[0] == "[" and cmdline[-1] == "]":
-                    cmd = cmdline
-                else:
-                    cmd = os.path.basename(cmdline.split()[0])
-                key = pid + "-" + cmd
-                data[key].append(mem)
-                timestamps[key].append(ts)
+    def feed(self, text):
+        """Collect memory usage from the lines printed by ps."""
+        for index, line in self.output.lines(text):
+            # skip the command and header lines
+            if index < 2:
+                continue
+            line = _TS_SEP_RE.sub("] ", line)
+            e = line.split()
+            if len(e) < 4:
+                continue
+            ts = float(e.pop(0).strip("[]"))
+            pid = e.pop(0)
+            mem = e.pop(0)
+            while e[0] in ["S", "R", "SW", "SW<", "DW", "N", "<", "D", "Z"]:
+                e.pop(0)
+            cmdline = " ".join(e)
+            if cmdline[0] == "[" and cmdline[-1] == "]":
+                cmd = cmdline
+            else:
+                cmd = os.path.basename(cmdline.split()[0])
+            key = pid + "-" + cmd
+            self.data[key].append(mem)
+            self.timestamps[key].append(ts)
 
+    def finish(self, output_dir):
+        """Graph the memory usage of each process."""
+        data, timestamps = self.data, self.timestamps
         for k in data:
             if len(data[k]) > 1:
                 fname = k
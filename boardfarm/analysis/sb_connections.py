@@ -5,25 +5,30 @@
 # This file is distributed under the Clear BSD license.
 # The full text can be found in LICENSE in the root directory.
 
-import re
-
 from . import analysis
 
 
 class SbConnectionsAnalysis(analysis.Analysis):
     """Look for streamboost 2.0 number of connections and make graphs."""
 
-    def analyze(self, console_log, output_dir):
-        regex = (
-            r"redis-cli -s \$s keys \\'conndb...flow\\' \| wc -l"
-            + analysis.newline_re_match
-            + r"(\d+)"
-            + analysis.newline_re
+    def start(self):
+        """Reset the state before a log is fed."""
+        self.connections = analysis.CommandValue(
+            r"redis-cli -s \$s keys 'conndb...flow' \| wc -l", r"(\d+)"
         )
-        timestamps, results = analysis.split_results(
-            re.findall(regex, repr(console_log))
+        self.flows = analysis.CommandValue(
+            r"redis-cli -s \$s scard flowdb.flows", r"\(integer\) (\d+)"
         )
 
+    def feed(self, text):
+        """Collect the number of streamboost connections and flows."""
+        self.connections.feed(text)
+        self.flows.feed(text)
+
+    def finish(self, output_dir):
+        """Graph the number of connections and flows."""
+        timestamps, results = analysis.split_results(self.connections.results)
+
         if len(timestamps) == len(results) and len(results) > 1:
             self.make_graph(
                 results,
@@ -40,15 +45,7 @@ class SbConnectionsAnalysis(analysis.Analysis):
                 output_dir=output_dir,
             )
 
-        regex = (
-            r"redis-cli -s \$s scard flowdb.flows"
-            + analysis.newline_re_match
-            + r"\(integer\) (\d+)"
-            + analysis.newline_re
-        )
-        timestamps, results = analysis.split_results(
-            re.findall(regex, repr(console_log))
-        )
+        timestamps, results = analysis.split_results(self.flows.results)
 
         if len(timestamps) == len(results) and len(results) > 1:
             self.make_graph(
@@ -11,31 +11,39 @@ import re
 
 from . import analysis
 
+# separate the timestamp from the first column
+_TS_SEP_RE = re.compile(r"](?=[^\s])")
+
 
 class SlabAnalysis(analysis.Analysis):
     """Make graphs for output of /proc/slabinfo over time."""
 
-    def analyze(self, console_log, output_dir):
-        """Perform analysis on console log."""
-        regex = "root\\@OpenWrt:[^#]+# cat /proc/slabinfo.*?(?=root@OpenWrt)"
-        results = re.findall(regex, repr(console_log))
-
-        # now process each time ps was run
-        data = collections.defaultdict(list)
-        timestamps = collections.defaultdict(list)
-        for dump in results:
-            for line in dump.split("\\r\\n")[3:]:
-                line = re.sub(r"](?=[^\s])", "]", line)
-                e = line.split()
-                if len(e) < 4:
-                    continue
-                ts = float(e.pop(0).strip("[]"))
-                slab_name = e.pop(0)
-                active_objs = e.pop(0)
-                key = "slab-" + slab_name
-                data[key].append(active_objs)
-                timestamps[key].append(ts)
+    def start(self):
+        """Reset the state before a log is fed."""
+        self.output = analysis.CommandOutput("root@OpenWrt:[^#]+# cat /proc/slabinfo")
+        self.data = collections.defaultdict(list)
+        self.timestamps = collections.defaultdict(list)
+
+    def feed(self, text):
+        """Collect active objects from the lines of /proc/slabinfo."""
+        for index, line in self.output.lines(text):
+            # skip the command, version and header lines
+            if index < 3:
+                continue
+            line = _TS_SEP_RE.sub("] ", line)
+            e = line.split()
+            if len(e) < 4:
+                continue
+            ts = float(e.pop(0).strip("[]"))
+            slab_name = e.pop(0)
+            active_objs = e.pop(0)
+            key = "slab-" + slab_name
+            self.data[key].append(active_objs)
+            self.timestamps[key].append(ts)
 
+    def finish(self, output_dir):
+        """Graph the active objects of each slab."""
+        data, timestamps = self.data, self.timestamps
         for k in data:
             if len(data[k]) > 1:
                 fname = k
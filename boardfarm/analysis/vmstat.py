@@ -10,22 +10,37 @@ import re
 
 from . import analysis
 
+_VMSTAT = r"nr_(\w+) (\d+)"
+_VMSTAT_RE = re.compile(analysis.newline_match + _VMSTAT)
+# first line of a block, the previous one ended with \r\n
+_VMSTAT_FIRST_RE = re.compile(analysis.timestamp_match + _VMSTAT)
+
 
 class VmStatAnalysis(analysis.Analysis):
     """Make graphs from /proc/vmstat over time."""
 
-    def analyze(self, console_log, output_dir):
-        results = re.findall(analysis.newline_match + r"nr_(\w+) (\d+)", console_log)
-        data = collections.defaultdict(list)
-        timestamps = collections.defaultdict(list)
+    def start(self):
+        """Reset the state before a log is fed."""
+        self.data = collections.defaultdict(list)
+        self.timestamps = collections.defaultdict(list)
+
+    def feed(self, text):
+        """Collect the nr_* counters of /proc/vmstat."""
+        results = _VMSTAT_RE.findall(text)
+        first = _VMSTAT_FIRST_RE.match(text)
+        if first:
+            results.insert(0, first.groups())
         for t, k, v in results:
-            data[k].append(int(v))
-            timestamps[k].append(float(t))
+            self.data[k].append(int(v))
+            self.timestamps[k].append(float(t))
 
+    def finish(self, output_dir):
+        """Graph the counters over time."""
+        data, timestamps = self.data, self.timestamps
         if len(data) == 0:
             return
 
-        sz = len(data.itervalues().__next__())
+        sz = len(next(iter(data.values())))
         for k in data:
             if len(data[k]) > 1:
                 sz = min(len(data[k]), sz)
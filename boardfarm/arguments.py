@@ -8,11 +8,9 @@
 # The full text can be found in LICENSE in the root directory.
 """module: arguments: bft's command-line options."""
 import argparse
-import inspect
 import os
 import os.path
 import sys
-import traceback
 
 import boardfarm.lib.test_configurator
 from boardfarm import config
@@ -237,6 +235,11 @@ def parse():
         default=None,
         help="URL or file PATH of Rootfs image to flash",
     )
+    parser.add_argument(
+        "--analysis_benchmark",
+        action="store_true",
+        help="With --analysis, compare the time taken to scan the log once per analysis class",
+    )
     parser.add_argument("--version", action="store_true", help="show version and exit")
     parser.add_argument(
         "--nostrict",
@@ -457,21 +460,20 @@ def parse():
 
     if args.analysis:
         from boardfarm import analysis
+        from boardfarm.analysis.analysis import run_analysis
+
+        print(f"Running analysis classes = {', '.join(sorted(analysis.classes))}... ")
+        failed = run_analysis(args.analysis, analysis.classes, config.output_dir)
+        print(f"FAILED: {', '.join(failed)}" if failed else "DONE!")
+
+        if args.analysis_benchmark:
+            from boardfarm.analysis.benchmark import benchmark
 
-        for cstr in dir(analysis):
-            c = getattr(analysis, cstr)
-            if inspect.isclass(c) and issubclass(c, analysis.Analysis):
-                sys.stdout.write(f"Running analysis class = {c}... ")
-                console_log = open(args.analysis).read()
-                from boardfarm.analysis.analysis import prepare_log
-
-                try:
-                    c().analyze(prepare_log(console_log), config.output_dir)
-                    print("DONE!")
-                except Exception:
-                    print("FAILED!")
-                    traceback.print_exc(file=sys.stdout)
-                    continue
+            # graphs are left out, only the time spent going through the log
+            single_pass, legacy = benchmark(args.analysis, analysis.classes)
+            print(f"Single pass over the log: {single_pass:.2f}s")
+            print(f"Previous per class scans: {legacy:.2f}s")
+            print(f"Speed-up: {legacy / max(single_pass, 1e-6):.1f}x")
         exit(0)
 
     config.BOARD_NAMES = boardfarm.lib.test_configurator.filter_station_config(
@@ -162,6 +162,14 @@ features = []  # Features required for this test run
 TEST_SUITE_NOSTRICT = False  # ignores failure to import a tests from a testsuite
 regex_config = []  # Regex substitution for board config
 retry = 0  # How many times to retry every test if it fails
+# Minimum seconds between updates of results.html/test_results.json while running
+results_flush_interval = int(os.environ.get("BFT_RESULTS_INTERVAL", "60"))
+# Number of devices of a station instantiated concurrently
+device_setup_workers = int(os.environ.get("BFT_DEVICE_WORKERS", "8"))
+# Default timeout (seconds) to instantiate a device, see "setup_timeout"
+device_setup_timeout = int(os.environ.get("BFT_DEVICE_TIMEOUT", "900"))
+# Number of boot actions run at the same time, 1 runs them one after the other
+boot_workers = int(os.environ.get("BFT_BOOT_WORKERS", "4"))
 # Default image files to flash
 UBOOT = None
 KERNEL = None
@@ -2,11 +2,16 @@
 # The full text can be found in LICENSE in the root directory.
 
 
-import json
+import copy
+import logging
 from datetime import datetime, timedelta
 
 from influxdb import InfluxDBClient
 
+from boardfarm.dbclients.influx_writer import InfluxBatchWriter
+
+logger = logging.getLogger("bft")
+
 
 def datetimetostr(dt):
     if dt.utcoffset() is None:
@@ -53,6 +58,8 @@ class Influx_DB_Logger(InfluxDBClient, dict):
         # need to validate if DB is present, if not we need to create.
         self.validate_db(self.database)
         self.switch_database(self.database)
+        # points are written in batches from a background thread
+        self.writer = InfluxBatchWriter(self)
         print("Client Initialized!")
 
     def validate_db(self, db_name):
@@ -66,7 +73,8 @@ class Influx_DB_Logger(InfluxDBClient, dict):
 
     def populate_result_dictionary(self, data_field, cmd, iteration, date):
 
-        body = self.measurement_templatedic.copy()
+        # a deep copy, the queued points must not share their tags
+        body = copy.deepcopy(self.measurement_templatedic)
         body["fields"] = data_field
         body.pop("time")  # at the moment we use the db update time
         body["measurement"] = cmd
@@ -91,10 +99,8 @@ class Influx_DB_Logger(InfluxDBClient, dict):
             res_dict["date"] = date
             body = self.populate_result_dictionary(res_dict, cmd, iteration, date)
             self.db_data.append(body)
-            print(
-                "process_table: body: %s DB updating: %r"
-                % (json.dumps(body, indent=4), self.write_points([body]))
-            )
+        logger.debug(f"process_table: queuing {len(self.db_data)} {cmd} points")
+        self.writer.write(self.db_data)
         self.db_data = []
 
     def send_to_db(self, datain, cmd, iteration, date):
@@ -156,7 +162,18 @@ class Influx_DB_Logger(InfluxDBClient, dict):
             else:
                 data_unit = {"measurement": "response", "tags": {}}
                 _fill_common_data(data_unit, idx)
-        print(f"Update to DB : {self.write_points(data_to_post)!r}")
+        logger.debug(f"Update to DB : queuing {len(data_to_post)} points")
+        self.writer.write(data_to_post)
+
+    def flush(self, timeout=None):
+        """Wait until the queued points are written to the DB.
+
+        :param timeout: seconds to wait for, forever if None
+        :type timeout: float
+        :return: True if all points were written (or spilled) in time
+        :rtype: bool
+        """
+        return self.writer.flush(timeout)
 
     def __setitem__(self, key, value):
         func_call = {"influx": self.log_data, "board": self.process_table}
@@ -0,0 +1,227 @@
+"""Batched, asynchronous writes of points to InfluxDB.
+
+Writing each sample with its own request adds the round-trip to the DB to
+every sample a test takes. :class:`InfluxBatchWriter` queues the points and
+writes them from a background thread, in batches of ``batch_size`` points
+or every ``flush_interval`` seconds. A batch that cannot be written after
+``retries`` attempts is appended to a spill file and written again once the
+DB is reachable.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import weakref
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("bft")
+
+# points written together
+INFLUX_BATCH_SIZE = int(os.environ.get("BFT_INFLUX_BATCH_SIZE", 500))
+# seconds a point waits at most before being written
+INFLUX_FLUSH_INTERVAL = float(os.environ.get("BFT_INFLUX_FLUSH_INTERVAL", 5))
+# points queued at most, writers are throttled beyond
+INFLUX_QUEUE_SIZE = int(os.environ.get("BFT_INFLUX_QUEUE_SIZE", 10000))
+# directory of the points that could not be written, one file per database,
+# an empty BFT_INFLUX_SPILL drops them
+INFLUX_SPILL = os.environ.get(
+    "BFT_INFLUX_SPILL",
+    os.path.join(os.path.expanduser("~"), ".cache", "boardfarm", "influx-spill"),
+)
+
+_writers: "weakref.WeakSet[InfluxBatchWriter]" = weakref.WeakSet()
+
+
+class InfluxBatchWriter:
+    """Write the points of an InfluxDB client from a background thread."""
+
+    def __init__(
+        self,
+        client: Any,
+        batch_size: int = INFLUX_BATCH_SIZE,
+        flush_interval: float = INFLUX_FLUSH_INTERVAL,
+        queue_size: int = INFLUX_QUEUE_SIZE,
+        spill_path: Optional[str] = None,
+        retries: int = 3,
+        backoff: float = 1.0,
+    ) -> None:
+        """Instance initialization.
+
+        :param client: influxdb.InfluxDBClient the points are written with
+        :type client: object
+        :param batch_size: points written together at most
+        :type batch_size: int
+        :param flush_interval: seconds a point waits at most before being written
+        :type flush_interval: float
+        :param queue_size: points queued at most
+        :type queue_size: int
+        :param spill_path: file of the points that could not be written,
+            defaults to one in INFLUX_SPILL named after the client's database
+        :type spill_path: str, optional
+        :param retries: attempts to write a batch before it is spilled
+        :type retries: int
+        :param backoff: seconds before the first retry, doubled on each retry
+        :type backoff: float
+        """
+        self.client = client
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        if spill_path is None and INFLUX_SPILL:
+            name = "{}_{}_{}.jsonl".format(
+                getattr(client, "_host", ""),
+                getattr(client, "_port", ""),
+                getattr(client, "_database", ""),
+            )
+            spill_path = os.path.join(INFLUX_SPILL, name)
+        self.spill_path = spill_path
+        self.retries = retries
+        self.backoff = backoff
+        # points written, and appended to the spill file (replays included)
+        self.written = 0
+        self.spilled = 0
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(queue_size)
+        self._spill_lock = threading.Lock()
+        self._time_lock = threading.Lock()
+        self._last_time = 0
+        self._thread = threading.Thread(
+            target=self._run, name="influx-writer", daemon=True
+        )
+        self._thread.start()
+        _writers.add(self)
+
+    def write(self, points: List[Dict[str, Any]]) -> None:
+        """Queue points to be written.
+
+        Points without a time are stamped now, as they would be by the DB
+        if they were written immediately. Each of them gets a distinct time
+        (in ns), the rows of a table are written with the same measurement
+        and tags, and InfluxDB keeps one point per series and time.
+
+        :param points: points as for ``InfluxDBClient.write_points``
+        :type points: list
+        """
+        for point in points:
+            if not point.get("time"):
+                point = dict(point, time=self._now())
+            try:
+                self._queue.put(point, timeout=self.flush_interval)
+            except queue.Full:
+                logger.warning("Influx writer queue full, spilling a point to disk")
+                self._spill([point])
+
+    def _now(self) -> int:
+        """Return the time in ns, later than the one returned previously."""
+        with self._time_lock:
+            self._last_time = max(time.time_ns(), self._last_time + 1)
+            return self._last_time
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the queued points are written (or spilled).
+
+        :param timeout: seconds to wait for, forever if None
+        :type timeout: float, optional
+        :return: True if all points were handled in time
+        :rtype: bool
+        """
+        self._queue.put(None)
+        deadline = None if timeout is None else time.time() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def _run(self) -> None:
+        batch: List[Dict[str, Any]] = []
+        done = 0
+        deadline = time.time() + self.flush_interval
+        while True:
+            try:
+                point = self._queue.get(timeout=max(deadline - time.time(), 0))
+                done += 1
+                if point is not None:
+                    batch.append(point)
+                flush = point is None or len(batch) >= self.batch_size
+            except queue.Empty:
+                flush = True
+            if flush:
+                if batch:
+                    self._write(batch)
+                    batch = []
+                for _ in range(done):
+                    self._queue.task_done()
+                done = 0
+                deadline = time.time() + self.flush_interval
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        delay = self.backoff
+        for attempt in range(self.retries):
+            try:
+                self.client.write_points(batch)
+            except Exception as e:
+                logger.debug(f"Influx write of {len(batch)} points failed: {e!r}")
+                if attempt < self.retries - 1:
+                    time.sleep(delay)
+                    delay *= 2
+                continue
+            self.written += len(batch)
+            self._replay()
+            return
+        logger.warning(f"Influx DB unreachable, spilling {len(batch)} points")
+        self._spill(batch)
+
+    def _spill(self, points: List[Dict[str, Any]]) -> None:
+        self.spilled += len(points)
+        if not self.spill_path:
+            return
+        with self._spill_lock:
+            try:
+                os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+                with open(self.spill_path, "a") as f:
+                    for point in points:
+                        f.write(json.dumps(point, default=str) + "\n")
+            except OSError as e:
+                logger.error(f"Could not spill influx points to {self.spill_path}: {e}")
+
+    def _replay(self) -> None:
+        """Write the spilled points, now that the DB is reachable."""
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return
+        with self._spill_lock:
+            replay = f"{self.spill_path}.{os.getpid()}.replay"
+            try:
+                os.replace(self.spill_path, replay)
+                with open(replay) as f:
+                    points = [json.loads(line) for line in f if line.strip()]
+            except (OSError, ValueError) as e:
+                logger.error(f"Could not read spilled influx points: {e}")
+                return
+        try:
+            for i in range(0, len(points), self.batch_size):
+                self.client.write_points(points[i : i + self.batch_size])
+                self.written += len(points[i : i + self.batch_size])
+        except Exception as e:
+            logger.debug(f"Influx replay failed: {e!r}")
+            self._spill(points[i:])
+        os.remove(replay)
+        logger.info(f"Replayed {len(points)} spilled influx points")
+
+
+def flush_all(timeout: Optional[float] = 60) -> None:
+    """Write the queued points of all writers, e.g. on test teardown.
+
+    :param timeout: seconds to wait for each writer
+    :type timeout: float, optional
+    """
+    for writer in list(_writers):
+        if not writer.flush(timeout):
+            logger.warning("Influx writer did not flush in time")
+
+
+atexit.register(flush_all)
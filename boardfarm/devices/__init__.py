@@ -7,6 +7,7 @@ import logging
 import os
 import pkgutil
 import re
+import threading
 import traceback
 from collections import UserList
 from typing import Dict, Optional
@@ -15,6 +16,7 @@ import pexpect
 import termcolor
 
 import boardfarm
+from boardfarm import registry
 from boardfarm.exceptions import BftNotSupportedDevice, ConnectionRefused
 from boardfarm.lib.DeviceManager import device_manager
 from boardfarm.tests_wrappers import check_plugin_for_probe_devices
@@ -34,11 +36,41 @@ class DeviceMappings:
     dev_sw_mappings: Dict = {}
 
 
+def _all_boardfarm_modules():
+    """Return a dictionary of boardfarm and its plugins."""
+    all_boardfarm_modules = dict(boardfarm.plugins)
+    all_boardfarm_modules["boardfarm"] = importlib.import_module("boardfarm")
+    return all_boardfarm_modules
+
+
+def _load_devices(all_mods):
+    """Add the device classes of the given modules to device_mappings.
+
+    :return: model to names of the modules defining it
+    :rtype: dict
+    """
+    index = {}
+    for module in all_mods:
+        device_mappings[module] = []
+        for thing_name in dir(module):
+            thing = getattr(module, thing_name)
+            if inspect.isclass(thing) and hasattr(thing, "model"):
+                # thing.__module__ prints the module name where it is defined
+                # this name needs to match the current module we're scanning.
+                # else we skip
+                if thing.__module__ == module.__name__:
+                    device_mappings[module].append(thing)
+                    models = thing.model
+                    for model in models if type(models) is tuple else [models]:
+                        if type(model) is str:
+                            index.setdefault(model, []).append(module.__name__)
+    return index
+
+
 @check_plugin_for_probe_devices(DeviceMappings)
 def probe_devices():
     """Dynamically find all devices classes across all boardfarm projects."""
-    all_boardfarm_modules = dict(boardfarm.plugins)
-    all_boardfarm_modules["boardfarm"] = importlib.import_module("boardfarm")
+    all_boardfarm_modules = _all_boardfarm_modules()
 
     all_mods = []
 
@@ -52,16 +84,54 @@ def probe_devices():
                 filter_pkgs=["base_devices", "connections", "platform"],
             )
 
-    for module in all_mods:
-        device_mappings[module] = []
-        for thing_name in dir(module):
-            thing = getattr(module, thing_name)
-            if inspect.isclass(thing) and hasattr(thing, "model"):
-                # thing.__module__ prints the module name where it is defined
-                # this name needs to match the current module we're scanning.
-                # else we skip
-                if thing.__module__ == module.__name__:
-                    device_mappings[module].append(thing)
+    index = _load_devices(all_mods)
+    key = registry.fingerprint(all_boardfarm_modules, "devices")
+    registry.save("devices", key, index)
+
+
+# model to device modules, set when devices are imported on demand
+_device_index: Optional[Dict] = None
+_device_index_lock = threading.Lock()
+
+
+def probe_devices_lazily():
+    """Find device classes on demand instead of importing all of them.
+
+    get_device then imports the modules defining the requested model (and
+    profiles) only, as listed by the registry index. It falls back to
+    probe_devices if a plugin overrides it or the index is out of date.
+    """
+    global _device_index
+    if probe_devices.__module__ != __name__:
+        probe_devices()
+        return
+    key = registry.fingerprint(_all_boardfarm_modules(), "devices")
+    index = registry.load("devices", key)
+    if index is None:
+        probe_devices()
+        return
+    with _device_index_lock:
+        _device_index = index
+
+
+def _import_models(model, profiles):
+    """Import the device classes of a model and its profiles, if not done already."""
+    global _device_index
+    with _device_index_lock:
+        if _device_index is None:
+            return
+        if model not in _device_index:
+            logger.debug(f"Device model {model} not in the registry, probing all")
+            _device_index = None
+            probe_devices()
+            return
+        names = set(_device_index[model])
+        for name in profiles:
+            names.update(_device_index.get(name, []))
+        loaded = {module.__name__ for module in device_mappings}
+        _load_devices(
+            [importlib.import_module(name) for name in sorted(names - loaded)]
+        )
 
 
 device_mappings = DeviceMappings.dev_mappings
@@ -180,6 +250,7 @@ def get_device(model, device_mgr, **kwargs):
     profile = kwargs.get("profile", {})
     override = kwargs.pop("override", False)
     plugin = kwargs.pop("plugin_device", False)
+    _import_models(model, profile)
     cls_list = []
     profile_list = []
     for _device_file, devs in device_mappings.items():
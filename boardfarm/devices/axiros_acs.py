@@ -1,15 +1,18 @@
 import ast
+import functools
 import inspect
+import io
 import ipaddress
 import logging
 import os
 import re
 import tempfile
+import threading
 import time
 import warnings
 import xml.dom.minidom
 from datetime import datetime
-from typing import Optional, Union
+from typing import Dict, List, Optional, Tuple, Union
 from xml.etree import ElementTree
 
 import pexpect
@@ -18,11 +21,11 @@ import xmltodict
 from debtcollector import moves
 from nested_lookup import nested_lookup
 from requests import HTTPError, Session
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
 from termcolor import colored
 from zeep import Client
 from zeep.cache import InMemoryCache
-from zeep.transports import Transport
 from zeep.wsse.username import UsernameToken
 
 from boardfarm.devices.base_devices.acs_template import (
@@ -37,11 +40,13 @@ from boardfarm.exceptions import (
     TR069FaultCode,
     TR069ResponseError,
 )
+from boardfarm.lib import task_scheduler
 from boardfarm.lib.bft_pexpect_helper import bft_pexpect_helper
 from boardfarm.lib.common import get_class_name_in_stack, scp_from
 from boardfarm.lib.dns import DNS
 from boardfarm.lib.linux_nw_utility import NwFirewall
 from boardfarm.lib.network_testing import kill_process, tcpdump_capture
+from boardfarm.lib.soap_cache import CachingTransport
 
 from . import base_acs
 
@@ -51,15 +56,41 @@ logger = logging.getLogger("zeep.transports")
 
 _DEFAULT_TIMEOUT = 120
 
+_XSI_TYPE = "{http://www.w3.org/2001/XMLSchema-instance}type"
+_SOAP_ENC_ARRAY_TYPE = "{http://schemas.xmlsoap.org/soap/encoding/}arrayType"
+
 
 class Intercept:
-    """Any calls on Axiros RPC functions "GPV","SPV", "GPA","GPN", "SPA","AddObject","DelObject","FactoryReset","Reboot","ScheduleInform","GetRPCMethods","Download" will capture tcpdump if the ssh session is connected.
-    And also adds a wait time of 10 seconds when 507 HTTPError is thrown.
+    """Wrap the RPC methods of the ACS classes when they are created.
+
+    A call of the RPC methods "GPV","SPV","GPV_batch","SPV_batch","GPA","GPN",
+    "SPA","AddObject","DelObject","FactoryReset","Reboot","ScheduleInform",
+    "GetRPCMethods","Download","get","getcurrent","set","get_ticketId",
+    "Axiros_GetListOfCPEs","Axiros_DeleteCPEs","Axiros_GetTicketResponse",
+    "Axiros_GetTicketValue","rpc_GetParameterAttributes",
+    "rpc_SetParameterAttributes","rpc_AddObject","rpc_DelObject",
+    "Read_Log_Message","Del_Log_Message" that fails with a 507 HTTPError (DOS
+    protection of the ACS) is retried once after 10 seconds. Other methods,
+    the private helpers in particular, are not wrapped: the requests of
+    GPV_batch/SPV_batch sent from worker threads back off on their own
+    instead of waiting on the shared console.
+
+    When capture is enabled and the ssh session is connected, calls on Axiros
+    RPC functions "GPV","SPV","GPV_batch","SPV_batch","GPA","GPN","SPA",
+    "AddObject","DelObject","FactoryReset","Reboot","ScheduleInform",
+    "GetRPCMethods","Download" are captured with tcpdump and the capture is
+    saved to the results folder if they fail.
+
+    With capture_mode "rolling" a single tcpdump writes a ring buffer of pcap
+    files for the whole session, and only the files written during a failed
+    RPC are saved. With "per_call" a tcpdump is started and killed for each RPC.
     """
 
     __dump_on = [
         "GPV",
         "SPV",
+        "GPV_batch",
+        "SPV_batch",
         "GPA",
         "SPA",
         "GPN",
@@ -71,109 +102,179 @@ class Intercept:
         "GetRPCMethods",
         "Download",
     ]
+    __retry_on = __dump_on + [
+        "get",
+        "getcurrent",
+        "set",
+        "get_ticketId",
+        "Axiros_GetListOfCPEs",
+        "Axiros_DeleteCPEs",
+        "Axiros_GetTicketResponse",
+        "Axiros_GetTicketValue",
+        "rpc_GetParameterAttributes",
+        "rpc_SetParameterAttributes",
+        "rpc_AddObject",
+        "rpc_DelObject",
+        "Read_Log_Message",
+        "Del_Log_Message",
+    ]
 
-    def __getattribute__(self, name):
-        attr = object.__getattribute__(self, name)
-        if callable(attr):
-            d_flag = False
-            if (
-                self.skip_capture is False
-                and name in Intercept.__dump_on
+    capture_mode = "rolling"
+    # number of 2MB pcap files of the rolling capture
+    capture_ring_files = 10
+    # seconds of traffic saved before the start of a failed RPC
+    capture_margin = 2
+    _ring_pid: Optional[str] = None
+    _capture_depth = 0
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for name, attr in list(vars(cls).items()):
+            if inspect.isfunction(attr) and name in Intercept.__retry_on:
+                setattr(cls, name, Intercept.__wrap(name, attr))
+
+    @staticmethod
+    def __wrap(name, func):
+        dump = name in Intercept.__dump_on
+
+        @functools.wraps(func)
+        def newfunc(self, *args, **kwargs):
+            capture = (
+                dump
+                and self.skip_capture is False
                 and self.session_connected
+                and not self._capture_depth
+            )
+            if (
+                capture
+                and args
+                and hasattr(self.dev.board, "unsupported_objects")
+                and args[0] in self.dev.board.unsupported_objects
             ):
-                # sets the flag to true only if ssh session is connected
-                d_flag = True
-
-            def newfunc(*args, **kwargs):
-                count = 2  # retries on 507 HTTPerror, even if ssh conn is not available
-                if d_flag:
-                    arg = [x for x in args]
-                    if (
-                        args
-                        and hasattr(self.dev.board, "unsupported_objects")
-                        and arg[0] in self.dev.board.unsupported_objects
-                    ):
-                        warnings.warn("Unsupported parameter")
-                        logger.warning("Warning!!! Unsupported parameter")
-                        return
-                    stack = inspect.stack()
-                    test_name = get_class_name_in_stack(
-                        self,
-                        ["test_main", "mvx_tst_setup"],
-                        stack,
-                        not_found="TestNameNotFound",
-                    )
-                    build_number = os.getenv("BUILD_NUMBER", "")
-                    job_name = os.getenv("JOB_NAME", "")
-                    pcap = "_" + time.strftime("%Y%m%d_%H%M%S") + ".pcap"
-                    capture = (
-                        job_name.replace("/", "_")
-                        + "_"
-                        + build_number
-                        + "_"
-                        + test_name
-                        + pcap
+                warnings.warn("Unsupported parameter")
+                logger.warning("Warning!!! Unsupported parameter")
+                return None
+            count = 2  # retries on 507 HTTPerror, even if ssh conn is not available
+            for retry in range(count):
+                if capture:
+                    token = self._capture_start()
+                    self._capture_depth += 1
+                try:
+                    result = func(self, *args, **kwargs)
+                except Exception as e:
+                    retry_507 = "507" in str(e) and retry != (count - 1)
+                    if capture:
+                        self._capture_depth -= 1
+                        self._capture_stop(token, save=not retry_507)
+                    if not retry_507:
+                        raise
+                    # adding 10 sec timeout
+                    warnings.warn(
+                        "Ten seconds of timeout is added to compensate DOS attack."
                     )
-                ok = False
-                for retry in range(count):
-                    result = None
-                    if d_flag:
-                        tcpdump_output = tcpdump_capture(
-                            self,
-                            "any",
-                            capture_file=capture,
-                            return_pid=True,
-                            additional_filters=self.tcpdump_filter,
-                        )
-                    try:
-                        result = attr(*args, **kwargs)
-                        ok = True  # will remove file in finally
-                        break
-                    except Exception as e:
-                        if "507" not in str(e):
-                            raise (e)
-                        else:
-                            if retry != (count - 1):
-                                # adding 10 sec timeout
-                                warnings.warn(
-                                    "Ten seconds of timeout is added to compensate DOS attack."
-                                )
-                                self.expect(pexpect.TIMEOUT, timeout=10)
-                            else:
-                                raise (e)
-                    finally:
-                        # kill and if successful remove pcap file
-                        if d_flag:
-                            kill_process(
-                                self,
-                                process="tcpdump",
-                                pid=tcpdump_output,
-                                sync=False,
-                            )
-                            if not ok and (retry == (count - 1)):
-                                logger.info(
-                                    "\x1b[6;30;42m"
-                                    + f"TCPdump is saved in {capture}"
-                                    + "\x1b[0m"
-                                )
-                                # captured packet is moved to results folder
-                                dest = os.path.realpath("results")
-                                scp_from(
-                                    capture,
-                                    self.ipaddr,
-                                    self.cli_username,
-                                    self.cli_password,
-                                    self.cli_port,
-                                    dest,
-                                )
-                            self.sendline(f"rm {capture}")
-                            self.expect(self.prompt)
-
+                    self.expect(pexpect.TIMEOUT, timeout=10)
+                    continue
+                if capture:
+                    self._capture_depth -= 1
+                    self._capture_stop(token, save=False)
                 return result
 
-            return newfunc
-        else:
-            return attr
+        return newfunc
+
+    def _capture_name(self, extension: str) -> str:
+        """Return the name a failed RPC capture is saved with."""
+        test_name = get_class_name_in_stack(
+            self,
+            ["test_main", "mvx_tst_setup"],
+            inspect.stack(0),
+            not_found="TestNameNotFound",
+        )
+        build_number = os.getenv("BUILD_NUMBER", "")
+        job_name = os.getenv("JOB_NAME", "")
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
+        return f"{job_name.replace('/', '_')}_{build_number}_{test_name}_{timestamp}{extension}"
+
+    def _capture_start(self):
+        """Start capturing an RPC.
+
+        :return: token to pass to :meth:`_capture_stop`
+        """
+        if self.capture_mode == "rolling":
+            if not self._ring_pid:
+                self._ring_pid = tcpdump_capture(
+                    self,
+                    "any",
+                    capture_file=self._ring_file,
+                    return_pid=True,
+                    filecount=self.capture_ring_files,
+                    additional_filters=self.tcpdump_filter,
+                )
+            return time.monotonic()
+        capture = f"acs_{os.getpid()}_{time.strftime('%Y%m%d_%H%M%S')}.pcap"
+        pid = tcpdump_capture(
+            self,
+            "any",
+            capture_file=capture,
+            return_pid=True,
+            additional_filters=self.tcpdump_filter,
+        )
+        return pid, capture
+
+    def _capture_stop(self, token, save: bool) -> None:
+        """Stop capturing an RPC, saving what was captured if it failed.
+
+        :param token: value returned by :meth:`_capture_start`
+        :param save: copy the capture to the results folder
+        :type save: bool
+        """
+        if self.capture_mode == "rolling":
+            if save:
+                self._save_ring(time.monotonic() - token + self.capture_margin)
+            return
+        pid, capture = token
+        kill_process(self, process="tcpdump", pid=pid, sync=False)
+        if save:
+            self._save_capture(capture, self._capture_name(".pcap"))
+        self.sendline(f"rm {capture}")
+        self.expect(self.prompt)
+
+    @property
+    def _ring_file(self) -> str:
+        return f"acs_ring_{os.getpid()}.pcap"
+
+    def _save_ring(self, seconds: float) -> None:
+        """Save the ring buffer files written during the last seconds."""
+        archive = f"acs_ring_{os.getpid()}.tgz"
+        self.sendline(
+            f"tar czf {archive} $(find . -maxdepth 1 -name '{self._ring_file}*' "
+            f'-newermt "@$(( $(date +%s) - {int(seconds) + 1} ))") 2>/dev/null'
+        )
+        self.expect(self.prompt)
+        self._save_capture(archive, self._capture_name(".tgz"))
+        self.sendline(f"rm {archive}")
+        self.expect(self.prompt)
+
+    def _save_capture(self, capture: str, name: str) -> None:
+        """Copy a capture from the ACS to the results folder."""
+        dest = os.path.join(os.path.realpath("results"), name)
+        logger.info("\x1b[6;30;42m" + f"TCPdump is saved in {dest}" + "\x1b[0m")
+        scp_from(
+            capture,
+            self.ipaddr,
+            self.cli_username,
+            self.cli_password,
+            self.cli_port,
+            dest,
+        )
+
+    def _stop_ring(self) -> None:
+        """Stop the rolling capture and remove its files."""
+        if not self._ring_pid:
+            return
+        kill_process(self, process="tcpdump", pid=self._ring_pid, sync=False)
+        self.sendline(f"rm -f {self._ring_file}*")
+        self.expect(self.prompt)
+        self._ring_pid = None
 
 
 class AxirosACS(Intercept, base_acs.BaseACS, AcsTemplate):
@@ -185,7 +286,36 @@ class AxirosACS(Intercept, base_acs.BaseACS, AcsTemplate):
     cpe_wait_time = _DEFAULT_TIMEOUT
     Count_retry_on_error = 3  # to be audited
     skip_capture = True
+    # maximum number of parameters sent in one request by GPV_batch/SPV_batch
+    batch_size = 100
+    # maximum number of batched requests in flight at the same time
+    batch_workers = 4
     _cpeid: str = ""
+    _client: Optional[Client] = None
+    _client_lock = threading.Lock()
+    _types: Optional[dict] = None
+
+    @property
+    def client(self) -> Client:
+        """SOAP client of the ACS, created from the WSDL on first use.
+
+        :return: the zeep client
+        :rtype: Client
+        """
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = Client(
+                        wsdl=self.wsdl,
+                        transport=self._transport,
+                        wsse=UsernameToken(self.username, self.password),
+                    )
+        return self._client
+
+    @client.setter
+    def client(self, value: Client):
+        self._client = value
+        self._types = None
 
     @property
     def cpeid(self) -> str:
@@ -252,10 +382,13 @@ class AxirosACS(Intercept, base_acs.BaseACS, AcsTemplate):
         session.auth = HTTPBasicAuth(self.username, self.password)
         self._certs = None
         session.verify = self._get_certs(self.kwargs.get("certs"))
-        self.client = Client(
-            wsdl=self.wsdl,
-            transport=Transport(session=session, cache=InMemoryCache(timeout=3600 * 3)),
-            wsse=UsernameToken(self.username, self.password),
+        # keep a connection per concurrent batched request
+        adapter = HTTPAdapter(pool_maxsize=self.batch_workers)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        # the WSDL is loaded when the client is first used
+        self._transport = CachingTransport(
+            session=session, cache=InMemoryCache(timeout=3600 * 3)
         )
 
         # to spawn pexpect on cli
@@ -322,7 +455,17 @@ class AxirosACS(Intercept, base_acs.BaseACS, AcsTemplate):
         """
         raise NotImplementedError
 
-    def enable_capture(self):
+    def enable_capture(self, mode: Optional[str] = None):
+        """Capture the RPCs and save the capture of the ones that fail.
+
+        :param mode: "rolling" or "per_call", defaults to capture_mode
+        :type mode: str, optional
+        """
+        if mode not in (None, "rolling", "per_call"):
+            raise CodeError(f"Invalid capture mode: {mode}")
+        if mode and mode != self.capture_mode:
+            self._stop_ring()
+            self.capture_mode = mode
         self.skip_capture = False
         logger.warning(
             colored("ACS pcap capture ENABLED", color="green", attrs=["bold"])
@@ -330,6 +473,7 @@ class AxirosACS(Intercept, base_acs.BaseACS, AcsTemplate):
 
     def disable_capture(self):
         self.skip_capture = True
+        self._stop_ring()
         logger.warning(
             colored(
                 "ACS pcap capture DISABLED",
@@ -445,35 +589,109 @@ class AxirosACS(Intercept, base_acs.BaseACS, AcsTemplate):
             ),
         )
 
+    @staticmethod
+    def _soap_text(elem):
+        """Return the character data of an element, stripped as xmltodict does."""
+        if elem is None:
+            return ""
+        text = (elem.text or "") + "".join(child.tail or "" for child in elem)
+        return AxirosACS._replace_non_ascii_and_control_chars_with_hex(text.strip())
+
+    @staticmethod
+    def _soap_item(item):
+        """Return the record of a Result/details/item element."""
+        fields = {child.tag.rsplit("}", 1)[-1]: child for child in item}
+        key = AxirosACS._soap_text(fields.get("key"))
+        value = fields["value"]
+        children = {child.tag.rsplit("}", 1)[-1]: child for child in value}
+        if "AccessList" in children:
+            access_list = [AxirosACS._soap_text(i) for i in children["AccessList"]]
+            return {
+                "Name": key,
+                "AccessList": access_list[0] if len(access_list) == 1 else access_list,
+                "Notification": AxirosACS._soap_text(children.get("Notification")),
+            }
+        v = AxirosACS._soap_text(value)
+        if v == "" and len(value):
+            v = " ".join(AxirosACS._soap_text(i) for i in value)
+        val_type = value.get(_XSI_TYPE, "")
+        if val_type == "SOAP-ENC:Array":
+            val_type = value.get(_SOAP_ENC_ARRAY_TYPE)
+        return AxirosACS._data_conversion({"key": key, "type": val_type, "value": v})
+
+    @staticmethod
+    def _iterparse_soap_response(content):
+        """Parse an ACS reply in a single pass.
+
+        The details items are converted to records as soon as they are parsed
+        and then dropped from the tree.
+
+        :param content: body of the reply
+        :type content: bytes
+        :return: number of Result elements, the elements directly under Result
+            (code, details, message, ticketid) and the details records
+        :rtype: tuple
+        """
+        results, fields, records = 0, {}, []
+        path = []
+        events = ElementTree.iterparse(io.BytesIO(content), events=("start", "end"))
+        for event, elem in events:
+            name = elem.tag.rsplit("}", 1)[-1]
+            if event == "start":
+                path.append(name)
+                results += name == "Result"
+                continue
+            path.pop()
+            if path[-1:] == ["Result"]:
+                fields[name] = elem
+            elif name == "item" and path[-2:] == ["Result", "details"]:
+                records.append(AxirosACS._soap_item(elem))
+                elem.clear()
+        return results, fields, records
+
     @staticmethod
     def _parse_soap_response(response):
         """Parse the ACS response and return a\
         list of dictionary with {key,type,value} pair."""
-        response_text = AxirosACS._replace_non_ascii_and_control_chars_with_hex(
-            response.text
-        )
-        msg = xml.dom.minidom.parseString(response_text)
-        logger.debug(msg.toprettyxml(indent=" ", newl=""))
+        if logger.isEnabledFor(logging.DEBUG):
+            response_text = AxirosACS._replace_non_ascii_and_control_chars_with_hex(
+                response.text
+            )
+            msg = xml.dom.minidom.parseString(response_text)
+            logger.debug(msg.toprettyxml(indent=" ", newl=""))
 
-        result = AxirosACS._get_xml_key(response)
-        if len(result) > 1:
+        try:
+            results, fields, records = AxirosACS._iterparse_soap_response(
+                response.content
+            )
+        except ElementTree.ParseError:
+            # control characters are not allowed in XML, escape them first
+            content = AxirosACS._replace_non_ascii_and_control_chars_with_hex(
+                response.content.decode("utf-8")
+            )
+            results, fields, records = AxirosACS._iterparse_soap_response(
+                content.encode("utf-8")
+            )
+        if results > 1:
             raise KeyError("More than 1 Result in reply not implemented yet")
-        result = result[0]
-        httpcode = result["code"]["text"]
-        msg = result["message"]["text"]
+        result = {name: AxirosACS._soap_text(elem) for name, elem in fields.items()}
+        httpcode = result.get("code", "")
+        msg = result.get("message", "")
         http_error_message = "HTTP Error code:" + httpcode + " " + msg
         if httpcode != "200":
             # with 507 (timeout/expired) there seem to be NO faultcode message
             if httpcode == "500":
-                if "faultcode" not in result["message"]["text"]:
+                if "faultcode" not in msg:
                     raise HTTPError(http_error_message)
             else:
                 raise HTTPError(http_error_message)
 
+        def present(name):
+            elem = fields.get(name)
+            return elem is not None and bool(elem.attrib or len(elem) or result[name])
+
         # is this needed (might be overkill)?
-        if not all(
-            [result.get("details"), result.get("message"), result.get("ticketid")]
-        ):
+        if not all(present(name) for name in ["details", "message", "ticketid"]):
             e = TR069ResponseError(
                 "ACS malformed response (issues with either "
                 "details/message/ticketid)."
@@ -487,29 +705,34 @@ class AxirosACS(Intercept, base_acs.BaseACS, AcsTemplate):
             e.faultdict = ast.literal_eval(msg[msg.index("{") :])
             raise e
         # 'item' is not present in FactoryReset RPC response
-        if "item" in result["details"]:
-            return AxirosACS._parse_xml_response(result["details"]["item"])
-        elif (
-            "ns1:KeyValueStruct[0]"
-            in result["details"]["http://schemas.xmlsoap.org/soap/encoding/:arrayType"]
-        ):
+        if records:
+            return records
+        elif "ns1:KeyValueStruct[0]" in fields["details"].get(_SOAP_ENC_ARRAY_TYPE, ""):
             return []
 
+    def _get_type(self, name: str):
+        """Return the zeep type factory of a type name, resolved once per client."""
+        if self._types is None:
+            self._types = {}
+        if name not in self._types:
+            self._types[name] = self.client.get_type(name)
+        return self._types[name]
+
     def _get_cmd_data(self, *args, **kwagrs):
         """Return CmdOptTypeStruct_data. It is a helper method."""
         c_opt_type = "ns0:CommandOptionsTypeStruct"
-        CmdOptTypeStruct_type = self.client.get_type(c_opt_type)
+        CmdOptTypeStruct_type = self._get_type(c_opt_type)
         return CmdOptTypeStruct_type(*args, **kwagrs)
 
     def _get_class_data(self, *args, **kwagrs):
         """Return CPEIdClassStruct_data. It is a helper method."""
         cpe__id_type = "ns0:CPEIdentifierClassStruct"
-        CPEIdClassStruct_type = self.client.get_type(cpe__id_type)
+        CPEIdClassStruct_type = self._get_type(cpe__id_type)
         return CPEIdClassStruct_type(*args, **kwagrs)
 
     def _get_pars_val_data(self, p_arr_type, *args, **kwargs):
         """Return ParValsParsClassArray_data.It is a helper method."""
-        ParValsClassArray_type = self.client.get_type(p_arr_type)
+        ParValsClassArray_type = self._get_type(p_arr_type)
         return ParValsClassArray_type(*args, **kwargs)
 
     def spa_param_struct(self, k, v, o):
@@ -614,8 +837,9 @@ class AxirosACS(Intercept, base_acs.BaseACS, AcsTemplate):
         return ParValsParsClassArray_data, CmdOptTypeStruct_data, CPEIdClassStruct_data
 
     def close(self):
-        """Implement to close ACS connection. TODO."""
-        pass
+        """Stop the rolling capture, closing the ACS connection is TODO."""
+        if self.session_connected:
+            self._stop_ring()
 
     def get_ticketId(self, cpeid, param):
         """ACS server maintain a ticket ID for all TR069 RPC calls.
@@ -631,21 +855,17 @@ class AxirosACS(Intercept, base_acs.BaseACS, AcsTemplate):
         :returns: ticketid
         :rtype: string
         """
-        GetParameterValuesParametersClassArray_type = self.client.get_type(
+        GetParameterValuesParametersClassArray_type = self._get_type(
             "ns0:GetParameterValuesParametersClassArray"
         )
         GetParameterValuesParametersClassArray_data = (
             GetParameterValuesParametersClassArray_type([param])
         )
 
-        CommandOptionsTypeStruct_type = self.client.get_type(
-            "ns0:CommandOptionsTypeStruct"
-        )
+        CommandOptionsTypeStruct_type = self._get_type("ns0:CommandOptionsTypeStruct")
         CommandOptionsTypeStruct_data = CommandOptionsTypeStruct_type()
 
-        CPEIdentifierClassStruct_type = self.client.get_type(
-            "ns0:CPEIdentifierClassStruct"
-        )
+        CPEIdentifierClassStruct_type = self._get_type("ns0:CPEIdentifierClassStruct")
         CPEIdentifierClassStruct_data = CPEIdentifierClassStruct_type(cpeid=cpeid)
 
         # get raw soap response (parsing error with zeep)
@@ -745,12 +965,12 @@ class AxirosACS(Intercept, base_acs.BaseACS, AcsTemplate):
         :returns: ACS response containing the list of CPE.
         :rtype: string
         """
-        CPESearchOptionsClassStruct_type = self.client.get_type(
+        CPESearchOptionsClassStruct_type = self._get_type(
             "ns0:CPESearchOptionsClassStruct"
         )
         CPESearchOptionsClassStruct_data = CPESearchOptionsClassStruct_type()
 
-        CommandOptionsForCPESearchStruct_type = self.client.get_type(
+        CommandOptionsForCPESearchStruct_type = self._get_type(
             "ns0:CommandOptionsForCPESearchStruct"
         )
         CommandOptionsForCPESearchStruct_data = CommandOptionsForCPESearchStruct_type()
@@ -770,12 +990,12 @@ class AxirosACS(Intercept, base_acs.BaseACS, AcsTemplate):
         :returns: True if successful
         :rtype: True/False
         """
-        CPESearchOptionsClassStruct_type = self.client.get_type(
+        CPESearchOptionsClassStruct_type = self._get_type(
             "ns0:CPESearchOptionsClassStruct"
         )
         CPESearchOptionsClassStruct_data = CPESearchOptionsClassStruct_type(cpeid=cpeid)
 
-        CommandOptionsForCPESearchStruct_type = self.client.get_type(
+        CommandOptionsForCPESearchStruct_type = self._get_type(
             "ns0:CommandOptionsForCPESearchStruct"
         )
         CommandOptionsForCPESearchStruct_data = CommandOptionsForCPESearchStruct_type()
@@ -996,14 +1216,12 @@ class AxirosACS(Intercept, base_acs.BaseACS, AcsTemplate):
         :returns: ticket response on ACS(Log message)
         :rtype: dictionary
         """
-        CommandOptionsTypeStruct_type = self.client.get_type(
+        CommandOptionsTypeStruct_type = self._get_type(
             "ns0:CommandOptionsForCPELogStruct"
         )
         CommandOptionsTypeStruct_data = CommandOptionsTypeStruct_type()
 
-        CPEIdentifierClassStruct_type = self.client.get_type(
-            "ns0:CPEIdentifierClassStruct"
-        )
+        CPEIdentifierClassStruct_type = self._get_type("ns0:CPEIdentifierClassStruct")
         CPEIdentifierClassStruct_data = CPEIdentifierClassStruct_type(cpeid=cpeid)
 
         # get raw soap response (parsing error with zeep)
@@ -1038,9 +1256,7 @@ class AxirosACS(Intercept, base_acs.BaseACS, AcsTemplate):
         :returns: True or None
         :rtype: Boolean
         """
-        CPEIdentifierClassStruct_type = self.client.get_type(
-            "ns0:CPEIdentifierClassStruct"
-        )
+        CPEIdentifierClassStruct_type = self._get_type("ns0:CPEIdentifierClassStruct")
         CPEIdentifierClassStruct_data = CPEIdentifierClassStruct_type(cpeid=cpeid)
 
         # get raw soap response (parsing error with zeep)
@@ -1128,6 +1344,305 @@ class AxirosACS(Intercept, base_acs.BaseACS, AcsTemplate):
             raise TR069ResponseError("SPV Invalid status: " + str(status))
         return status
 
+    def _batch_rpc(self, action: str, param, timeout: int, cpe_id: str):
+        """Send a GPV or SPV request for GPV_batch/SPV_batch.
+
+        Unlike GPV and SPV, it is not captured nor wrapped by Intercept as it
+        runs in a worker thread: it is retried once on a 507 HTTPError after
+        sleeping 10 seconds, without waiting on the console shared with the
+        other workers.
+        """
+        p, cmd, cpeid = self._build_input_structs(
+            cpe_id, param, action=action, wait_time=timeout
+        )
+        service = {
+            "GPV": self.client.service.GetParameterValues,
+            "SPV": self.client.service.SetParameterValues,
+        }[action]
+        for retry in range(2):
+            try:
+                with self.client.settings(raw_response=True):
+                    response = service(p, cmd, cpeid)
+                return AxirosACS._parse_soap_response(response)
+            except Exception as e:
+                if "507" not in str(e) or retry:
+                    raise
+                logger.warning(f"{action} request got a 507, retrying in 10 seconds")
+                time.sleep(10)
+
+    def _batch_cpe_ids(
+        self, cpe_id: Union[str, List[Optional[str]], None], count: int
+    ) -> List[str]:
+        """Return the cpe identifier of each call of a batch."""
+        if cpe_id is None or isinstance(cpe_id, str):
+            return [cpe_id or self.cpeid] * count
+        if len(cpe_id) != count:
+            raise CodeError(f"Expected {count} cpe identifiers, got {len(cpe_id)}")
+        default = None if all(cpe_id) else self.cpeid
+        return [c or default for c in cpe_id]
+
+    def _batch_chunks(
+        self, calls: List[Tuple[int, list]]
+    ) -> List[List[Tuple[int, list]]]:
+        """Pack calls in chunks of at most batch_size parameters.
+
+        Calls are never split, one with more parameters is alone in its chunk.
+        """
+        chunks, current, size = [], [], 0
+        for index, params in calls:
+            if current and size + len(params) > self.batch_size:
+                chunks.append(current)
+                current, size = [], 0
+            current.append((index, params))
+            size += len(params)
+        if current:
+            chunks.append(current)
+        return chunks
+
+    @staticmethod
+    def _batch_results(
+        results: List[Union[list, int, Exception]], return_exceptions: bool
+    ) -> list:
+        """Raise the error of the first failed call unless return_exceptions."""
+        if not return_exceptions:
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+        return results
+
+    def GPV_batch(
+        self,
+        params: List[GpvInput],
+        timeout: Optional[int] = None,
+        cpe_id: Union[str, List[Optional[str]], None] = None,
+        return_exceptions: bool = False,
+    ) -> List[Union[GpvResponse, Exception]]:
+        """Get the values of the parameters of many GPV calls in as few requests as possible.
+
+        The parameters of all the calls are deduplicated, a parameter below a
+        partial path already requested is not requested again, and sent in
+        requests of at most batch_size parameters. Up to batch_workers
+        requests are in flight at the same time over the pooled HTTP session.
+        If a request fails with a TR069 fault its parameters are requested one
+        by one, so that the fault is reported for the calls it belongs to.
+
+        Example usage : acs_server.GPV_batch(['Device.DeviceInfo.', ['Device.WiFi.SSID.1.SSID', 'Device.WiFi.SSID.2.SSID']])
+        :param params: param of each GPV call
+        :type params: List[GpvInput]
+        :param timeout: to set the Lifetime Expiry time, defaults to None
+        :type timeout: Optional[int], optional
+        :param cpe_id: cpe identifier of all the calls or of each call, defaults to None
+        :type cpe_id: Union[str, List[Optional[str]], None], optional
+        :param return_exceptions: return the exception of a failed call in its
+            place instead of raising the first one, defaults to False
+        :type return_exceptions: bool, optional
+        :raises CodeError: if cpe_id is a list of another length than params
+        :return: GPV response of each call, in the order of params
+        :rtype: List[Union[GpvResponse, Exception]]
+        """
+        timeout = timeout or _DEFAULT_TIMEOUT
+        calls = [[p] if isinstance(p, str) else list(p) for p in params]
+        cpe_ids = self._batch_cpe_ids(cpe_id, len(calls))
+
+        # path of each call to the path it is requested with, per cpe
+        sources: Dict[str, Dict[str, str]] = {}
+        tasks, chunks = {}, {}
+        for cpe in dict.fromkeys(cpe_ids):
+            source = sources[cpe] = {}
+            partials: List[str] = []
+            new_paths = []
+            for index, paths in enumerate(calls):
+                if cpe_ids[index] != cpe:
+                    continue
+                new = []
+                for path in paths:
+                    if path in source:
+                        continue
+                    covering = next((q for q in partials if path.startswith(q)), None)
+                    source[path] = covering or path
+                    if covering is None:
+                        new.append(path)
+                        if path.endswith("."):
+                            partials.append(path)
+                if new:
+                    new_paths.append((index, new))
+            for chunk in self._batch_chunks(new_paths):
+                name = f"GPV {cpe} #{len(tasks)}"
+                paths = [path for _, paths in chunk for path in paths]
+                chunks[name] = (cpe, paths)
+                tasks[name] = lambda cpe=cpe, paths=paths: self._batch_gpv_chunk(
+                    paths, timeout, cpe
+                )
+
+        results = task_scheduler.run_tasks(tasks, max_workers=self.batch_workers)
+
+        records: Dict[str, list] = {cpe: [] for cpe in sources}
+        errors: Dict[Tuple[str, str], Exception] = {}
+        for name, result in results.items():
+            cpe, paths = chunks[name]
+            if not result.ok:
+                errors.update({(cpe, path): result.error for path in paths})
+                continue
+            chunk_records, chunk_errors = result.value
+            records[cpe] += chunk_records
+            errors.update({(cpe, path): e for path, e in chunk_errors.items()})
+        by_key: Dict[str, dict] = {cpe: {} for cpe in sources}
+        for cpe, recs in records.items():
+            for record in recs:
+                by_key[cpe].setdefault(record["key"], record)
+            records[cpe] = list(by_key[cpe].values())
+
+        responses: List[Union[GpvResponse, Exception]] = []
+        for paths, cpe in zip(calls, cpe_ids):
+            error = next(
+                (
+                    errors[(cpe, sources[cpe][path])]
+                    for path in paths
+                    if (cpe, sources[cpe][path]) in errors
+                ),
+                None,
+            )
+            if error is not None:
+                responses.append(error)
+                continue
+            response = []
+            for path in paths:
+                if path.endswith("."):
+                    response += [r for r in records[cpe] if r["key"].startswith(path)]
+                elif path in by_key[cpe]:
+                    response.append(by_key[cpe][path])
+            responses.append(response)
+        return self._batch_results(responses, return_exceptions)
+
+    def _batch_gpv_chunk(
+        self, paths: List[str], timeout: int, cpe_id: str
+    ) -> Tuple[list, Dict[str, Exception]]:
+        """Request the paths of a GPV_batch chunk, one by one on TR069 fault.
+
+        :return: the records and the fault of each failed path
+        :rtype: tuple(list, dict)
+        """
+        try:
+            return self._batch_rpc("GPV", paths, timeout, cpe_id) or [], {}
+        except TR069FaultCode:
+            if len(paths) == 1:
+                raise
+        logger.debug(f"GPV of {len(paths)} parameters failed, retrying one by one")
+        records, errors = [], {}
+        for path in paths:
+            try:
+                records += self._batch_rpc("GPV", path, timeout, cpe_id) or []
+            except TR069FaultCode as e:
+                errors[path] = e
+        return records, errors
+
+    def SPV_batch(
+        self,
+        params: List[SpvInput],
+        timeout: Optional[int] = None,
+        cpe_id: Union[str, List[Optional[str]], None] = None,
+        return_exceptions: bool = False,
+    ) -> List[Union[int, Exception]]:
+        """Set the values of many SPV calls in as few requests as possible.
+
+        Calls are sent together in requests of at most batch_size parameters.
+        A call is never split over requests, so it is still applied atomically
+        by the CPE. A call setting a parameter to another value than an
+        earlier call is sent after the requests of the earlier one completed,
+        the requests in between are sent concurrently, up to batch_workers of
+        them. If a request fails with a TR069 fault its calls are sent one by
+        one, so that the fault is reported for the call it belongs to.
+
+        Example usage : acs_server.SPV_batch([{'Device.WiFi.SSID.1.SSID': 'ssid1'}, [{'Device.WiFi.SSID.2.SSID': 'ssid2'}]])
+        :param params: param_value of each SPV call
+        :type params: List[SpvInput]
+        :param timeout: to set the Lifetime Expiry time, defaults to None
+        :type timeout: Optional[int], optional
+        :param cpe_id: cpe identifier of all the calls or of each call, defaults to None
+        :type cpe_id: Union[str, List[Optional[str]], None], optional
+        :param return_exceptions: return the exception of a failed call in its
+            place instead of raising the first one, defaults to False
+        :type return_exceptions: bool, optional
+        :raises CodeError: if cpe_id is a list of another length than params
+        :raises TR069ResponseError: if the status is not (0/1)
+        :return: status of the request each call was sent in, in the order of params
+        :rtype: List[Union[int, Exception]]
+        """
+        timeout = timeout or _DEFAULT_TIMEOUT
+        calls = [
+            [(k, v) for d in (p if isinstance(p, list) else [p]) for k, v in d.items()]
+            for p in params
+        ]
+        cpe_ids = self._batch_cpe_ids(cpe_id, len(calls))
+
+        tasks, depends_on, chunks = {}, {}, {}
+        for cpe in dict.fromkeys(cpe_ids):
+            # calls of a round do not conflict with each other
+            rounds: List[List[Tuple[int, list]]] = [[]]
+            values: dict = {}
+            for index, kvs in enumerate(calls):
+                if cpe_ids[index] != cpe:
+                    continue
+                if any(values.get(k, v) != v for k, v in kvs):
+                    rounds.append([])
+                    values = {}
+                values.update(kvs)
+                rounds[-1].append((index, kvs))
+            previous: List[str] = []
+            for calls_of_round in rounds:
+                names = []
+                for chunk in self._batch_chunks(calls_of_round):
+                    name = f"SPV {cpe} #{len(tasks)}"
+                    chunks[name] = [index for index, _ in chunk]
+                    depends_on[name] = previous
+                    tasks[name] = lambda cpe=cpe, chunk=chunk: self._batch_spv_chunk(
+                        chunk, timeout, cpe
+                    )
+                    names.append(name)
+                previous = names
+
+        results = task_scheduler.run_tasks(
+            tasks, depends_on, max_workers=self.batch_workers
+        )
+
+        statuses: List[Union[int, Exception]] = [None] * len(calls)
+        for name, result in results.items():
+            for index in chunks[name]:
+                statuses[index] = result.value[index] if result.ok else result.error
+        return self._batch_results(statuses, return_exceptions)
+
+    def _batch_spv_chunk(
+        self, chunk: List[Tuple[int, list]], timeout: int, cpe_id: str
+    ) -> Dict[int, Union[int, Exception]]:
+        """Send the calls of an SPV_batch chunk, one by one on TR069 fault.
+
+        :return: call index to the status of its request, or its fault
+        :rtype: dict
+        """
+
+        def _spv(kvs):
+            param = [{k: v} for k, v in dict(kvs).items()]
+            result = self._batch_rpc("SPV", param, timeout, cpe_id)
+            status = int(result[0]["value"])
+            if status not in [0, 1]:
+                raise TR069ResponseError("SPV Invalid status: " + str(status))
+            return status
+
+        try:
+            status = _spv([kv for _, kvs in chunk for kv in kvs])
+            return {index: status for index, _ in chunk}
+        except TR069FaultCode:
+            if len(chunk) == 1:
+                raise
+        logger.debug(f"SPV of {len(chunk)} calls failed, retrying one by one")
+        statuses = {}
+        for index, kvs in chunk:
+            try:
+                statuses[index] = _spv(kvs)
+            except TR069FaultCode as e:
+                statuses[index] = e
+        return statuses
+
     def GPN(self, param, next_level, timeout: Optional[int] = _DEFAULT_TIMEOUT):
         """This method is used to  discover the Parameters accessible on a particular CPE
 
@@ -8,13 +8,15 @@
 import logging
 import signal
 
+from boardfarm.lib import state_epoch
+from boardfarm.lib.bft_logging import BufferedLog
 from boardfarm.lib.bft_pexpect_helper import bft_pexpect_helper
 
 logger = logging.getLogger("bft")
 
 
-class BaseDevice(bft_pexpect_helper):
-    log = ""
+class BaseDevice(bft_pexpect_helper, state_epoch.BumpOnReset):
+    log = BufferedLog()
     log_calls = ""
 
     prompt = [
@@ -13,6 +13,7 @@ from boardfarm.lib.bft_pexpect_helper import bft_pexpect_helper as PexpectHelper
 from boardfarm.lib.env_helper import EnvHelper
 from boardfarm.lib.linux_nw_utility import DeviceNwUtility, NwFirewall
 from boardfarm.lib.signature_checker import __MetaSignatureChecker
+from boardfarm.lib.state_epoch import BumpOnReset
 
 from .fxo_template import FXOTemplate
 
@@ -51,7 +52,7 @@ class ConsoleTemplate(PexpectHelper, metaclass=__MetaSignatureChecker):
         )
 
 
-class BoardHWTemplate(metaclass=__MetaSignatureChecker):
+class BoardHWTemplate(BumpOnReset, metaclass=__MetaSignatureChecker):
     @abstractmethod
     def __init__(self, *args, **kwargs):
         """Base initialisation of the DUT HW interface."""
@@ -95,7 +96,7 @@ class BoardHWTemplate(metaclass=__MetaSignatureChecker):
             c.close()
 
 
-class BoardSWTemplate(metaclass=__MetaSignatureChecker):
+class BoardSWTemplate(BumpOnReset, metaclass=__MetaSignatureChecker):
     voice: Optional[FXOTemplate] = None
     mib: Optional[MIBTemplate] = None
     nw_utility: Optional[DeviceNwUtility] = None
@@ -253,7 +254,7 @@ class BoardSWTemplate(metaclass=__MetaSignatureChecker):
         raise NotImplementedError
 
 
-class BoardTemplate(metaclass=__MetaSignatureChecker):
+class BoardTemplate(BumpOnReset, metaclass=__MetaSignatureChecker):
     """This class shows a basic set of interfaces to be implemented for testing
     a DUT with boardfarm. The DUT attributes (and other devices) are defined
     a .json file (called "inventory file")."""
@@ -1,14 +1,17 @@
 import datetime
+import hashlib
 import ipaddress
 import logging
 import os
 import re
+import tempfile
 import traceback
 
 import pexpect
 from termcolor import colored
 
 from boardfarm.exceptions import CodeError, ConfigKeyError
+from boardfarm.lib import state_epoch
 from boardfarm.lib.bft_pexpect_helper import spawn_ssh_pexpect
 from boardfarm.lib.common import retry_on_exception, scp_from
 from boardfarm.lib.regexlib import ValidIpv4AddressRegex
@@ -176,11 +179,7 @@ class DebianISCProvisioner(debian_wan.DebianWAN):
         """Set up DHCP 6 Config."""
         tftp_server = self.tftp_device.tftp_server_ipv6_int()
 
-        to_send = (
-            """cat > /etc/dhcp/dhcpd6.conf-"""
-            + board_config.get_station()
-            + """.master << EOF
-log-facility local1;
+        to_send = """log-facility local1;
 preferred-lifetime 7200;
 default-lease-time 43200;
 option dhcp-renewal-time 3600;
@@ -237,7 +236,6 @@ shared-network boardfarm {
             option docsis.PKTCBL-CCCV4 1 4 ###MTA_DHCP_SERVER1### 2 4 ###MTA_DHCP_SERVER2###;
             option docsis.time-offset ###TIMEZONE###;
         }"""
-        )
 
         if self.cm_network_v6 != self.open_network_v6:
             to_send = (
@@ -265,7 +263,7 @@ shared-network boardfarm {
         }
     }
 }
-EOF"""
+"""
         )
 
         to_send = to_send.replace("###IFACE###", self.iface_dut)
@@ -310,18 +308,6 @@ EOF"""
         to_send = to_send.replace("###TIMEZONE###", str(self.timezone))
         # TODO: add ranges for subnet's, syslog server per CM
 
-        self.sendline(to_send)
-        self.expect(self.prompt)
-
-        self.sendline("rm /etc/dhcp/dhcpd6.conf." "" + board_config.get_station())
-        self.expect(self.prompt)
-
-        cfg_file = "/etc/dhcp/dhcpd6.conf-" + board_config.get_station()
-
-        # zero out old config
-        self.sendline(f"cp /dev/null {cfg_file}")
-        self.expect(self.prompt)
-
         # insert tftp server, TODO: how to clean up?
         if "options" not in board_config["extra_provisioning_v6"]["cm"]:
             board_config["extra_provisioning_v6"]["cm"]["options"] = {}
@@ -352,55 +338,20 @@ EOF"""
                 )
                 self.snooper.expect(self.snooper.prompt)
 
-        # there is probably a better way to construct this file...
-        for dev, cfg_sec in board_config["extra_provisioning_v6"].items():
-            self.sendline(
-                "echo 'host %s-%s {' >> %s"
-                % (dev, board_config.get_station(), cfg_file)
-            )
-            for key, value in cfg_sec.items():
-                if key == "options":
-                    for k2, v2 in value.items():
-                        self.sendline(f"echo '   option {k2} {v2};' >> {cfg_file}")
-                        self.expect(self.prompt)
-                else:
-                    self.sendline(f"echo '   {key} {value};' >> {cfg_file}")
-                    self.expect(self.prompt)
-            self.sendline("echo '}' >> %s" % cfg_file)
-
-        self.sendline(
-            "mv " + cfg_file + " /etc/dhcp/dhcpd6.conf." + board_config.get_station()
+        station = board_config.get_station()
+        hosts = self._render_host_entries(
+            board_config["extra_provisioning_v6"], station
         )
-        self.expect(self.prompt)
-
         # can't provision without this, so let's ignore v6 if that's the case
         if tftp_server is None:
-            self.sendline("rm /etc/dhcp/dhcpd6.conf." + board_config.get_station())
-            self.expect(self.prompt)
-
-        # combine all configs into one
-        self.sendline(
-            "cat /etc/dhcp/dhcpd6.conf.* >> /etc/dhcp/dhcpd6.conf-"
-            + board_config.get_station()
-            + ".master"
-        )
-        self.expect(self.prompt)
-        self.sendline(
-            "mv /etc/dhcp/dhcpd6.conf-"
-            + board_config.get_station()
-            + ".master /etc/dhcp/dhcpd6.conf"
-        )
-        self.expect(self.prompt)
+            hosts = None
+        return self._push_dhcp_config(station, to_send, hosts, v6="6")
 
     def setup_dhcp_config(self, board_config):
         """Set up DHCP Config."""
         tftp_server = self.tftp_device.tftp_server_ip_int()
 
-        to_send = (
-            """cat > /etc/dhcp/dhcpd.conf-"""
-            + board_config.get_station()
-            + """.master << EOF
-log-facility local0;
+        to_send = """log-facility local0;
 option log-servers ###LOG_SERVER###;
 option time-servers ###TIME_SERVER###;
 default-lease-time 604800;
@@ -485,8 +436,7 @@ shared-network boardfarm {
     allow members of "HOST";
   }
 }
-EOF"""
-        )
+"""
 
         to_send = to_send.replace("###LOG_SERVER###", str(self.syslog_server))
         to_send = to_send.replace("###TIME_SERVER###", str(self.time_server))
@@ -525,61 +475,129 @@ EOF"""
                 "###OPEN_GATEWAY###",
                 str(self.get_invalid_route(self.open_network[120])),
             )
-        self.sendline(to_send)
-        self.expect(self.prompt)
-
-        self.sendline(f"rm /etc/dhcp/dhcpd.conf.{board_config.get_station()}")
-        self.expect(self.prompt)
-
-        cfg_file = f"/etc/dhcp/dhcpd.conf-{board_config.get_station()}"
-
-        # zero out old config
-        self.sendline(f"cp /dev/null {cfg_file}")
-        self.expect(self.prompt)
-
         # insert tftp server, TODO: how to clean up?
         board_config["extra_provisioning"]["cm"]["next-server"] = tftp_server
         board_config["extra_provisioning"]["mta"]["next-server"] = tftp_server
 
-        # there is probably a better way to construct this file...
-        for dev, cfg_sec in board_config["extra_provisioning"].items():
-            self.sendline(
-                "echo 'host %s-%s {' >> %s"
-                % (dev, board_config.get_station(), cfg_file)
-            )
+        station = board_config.get_station()
+        hosts = self._render_host_entries(board_config["extra_provisioning"], station)
+        if tftp_server is None:
+            hosts = None
+        return self._push_dhcp_config(station, to_send, hosts)
+
+    @staticmethod
+    def _render_host_entries(extra_provisioning, station):
+        """Render the host entries of a station's dhcpd config file.
+
+        :param extra_provisioning: host parameters and options per device
+        :type extra_provisioning: dict
+        :param station: station name, suffixed to the host names
+        :type station: str
+        :return: text of the config file
+        :rtype: str
+        """
+        lines = []
+        for dev, cfg_sec in extra_provisioning.items():
+            lines.append(f"host {dev}-{station} {{")
             for key, value in cfg_sec.items():
                 if key == "options":
-                    for k2, v2 in value.items():
-                        self.sendline(f"echo '   option {k2} {v2};' >> {cfg_file}")
-                        self.expect(self.prompt)
+                    lines.extend(f"   option {k2} {v2};" for k2, v2 in value.items())
                 else:
-                    self.sendline(f"echo '   {key} {value};' >> {cfg_file}")
-                    self.expect(self.prompt)
-            self.sendline("echo '}' >> %s" % cfg_file)
+                    lines.append(f"   {key} {value};")
+            lines.append("}")
+        return "".join(f"{line}\n" for line in lines)
+
+    def _push_dhcp_config(self, station, master, hosts, v6=""):
+        """Push the DHCP config of a station, restarting nothing.
+
+        The master config and the host entries of the station are only
+        uploaded if they differ from the files on the provisioner, the
+        combined dhcpd.conf is then rebuilt (see :meth:`_install_dhcp_conf`).
+
+        :param station: station name
+        :type station: str
+        :param master: text of the master config
+        :type master: str
+        :param hosts: host entries of the station, None to remove them
+        :type hosts: str, optional
+        :param v6: "6" for the DHCPv6 config
+        :type v6: str
+        :return: True if dhcpd.conf changed, i.e. the server must be restarted
+        :rtype: bool
+        """
+        master_file = f"/etc/dhcp/dhcpd{v6}.conf-{station}.master"
+        station_file = f"/etc/dhcp/dhcpd{v6}.conf.{station}"
+        self._push_file(master_file, master)
+        if hosts is None:
+            self.sendline(f"rm -f {station_file}")
+            self.expect(self.prompt)
+        else:
+            self._push_file(station_file, hosts)
+        return self._install_dhcp_conf(v6, f"cat {master_file}")
 
-        self.sendline(
-            f"mv {cfg_file} /etc/dhcp/dhcpd.conf.{board_config.get_station()}"
-        )
+    def _push_file(self, path, txt):
+        """Replace a file on the provisioner, if its content differs.
 
+        The file is uploaded in one transfer next to its destination and
+        moved in place, so it is never seen half written.
+
+        :param path: file on the provisioner
+        :type path: str
+        :param txt: new content of the file
+        :type txt: str
+        :return: True if the file changed
+        :rtype: bool
+        """
+        digest = hashlib.sha256(txt.encode()).hexdigest()
+        if self._remote_file_info(path)[1] == digest:
+            return False
+        # hidden, so that the dhcpd.conf.* globs do not pick it up
+        tmp = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.new")
+        with tempfile.NamedTemporaryFile("w") as f:
+            f.write(txt)
+            f.flush()
+            self.copy_file_to_server(f.name, tmp)
+        self.sendline(f"mv -f {tmp} {path}")
         self.expect(self.prompt)
+        return True
 
-        if tftp_server is None:
-            self.sendline(f"rm /etc/dhcp/dhcpd.conf.{board_config.get_station()}")
-            self.expect(self.prompt)
+    def _install_dhcp_conf(self, v6, base_cmd):
+        """Rebuild dhcpd.conf from its base and all the station files.
 
-        # combine all configs into one
-        self.sendline(
-            "cat /etc/dhcp/dhcpd.conf.* >> /etc/dhcp/dhcpd.conf-"
-            + board_config.get_station()
-            + ".master"
+        The new config is built next to dhcpd.conf and compared to it. If it
+        differs it is checked with ``dhcpd -t`` and moved in place, an
+        invalid config is discarded and the running one kept.
+
+        :param v6: "6" for the DHCPv6 config
+        :type v6: str
+        :param base_cmd: command printing the config preceding the hosts
+        :type base_cmd: str
+        :raises CodeError: if dhcpd rejects the new config
+        :return: True if dhcpd.conf changed
+        :rtype: bool
+        """
+        conf = f"/etc/dhcp/dhcpd{v6}.conf"
+        tmp = f"/etc/dhcp/.dhcpd{v6}.conf.new"
+        family = "-6" if v6 else "-4"
+        # the markers are split, so that the echoed command does not match
+        out = self.check_output(
+            f"({base_cmd}; cat {conf}.* 2>/dev/null) > {tmp}; "
+            f"if cmp -s {tmp} {conf}; then echo DHCP_UN''CHANGED; "
+            f"elif dhcpd {family} -t -cf {tmp} > {tmp}.log 2>&1; "
+            f"then mv -f {tmp} {conf}; echo DHCP_UP''DATED; "
+            f"else cat {tmp}.log; echo DHCP_IN''VALID; fi; rm -f {tmp} {tmp}.log"
         )
-        self.expect(self.prompt)
-        self.sendline(
-            "mv /etc/dhcp/dhcpd.conf-"
-            + board_config.get_station()
-            + ".master /etc/dhcp/dhcpd.conf"
+        if "DHCP_INVALID" in out:
+            raise CodeError(f"dhcpd{v6}.conf rejected by dhcpd -t:\n{out}")
+        return "DHCP_UPDATED" in out
+
+    def _dhcp_servers_running(self):
+        """Return True if one dhcpd -4 and one dhcpd -6 server are running."""
+        out = self.check_output("ps aux | grep [d]hcpd")
+        return (
+            len(re.findall("dhcpd[^\n]*-4", out)) == 1
+            and len(re.findall("dhcpd[^\n]*-6", out)) == 1
         )
-        self.expect(self.prompt)
 
     def get_invalid_route(
         self, ip_pool_upper_bound: ipaddress.IPv4Network
@@ -732,8 +750,10 @@ EOF"""
                 "docsis.acsserver"
             ] = f"00 {acs_aux_url_hex}"
 
-        self.setup_dhcp_config(board_config)
-        self.setup_dhcp6_config(board_config)
+        changed = self.setup_dhcp_config(board_config)
+        changed6 = self.setup_dhcp6_config(board_config)
+        # setup_dhcp*_config overrides returning nothing may have changed it
+        return changed is not False or changed6 is not False
 
     def setup_dhcp_logging(self):
         out = self.check_output("ls /var/log/dhcp/dhcpd.log")
@@ -786,56 +806,49 @@ EOF"""
         if not device.wan_cmts_provisioner:
             device.setup([])
         """ Setup DHCP and time server etc for CM provisioning"""
-        device.sendline(
-            f'echo INTERFACESv4="{device.iface_dut}" > /etc/default/isc-dhcp-server'
-        )
-        device.expect(device.prompt)
-        device.sendline(
-            f'echo INTERFACESv6="{device.iface_dut}" >> /etc/default/isc-dhcp-server'
-        )
-        device.expect(device.prompt)
-        # we are bypass this for now (see http://patchwork.ozlabs.org/patch/117949/)
-        device.sendline(f"sysctl -w net.ipv6.conf.{device.iface_dut}.accept_dad=0")
-        device.expect(device.prompt)
+        cmds = [
+            f'echo INTERFACESv4="{device.iface_dut}" > /etc/default/isc-dhcp-server',
+            f'echo INTERFACESv6="{device.iface_dut}" >> /etc/default/isc-dhcp-server',
+            # we are bypass this for now (see http://patchwork.ozlabs.org/patch/117949/)
+            f"sysctl -w net.ipv6.conf.{device.iface_dut}.accept_dad=0",
+        ]
         if not device.wan_no_eth0:
-            device.sendline(f"ifconfig {device.iface_dut} up")
-            device.expect(device.prompt)
-            device.sendline(f"ifconfig {device.iface_dut} {device.gw}")
-            device.expect(device.prompt)
+            cmds.append(f"ifconfig {device.iface_dut} up")
+            cmds.append(f"ifconfig {device.iface_dut} {device.gw}")
+        device.run_batch(cmds)
 
+        cmds = []
+        if not device.wan_no_eth0:
             # TODO: we need to route via eth0 at some point
             # TODO: don't hard code eth0...
             device.disable_ipv6("eth0")
             device.enable_ipv6(device.iface_dut)
             if device.gwv6 is not None:
-                device.sendline(
+                cmds.append(
                     "ip -6 addr add %s/%s dev %s"
                     % (device.gwv6, device.ipv6_prefix, device.iface_dut)
                 )
-                device.expect(device.prompt)
 
         if device.static_route is not None:
-            device.sendline(f"ip route add {device.static_route}")
-            device.expect(device.prompt)
+            cmds.append(f"ip route add {device.static_route}")
 
         if device.prov_gateway != device.prov_ip:
             for nw in [device.cm_network, device.mta_network, device.open_network]:
-                device.sendline(f"ip route add {nw} via {device.prov_gateway}")
-                device.expect(device.prompt)
+                cmds.append(f"ip route add {nw} via {device.prov_gateway}")
 
         if device.prov_gateway_v6 != device.prov_ipv6:
             for nw in [device.cm_gateway_v6, device.open_gateway_v6]:
-                device.sendline(
+                cmds.append(
                     "ip -6 route add %s/%s via %s dev %s"
                     % (nw, device.ipv6_prefix, device.prov_gateway_v6, device.iface_dut)
                 )
-                device.expect(device.prompt)
 
         # if fixed IP range is set, routes need to be configured based on individual host IPs.
         if not device.erouter_fixed_ip_start:
             for nw in device.erouter_net:
-                device.sendline(f"ip -6 route add {nw} via {device.prov_gateway_v6}")
-                device.expect(device.prompt)
+                cmds.append(f"ip -6 route add {nw} via {device.prov_gateway_v6}")
+        # one round-trip for the (many) routes, failures are ignored as before
+        device.run_batch(cmds, timeout=60)
 
         # only start tftp server if we are a full blown wan+provisioner
         if device.wan_cmts_provisioner:
@@ -868,6 +881,7 @@ EOF"""
     # this should be renamed to a more suitable generic name.
     def provision_board(self, board_config):
         """Reprovisions current board with new CM cfg."""
+        state_epoch.bump("board reprovisioned")
         exc_to_raise = None
         check = False
         for i in range(3):
@@ -880,8 +894,11 @@ EOF"""
                     print_config = True
 
                 # this is the chunk from reprovision
-                self.update_cmts_isc_dhcp_config(board_config)
-                self._restart_dhcp()
+                changed = self.update_cmts_isc_dhcp_config(board_config)
+                if changed or print_config or not self._dhcp_servers_running():
+                    self._restart_dhcp()
+                else:
+                    logger.info("DHCP config unchanged, not restarting dhcpd")
                 check = True
             except Exception as e:
                 exc_to_raise = e
@@ -1144,6 +1161,10 @@ EOF"""
             try:
                 self._modify_station_cfg_file(station_name, cfg_txt, v6)
                 self._concat_station_configs(station_name, v6)
+            except CodeError as e:
+                # rejected by dhcpd -t, the running config was left in place
+                logger.error(colored(str(e), color="red", attrs=["bold"]))
+                self._modify_station_cfg_file(station_name, old_txt, v6)
             except Exception:
                 self.expect(self.prompt)
                 logger.error(
@@ -1176,23 +1197,13 @@ EOF"""
             self.print_dhcp_config()
 
     def _concat_station_configs(self, station_name, v6):
-        # Get the base DHCP configs stored.
-        self.check_output(
-            f"awk '/log-facility/,/host .* {{/' /etc/dhcp/dhcpd{v6}.conf | head -n-1 >"
-            f" /etc/dhcp/dhcpd{v6}.conf-{station_name}.master"
-        )
-        # concat all stations config files again.
-        self.check_output(
-            f"cat /etc/dhcp/dhcpd{v6}.conf.* >> /etc/dhcp/dhcpd{v6}.conf-{station_name}.master"
+        # the base DHCP config is the one preceding the hosts in dhcpd.conf
+        base_cmd = (
+            f"awk '/log-facility/,/host .* {{/' /etc/dhcp/dhcpd{v6}.conf | head -n-1"
         )
-        self.check_output(
-            f"mv /etc/dhcp/dhcpd{v6}.conf-{station_name}.master /etc/dhcp/dhcpd{v6}.conf"
-        )
-        self._restart_dhcp(retries=1)
+        if self._install_dhcp_conf(v6, base_cmd):
+            self._restart_dhcp(retries=1)
 
     def _modify_station_cfg_file(self, station_name, txt, v6):
-        self.sendline(f"cat > /etc/dhcp/dhcpd{v6}.conf.{station_name} << EOF")
-        for line in txt.splitlines():
-            self.sendline(line)
-        self.sendline("EOF")
-        self.expect(self.prompt)
+        txt = "".join(f"{line}\n" for line in txt.splitlines())
+        self._push_file(f"/etc/dhcp/dhcpd{v6}.conf.{station_name}", txt)
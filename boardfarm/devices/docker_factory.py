@@ -1,19 +1,24 @@
 import atexit
 import codecs
+import functools
 import json
 import logging
 import os
 import pkgutil
 import re
 import sys
+import threading
+import time
 from collections import defaultdict
 from threading import Lock
 
 import pexpect
 
 from boardfarm.devices import get_device, linux
-from boardfarm.exceptions import DeviceDoesNotExistError
+from boardfarm.exceptions import DeviceDoesNotExistError, DockerAPIError
+from boardfarm.lib import docker_api, task_scheduler
 from boardfarm.lib.bft_pexpect_helper import bft_pexpect_helper
+from boardfarm.lib.DeviceManager import PendingDevices
 from boardfarm.tests_wrappers import run_with_lock
 
 lock = Lock()
@@ -69,6 +74,13 @@ class DockerFactory(linux.LinuxDevice):
     3. Env configuration to respective docker engines
     4. Docker interface validation and docker network configuration
     5. If pre-configured target specified in JSON, deploy target containers
+    6. If ``pool_size`` is set, start a pool of ``bft:node`` containers
+       that later targets are claimed from
+
+    Docker is driven from the factory console, or with ``"backend": "api"``
+    (or ``BFT_DOCKER_BACKEND=api``) through the Docker Engine API of the
+    docker host, see :mod:`boardfarm.lib.docker_api`. The console is used
+    if the API cannot be reached.
 
     :param ``*args``: mandatory args **model**
     :type ``*args``: tuple
@@ -92,6 +104,15 @@ class DockerFactory(linux.LinuxDevice):
     target_cname = []
     del_docker_network = False
     build_image_path = None
+    # number of started containers of pool_img kept ready to be claimed
+    pool_size = 0
+    pool_img = "bft:node"
+    # seconds for sshd to accept connections in a new container
+    ready_timeout = 60
+    # "console" or "api"
+    backend = os.environ.get("BFT_DOCKER_BACKEND", "console")
+    # boardfarm.lib.docker_api client, with the api backend
+    api = None
 
     def __str__(self):
         return self.name
@@ -113,6 +134,11 @@ class DockerFactory(linux.LinuxDevice):
         self.network_options = ""
 
         self.device_counter = defaultdict(int)
+        self.pool_size = int(kwargs.pop("pool_size", self.pool_size))
+        self._pool = []
+        self._pool_counter = 0
+        self._gateway = None
+        self.backend = kwargs.pop("backend", self.backend)
 
         # In case json provides its own env, update that to boardfarm.devices.env
         # These are meant to be exported to docker-factory not to docker-engines
@@ -219,18 +245,22 @@ class DockerFactory(linux.LinuxDevice):
                 break
             self.expect(pexpect.TIMEOUT, timeout=5)
 
+        if self.backend == "api":
+            self.api = self._api_client()
+
         # enforcing here, containers will only be created using docker-network
         self.configure_docker_network()
 
-        for target in kwargs.pop("targets", []):
-            self.add_target(target)
+        self.add_targets(kwargs.pop("targets", []))
+        if self.pool_size:
+            self.fill_pool(wait=False)
 
     def add_target(self, target, docker_network=None):
         """Run a docker container from DockerFactory.
 
         ``add_target`` performs the following actions:
             - Validate / Build target image for container
-            - Spawn the requested docker container
+            - Claim a container from the pool, or spawn the requested one
             - Connect the docker network to container
             - Register the target to ``boardfarm.lib.DeviceManager``
 
@@ -245,87 +275,362 @@ class DockerFactory(linux.LinuxDevice):
             2. LAN and WAN containers both have a mgmt iface ``eth0`` and a data iface ``eth1``
             3. JSON validation for target is not handled by add_target
         """
-        target_img = target["img"]
-        target_type = target["type"]
-        name = target["name"]
+        self.add_targets([target], docker_network)
 
-        counter = self.device_counter
-        counter[name] += 1
+    def add_targets(self, targets, docker_network=None):
+        """Run the docker containers of several targets at the same time.
 
-        target_cname = target["name"] + "-${uniq_id}" + str(counter[name])
+        Targets using ``pool_img`` are claimed from the pool of started
+        containers, the others are started concurrently on the docker
+        engine. Starting, connecting and inspecting the containers each take
+        a single console round-trip whatever the number of targets, then the
+        target devices connect to their container in parallel.
 
+        :param targets: mandatory keys **img, type, name** for each target
+        :type targets: list(dict)
+        :param docker_network: docker network to connect to target containers
+        :type docker_network: string
+        """
+        if not targets:
+            return
+        docker_network = self.docker_network if not docker_network else docker_network
         ip = getattr(self, "docker_engine", None)
         if not ip:
             ip = self.ipaddr
-        target["ipaddr"] = ip.split("@")[-1]
-        target["device_mgr"] = self.dev
 
-        options = target.get("options", [])
-        if options:
-            options = options.split(",")
-        docker_network = self.docker_network if not docker_network else docker_network
+        cnames = []
+        for target in targets:
+            counter = self.device_counter
+            counter[target["name"]] += 1
+            cnames.append(
+                target["name"] + "-" + self._uniq_id + str(counter[target["name"]])
+            )
+            target["ipaddr"] = ip.split("@")[-1]
+            target["device_mgr"] = self.dev
 
-        self.configure_docker_image(target_img)
+        for img in {target["img"] for target in targets}:
+            self.configure_docker_image(img)
 
-        # TODO: check for docker image and build if needed/can
         # TODO: move default command into Dockerfile
         # TODO: list of ports to forward, http proxy port for example and ssh
-        self.sendline(
-            "docker run --rm --privileged --name=%s -d -p 22 %s /usr/sbin/sshd -D"
-            % (target_cname, target_img)
+        claimed = self._claim_from_pool(
+            [c for c, t in zip(cnames, targets) if t["img"] == self.pool_img]
         )
-        self.expect(self.prompt)
-        self.expect(pexpect.TIMEOUT, timeout=5)
+        to_start = [(c, t["img"]) for c, t in zip(cnames, targets) if c not in claimed]
+        started = self._start_containers([(c, img, None) for c, img in to_start])
+        failed = [c for i, (c, _) in enumerate(to_start) if i not in started]
+        assert not failed, f"Failed to start docker containers: {failed}"
         self.created_docker = True
-        self.target_cname.append(target_cname)
+        self.target_cname.extend(cnames)
+
+        info = self._connect_containers(cnames, docker_network)
+        for i, (target, cname) in enumerate(zip(targets, cnames)):
+            options = target.get("options", [])
+            if options:
+                options = options.split(",")
+            if self.network_options:
+                net = info["NET"].get(i)
+                assert (
+                    net and net["IPAddress"]
+                ), f"Failed to set a static IPv4 Address for container : {cname}"
 
-        self.isolate_traffic(target_cname)
+                options.append(
+                    f"wan-static-ip:{net['IPAddress']}/{net['IPPrefixLen']} "
+                )
 
-        self.sendline(f"docker network connect {docker_network} {target_cname}")
-        self.expect(self.prompt)
-        assert (
-            "Error response from daemon" not in self.before
-        ), "Failed to connect docker network"
-
-        if self.network_options:
-            ip = json.loads(
-                self.check_output(
-                    "docker inspect -f '{{json .NetworkSettings.Networks.%s}}' %s"
-                    % (docker_network, target_cname)
+                # IPv6 is optional
+                if net["GlobalIPv6Address"]:
+                    options.append(
+                        "wan-static-ipv6:%s/%s"
+                        % (net["GlobalIPv6Address"], net["GlobalIPv6PrefixLen"])
+                    )
+
+                if net["Gateway"]:
+                    options.append(f"static-route:0.0.0.0/0-{net['Gateway']}")
+            target["port"] = info["PORT"][i]
+            target["options"] = ",".join(options)
+            int(target["port"])
+
+        if claimed:
+            self.fill_pool(wait=False)
+
+        # the targets are added to the device manager in order, not as they come up
+        pending = {cname: PendingDevices() for cname in cnames}
+        results = task_scheduler.run_tasks(
+            {
+                cname: functools.partial(
+                    pending[cname].run, get_device, target["type"], **target
                 )
-            )
+                for cname, target in zip(cnames, targets)
+            },
+            max_workers=len(targets),
+        )
+        for cname, result in results.items():
+            if not result.ok:
+                for targets_added in pending.values():
+                    targets_added.discard()
+                raise result.error
+            pending[cname].commit()
+            self.extra_devices.append(result.value)
+
+    def _ready_cmd(self, cname):
+        """Return a command waiting until sshd accepts connections in a container."""
+        tries = int(self.ready_timeout / 0.5)
+        return (
+            "(n=0; until docker exec %s bash -c ': </dev/tcp/127.0.0.1/22' 2>/dev/null;"
+            " do n=$((n+1)); [ $n -ge %d ] && exit 1; sleep 0.5; done)" % (cname, tries)
+        )
 
-            assert ip[
-                "IPAddress"
-            ], f"Failed to set a static IPv4 Address for container : {target_cname}"
+    def _start_cmd(self, cname, img, name=None):
+        """Return a command starting a container, ready and with its traffic isolated.
 
-            options.append(f"wan-static-ip:{ip['IPAddress']}/{ip['IPPrefixLen']} ")
+        :param name: rename the container to it once ready
+        """
+        cmd = (
+            "docker run --rm --privileged --name=%s -d -p 22 %s /usr/sbin/sshd -D"
+            " > /dev/null && %s && %s"
+            % (cname, img, self._ready_cmd(cname), self._isolate_cmd(cname))
+        )
+        if name:
+            cmd += f" && docker rename {cname} {name}"
+        return cmd
 
-            # IPv6 is optional
-            if ip["GlobalIPv6Address"]:
-                options.append(
-                    "wan-static-ipv6:%s/%s"
-                    % (ip["GlobalIPv6Address"], ip["GlobalIPv6PrefixLen"])
+    def _run_markers(self, cmd, timeout=30):
+        """Run a command printing ``MARKER:<index>:<value>`` lines and parse them.
+
+        The markers are echoed as ``MARK''ER`` so that the echo of the command
+        itself does not match.
+
+        :return: marker to {index: value}
+        :rtype: dict
+        """
+        self.sendline(cmd)
+        self.expect(self.prompt, timeout=timeout)
+        found = defaultdict(dict)
+        for marker, index, value in re.findall(
+            r"^(STARTED|NET|PORT):(\d+):(.*?)\s*$", self.before, re.M
+        ):
+            found[marker][int(index)] = value
+        return found
+
+    def _start_containers(self, containers):
+        """Start containers concurrently and wait until they are ready.
+
+        Instead of a fixed sleep, each container is ready once its sshd
+        accepts connections: probed from the console, or reported by the
+        container health check with the API backend.
+
+        :param containers: name, image and name once ready (or None) of each container
+        :type containers: list(tuple)
+        :return: indexes of the containers that started
+        :rtype: set
+        """
+        if not containers:
+            return set()
+        if self.api:
+            return self._api_start_containers(containers)
+        # wait for these jobs only, not for the pool refills running in the
+        # background of the same shell
+        cmd = " ".join(
+            "(%s && echo START''ED:%d:) & pids=\"$pids $!\";"
+            % (self._start_cmd(*container), i)
+            for i, container in enumerate(containers)
+        )
+        found = self._run_markers(
+            f"pids=; {cmd} wait $pids", timeout=self.ready_timeout + 60
+        )
+        return set(found["STARTED"])
+
+    def _api_start_containers(self, containers):
+        since = time.time()
+        healthcheck = {
+            # as _ready_cmd, /bin/sh of the images (dash) has no /dev/tcp
+            "Test": ["CMD", "bash", "-c", ": </dev/tcp/127.0.0.1/22"],
+            "Interval": 500 * 10**6,
+            "Timeout": 10**9,
+            "Retries": int(self.ready_timeout / 0.5),
+        }
+        results = task_scheduler.run_tasks(
+            {
+                cname: functools.partial(
+                    self.api.run,
+                    cname,
+                    img,
+                    ["/usr/sbin/sshd", "-D"],
+                    healthcheck=healthcheck,
+                )
+                for cname, img, _ in containers
+            },
+            max_workers=len(containers),
+        )
+        started = [cname for cname, result in results.items() if result.ok]
+        healthy = self.api.wait_healthy(started, since, self.ready_timeout)
+
+        def isolate(cname, name):
+            self._api_isolate(cname)
+            if name:
+                self.api.rename(cname, name)
+
+        results = task_scheduler.run_tasks(
+            {
+                cname: functools.partial(isolate, cname, name)
+                for cname, _, name in containers
+                if cname in healthy
+            },
+            max_workers=len(containers),
+        )
+        for cname, result in results.items():
+            if not result.ok:
+                logger.error(f"{self.name}: failed to start {cname}: {result.error!r}")
+        return {
+            i
+            for i, (cname, _, _) in enumerate(containers)
+            if cname in results and results[cname].ok
+        }
+
+    def _connect_containers(self, cnames, docker_network):
+        """Connect containers to the docker network and read their details.
+
+        :return: NET (docker inspect of the network, if network_options) and
+            PORT (forwarded ssh port) of each container, by index
+        :rtype: dict
+        """
+        if self.api:
+            return self._api_connect_containers(cnames, docker_network)
+        cmds = []
+        for i, cname in enumerate(cnames):
+            if self.network_options:
+                info = (
+                    "echo NE''T:%d:$(docker inspect -f "
+                    "'{{json .NetworkSettings.Networks.%s}}' %s)"
+                    % (i, docker_network, cname)
                 )
+            else:
+                # if the IP address for interface is suppose to be assigned using DHCP
+                info = f"docker exec {cname} ip address flush dev eth1"
+            cmds.append(
+                f"docker network connect {docker_network} {cname} && {info} && "
+                f"echo PO''RT:{i}:$(docker port {cname} 22/tcp | head -n1 | sed 's/.*://g')"
+            )
+        found = self._run_markers("; ".join(cmds), timeout=30 + 5 * len(cnames))
+        assert len(found["PORT"]) == len(
+            cnames
+        ), f"Failed to connect docker network: {self.before}"
+        found["NET"] = {i: json.loads(v) for i, v in found["NET"].items()}
+        return found
+
+    def _api_connect_containers(self, cnames, docker_network):
+        def connect(cname):
+            self.api.connect_network(docker_network, cname)
+            if not self.network_options:
+                self.api.exec_run(cname, ["ip", "address", "flush", "dev", "eth1"])
+            settings = self.api.inspect(cname)["NetworkSettings"]
+            return (
+                settings["Networks"].get(docker_network),
+                settings["Ports"]["22/tcp"][0]["HostPort"],
+            )
 
-            if ip["Gateway"]:
-                options.append(f"static-route:0.0.0.0/0-{ip['Gateway']}")
+        results = task_scheduler.run_tasks(
+            {i: functools.partial(connect, cname) for i, cname in enumerate(cnames)},
+            max_workers=len(cnames),
+        )
+        found = {"NET": {}, "PORT": {}}
+        for i, result in results.items():
+            if not result.ok:
+                raise result.error
+            found["NET"][i], found["PORT"][i] = result.value
+        return found
+
+    def fill_pool(self, wait=True):
+        """Start containers of ``pool_img`` until the pool has ``pool_size`` of them.
+
+        A pool container only gets its pool name once it is ready, so a
+        container still starting cannot be claimed.
+
+        :param wait: wait for the containers to be ready, else start them in the background
+        :type wait: bool
+        """
+        containers = []
+        for _ in range(self.pool_size - len(self._pool)):
+            self._pool_counter += 1
+            name = f"{self.name}-pool-{self._uniq_id}{self._pool_counter}"
+            self._pool.append(name)
+            containers.append((f"{name}-warming", self.pool_img, name))
+        if not containers:
+            return
+        self.created_docker = True
+        if wait:
+            started = self._start_containers(containers)
+            if len(started) != len(containers):
+                logger.warning(
+                    f"{self.name}: {len(containers) - len(started)} pool containers failed to start"
+                )
+        elif self.api:
+            threading.Thread(
+                target=self._start_containers, args=(containers,), daemon=True
+            ).start()
         else:
-            # if the IP address for interface is suppose to be assigned using DHCP
-            self.sendline(f"docker exec {target_cname} ip address flush dev eth1")
+            self.sendline(
+                " ".join(
+                    f"({self._start_cmd(*c)}) > /dev/null 2>&1 &" for c in containers
+                )
+                + " true"
+            )
             self.expect(self.prompt)
 
-        self.sendline(f"docker port {target_cname} | grep '22/tcp' | sed 's/.*://g'")
-        self.expect_exact(
-            f"docker port {target_cname} | grep '22/tcp' | sed 's/.*://g'"
-        )
-        self.expect(self.prompt)
-        target["port"] = self.before.strip()
-        target["options"] = ",".join(options)
-        int(self.before.strip())
+    def _claim_from_pool(self, cnames):
+        """Rename ready pool containers to the given names, in one round-trip.
 
-        new_device = get_device(target_type, **target)
-        self.extra_devices.append(new_device)
+        :return: the names that were claimed
+        :rtype: list
+        """
+        pairs = list(zip(self._pool, cnames))
+        if not pairs:
+            return []
+        if self.api:
+            started = set()
+            for i, (pooled, cname) in enumerate(pairs):
+                try:
+                    self.api.rename(pooled, cname)
+                    started.add(i)
+                except DockerAPIError as e:
+                    logger.debug(f"{self.name}: {pooled} not claimed: {e}")
+        else:
+            cmd = "; ".join(
+                f"docker rename {pooled} {cname} && echo START''ED:{i}:"
+                for i, (pooled, cname) in enumerate(pairs)
+            )
+            started = self._run_markers(cmd)["STARTED"]
+        claimed = []
+        for i, (pooled, cname) in enumerate(pairs):
+            if i in started:
+                self._pool.remove(pooled)
+                claimed.append(cname)
+        logger.debug(f"{self.name}: claimed {len(claimed)} containers from the pool")
+        return claimed
+
+    @property
+    def _uniq_id(self):
+        """Return the uniq_id of container names, expanded by the console or not."""
+        return self.dev.env["uniq_id"] if self.api else "${uniq_id}"
+
+    def _api_client(self):
+        """Return the Docker Engine API client of the docker host, None if unreachable."""
+        if self.docker_engine:
+            host = f"ssh://{self.docker_engine}"
+        elif self.ipaddr != "localhost":
+            host = f"ssh://{self.username}@{self.ipaddr}"
+        else:
+            host = os.environ.get("DOCKER_HOST")
+        try:
+            api = docker_api.get_client(host)
+            api.request("GET", "/_ping")
+        except DockerAPIError as e:
+            logger.warning(
+                f"{self.name}: Docker Engine API unavailable, using the console: {e}"
+            )
+            return None
+        return api
 
     def validate_docker_image(self, img):
         """Validate if docker image tag is already built in docker engine.
@@ -335,6 +640,8 @@ class DockerFactory(linux.LinuxDevice):
         :return: ``True`` if exist, else ``False``
         :rtype: bool
         """
+        if self.api:
+            return self.api.image_exists(img)
         out = self.check_output("docker inspect %s --format {{.Id}}" % img)
         return "Error: No such object" not in out
 
@@ -412,13 +719,30 @@ class DockerFactory(linux.LinuxDevice):
 
     def clean_docker(self):
         """Clean docker."""
-        if self.created_docker:
+        if self.created_docker and self.api:
+            # pool containers may still be starting under their -warming name
+            names = self.target_cname + [
+                n for c in self._pool for n in (c, f"{c}-warming")
+            ]
+            task_scheduler.run_tasks(
+                {c: functools.partial(self.api.stop, c) for c in names},
+                max_workers=8,
+            )
+            self.created_docker = False
+            self._pool = []
+        elif self.created_docker:
             self.sendcontrol("c")
             self.expect_prompt()
             for c in self.target_cname:
                 self.sendline(f"docker stop {c}")
                 self.expect(self.prompt)
                 self.created_docker = False
+            if self._pool:
+                # pool containers may still be starting under their -warming name
+                pool = " ".join(f"{c} {c}-warming" for c in self._pool)
+                self.sendline(f"docker stop {pool} > /dev/null 2>&1")
+                self.expect(self.prompt)
+                self._pool = []
 
     def validate_docker_network(self):
         """Validate if docker network is already configured.
@@ -516,6 +840,41 @@ class DockerFactory(linux.LinuxDevice):
                 self.validate_docker_network()
             ), f"Failed to configure docker network: {self.docker_network}"
 
+    def _docker_gateway(self):
+        """Return the docker0 address and network of the docker engine, read once."""
+        if not self._gateway and self.api:
+            ipam = self.api.network("bridge")["IPAM"]["Config"][0]
+            self._gateway = ipam["Gateway"], ipam["Subnet"]
+        elif not self._gateway:
+            prefix = f"ssh {self.docker_engine} " if self.docker_engine else ""
+            docker_gw_ip = self.check_output(
+                r"%sip -4 addr show docker0 | grep -oP '(?<=inet\s)\d+(\.\d+){3}'"
+                % prefix
+            )
+            docker_nw = self.check_output(
+                '%sip route | grep "dev docker0" | grep src | '
+                "awk '{print $1}' | head -n1" % prefix
+            )
+            self._gateway = docker_gw_ip.strip(), docker_nw.strip()
+        return self._gateway
+
+    def _isolate_script(self):
+        """Return the script run by :meth:`isolate_traffic` in a container."""
+        docker_gw_ip, docker_nw = self._docker_gateway()
+        return (
+            r'IP=$(ip -4 addr show eth0 | grep -oP "(?<=inet\s)\d+(\.\d+){3}") && '
+            'echo "1 mgmt" >> /etc/iproute2/rt_tables && '
+            f"ip route add default via {docker_gw_ip} table mgmt && "
+            "ip rule add from $IP table mgmt && ip rule add to $IP table mgmt && "
+            f"ip rule add from {docker_nw} table mgmt && "
+            f"ip rule add to {docker_nw} table mgmt && "
+            r'printf "alias mgmt=\047BIND_ADDR=%s LD_PRELOAD=/usr/lib/bind.so \047\n" '
+            "$IP >> /root/.bashrc"
+        )
+
+    def _isolate_cmd(self, cname):
+        return f"docker exec {cname} bash -c '{self._isolate_script()}'"
+
     @run_with_lock(lock)
     def isolate_traffic(self, cname):
         """
@@ -526,42 +885,11 @@ class DockerFactory(linux.LinuxDevice):
         :param cname: name of the container
         :type cname: string
         """
-        prefix = f"ssh {self.docker_engine} " if self.docker_engine else ""
-        docker_gw_ip = self.check_output(
-            r"%sip -4 addr show docker0 | grep -oP '(?<=inet\s)\d+(\.\d+){3}'" % prefix
-        )
-        docker_dev_ip = self.check_output(
-            r"docker exec %s ip -4 addr show eth0 | grep -oP '(?<=inet\s)\d+(\.\d+){3}'"
-            % cname
-        )
-        docker_nw = self.check_output(
-            '%sip route | grep "dev docker0" | grep src | '
-            "awk '{print $1}' | head -n1" % prefix
-        )
-
-        self.check_output(
-            f"docker exec {cname} bash -c 'echo \"1 mgmt\" >> /etc/iproute2/rt_tables'"
-        )
-        self.check_output(
-            f"docker exec {cname} ip route add default via {docker_gw_ip} table mgmt"
-        )
-        self.check_output(
-            f"docker exec {cname} ip rule add from {docker_dev_ip} table mgmt"
-        )
-        self.check_output(
-            f"docker exec {cname} ip rule add to {docker_dev_ip} table mgmt"
-        )
-        self.check_output(
-            f"docker exec {cname} ip rule add from {docker_nw} table mgmt"
-        )
-        self.check_output(f"docker exec {cname} ip rule add to {docker_nw} table mgmt")
+        if self.api:
+            self._api_isolate(cname)
+        else:
+            self.check_output(self._isolate_cmd(cname))
 
-        self.check_output(f"docker cp {cname}:root/.bashrc bashrc_{cname}")
-        self.check_output(
-            'echo "alias mgmt='
-            "'BIND_ADDR=%s LD_PRELOAD=/usr/lib/bind.so '"
-            '" >> bashrc_%s' % (docker_dev_ip, cname)
-        )
-        self.check_output(
-            f"docker cp bashrc_{cname} {cname}:root/.bashrc; rm bashrc_{cname}"
-        )
+    def _api_isolate(self, cname):
+        code, out = self.api.exec_run(cname, ["bash", "-c", self._isolate_script()])
+        assert code == 0, f"Failed to isolate the traffic of {cname}: {out}"
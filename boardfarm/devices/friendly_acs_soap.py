@@ -5,6 +5,8 @@ import xmltodict
 from zeep import Client
 from zeep.wsse.username import UsernameToken
 
+from boardfarm.lib.soap_cache import CachingTransport
+
 logger = logging.getLogger("bft")
 
 
@@ -23,7 +25,9 @@ class FriendlyACS:
         self.ipaddr = self.kwargs["ipaddr"]
         self.wsdl = "http://" + self.kwargs["ipaddr"] + "/ftacsws/acsws.asmx?WSDL"
         self.client = Client(
-            wsdl=self.wsdl, wsse=UsernameToken(self.username, self.password)
+            wsdl=self.wsdl,
+            transport=CachingTransport(),
+            wsse=UsernameToken(self.username, self.password),
         )
         self.port = self.kwargs.get("port", "80")
         self.log = ""
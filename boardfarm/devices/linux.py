@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
-import binascii
+import base64
+import gzip
+import hashlib
 import ipaddress
 import logging
 import os
 import re
+import tempfile
 from contextlib import contextmanager, suppress
 from typing import Any, Dict, Optional, Union
 
@@ -11,7 +14,14 @@ import jc
 import jc.parsers.ping
 import pexpect
 
-from boardfarm.exceptions import BftIfaceNoIpV6Addr, CodeError, PexpectErrorTimeout
+from boardfarm.exceptions import (
+    BftIfaceNoIpV6Addr,
+    CodeError,
+    FileTransferError,
+    PexpectErrorTimeout,
+)
+from boardfarm.lib.bft_pexpect_helper import bft_pexpect_helper
+from boardfarm.lib.pcap_analysis import PcapTable, read_pcap
 from boardfarm.lib.regexlib import (
     AllValidIpv6AddressesRegex,
     InterfaceIPv6_AddressRegex,
@@ -25,11 +35,34 @@ BFT_DEBUG = "BFT_DEBUG" in os.environ
 logger = logging.getLogger("bft")
 
 
+def _sha256_file(f, size=None):
+    """Return the sha256 of an open binary file, from its start.
+
+    :param f: file object, read from its current position
+    :type f: file
+    :param size: number of bytes to hash, defaults to the whole file
+    :type size: int, optional
+    :return: hex digest
+    :rtype: str
+    """
+    h = hashlib.sha256()
+    remaining = float("inf") if size is None else size
+    while remaining > 0:
+        data = f.read(int(min(remaining, 1 << 20)))
+        if not data:
+            break
+        h.update(data)
+        remaining -= len(data)
+    return h.hexdigest()
+
+
 class LinuxInterface:
     """Linux implementations. Cannot be instantiated by itself."""
 
     tftp_dir = "/tftpboot"
     sign_check = True
+    # bytes of file sent in each heredoc by copy_file_to_server
+    copy_chunk_size = 32 * 1024
     iface_dut: Optional[str] = None
     iface_dut_mgmt: Optional[str] = None
     name: str = ""
@@ -429,36 +462,194 @@ class LinuxInterface:
         except Exception:
             self.expect(self.prompt, timeout=30)
 
-    def copy_file_to_server(self, src, dst=None):
-        """Copy the file from source to destination."""
-
-        def gzip_str(string_):
-            import gzip
-            import io
-
-            out = io.BytesIO()
-            with gzip.GzipFile(fileobj=out, mode="w") as file:
-                file.write(string_)
-            return out.getvalue()
-
-        with open(src, mode="rb") as file:
-            bin_file = binascii.hexlify(gzip_str(file.read()))
+    def copy_file_to_server(self, src, dst=None, chunk_size=None, retries=3, scp=True):
+        """Copy the file from source to destination.
+
+        The file is copied with scp when the device is reached over ssh, else
+        it is streamed over the console in base64 chunks. Each chunk is checked
+        against its sha256 before being appended to ``<dst>.part``, so a copy
+        interrupted by a dropped session resumes from the last good chunk when
+        called again. The whole file is checked against its sha256 before
+        being moved to dst.
+
+        :param src: local file
+        :type src: str
+        :param dst: path on the device, defaults to the tftp directory
+        :type dst: str, optional
+        :param chunk_size: bytes sent per chunk, defaults to copy_chunk_size
+        :type chunk_size: int, optional
+        :param retries: number of times a failed chunk is sent again
+        :type retries: int
+        :param scp: try scp first if the device has an ssh address
+        :type scp: bool
+        :raises FileTransferError: if the copied file does not match src
+        """
         if dst is None:
             dst = self.tftp_dir + "/" + os.path.basename(src)
         logger.info(f"Copying {src} to {dst}")
+        with open(src, mode="rb") as file:
+            digest = _sha256_file(file)
+            if scp and self._scp_to_device(src, dst):
+                if self._remote_file_info(dst)[1] == digest:
+                    return
+                logger.warning(f"scp of {src} to {dst} corrupted, using the console")
+            file.seek(0)
+            self._copy_file_over_console(
+                file, dst, chunk_size or self.copy_chunk_size, retries
+            )
+
+        part = f"{dst}.part"
+        if self._remote_file_info(part)[1] != digest:
+            raise FileTransferError(f"Failed to copy file: sha256 of {part} mismatch")
+        self.sendline(f"mv {part} {dst}; rm -f {part}.chunk")
+        self.expect(self.prompt)
+
+    def _scp_to_device(self, src, dst):
+        """Copy a file with scp if the device has an ssh address.
+
+        :return: True if scp succeeded
+        :rtype: bool
+        """
+        return self._scp(src, dst, upload=True)
+
+    def _scp_from_device(self, src, dst):
+        """Copy a file from the device with scp if it has an ssh address.
+
+        :return: True if scp succeeded
+        :rtype: bool
+        """
+        return self._scp(dst, src, upload=False)
+
+    def _scp(self, local, remote, upload):
+        ipaddr = getattr(self, "ipaddr", None)
+        username = getattr(self, "username", None)
+        if not ipaddr or not username:
+            return False
+        remote = f"{username}@{ipaddr}:{remote}"
+        args = [
+            "-P",
+            str(getattr(self, "port", 22)),
+            "-o",
+            "StrictHostKeyChecking=no",
+            "-o",
+            "UserKnownHostsFile=/dev/null",
+            "-o",
+            "ConnectTimeout=10",
+        ]
+        args += [local, remote] if upload else [remote, local]
+        try:
+            scp = bft_pexpect_helper.spawn("scp", args=args)
+            while scp.expect(["assword:", pexpect.EOF], timeout=600) == 0:
+                scp.sendline(getattr(self, "password", ""))
+            scp.close()
+        except (pexpect.ExceptionPexpect, OSError) as e:
+            logger.debug(f"scp with {self.name} failed: {e!r}")
+            return False
+        return scp.exitstatus == 0
+
+    def _remote_file_info(self, path):
+        """Return the size and sha256 of a file on the device.
+
+        :return: size and hex digest, (None, None) if the file does not exist
+        :rtype: tuple
+        """
+        self.sendline(f"wc -c < {path} && sha256sum {path}")
+        self.expect(self.prompt)
+        match = re.search(r"(\d+)\s+([0-9a-f]{64})\s", self.before)
+        if match is None:
+            return None, None
+        return int(match.group(1)), match.group(2)
+
+    def copy_file_from_server(self, src, dst, scp=True):
+        """Copy a file from the device.
+
+        The file is copied with scp when the device is reached over ssh, else
+        it is read gzipped and base64 encoded from the console. The copy is
+        checked against the sha256 of src.
+
+        :param src: path on the device
+        :type src: str
+        :param dst: local file
+        :type dst: str
+        :param scp: try scp first if the device has an ssh address
+        :type scp: bool
+        :raises FileNotFoundError: if src does not exist
+        :raises FileTransferError: if the copied file does not match src
+        """
+        digest = self._remote_file_info(src)[1]
+        if digest is None:
+            raise FileNotFoundError(f"{src} not found on device {self.name}")
+        logger.info(f"Copying {self.name}:{src} to {dst}")
+        if scp and self._scp_from_device(src, dst):
+            with open(dst, "rb") as file:
+                if _sha256_file(file) == digest:
+                    return
+            logger.warning(f"scp of {src} to {dst} corrupted, using the console")
+        # quotes keep the echoed command from matching the markers
+        self.sendline(f"echo COPY_'START'; gzip -c {src} | base64; echo COPY_'END'")
+        self.expect_exact("COPY_START")
+        self.expect_exact("COPY_END", timeout=600)
+        encoded = "".join(self.before.split())
+        self.expect(self.prompt)
+        data = gzip.decompress(base64.b64decode(encoded))
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise FileTransferError(f"Failed to copy file: sha256 of {src} mismatch")
+        with open(dst, "wb") as file:
+            file.write(data)
+
+    def _copy_file_over_console(self, file, dst, chunk_size, retries):
+        """Append the file to <dst>.part over the console, chunk by chunk."""
+        part = f"{dst}.part"
+        size = os.fstat(file.fileno()).st_size
+        for attempt in range(retries + 1):
+            try:
+                # resume from the chunks already copied, if they are intact
+                offset, remote_digest = self._remote_file_info(part)
+                file.seek(0)
+                if not offset or _sha256_file(file, offset) != remote_digest:
+                    offset = 0
+                    self.sendline(f": > {part}")
+                    self.expect(self.prompt)
+                if offset:
+                    logger.info(f"Resuming copy to {dst} at {offset}/{size} bytes")
+                file.seek(offset)
+                while offset < size:
+                    data = file.read(chunk_size)
+                    self._send_chunk(data, part)
+                    offset += len(data)
+                return
+            except (pexpect.TIMEOUT, FileTransferError) as e:
+                if attempt == retries:
+                    raise FileTransferError(f"Failed to copy file to {dst}") from e
+                logger.warning(f"Copy to {dst} failed ({e!r}), retrying")
+                self.sendcontrol("c")
+                self.expect(self.prompt)
+
+    def _send_chunk(self, data, part):
+        """Send a chunk and append it to part once its sha256 is verified."""
+        chunk = f"{part}.chunk"
+        encoded = base64.b64encode(gzip.compress(data)).decode()
+        # short lines, so that they are echoed back without wrapping
+        lines = [encoded[i : i + 64] for i in range(0, len(encoded), 64)]
+        self.sendline(f"base64 -d << 'EOFEOFEOFEOF' | gunzip > {chunk}")
+        # send a few lines at a time and read their echo back, so that the
+        # console output does not fill up and block the input
+        for i in range(0, len(lines), 48):
+            group = lines[i : i + 48]
+            self.send("\n".join(group) + "\n")
+            self.expect_exact(group[-1][-16:])
+        self.sendline("EOFEOFEOFEOF")
+        self.expect(self.prompt)
+        # quotes keep the echoed command from matching the markers
+        digest = hashlib.sha256(data).hexdigest()
         self.sendline(
-            f"""cat << EOFEOFEOFEOF | xxd -r -p | gunzip > {dst}
-{bin_file}
-EOFEOFEOFEOF"""
+            f'echo "{digest}  {chunk}" | sha256sum -c - > /dev/null 2>&1'
+            f" && cat {chunk} >> {part} && echo COPY_'OK' || echo COPY_'FAILED'"
         )
+        if self.expect(["COPY_OK", "COPY_FAILED"]) != 0:
+            self.expect(self.prompt)
+            raise FileTransferError(f"sha256 mismatch of chunk {chunk}")
         self.expect(self.prompt)
-        self.sendline(f"ls {dst}")
-        self.expect_exact(f"ls {dst}")
-        i = self.expect(
-            [f"ls: cannot access {dst}: No such file or directory"] + self.prompt
-        )
-        if i == 0:
-            raise Exception("Failed to copy file")
 
     def ip_neigh_flush(self):
         """Remove entries in the neighbour table."""
@@ -853,6 +1044,29 @@ EOFEOFEOFEOF"""
                         if "Done" in self.before:
                             break
 
+    def read_pcap(self, fname: str, rm_pcap: bool = False) -> PcapTable:
+        """Copy a packet capture from the device and read it locally.
+
+        Unlike tshark_read_pcap and tcpdump_read_pcap, nothing is decoded on
+        the device, see :mod:`boardfarm.lib.pcap_analysis` for the queries
+        the returned table offers.
+
+        :param fname: capture file on the device, pcap or pcapng
+        :type fname: str
+        :param rm_pcap: if True remove the capture file after copying it
+        :type rm_pcap: bool
+        :return: the packets of the capture
+        :rtype: PcapTable
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            local = os.path.join(tmpdir, os.path.basename(fname))
+            self.copy_file_from_server(fname, local)
+            table = read_pcap(local)
+        if rm_pcap:
+            self.sudo_sendline(f"rm {fname}")
+            self.expect(self.prompt)
+        return table
+
     def tcpdump_read_pcap(
         self,
         fname: str,
@@ -14,16 +14,20 @@ except Exception:
     from urllib2 import urlopen, HTTPError
     import urllib2 as _urllib
 
+import functools
 import inspect
 import logging
+import threading
 import time
-from typing import Any
+from typing import Any, Dict, Iterable, List, Optional
 
 import dlipower
 import pexpect
 from easysnmp import Session
 
+from boardfarm import registry
 from boardfarm.devices.base_devices.pdu_templates import PDUTemplate
+from boardfarm.lib import task_scheduler
 from boardfarm.lib.bft_pexpect_helper import bft_pexpect_helper
 
 logger = logging.getLogger("bft")
@@ -41,86 +45,94 @@ except Exception:
     WemoSwitch = None
 
 
-def get_power_device(
-    ip_address: str, username: str = None, password: str = None, outlet: str = None
-):
-    """Try to determine the type of network-controlled power switch\
-    at a given IP address.
+# the title or banner of the HTTP root page of each PDU model
+_FINGERPRINTS = [
+    ("<title>Power Controller", "DLIPowerSwitch"),
+    ("Sentry Switched CDU", "SentrySwitchedCDU"),
+    ("<title>APC ", "APCPower"),
+    ("<b>IP9258 Log In</b>", "Ip9258"),
+    ("Cyber Power Systems", "CyberPowerPdu"),
+    ("IP9820", "Ip9820"),
+]
+# bumped when the layout of the cached fingerprints changes
+PDU_CACHE_VERSION = "1"
+_pdu_cache_lock = threading.Lock()
 
-    Return a class that can correctly interact with that type of switch.
-    """
-    login_failed = False
-    all_login_defaults = []
-    for _name, obj in list(globals().items()):
-        if inspect.isclass(obj) and issubclass(obj, PDUTemplate):
-            defaults = get_default_for_arg(obj.__init__, "username")
-            if defaults is not None and len(defaults) == 2:
-                all_login_defaults.append((defaults[0], defaults[1]))
 
-    if ip_address is None:
-        if outlet is not None:
-            if "wemo://" in outlet:
-                if WemoEnv is None:
-                    logger.error("Please install ouimeaux: pip install ouimeaux")
-                else:
-                    return WemoPowerSwitch(outlet=outlet)
-            if "serial://" in outlet:
-                return SimpleSerialPower(outlet=outlet)
-            if "cmd://" in outlet:
-                return SimpleCommandPower(outlet=outlet)
-            if "px2://" in outlet:
-                kwargs = {}
-                if username:
-                    kwargs["username"] = username
-                if password:
-                    kwargs["password"] = password
-                return PX2(outlet=outlet, **kwargs)
-            if "netio://" in outlet:
-                return NetioPDU(outlet=outlet)
+def _pdu_cache() -> Dict[str, Dict[str, Any]]:
+    return registry.load("pdu", PDU_CACHE_VERSION) or {}
+
+
+def _cache_pdu(ip_address: str, entry: Optional[Dict[str, Any]]) -> None:
+    """Store (or forget if None) the fingerprint of the PDU at an address."""
+    with _pdu_cache_lock:
+        cache = _pdu_cache()
+        if entry is None:
+            if cache.pop(ip_address, None) is None:
+                return
+        else:
+            cache[ip_address] = entry
+        registry.save("pdu", PDU_CACHE_VERSION, cache)
+
+
+def _fingerprint(data: str) -> Optional[str]:
+    for marker, model in _FINGERPRINTS:
+        if marker in data:
+            return model
+    return None
 
-        return HumanButtonPusher()
 
+def _power_device(
+    model: str, ip_address: str, outlet: str, username: str, password: str
+) -> PDUTemplate:
+    """Return the power device of a PDU model."""
+    if model == "DLIPowerSwitch":
+        return DLIPowerSwitch(
+            ip_address, outlet=outlet, username=username, password=password
+        )
+    if model == "SentrySwitchedCDU":
+        return SentrySwitchedCDU(ip_address, outlet=outlet)
+    if model == "APCPower":
+        return APCPower(ip_address, outlet=outlet)
+    if model == "Ip9258":
+        return Ip9258(ip_address, outlet, username=username, password=password)
+    if model == "CyberPowerPdu":
+        return CyberPowerPdu(
+            ip_address,
+            port=outlet,
+            outlet=outlet,
+            username=username,
+            password=password,
+        )
+    if model == "Ip9820":
+        return Ip9820(ip_address, outlet)
+    raise Exception(f"No code written to handle power device {model}")
+
+
+def _probe_power_device(
+    ip_address: str, username: str = None, password: str = None
+) -> Dict[str, Any]:
+    """Identify the model of the PDU at an address from its HTTP root page.
+
+    :return: model and, if they were needed, the default credentials that logged in
+    :rtype: dict
+    """
+    login_failed = False
     try:
-        data = urlopen("http://" + ip_address).read().decode()
-    except UnicodeDecodeError:
-        data = urlopen("http://" + ip_address).read()
+        data = urlopen("http://" + ip_address).read().decode(errors="replace")
     except HTTPError as e:
         if str(e) == "HTTP Error 401: Unauthorized":
             login_failed = True
 
         # still try to read data
-        data = e.read().decode()
+        data = e.read().decode(errors="replace")
     except Exception as e:
         logger.error(e)
         raise Exception(f"\nError connecting to {ip_address}")
 
-    def check_data(data):
-        if "<title>Power Controller" in data:
-            return DLIPowerSwitch(
-                ip_address, outlet=outlet, username=username, password=password
-            )
-        if "Sentry Switched CDU" in data:
-            return SentrySwitchedCDU(ip_address, outlet=outlet)
-        if "<title>APC " in data:
-            return APCPower(ip_address, outlet=outlet)
-        if "<b>IP9258 Log In</b>" in data:
-            return Ip9258(ip_address, outlet, username=username, password=password)
-        if "Cyber Power Systems" in data:
-            return CyberPowerPdu(
-                ip_address,
-                port=outlet,
-                outlet=outlet,
-                username=username,
-                password=password,
-            )
-        if "IP9820" in data:
-            return Ip9820(ip_address, outlet)
-
-        return None
-
-    ret = check_data(data)
-    if ret is not None:
-        return ret
+    model = _fingerprint(data)
+    if model is not None:
+        return {"model": model, "credentials": None}
 
     if login_failed:
         # TODO: prioritize Ip9820 since it requires login?
@@ -130,8 +142,6 @@ def get_power_device(
             password_mgr.add_password(None, "http://" + ip_address, username, password)
             handler = _urllib.request.HTTPBasicAuthHandler(password_mgr)
             opener = _urllib.request.build_opener(handler)
-            opener.open("http://" + ip_address)
-            _urllib.request.install_opener(opener)
 
             request = _urllib.request.Request("http://" + ip_address)
             response = opener.open(request)
@@ -139,25 +149,127 @@ def get_power_device(
             return data.decode("utf-8")
 
         # try with passed in info first
-        ret = check_data(get_with_username_password(username, password))
-        if ret is not None:
-            return ret
-
-        for username, password in all_login_defaults:
+        try:
+            model = _fingerprint(get_with_username_password(username, password))
+        except Exception as e:
+            logger.debug(f"{ip_address}: login with the given credentials: {e!r}")
+        if model is not None:
+            return {"model": model, "credentials": None}
+
+        all_login_defaults = []
+        for _name, obj in list(globals().items()):
+            if inspect.isclass(obj) and issubclass(obj, PDUTemplate):
+                defaults = get_default_for_arg(obj.__init__, "username")
+                if defaults is not None and len(defaults) == 2:
+                    all_login_defaults.append((defaults[0], defaults[1]))
+
+        for credentials in all_login_defaults:
             try:
-                ret = check_data(get_with_username_password(username, password))
+                model = _fingerprint(get_with_username_password(*credentials))
             except Exception:
                 continue
-            else:
-                break
-
-        ret = check_data(data)
-        if ret is not None:
-            return ret
+            if model is not None:
+                return {"model": model, "credentials": list(credentials)}
 
     raise Exception(f"No code written to handle power device found at {ip_address}")
 
 
+def get_power_device(
+    ip_address: str, username: str = None, password: str = None, outlet: str = None
+):
+    """Try to determine the type of network-controlled power switch\
+    at a given IP address.
+
+    Return a class that can correctly interact with that type of switch.
+    The model found at an address is cached (see :mod:`boardfarm.registry`),
+    the PDU is only probed again if the cached model fails to connect.
+    """
+    if ip_address is None:
+        if outlet is not None:
+            if "wemo://" in outlet:
+                if WemoEnv is None:
+                    logger.error("Please install ouimeaux: pip install ouimeaux")
+                else:
+                    return WemoPowerSwitch(outlet=outlet)
+            if "serial://" in outlet:
+                return SimpleSerialPower(outlet=outlet)
+            if "cmd://" in outlet:
+                return SimpleCommandPower(outlet=outlet)
+            if "px2://" in outlet:
+                kwargs = {}
+                if username:
+                    kwargs["username"] = username
+                if password:
+                    kwargs["password"] = password
+                return PX2(outlet=outlet, **kwargs)
+            if "netio://" in outlet:
+                return NetioPDU(outlet=outlet)
+
+        return HumanButtonPusher()
+
+    entry = _pdu_cache().get(ip_address)
+    if entry is not None:
+        try:
+            return _power_device(
+                entry["model"],
+                ip_address,
+                outlet,
+                *(entry["credentials"] or (username, password)),
+            )
+        except Exception as e:
+            logger.debug(f"Cached PDU {entry['model']} at {ip_address} failed: {e!r}")
+            _cache_pdu(ip_address, None)
+
+    entry = _probe_power_device(ip_address, username, password)
+    device = _power_device(
+        entry["model"],
+        ip_address,
+        outlet,
+        *(entry["credentials"] or (username, password)),
+    )
+    _cache_pdu(ip_address, entry)
+    return device
+
+
+def power_all(power_devices: Iterable[PDUTemplate], action: str = "turn_off") -> None:
+    """Run a power action on many outlets at once.
+
+    PDUs are switched in parallel, the outlets of one PDU one after the
+    other since most PDUs only accept one session at a time.
+
+    :param power_devices: power devices of the outlets, e.g. board.hw.power
+    :type power_devices: list
+    :param action: method of the power devices to call, "turn_off" or "reset"
+    :type action: str
+    :raises Exception: listing the outlets that failed, once all are done
+    """
+    by_pdu: Dict[Any, List[PDUTemplate]] = {}
+    for dev in power_devices:
+        key = getattr(dev, "ip_address", None) or id(dev)
+        by_pdu.setdefault(key, []).append(dev)
+
+    def switch(devices):
+        errors = []
+        for dev in devices:
+            try:
+                getattr(dev, action)()
+            except Exception as e:
+                errors.append(f"{dev.__class__.__name__} outlet {dev.outlet}: {e!r}")
+        if errors:
+            raise Exception("; ".join(errors))
+
+    results = task_scheduler.run_tasks(
+        {
+            str(pdu): functools.partial(switch, devices)
+            for pdu, devices in by_pdu.items()
+        },
+        max_workers=len(by_pdu) or 1,
+    )
+    failed = [f"{pdu}: {r.error}" for pdu, r in results.items() if not r.ok]
+    if failed:
+        raise Exception(f"Power {action} failed on " + ", ".join(failed))
+
+
 class SentrySwitchedCDU(PDUTemplate):
     """Power Unit from Server Technology."""
 
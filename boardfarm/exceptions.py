@@ -237,3 +237,21 @@ class UseCaseFailure(BftBaseException):
 
 class VoiceSetupConfigureFailure(BftBaseException):
     """Exception that occurs when Voice setup is not configured"""
+
+
+class WaitTimeout(BftBaseException):
+    """Raise this if a condition is not met before its deadline."""
+
+    pass
+
+
+class FileTransferError(BftBaseException):
+    """Raise this if a file copied to a device cannot be verified."""
+
+    pass
+
+
+class DockerAPIError(BftBaseException):
+    """Raise this if a request to the Docker Engine API fails."""
+
+    pass
@@ -1,11 +1,13 @@
 #!/usr/bin/env python3
 # Setup logging
 """Class functions to Manage device."""
+import contextvars
 import logging
 import re
 import sys
+import threading
 import uuid
-from collections import UserList
+from collections import UserList, defaultdict
 from typing import Dict, List
 
 from aenum import Enum, extend_enum
@@ -18,6 +20,72 @@ logging.basicConfig(stream=sys.stdout, format="%(message)s")
 logger = logging.getLogger("DeviceManager")
 logger.setLevel(logging.INFO)  # DEBUG, INFO, WARNING, ERROR, CRITICAL
 
+# devices are instantiated (and so added) from several threads
+_add_device_lock = threading.RLock()
+
+# set while a PendingDevices collects the devices added, see PendingDevices.run
+_pending_devices: contextvars.ContextVar = contextvars.ContextVar(
+    "pending_devices", default=None
+)
+
+
+class PendingDevices:
+    """Devices added to a device manager by a task, to be added later on.
+
+    :meth:`run` runs a task collecting the devices it adds (and the ones
+    added by the tasks it runs with task_scheduler.run_tasks) instead of
+    adding them, :meth:`commit` adds them once the task has completed.
+    :meth:`discard` drops them, as well as the devices added later by a task
+    that timed out and kept running in its abandoned thread. Devices created
+    concurrently are committed in the order they complete,
+    :meth:`device_manager._reorder` puts them back in the order they were
+    requested in.
+    """
+
+    def __init__(self):
+        """Instance initialisation."""
+        self.devices = []
+        # devices added to their device manager by commit
+        self.committed = []
+        self.discarded = False
+        self._lock = threading.Lock()
+
+    def run(self, func, *args, **kwargs):
+        """Run func, collecting the devices it adds to a device manager.
+
+        :return: what func returns
+        """
+        token = _pending_devices.set(self)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _pending_devices.reset(token)
+
+    def add(self, mgr, dev, override=False, plugin=False):
+        """Collect a device added to mgr."""
+        with self._lock:
+            if self.discarded:
+                logger.warning(
+                    f"Not adding device {getattr(dev, 'name', dev)},"
+                    " its setup was abandoned"
+                )
+                return
+            self.devices.append((mgr, dev, override, plugin))
+
+    def commit(self):
+        """Add the collected devices to their device manager."""
+        with self._lock:
+            devices, self.devices = self.devices, []
+        for mgr, dev, override, plugin in devices:
+            mgr._add_device(dev, override, plugin)
+            self.committed.append(dev)
+
+    def discard(self):
+        """Drop the collected devices and the ones added from now on."""
+        with self._lock:
+            self.discarded = True
+            self.devices = []
+
 
 class DeviceNone:
     """Check device."""
@@ -152,11 +220,23 @@ class device_descriptor:
         return ret
 
 
+def _reorder_in_place(items, rank):
+    """Sort the items ranked (not None) among themselves, in their positions."""
+    slots = [i for i, item in enumerate(items) if rank(item) is not None]
+    ranked = sorted((items[i] for i in slots), key=rank)
+    for i, item in zip(slots, ranked):
+        items[i] = item
+
+
+# device array element, e.g. "lan_clients[0]"
+_ARRAY_ITEM_RE = re.compile(r"(.*)\[(.*)\]")
+
+
 def get_device_by_name(name):
     mgr = device_manager()
 
     # check if device from an array is requested
-    o = re.search(r"(.*)\[(.*)\]", name)
+    o = _ARRAY_ITEM_RE.search(name)
     if o:
         device_idx = int(o.group(2))
         array_type = o.group(1)
@@ -182,6 +262,7 @@ class device_manager(UserList):
         # so we can use them to create devices that might not already exist
         self.factories = []
         self.plugin_counter = -1
+        self._reindex()
 
         # TODO: does self.env really belong here or in device class?
         self.uniqid = uuid.uuid4().hex[:15]  # Random, unique ID and use first 15 bytes
@@ -212,6 +293,40 @@ class device_manager(UserList):
     def data(self, x):
         """To clear/initialize the list of devices."""
         self.devices = x
+        self._reindex()
+
+    def _reindex(self):
+        """Rebuild the type, feature and location indexes of the devices."""
+        self._by_type = defaultdict(list)
+        self._by_feature = defaultdict(list)
+        self._by_location = defaultdict(list)
+        for d in self.devices:
+            self._index(d)
+
+    def _index(self, d):
+        """Add a device descriptor to the indexes."""
+        self._by_type[d.type].append(d)
+        for feature in d.features:
+            self._by_feature[feature].append(d)
+        self._by_location[d.location].append(d)
+
+    def _reorder(self, objs):
+        """Put devices back in the order of objs, in the positions they hold.
+
+        Applies to the device list, its indexes and the device arrays. The
+        other devices keep their position.
+
+        :param objs: devices, in the order they were requested in
+        :type objs: list
+        """
+        rank = {id(obj): i for i, obj in enumerate(objs)}
+        with _add_device_lock:
+            _reorder_in_place(self.devices, lambda d: rank.get(id(d.obj)))
+            self._reindex()
+            for array_name in device_array_type._arrays.value:
+                dev_array = getattr(self, array_name, None)
+                if dev_array is not None:
+                    _reorder_in_place(dev_array, lambda d: rank.get(id(d)))
 
     def set_device_array(self, array_name, dev, override):
         """Set Device Array details."""
@@ -243,6 +358,7 @@ class device_manager(UserList):
                 )
         # erase device list
         self.devices = []
+        self._reindex()
 
     def by_type(self, t, num=1):
         """Shorthand for getting device by type."""
@@ -283,16 +399,46 @@ class device_manager(UserList):
         return self.get_device(None, None, location, num)
 
     def get_device(self, t, feature, location, num=1):
-        """Get a new device by feature and location."""
-        assert num == 1, "We don't support getting more than one device currently!"
-
-        matching = self.devices[:]
-        if t is not None:
-            matching[:] = [d for d in matching if d.type == t]
-        if feature is not None:
-            matching[:] = [d for d in matching if feature in d.features]
-        if location is not None:
-            matching[:] = [d for d in matching if d.location == location]
+        """Get a new device by feature and location.
+
+        :param t: device type, None for any
+        :type t: device_type
+        :param feature: device feature, None for any
+        :type feature: device_feature
+        :param location: device location, None for any
+        :type location: device_location
+        :param num: number of devices to return, None for all of them
+        :type num: int, optional
+        :return: with num == 1 the first matching device, or DeviceNone,
+            else a list of at most num matching devices, in the order they
+            were added
+        :rtype: object or list
+        """
+        if num is not None and num < 1:
+            raise ValueError(f"Invalid number of devices requested: {num}")
+
+        # start from the smallest index matching, then filter on the others
+        candidates = [
+            index.get(key, [])
+            for index, key in [
+                (self._by_type, t),
+                (self._by_feature, feature),
+                (self._by_location, location),
+            ]
+            if key is not None
+        ]
+        matching = min(candidates, key=len) if candidates else self.devices
+        if len(candidates) > 1:
+            matching = [
+                d
+                for d in matching
+                if (t is None or d.type == t)
+                and (feature is None or feature in d.features)
+                and (location is None or d.location == location)
+            ]
+
+        if num != 1:
+            return [d.obj for d in matching[:num]]
 
         if len(matching) > 1:
             logger.debug(
@@ -308,44 +454,50 @@ class device_manager(UserList):
 
     def _add_device(self, dev, override=False, plugin=False):
         """To add devices created via old method get_device()."""
-        new_dev = device_descriptor()
-        if plugin:
-            # first check if dev.name exist
-            if not hasattr(device_type, dev.name):
-                extend_enum(device_type, dev.name, self.plugin_counter)
-                self.plugin_counter -= 1
+        pending = _pending_devices.get()
+        if pending is not None:
+            pending.add(self, dev, override, plugin)
+            return
+        with _add_device_lock:
+            new_dev = device_descriptor()
+            if plugin:
+                # first check if dev.name exist
+                if not hasattr(device_type, dev.name):
+                    extend_enum(device_type, dev.name, self.plugin_counter)
+                    self.plugin_counter -= 1
+                else:
+                    logger.warning(
+                        "WARNING!! WARNING!! this device cannot be added as a plugin"
+                        "\nCode will fail, if two devices found with same name."
+                    )
+            if len(self.devices) == 0:
+                new_dev.type = device_type.DUT
             else:
-                logger.warning(
-                    "WARNING!! WARNING!! this device cannot be added as a plugin"
-                    "\nCode will fail, if two devices found with same name."
-                )
-        if len(self.devices) == 0:
-            new_dev.type = device_type.DUT
-        else:
-            new_dev.type = getattr(device_type, dev.name, device_type.Unknown)
-        new_dev.obj = dev
-        self.devices.append(new_dev)
-
-        array_name = getattr(dev, "dev_array", None)
-        if array_name:
-            self.set_device_array(array_name, dev, override)
-        if getattr(dev, "legacy_add", True):
-            # For convenience, set an attribute with a name the same as the
-            # newly added device type. Example: self.lan = the device of type lan
-            attribute_name = new_dev.type.name
-            if (
-                attribute_name != "Unknown"
-                and getattr(self, attribute_name, None) is not None
-            ):
-                # device manager already has an attribute of this name
-                raise Exception(
-                    "Device Manager already has '%s' attribute, you cannot add another."
-                    % attribute_name
-                )
-            setattr(self, attribute_name, new_dev.obj)
-            # Alias board to DUT
-            if attribute_name == "DUT":
-                self.board = new_dev.obj
+                new_dev.type = getattr(device_type, dev.name, device_type.Unknown)
+            new_dev.obj = dev
+            self.devices.append(new_dev)
+            self._index(new_dev)
+
+            array_name = getattr(dev, "dev_array", None)
+            if array_name:
+                self.set_device_array(array_name, dev, override)
+            if getattr(dev, "legacy_add", True):
+                # For convenience, set an attribute with a name the same as the
+                # newly added device type. Example: self.lan = the device of type lan
+                attribute_name = new_dev.type.name
+                if (
+                    attribute_name != "Unknown"
+                    and getattr(self, attribute_name, None) is not None
+                ):
+                    # device manager already has an attribute of this name
+                    raise Exception(
+                        "Device Manager already has '%s' attribute, you cannot add another."
+                        % attribute_name
+                    )
+                setattr(self, attribute_name, new_dev.obj)
+                # Alias board to DUT
+                if attribute_name == "DUT":
+                    self.board = new_dev.obj
 
 
 def clean_device_manager():
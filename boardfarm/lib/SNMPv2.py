@@ -1,3 +1,4 @@
+import logging
 import re
 
 import pexpect
@@ -6,6 +7,9 @@ from boardfarm.exceptions import PexpectErrorTimeout, SNMPError
 from boardfarm.lib.SnmpHelper import SnmpMibs
 
 from .installers import install_snmp
+from .snmp_engine import SnmpEngine, SnmpRelay
+
+logger = logging.getLogger("bft")
 
 
 class SNMPv2:
@@ -20,6 +24,7 @@ class SNMPv2:
         self.device = device
         self.ip = ip
         self.snmpmibs_obj = SnmpMibs.default_mibs
+        self.relay = None
         if not getattr(self.device, "snmp_installed", False):
             install_snmp(self.device)
             self.device.snmp_installed = True
@@ -35,6 +40,54 @@ class SNMPv2:
                 raise SNMPError(f"MIB not available, Error: {e}")
         return oid
 
+    def engine(self, community="private", relay=True, **kwargs):
+        """Return an in-process SNMP engine to the ip, instead of the console commands.
+
+        Much faster for the walks and the gets of many objects, see
+        :mod:`boardfarm.lib.snmp_engine`.
+
+        :param community: SNMP community, defaults to "private"
+        :type community: str
+        :param relay: send the requests through a socat relay on the device,
+            when the ip is not reachable from the boardfarm host, defaults to True.
+            Falls back to the ip if the relay does not answer, the relay is
+            stopped by :meth:`close`
+        :type relay: bool
+        :param kwargs: other SnmpEngine arguments (timeout, retries, max_oids...)
+        :raises SNMPError: if neither the relay nor the ip answer
+        :return: the engine, its names are resolved with the default mibs
+        :rtype: SnmpEngine
+        """
+        kwargs.setdefault("mibs", self.snmpmibs_obj)
+        if not relay:
+            return SnmpEngine(self.ip, community=community, **kwargs)
+        if self.relay is None:
+            self.relay = SnmpRelay(self.device, self.ip)
+        try:
+            return self.relay.engine(community=community, **kwargs)
+        except SNMPError as e:
+            logger.warning(f"{e}, sending the requests to {self.ip}")
+            self.relay = None
+        engine = SnmpEngine(self.ip, community=community, **kwargs)
+        if not engine.reachable():
+            raise SNMPError(
+                f"SNMP agent {self.ip} does not answer, directly or through"
+                f" a relay on {self.device}"
+            )
+        return engine
+
+    def close(self):
+        """Stop the relay of :meth:`engine`, if any."""
+        if self.relay is not None:
+            self.relay.stop()
+            self.relay = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
     def snmpget(
         self,
         mib_name,
@@ -6,10 +6,13 @@
 # This file is distributed under the Clear BSD license.
 # The full text can be found in LICENSE in the root directory.
 
+import argparse
+import hashlib
 import json
 import logging
 import os
 import re
+import tempfile
 
 import debtcollector
 import pexpect
@@ -28,6 +31,13 @@ from .regexlib import AllValidIpv6AddressesRegex, ValidIpv4AddressRegex
 
 logger = logging.getLogger("bft")
 
+# compiled mib_dict cache, an empty BFT_MIB_CACHE disables it
+MIB_CACHE = os.environ.get(
+    "BFT_MIB_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "boardfarm", "mib_dict.json"),
+)
+MIB_IGNORE = ["miblist.txt", "__", ".py"]
+
 
 def find_directory_in_tree(pattern, root_dir):
     """
@@ -45,9 +55,11 @@ def find_directory_in_tree(pattern, root_dir):
     """
     dirs_list = []
     for root, dirs, _files in os.walk(root_dir):
-        for name in dirs:
+        for name in list(dirs):
             if "mib" in name or "mibs" in name:
                 d = os.path.join(root, name)
+                # everything below d would be skipped, do not walk it
+                dirs.remove(name)
                 if any(s in d for s in dirs_list):
                     continue
                 else:
@@ -86,6 +98,114 @@ def find_files_in_tree(root_dir, no_ext=True, no_dup=True, ignore=None):
     return file_list
 
 
+class MibCache:
+    """On-disk cache of the mib_dict compiled by SnmpMibs.
+
+    The cache is keyed by the list of MIBs to compile and by the path, size,
+    mtime and sha256 of every file in the MIB directories. Files whose size
+    and mtime did not change are not hashed again, so loading a valid cache
+    only costs a stat() per MIB file and the JSON decoding.
+    """
+
+    version = 1
+
+    def __init__(self, mib_list, src_dir_list, path=None):
+        """Instance initialisation.
+
+        :param mib_list: names of the MIBs to compile
+        :type mib_list: list
+        :param src_dir_list: directories holding the MIB files
+        :type src_dir_list: list
+        :param path: cache file, defaults to MIB_CACHE
+        :type path: str
+        """
+        self.mib_list = sorted(mib_list)
+        self.src_dir_list = list(src_dir_list)
+        self.path = path or MIB_CACHE
+
+    def _files(self):
+        """Return the paths of the MIB files found in the MIB directories."""
+        files = []
+        for d in self.src_dir_list:
+            for root, _dirs, names in os.walk(d):
+                files.extend(
+                    os.path.join(root, f)
+                    for f in names
+                    if not any(x in f for x in MIB_IGNORE)
+                )
+        return sorted(files)
+
+    @staticmethod
+    def _sha256(fname):
+        with open(fname, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    def fingerprint(self, known=None):
+        """Describe the current MIB files.
+
+        :param known: files of a previous fingerprint, their hash is reused
+            when size and mtime did not change
+        :type known: dict
+        :return: {path: [size, mtime_ns, sha256]} of every MIB file
+        :rtype: dict
+        """
+        known = known or {}
+        files = {}
+        for fname in self._files():
+            st = os.stat(fname)
+            entry = known.get(fname)
+            if entry and entry[:2] == [st.st_size, st.st_mtime_ns]:
+                files[fname] = entry
+            else:
+                files[fname] = [st.st_size, st.st_mtime_ns, self._sha256(fname)]
+        return files
+
+    def load(self):
+        """Return the cached mib_dict, None if missing or out of date."""
+        try:
+            with open(self.path) as f:
+                cache = json.load(f)
+            if cache["version"] != self.version or cache["mibs"] != self.mib_list:
+                return None
+            files = self.fingerprint(cache["files"])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.debug(f"MIB cache {self.path} not used: {e!r}")
+            return None
+
+        hashes = {k: v[2] for k, v in files.items()}
+        if hashes != {k: v[2] for k, v in cache["files"].items()}:
+            logger.debug(f"MIB cache {self.path} is out of date")
+            return None
+        if files != cache["files"]:
+            # only the mtimes changed, avoid hashing those files next time
+            self.save(cache["mib_dict"], files)
+        return cache["mib_dict"]
+
+    def save(self, mib_dict, files=None):
+        """Store the compiled mib_dict, replacing the cache file atomically.
+
+        :param mib_dict: compiled MIBs
+        :type mib_dict: dict
+        :param files: fingerprint of the MIB files, computed when not given
+        :type files: dict
+        """
+        cache = {
+            "version": self.version,
+            "mibs": self.mib_list,
+            "files": files or self.fingerprint(),
+            "mib_dict": mib_dict,
+        }
+        try:
+            dirname = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(dirname, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=dirname, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(cache, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.debug(f"Could not write MIB cache {self.path}: {e!r}")
+
+
 class SnmpMibsMeta(type):
     """Instance of SnmpMibs class."""
 
@@ -123,6 +243,23 @@ class SnmpMibs(metaclass=SnmpMibsMeta):
         if cls.snmp_parser is not None:
             return cls.snmp_parser
 
+        snmp_mib_files, snmp_mib_dirs = cls.find_mibs(snmp_mib_files, snmp_mib_dirs)
+
+        # creates the snmp parser object
+        cls.snmp_parser = cls(snmp_mib_files, snmp_mib_dirs)
+        return cls.snmp_parser
+
+    @staticmethod
+    def find_mibs(snmp_mib_files=None, snmp_mib_dirs=None):
+        """Find the MIB files and directories of boardfarm and its plugins.
+
+        :param snmp_mib_files: MIBs to compile, defaults to all the MIB files found
+        :type snmp_mib_files: list
+        :param snmp_mib_dirs: MIB directories, defaults to the mib dirs of the plugins
+        :type snmp_mib_dirs: list
+        :return: the MIB files and the MIB directories
+        :rtype: tuple
+        """
         if snmp_mib_files is None:
             snmp_mib_files = []
 
@@ -151,20 +288,35 @@ class SnmpMibs(metaclass=SnmpMibsMeta):
         if len(snmp_mib_files) == 0:
             # only traverses the mib dirs and compile all the files
             # /usr/share/snmp/mibs has miblist.txt which MUST be ignored
-            snmp_mib_files = find_files_in_tree(
-                snmp_mib_dirs, ignore=["miblist.txt", "__", ".py"]
-            )
+            snmp_mib_files = find_files_in_tree(snmp_mib_dirs, ignore=MIB_IGNORE)
         logger.debug(f"Mibs file list: {snmp_mib_files}")
-
-        # creates the snmp parser object
-        cls.snmp_parser = cls(snmp_mib_files, snmp_mib_dirs)
-        return cls.snmp_parser
-
-    def __init__(self, mib_list, src_dir_list, http_sources=None):
-        """Instance initialisation."""
+        return snmp_mib_files, snmp_mib_dirs
+
+    def __init__(self, mib_list, src_dir_list, http_sources=None, cache=None):
+        """Instance initialisation.
+
+        :param mib_list: names of the MIBs to compile
+        :type mib_list: list
+        :param src_dir_list: directories holding the MIB files
+        :type src_dir_list: list
+        :param http_sources: web sites to download MIBs from, disables the cache
+        :type http_sources: list
+        :param cache: MIB cache file, defaults to MIB_CACHE ("" to disable it)
+        :type cache: str
+        """
 
         self.dbg = os.environ.get("BFT_DEBUG", "")
 
+        cache = MIB_CACHE if cache is None else cache
+        mib_cache = None
+        if cache and not http_sources:
+            mib_cache = MibCache(mib_list, src_dir_list, cache)
+            mib_dict = mib_cache.load()
+            if mib_dict is not None:
+                self.mib_dict.update(mib_dict)
+                logger.debug(f"# {len(mib_dict)} MIB objects loaded from {cache}")
+                return
+
         if "yyy" in self.dbg:
             # VERY verbose, but essential for spotting
             # possible  ASN.1 errors
@@ -207,6 +359,9 @@ class SnmpMibs(metaclass=SnmpMibsMeta):
             raise Exception("SnmpMibs failed to initialize.")
         logger.debug(f"# {len(mib_dict)} MIB modules compiled")
 
+        if mib_cache:
+            mib_cache.save(self.mib_dict)
+
     def callback_func(self, mibName, jsonDoc, cbCtx):
         """Add and prints the mib dict for mib name passed."""
         if "y" in self.dbg:
@@ -367,6 +522,43 @@ def get_mib_oid(mib_name):
     return obj.get_mib_oid(mib_name)
 
 
+def build_mib_cache(argv=None):
+    """Compile the MIBs of boardfarm and its plugins into the MIB cache.
+
+    Entry point of the bft-mib-cache command, e.g. to prebuild the cache
+    in a docker image or after pulling new MIBs.
+    """
+    parser = argparse.ArgumentParser(
+        description="Compile the MIBs of boardfarm and its plugins into the MIB cache."
+    )
+    parser.add_argument(
+        "-d",
+        "--mib_dirs",
+        nargs="+",
+        default=None,
+        help="MIB directories (default: the mib directories of the plugins)",
+    )
+    parser.add_argument(
+        "-o", "--output", default=MIB_CACHE, help=f"cache file (default: {MIB_CACHE})"
+    )
+    parser.add_argument(
+        "-f", "--force", action="store_true", help="rebuild even if up to date"
+    )
+    args = parser.parse_args(argv)
+
+    mib_files, mib_dirs = SnmpMibs.find_mibs(snmp_mib_dirs=args.mib_dirs)
+    if args.force:
+        try:
+            os.remove(args.output)
+        except FileNotFoundError:
+            pass
+    elif MibCache(mib_files, mib_dirs, args.output).load() is not None:
+        print(f"{args.output} is up to date")
+        return
+    SnmpMibs(mib_files, mib_dirs, cache=args.output)
+    print(f"{len(SnmpMibs.mib_dict)} MIB objects written to {args.output}")
+
+
 ##############################################################################################
 
 if __name__ == "__main__":
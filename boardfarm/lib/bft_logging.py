@@ -6,9 +6,9 @@
 # This file is distributed under the Clear BSD license.
 # The full text can be found in LICENSE in the root directory.
 
+import inspect
 import logging
 import os
-import re
 import time
 
 from termcolor import colored
@@ -88,6 +88,120 @@ def log_message(s, msg, header=False):
         s.log_to_file += now_short() + msg + "\r\n"
 
 
+class LogBuffer:
+    """Append-only text buffer, joined into a string only when read.
+
+    Appending to a string reallocates and copies the whole string, which gets
+    expensive on devices printing a lot over a long run. Small writes are kept
+    in a list and merged in blocks, so appending costs O(len(string)).
+    """
+
+    block_size = 1024
+
+    def __init__(self, initial=""):
+        """Instance initialisation.
+
+        :param initial: initial content of the buffer
+        :type initial: str
+        """
+        self._blocks = [initial] if initial else []
+        self._tail = []
+        self._size = len(initial)
+        self._last = initial[-1:]
+
+    def append(self, string):
+        """Append a string to the buffer.
+
+        :param string: text to append
+        :type string: str
+        """
+        if not string:
+            return
+        self._tail.append(string)
+        self._size += len(string)
+        self._last = string[-1]
+        if len(self._tail) >= self.block_size:
+            self._blocks.append("".join(self._tail))
+            self._tail = []
+
+    def endswith(self, char):
+        """Return True if the buffer ends with the given (single) character."""
+        return self._last == char
+
+    def getvalue(self):
+        """Return the content of the buffer as a single string."""
+        if len(self._blocks) + len(self._tail) > 1:
+            self._blocks = ["".join(self._blocks + self._tail)]
+            self._tail = []
+        elif self._tail:
+            self._blocks, self._tail = self._tail, []
+        return self._blocks[0] if self._blocks else ""
+
+    def __len__(self):
+        """Return the number of characters in the buffer."""
+        return self._size
+
+
+class BufferedLog:
+    """Descriptor storing an attribute in a :class:`LogBuffer`.
+
+    Reading the attribute returns a plain string, assigning a string replaces
+    the content, so ``obj.log`` behaves as before for callers. o_helper appends
+    to the underlying buffer instead of concatenating strings.
+    """
+
+    def __set_name__(self, owner, name):
+        """Store the name of the instance attribute holding the buffer."""
+        self.attr = f"_{name}_buffer"
+
+    def buffer(self, obj):
+        """Return the LogBuffer of the given instance, create it if needed."""
+        buf = obj.__dict__.get(self.attr)
+        if buf is None:
+            buf = obj.__dict__[self.attr] = LogBuffer()
+        return buf
+
+    def __get__(self, obj, objtype=None):
+        """Return the log as a string ("" when accessed on the class)."""
+        if obj is None:
+            return ""
+        return self.buffer(obj).getvalue()
+
+    def __set__(self, obj, value):
+        """Replace the log with the given string."""
+        obj.__dict__[self.attr] = LogBuffer(value or "")
+
+
+_buffered_log_cache = {}
+
+
+def get_log_buffer(obj, name="log"):
+    """Return the LogBuffer behind ``obj.<name>``.
+
+    :param obj: object with a :class:`BufferedLog` attribute
+    :type obj: object
+    :param name: name of the attribute, defaults to "log"
+    :type name: str
+    :return: the buffer, None if the attribute is not a BufferedLog
+    :rtype: LogBuffer
+    """
+    key = (type(obj), name)
+    if key not in _buffered_log_cache:
+        descr = inspect.getattr_static(type(obj), name, None)
+        _buffered_log_cache[key] = descr if isinstance(descr, BufferedLog) else None
+    descr = _buffered_log_cache[key]
+    return descr.buffer(obj) if descr is not None else None
+
+
+def _append_log(obj, string):
+    """Append to obj.log, using its LogBuffer when available."""
+    buf = get_log_buffer(obj)
+    if buf is not None:
+        buf.append(string)
+    else:
+        obj.log += string
+
+
 class o_helper:
     """Class to handle output logging."""
 
@@ -105,6 +219,16 @@ class o_helper:
         self.out = out
         self.parent = parent
         self.first_write = True
+        self._ts_second = None
+        self._ts = ""
+
+    def _timestamp(self):
+        """Return the log timestamp, formatted at most once per second."""
+        now = int(time.time())
+        if now != self._ts_second:
+            self._ts_second = now
+            self._ts = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))
+        return self._ts
 
     def write(self, string):
         """Write or stdout input messages in colored(if defined).
@@ -123,26 +247,33 @@ class o_helper:
                 self.out.write(colored(string, self.color))
             else:
                 self.out.write(string)
-        current_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+        if not string:
+            return
+        current_time = self._timestamp()
+        buf = get_log_buffer(self.parent)
         # check for the split case
-        if (
-            len(self.parent.log) > 1
-            and self.parent.log[-1] == "\r"
-            and string[0] == "\n"
-        ):
+        if buf is not None:
+            split = len(buf) > 1 and buf.endswith("\r")
+        else:
+            log = self.parent.log
+            split = len(log) > 1 and log[-1] == "\r"
+        if split and string[0] == "\n":
             string = f"\n{current_time} {string[1:]}"
-        to_log = re.sub("\r\n", f"\r\n{current_time} ", string)
-        self.parent.log += to_log
+        to_log = string.replace("\r\n", f"\r\n{current_time} ")
+        if buf is not None:
+            buf.append(to_log)
+        else:
+            self.parent.log += to_log
         if hasattr(self.parent, "test_to_log"):
-            self.parent.test_to_log.log += re.sub(
-                r"\r\n\[", f"\r\n{self.parent.test_prefix}: [", to_log
+            _append_log(
+                self.parent.test_to_log,
+                to_log.replace("\r\n[", f"\r\n{self.parent.test_prefix}: ["),
             )
 
     def extra_log(self, string):
         """Add process time with the log messages."""
         if hasattr(self.parent, "log"):
-            self.parent.log += f"\r\n[{time.process_time()}] "
-            self.parent.log += string + "\r\n"
+            _append_log(self.parent, f"\r\n[{time.process_time()}] {string}\r\n")
 
     def flush(self):
         """Flushes the buffer storage in console before pexpect."""
@@ -3,13 +3,17 @@ import getpass
 import inspect
 import logging
 import os
+import re
 import sys
 import time
+import uuid
+from dataclasses import dataclass
+from typing import List, Optional
 
 import pexpect
 from termcolor import colored
 
-from boardfarm.lib.bft_logging import o_helper
+from boardfarm.lib.bft_logging import BufferedLog, o_helper
 from boardfarm.tests_wrappers import throw_pexpect_error
 
 IS_PYTHON_3 = sys.version_info > (3, 0)
@@ -76,10 +80,27 @@ def caller_file_line(i):
 password = None
 
 
+@dataclass
+class CommandResult:
+    """Output and exit code of a command run by ``run_batch``."""
+
+    cmd: str
+    output: str = ""
+    # None if the command did not run, after an error with stop_on_error
+    exit_code: Optional[int] = None
+
+    @property
+    def ok(self) -> bool:
+        """Return True if the command ran and exited with 0."""
+        return self.exit_code == 0
+
+
 class bft_pexpect_helper(pexpect.spawn):
     """Boardfarm helper for logging pexpect and making minor tweaks."""
 
     delaybetweenchar = None
+    # console output, appended to by o_helper
+    log = BufferedLog()
 
     def __setattr__(self, key, value):
         """Every time when an attribute assignment is attempted, the function is called."""
@@ -217,6 +238,61 @@ class bft_pexpect_helper(pexpect.spawn):
             )
         return self.before.strip()
 
+    def run_batch(
+        self, cmds: List[str], stop_on_error: bool = False, timeout: int = 30
+    ) -> List[CommandResult]:
+        """Run commands as one script, instead of waiting for a prompt after each.
+
+        The commands are sent at once in a ``{ ... }`` group, so that they run
+        in the console's shell (``cd``, variables etc. are kept), each followed
+        by a marker with its exit code. The outputs and exit codes are parsed
+        from a single read, up to the marker ending the batch.
+
+        :param cmds: shell commands
+        :type cmds: list
+        :param stop_on_error: skip the commands following a failed one
+        :type stop_on_error: bool
+        :param timeout: seconds the whole batch may run for
+        :type timeout: int
+        :raises Exception: if the batch did not complete in time
+        :return: result of each command, in order
+        :rtype: list
+        """
+        results = [CommandResult(cmd) for cmd in cmds]
+        if not cmds:
+            return results
+        # the tag is a printf argument, so the echoed script does not match
+        # the markers
+        tag = f"BFTB{uuid.uuid4().hex[:8]}"
+        lines = [f"{{ printf '%s:START\\n' {tag}"]
+        for i, cmd in enumerate(cmds):
+            lines.append(cmd)
+            lines.append(f"__bft_rc=$?; printf '%s:%s:%s\\n' {tag} {i} $__bft_rc")
+            if stop_on_error and i < len(cmds) - 1:
+                lines.append("[ $__bft_rc -eq 0 ] && {")
+        if stop_on_error:
+            lines.extend("}" * (len(cmds) - 1))
+        lines.append(f"printf '%s:END\\n' {tag}; }}")
+
+        self.sendline("\n".join(lines))
+        try:
+            self.expect_exact(f"{tag}:END", timeout=timeout)
+            out = self.before
+            self.expect(self.prompt, timeout=timeout)
+        except Exception as e:
+            self.sendcontrol("c")
+            raise Exception(
+                f"Batch did not complete within {timeout} seconds. "
+                f"{self.name} prompt was not seen."
+            ) from e
+
+        out = re.split(rf"{tag}:START\r?\n", out)[-1]
+        parts = re.split(rf"{tag}:(\d+):(\d+)\r?\n", out)
+        for output, i, code in zip(parts[0::3], parts[1::3], parts[2::3]):
+            results[int(i)].output = output.replace("\r\n", "\n").rstrip("\n")
+            results[int(i)].exit_code = int(code)
+        return results
+
     def write(self, string):
         """Log file write."""
         self._logfile_read.write(string)
@@ -1,5 +1,7 @@
 """Boot module forgeneric devices."""
+import functools
 import logging
+import os
 import time
 import traceback
 import warnings
@@ -13,9 +15,12 @@ from boardfarm.exceptions import (
     CodeError,
     DeviceDoesNotExistError,
     NoTFTPServer,
+    WaitTimeout,
 )
+from boardfarm.lib import state_epoch, task_scheduler
 from boardfarm.lib.booting_utils import check_and_connect_to_wifi
 from boardfarm.lib.common import retry_on_exception
+from boardfarm.lib.waiting import save_time_to_ready, time_to_ready_report, wait_until
 from boardfarm.library import check_devices
 
 logger = logging.getLogger("bft")
@@ -141,9 +146,24 @@ def boot_board(config, env_helper, devices):
             devices.board.__reset__timestamp = time.time()
             devices.board.reset()
             devices.board.hw.wait_for_hw_boot()
-            for _ in range(5):
+
+            def touch_until_online():
+                # keep the consoles active meanwhile, the console may not
+                # answer yet: errors mean not online, unlike post_boot_board
                 devices.board.touch()
-                time.sleep(10)
+                return devices.board.is_online()
+
+            try:
+                wait_until(
+                    touch_until_online,
+                    50,
+                    name="board_online_after_flash",
+                    delay=5,
+                    max_delay=10,
+                )
+            except WaitTimeout:
+                # post_boot_board keeps waiting
+                pass
     except Exception as e:
         logger.critical(colored("\n\nFailed to Boot", color="red", attrs=["bold"]))
         logger.error(e)
@@ -154,12 +174,14 @@ boot_actions = {"board_boot": boot_board}
 
 
 def post_boot_board(config, env_helper, devices):
-    for _ in range(10):
-        time.sleep(30)
-        if devices.board.is_online():
-            break
-    else:
-        raise BootFail("Board not online.")
+    wait_until(
+        devices.board.is_online,
+        300,
+        name="board_online",
+        delay=5,
+        exceptions=(),
+        exc=BootFail("Board not online."),
+    )
 
     if not devices.board.finalize_boot():
         BootFail("Failed to finalize board.")
@@ -250,16 +272,24 @@ def post_boot_wlan_clients(config, env_helper, devices):
 
 def post_boot_env(config, env_helper, devices):
     tr069provision = env_helper.get_tr069_provisioning()
-    for _ in range(20):
+
+    def get_cpeid():
         try:
             devices.board.get_cpeid()
-            break
+            return True
         except Exception as e:
             logger.error(e)
             warnings.warn("Failed to connect to ACS, retrying")
-            time.sleep(10)
-    else:
-        raise BootFail("Failed to connect to ACS")
+            return False
+
+    wait_until(
+        get_cpeid,
+        200,
+        name="acs_connection",
+        delay=2,
+        max_delay=10,
+        exc=BootFail("Failed to connect to ACS"),
+    )
     if tr069provision:
         reset_val = any(
             x in env_helper.get_software()
@@ -325,17 +355,117 @@ def run_actions(actions_dict, actions_name, *args, **kwargs):
     logger.info(colored(f"{actions_name} COMPLETED", color="green", attrs=["bold"]))
 
 
+# Actions each boot action waits for, across the pre-boot, boot and post-boot
+# actions. LAN and WLAN clients are prepared while the board is flashed.
+# An action missing from this dict (e.g. added by an overlay) waits for all the
+# actions before it, and the actions of later phases wait for it.
+action_dependencies = {
+    "wan_clients_pre_boot": [],
+    "lan_clients_pre_boot": [],
+    "wlan_clients_pre_boot": [],
+    "board_pre_boot": [],
+    "environment_pre_boot": ["wan_clients_pre_boot"],
+    "board_boot": ["wan_clients_pre_boot", "board_pre_boot", "environment_pre_boot"],
+    "board_post_boot": ["board_boot"],
+    "wan_clients_post_boot": ["board_post_boot"],
+    "lan_clients_post_boot": ["board_post_boot", "lan_clients_pre_boot"],
+    "environment_post_boot": ["lan_clients_post_boot"],
+    "wlan_clients_connection": ["environment_post_boot", "wlan_clients_pre_boot"],
+}
+
+
+def get_action_dependencies(phases):
+    """Return the dependencies of the actions to run.
+
+    :param phases: (phase name, actions dict) in the order they used to run
+    :type phases: list
+    :return: action name to the names of the actions it waits for
+    :rtype: dict
+    """
+    present = [key for _, actions in phases for key in actions]
+    depends_on = {}
+    seen = []
+    undeclared = []
+    for _, actions in phases:
+        phase_undeclared = []
+        for key in actions:
+            if key in action_dependencies:
+                deps = [d for d in action_dependencies[key] if d in present]
+                deps += undeclared
+            else:
+                deps = list(seen)
+                phase_undeclared.append(key)
+            depends_on[key] = list(dict.fromkeys(deps))
+            seen.append(key)
+        undeclared += phase_undeclared
+    return depends_on
+
+
+def _run_action(actions_name, key, func, *args, **kwargs):
+    start_time = time.time()
+    logger.info(
+        colored(f"{actions_name}: action {key} start", color="green", attrs=["bold"])
+    )
+    try:
+        func(*args, **kwargs)
+    except Exception as e:
+        msg = f"\nFailed at: {actions_name}: {key} after {int(time.time() - start_time)} seconds with exception {e}"
+        logger.error(colored(msg, color="red", attrs=["bold"]))
+        raise
+    logger.info(
+        colored(
+            f"\nAction {key} completed. Took {int(time.time() - start_time)} seconds to complete.",
+            color="green",
+            attrs=["bold"],
+        )
+    )
+
+
+def run_boot_actions(phases, config, env_helper, devices):
+    """Run the boot actions, concurrently when they do not depend on each other.
+
+    :param phases: (phase name, actions dict) in the order they used to run
+    :type phases: list
+    :raises: the exception of the first action that failed
+    """
+    tasks = {
+        key: functools.partial(
+            _run_action, name, key, func, config, env_helper, devices
+        )
+        for name, actions in phases
+        for key, func in actions.items()
+    }
+    results = task_scheduler.run_tasks(
+        tasks,
+        get_action_dependencies(phases),
+        max_workers=getattr(config, "boot_workers", 4),
+    )
+    logger.info(
+        "Boot actions:\n" + task_scheduler.critical_path_report(results, "Action")
+    )
+    failed = sorted(
+        (r for r in results.values() if r.status == "failed"), key=lambda r: r.end
+    )
+    if failed:
+        raise failed[0].error
+
+
 def boot(config, env_helper, devices, logged=None, actions_list=None):
     start_time = time.time()
+    state_epoch.bump("boot")
     if not actions_list:
         actions_list = ["pre", "boot", "post"]
+    phases = [
+        (name, actions)
+        for tag, name, actions in (
+            ("pre", "PRE-BOOT", pre_boot_actions),
+            ("boot", "BOOT", boot_actions),
+            ("post", "POST-BOOT", post_boot_actions),
+        )
+        if tag in actions_list
+    ]
     try:
-        if "pre" in actions_list:
-            run_actions(pre_boot_actions, "PRE-BOOT", config, env_helper, devices)
-        if "boot" in actions_list:
-            run_actions(boot_actions, "BOOT", config, env_helper, devices)
-        if "post" in actions_list:
-            run_actions(post_boot_actions, "POST-BOOT", config, env_helper, devices)
+        run_boot_actions(phases, config, env_helper, devices)
         logger.info(
             colored(
                 f"Boot completed in {int(time.time() - start_time)} seconds.",
@@ -354,3 +484,10 @@ def boot(config, env_helper, devices, logged=None, actions_list=None):
             )
         )
         raise
+    finally:
+        fname = os.path.join(config.output_dir, "time_to_ready.jsonl")
+        try:
+            save_time_to_ready(fname)
+            logger.info("Time to ready across runs:\n" + time_to_ready_report(fname))
+        except Exception as e:
+            logger.debug(f"Could not record the time to ready: {e!r}")
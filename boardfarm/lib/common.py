@@ -2219,6 +2219,9 @@ def send_to_influx(device, **kwargs):
         raise
 
 
+_influx_wrappers = {}
+
+
 def validate_influx_connection(device: object) -> Union[object, None]:
     """Validate influx DB connection
 
@@ -2252,8 +2255,13 @@ def validate_influx_connection(device: object) -> Union[object, None]:
         "timeout": 15,
     }
 
+    # one client per DB and board, its writer batches the points of all calls
+    key = tuple(sorted(db_config.items()))
+    if key in _influx_wrappers:
+        return _influx_wrappers[key]
     try:
-        return GenericWrapper(**db_config)
+        _influx_wrappers[key] = GenericWrapper(**db_config)
+        return _influx_wrappers[key]
     except Exception:
         logger.error(
             colored(
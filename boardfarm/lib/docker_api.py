@@ -0,0 +1,336 @@
+"""Client of the Docker Engine API.
+
+:class:`DockerEngineAPI` talks to a docker engine over its unix socket, as
+``DockerFactory`` otherwise does by typing docker commands in a console and
+parsing their output. An ``ssh://`` DOCKER_HOST is reached through a local
+socket forwarded by ssh to the remote engine's socket, ``tcp://`` hosts are
+used as they are. One client, and its pool of HTTP connections, is kept per
+docker host (see :func:`get_client`).
+"""
+
+import atexit
+import json
+import logging
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import quote, urlparse
+
+import httpx
+
+from boardfarm.exceptions import DockerAPIError
+
+logger = logging.getLogger("bft")
+
+API_VERSION = "v1.41"
+DOCKER_SOCKET = "/var/run/docker.sock"
+
+_clients: Dict[Optional[str], "DockerEngineAPI"] = {}
+_clients_lock = threading.Lock()
+
+
+class DockerEngineAPI:
+    """Docker Engine API client, on one pooled connection to the engine."""
+
+    def __init__(self, docker_host: Optional[str] = None, timeout: float = 60) -> None:
+        """Instance initialization.
+
+        :param docker_host: ``unix://``, ``ssh://`` or ``tcp://`` URL of the
+            engine, defaults to the local socket
+        :type docker_host: str, optional
+        :param timeout: seconds to wait for a response
+        :type timeout: float
+        """
+        self.docker_host = docker_host
+        self._tunnel: Optional[subprocess.Popen] = None
+        self._tunnel_dir: Optional[str] = None
+        url = urlparse(docker_host or f"unix://{DOCKER_SOCKET}")
+        if url.scheme == "tcp":
+            transport = httpx.HTTPTransport()
+            base_url = f"http://{url.netloc}/{API_VERSION}"
+        else:
+            socket = url.path or DOCKER_SOCKET
+            if url.scheme == "ssh":
+                socket = self._forward(url)
+            transport = httpx.HTTPTransport(uds=socket)
+            base_url = f"http://docker/{API_VERSION}"
+        self.client = httpx.Client(
+            transport=transport, base_url=base_url, timeout=timeout
+        )
+
+    def _forward(self, url) -> str:
+        """Forward a local socket to the engine socket of an ssh host."""
+        self._tunnel_dir = tempfile.mkdtemp(prefix="bft-docker-")
+        local = os.path.join(self._tunnel_dir, "docker.sock")
+        host = f"{url.username}@{url.hostname}" if url.username else url.hostname
+        cmd = ["ssh", "-nNT", "-o", "ExitOnForwardFailure=yes"]
+        cmd += ["-o", "StrictHostKeyChecking=no", "-o", "UserKnownHostsFile=/dev/null"]
+        if url.port:
+            cmd += ["-p", str(url.port)]
+        cmd += ["-L", f"{local}:{DOCKER_SOCKET}", host]
+        self._tunnel = subprocess.Popen(
+            cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        for _ in range(100):
+            if os.path.exists(local):
+                return local
+            if self._tunnel.poll() is not None:
+                break
+            time.sleep(0.1)
+        self.close()
+        raise DockerAPIError(f"Could not forward the docker socket of {host}")
+
+    def close(self) -> None:
+        """Close the connections and the ssh tunnel, if any."""
+        if getattr(self, "client", None):
+            self.client.close()
+        if self._tunnel:
+            self._tunnel.terminate()
+            self._tunnel.wait()
+            self._tunnel = None
+        if self._tunnel_dir:
+            shutil.rmtree(self._tunnel_dir, ignore_errors=True)
+            self._tunnel_dir = None
+
+    def request(self, method: str, path: str, ok=(200, 201, 204), **kwargs: Any) -> Any:
+        """Send a request to the engine.
+
+        :param method: HTTP method
+        :type method: str
+        :param path: API path, e.g. "/containers/json"
+        :type path: str
+        :param ok: status codes of a successful request
+        :type ok: tuple
+        :param kwargs: arguments of httpx.Client.request
+        :raises DockerAPIError: on any other status code
+        :return: decoded JSON body, None if empty
+        :rtype: any
+        """
+        try:
+            response = self.client.request(method, path, **kwargs)
+        except httpx.HTTPError as e:
+            raise DockerAPIError(f"{method} {path}: {e!r}") from e
+        if response.status_code not in ok:
+            try:
+                message = response.json().get("message", response.text)
+            except ValueError:
+                message = response.text
+            raise DockerAPIError(f"{method} {path}: {response.status_code} {message}")
+        if not response.content:
+            return None
+        if response.headers.get("Content-Type", "").startswith("application/json"):
+            return response.json()
+        return response.content
+
+    def image_exists(self, img: str) -> bool:
+        """Return True if the engine has an image.
+
+        :param img: image tag, e.g. bft:node
+        :type img: str
+        :rtype: bool
+        """
+        try:
+            self.request("GET", f"/images/{quote(img, safe='')}/json")
+        except DockerAPIError as e:
+            if " 404 " in str(e):
+                return False
+            raise
+        return True
+
+    def run(
+        self,
+        name: str,
+        img: str,
+        cmd: List[str],
+        ports: Tuple[str, ...] = ("22/tcp",),
+        healthcheck: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """Create and start a privileged container, removed once stopped.
+
+        :param name: container name
+        :type name: str
+        :param img: image tag
+        :type img: str
+        :param cmd: command of the container
+        :type cmd: list
+        :param ports: container ports published on random host ports
+        :type ports: tuple
+        :param healthcheck: ``Healthcheck`` of the container config
+        :type healthcheck: dict, optional
+        :return: container id
+        :rtype: str
+        """
+        config = {
+            "Image": img,
+            "Cmd": cmd,
+            "ExposedPorts": {p: {} for p in ports},
+            "HostConfig": {
+                "Privileged": True,
+                "AutoRemove": True,
+                "PortBindings": {p: [{"HostPort": ""}] for p in ports},
+            },
+        }
+        if healthcheck:
+            config["Healthcheck"] = healthcheck
+        cid = self.request(
+            "POST", "/containers/create", params={"name": name}, json=config
+        )["Id"]
+        self.request("POST", f"/containers/{cid}/start")
+        return cid
+
+    def inspect(self, name: str) -> Dict[str, Any]:
+        """Return the details of a container, as ``docker inspect``.
+
+        :param name: container name or id
+        :type name: str
+        :rtype: dict
+        """
+        return self.request("GET", f"/containers/{name}/json")
+
+    def rename(self, name: str, new_name: str) -> None:
+        """Rename a container.
+
+        :param name: container name or id
+        :type name: str
+        :param new_name: new container name
+        :type new_name: str
+        """
+        self.request("POST", f"/containers/{name}/rename", params={"name": new_name})
+
+    def stop(self, name: str, timeout: int = 10) -> None:
+        """Stop a container, doing nothing if it is not running.
+
+        :param name: container name or id
+        :type name: str
+        :param timeout: seconds before the container is killed
+        :type timeout: int
+        """
+        self.request(
+            "POST",
+            f"/containers/{name}/stop",
+            ok=(204, 304, 404),
+            params={"t": timeout},
+        )
+
+    def connect_network(self, network: str, name: str) -> None:
+        """Connect a container to a network.
+
+        :param network: network name or id
+        :type network: str
+        :param name: container name or id
+        :type name: str
+        """
+        self.request("POST", f"/networks/{network}/connect", json={"Container": name})
+
+    def network(self, network: str) -> Dict[str, Any]:
+        """Return the details of a network, as ``docker network inspect``.
+
+        :param network: network name or id
+        :type network: str
+        :rtype: dict
+        """
+        return self.request("GET", f"/networks/{network}")
+
+    def exec_run(self, name: str, cmd: List[str]) -> Tuple[int, str]:
+        """Run a command in a container, as ``docker exec``.
+
+        :param name: container name or id
+        :type name: str
+        :param cmd: command and its arguments
+        :type cmd: list
+        :return: exit code and output (stdout and stderr)
+        :rtype: tuple
+        """
+        exec_id = self.request(
+            "POST",
+            f"/containers/{name}/exec",
+            json={"Cmd": cmd, "AttachStdout": True, "AttachStderr": True},
+        )["Id"]
+        raw = self.request("POST", f"/exec/{exec_id}/start", json={"Detach": False})
+        code = self.request("GET", f"/exec/{exec_id}/json")["ExitCode"]
+        return code, demux(raw or b"")
+
+    def wait_healthy(self, names: List[str], since: float, timeout: float) -> Set[str]:
+        """Wait for the health checks of containers to pass.
+
+        The engine events are read from ``since``, so containers started
+        before the call are not missed.
+
+        :param names: container names
+        :type names: list
+        :param since: time the containers were started at, or before
+        :type since: float
+        :param timeout: seconds to wait for
+        :type timeout: float
+        :return: names of the healthy containers, missing ones failed or timed out
+        :rtype: set
+        """
+        filters = {"type": ["container"], "container": names}
+        params = {
+            "since": str(int(since) - 1),
+            "until": str(int(time.time() + timeout) + 1),
+            "filters": json.dumps(filters),
+        }
+        healthy: Set[str] = set()
+        pending = set(names)
+        with self.client.stream(
+            "GET", "/events", params=params, timeout=timeout + 10
+        ) as response:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                name = event.get("Actor", {}).get("Attributes", {}).get("name")
+                action = event.get("Action", "")
+                if name not in pending:
+                    continue
+                if action == "health_status: healthy":
+                    healthy.add(name)
+                    pending.discard(name)
+                elif action in ("die", "destroy", "health_status: unhealthy"):
+                    pending.discard(name)
+                if not pending:
+                    break
+        return healthy
+
+
+def demux(raw: bytes) -> str:
+    """Return the output of a multiplexed docker stream.
+
+    :param raw: frames of an 8 bytes header (stream, 0, 0, 0, size) and data
+    :type raw: bytes
+    :rtype: str
+    """
+    out = []
+    while len(raw) >= 8:
+        size = struct.unpack(">I", raw[4:8])[0]
+        out.append(raw[8 : 8 + size])
+        raw = raw[8 + size :]
+    return b"".join(out).decode(errors="replace")
+
+
+def get_client(docker_host: Optional[str] = None) -> DockerEngineAPI:
+    """Return the client of a docker host, shared by all its users.
+
+    :param docker_host: see :class:`DockerEngineAPI`
+    :type docker_host: str, optional
+    :rtype: DockerEngineAPI
+    """
+    with _clients_lock:
+        if docker_host not in _clients:
+            _clients[docker_host] = DockerEngineAPI(docker_host)
+        return _clients[docker_host]
+
+
+@atexit.register
+def close_clients() -> None:
+    """Close the clients of all docker hosts."""
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
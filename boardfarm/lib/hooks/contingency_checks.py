@@ -1,11 +1,16 @@
 """Provide Hook implementations for contingency checks."""
 
 
+import functools
+import json
 import logging
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from nested_lookup import nested_lookup
 
 from boardfarm.exceptions import ContingencyCheckError, SkipTest
+from boardfarm.lib import state_epoch, task_scheduler
 from boardfarm.lib.common import check_prompts, retry_on_exception
 from boardfarm.lib.DeviceManager import device_type
 from boardfarm.lib.hooks import contingency_impl, hookimpl
@@ -14,11 +19,109 @@ from boardfarm.plugins import BFPluginManager
 logger = logging.getLogger("tests_logger")
 
 
+def run_per_device(
+    check: str,
+    devices: List[Any],
+    work: Callable[[Any], Any],
+    timeout: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Run the work of a service check on each device concurrently.
+
+    The work of a device only uses its own console, so it blocks independently
+    of the others. A device listed twice (e.g. wan and provisioner being the
+    same) is only worked on once, devices that are None are ignored.
+
+    :param check: name of the service check, for the error message
+    :type check: str
+    :param devices: devices to work on
+    :type devices: list
+    :param work: callable taking a device
+    :type work: callable
+    :param timeout: seconds the work on a device may take, defaults to None
+    :type timeout: float, optional
+    :raises ContingencyCheckError: listing the devices the work failed on
+    :return: device name to the value returned by work
+    :rtype: dict
+    """
+    tasks = {}
+    for dev in {id(d): d for d in devices if d is not None}.values():
+        name = getattr(dev, "name", None) or str(dev)
+        while name in tasks:
+            name += "_"
+        tasks[name] = functools.partial(work, dev)
+    results = task_scheduler.run_tasks(tasks, max_workers=len(tasks), timeout=timeout)
+    failures = [f"{name}: {r.error!r}" for name, r in results.items() if not r.ok]
+    if failures:
+        raise ContingencyCheckError(f"{check} failed on " + ", ".join(failures))
+    return {name: r.value for name, r in results.items()}
+
+
 class ContingencyCheck:
     """Contingency check implementation."""
 
     impl_type = "base"
 
+    # feature plugin manager and implementations, built once
+    _feature_pm = None
+    _feature_impls = None
+    # seconds each service check may take
+    service_check_timeout = float(os.environ.get("BFT_SERVICE_CHECK_TIMEOUT", 900))
+    # env_req (as JSON) to the epoch its service checks passed in and their result
+    _passed: Dict[str, Tuple[int, Any]] = {}
+
+    @classmethod
+    def _feature_manager(cls):
+        """Return the feature plugin manager, loading its hooks on first use.
+
+        It is built again if it was reset by another BFPluginManager("contingency").
+        """
+        pm = cls._feature_pm
+        if pm is None or not hasattr(pm.hook, "service_check"):
+            pm = BFPluginManager("contingency")
+            # this will load all feature hooks for contingency
+            pm.load_hook_specs("feature")
+            cls._feature_impls = pm.fetch_impl_classes("feature")
+            cls._feature_pm = pm
+        return pm, cls._feature_impls
+
+    def _run_service_checks(self, pm, **kwargs) -> List[Any]:
+        """Call the registered service checks in hook order, each with a deadline.
+
+        A failing check does not prevent the next ones from running, the
+        failures are reported together. After a check timed out the next
+        ones are not run, as it may still be using the device consoles.
+
+        :raises ContingencyCheckError: listing the checks that failed
+        :return: the results of the checks that returned one, like the hook
+        :rtype: list
+        """
+        hook = pm.hook.service_check
+        plugins = [impl.plugin for impl in reversed(hook.get_hookimpls())]
+        results, failures = [], []
+        for plugin in plugins:
+            name = type(plugin).__name__
+            caller = pm.subset_hook_caller(
+                "service_check", [p for p in plugins if p is not plugin]
+            )
+            task = task_scheduler.run_tasks(
+                {name: functools.partial(caller, **kwargs)},
+                timeout=self.service_check_timeout,
+            )[name]
+            if task.ok:
+                results += task.value
+                continue
+            if isinstance(task.error, SkipTest):
+                raise task.error
+            logger.error(f"{name} service check failed: {task.error!r}")
+            failures.append(f"{name}: {task.error}")
+            if task.status == "timeout":
+                break
+        if failures:
+            raise ContingencyCheckError(
+                "Service checks failed:\n" + "\n".join(failures)
+            )
+        return results
+
     @hookimpl(tryfirst=True)
     def contingency_check(self, env_req, dev_mgr, env_helper):
         """Register service check plugins based on env_req.
@@ -28,18 +131,23 @@ class ContingencyCheck:
         feature PluginManager (use generate_feature_manager).
 
         Once all plugins are registered, this functions will call the hook
-        initiating respective service checks.
+        initiating respective service checks. If they already passed with
+        the same env_req in the current state epoch they are skipped.
 
         :param env_req: ENV request provided by a test
         :type env_req: dict
         """
+        key = json.dumps(env_req, sort_keys=True, default=str)
+        epoch = state_epoch.current()
+        if key in self._passed and self._passed[key][0] == epoch:
+            logger.info(
+                f"Contingency service checks already passed in state epoch {epoch}"
+            )
+            return self._passed[key][1]
 
         logger.info("Executing all contingency service checks under boardfarm")
         # initialize a feature Plugin Manager for Contingency check
-        pm = BFPluginManager("contingency")
-        # this will load all feature hooks for contingency
-        pm.load_hook_specs("feature")
-        all_impls = pm.fetch_impl_classes("feature")
+        pm, all_impls = self._feature_manager()
 
         plugins_to_register = [all_impls["boardfarm.DefaultChecks"]]
 
@@ -60,16 +168,24 @@ class ContingencyCheck:
 
         plugins_to_register.append(all_impls["boardfarm.CheckInterface"])
 
+        for plugin in pm.get_plugins():
+            pm.unregister(plugin)
         # since Pluggy executes plugin in LIFO order of registration
         # reverse the list so that Default check is executed first
         for i in reversed(plugins_to_register):
             pm.register(i)
-        result = pm.hook.service_check(
-            env_req=env_req, dev_mgr=dev_mgr, env_helper=env_helper
-        )
-
-        # this needs to be orchestrated by hook wrapper maybe
-        BFPluginManager.remove_plugin_manager("contingency")
+        try:
+            result = self._run_service_checks(
+                pm, env_req=env_req, dev_mgr=dev_mgr, env_helper=env_helper
+            )
+        except SkipTest:
+            raise
+        except Exception:
+            state_epoch.bump("contingency service check failed")
+            raise
+
+        self._passed.clear()
+        self._passed[key] = (epoch, result)
         return result
 
 
@@ -97,7 +213,11 @@ class DefaultChecks:
             softphone = dev_mgr.by_type(device_type.softphone)
             wan_devices = wan_devices + [sipserver, softphone]
 
-        check_prompts(wan_devices + lan_devices)
+        run_per_device(
+            "check_prompts",
+            wan_devices + lan_devices,
+            lambda dev: check_prompts([dev]),
+        )
 
         logger.info("Default service check [check_prompts] for BF executed")
 
@@ -138,11 +258,13 @@ class CheckInterface:
         if prov_mode != "ipv4" and prov_mode != "none":
             flags.append("ipv6")
 
-        for dev in lan_devices:
+        def setup_lan_client(dev):
             dev.configure_docker_iface()
             call_lan_clients(dev, flags, prep_iface=True)
             dev.configure_proxy_pkgs()
 
+        run_per_device("CheckInterface", lan_devices, setup_lan_client)
+
         def _setup_as_wan_gateway():
             ipv4 = wan.get_interface_ipaddr(wan.iface_dut)
             ipv6 = wan.get_interface_ip6addr(wan.iface_dut)
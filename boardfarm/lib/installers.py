@@ -1688,3 +1688,18 @@ def install_tshark(device):
     except Exception:
         device.expect(device.prompt)
         apt_install(device, "tshark")
+
+
+def install_socat(device):
+    """Install socat if not present.
+
+    :param device: lan or wan or wlan
+    :type device: Object
+    """
+    device.sendline("socat -V")
+    try:
+        device.expect("socat version", timeout=5)
+        device.expect(device.prompt)
+    except Exception:
+        device.expect(device.prompt)
+        apt_install(device, "socat")
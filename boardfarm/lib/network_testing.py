@@ -212,42 +212,19 @@ def rtp_read_verify(device, capture_file, msg_list=None, rm_pcap=True):
     :return: True if RTP messages found else False
     :rtype: Boolean
     """
-    device.sudo_sendline(f"tshark -r {capture_file} -Y rtp > rtp.txt")
-    device.expect_prompt()
-    result_list = []
+    rtp = device.read_pcap(capture_file, rm_pcap=rm_pcap).filter(app="rtp")
     if not msg_list:
-        try:
-            device.sendline("grep RTP rtp.txt|wc -l")
-            device.expect("[1-9]\\d*\r\n", timeout=5)
-            result_list.append(True)
-        except PexpectErrorTimeout:
+        if not len(rtp):
             logger.error("No RTP Packets found")
-            result_list.append(False)
-        device.expect_prompt()
-    else:
-        for msg in msg_list:
-            try:
-                device.sendline(
-                    'grep ".*'
-                    + msg.src_ip
-                    + ".*"
-                    + msg.dest_ip
-                    + '.*RTP.*" rtp.txt | wc -l'
-                )
-                device.expect("[1-9]\\d*\r\n", timeout=10)
-                device.expect_prompt()
-                result_list.append(True)
-            except PexpectErrorTimeout:
-                logger.error(
-                    f"No RTP Packets found with source {msg.src_ip} and destination {msg.dest_ip}"
-                )
-                device.expect_prompt()
-                result_list.append(False)
-    if rm_pcap:
-        device.sudo_sendline("rm rtp.txt")
-        device.expect_prompt()
-        device.sudo_sendline(f"rm {capture_file}")
-        device.expect_prompt()
+        return bool(len(rtp))
+    result_list = []
+    for msg in msg_list:
+        found = len(rtp.filter(src=msg.src_ip, dst=msg.dest_ip)) > 0
+        if not found:
+            logger.error(
+                f"No RTP Packets found with source {msg.src_ip} and destination {msg.dest_ip}"
+            )
+        result_list.append(found)
     return all(result_list)
 
 
@@ -0,0 +1,425 @@
+"""Local analysis of packet captures.
+
+Reading a capture with tshark or tcpdump on a device and scraping the
+console text is slow for large captures, and breaks whenever the decoder
+changes its output format. Here the capture file is read locally instead,
+one packet at a time (pcap and pcapng), and the fields tests look at are
+decoded into the columns of a pandas DataFrame, see :func:`read_pcap`.
+:class:`PcapTable` then answers queries on whole columns at once: filters,
+ordered sequences of packets and per flow statistics.
+
+Only the headers are decoded: Ethernet (with VLAN tags), Linux cooked
+captures and raw IP, IPv4 and IPv6, TCP, UDP, ICMP and ICMPv6. The
+application of UDP and TCP packets is guessed from their ports and
+payload, the first line of SIP messages and the RTP header are kept. As
+about one in eight UDP payloads looks like an RTP header, RTP is only kept
+for the flows of packets with the same SSRC and increasing sequence numbers.
+"""
+
+import ipaddress
+import logging
+import struct
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy
+import pandas
+
+logger = logging.getLogger("bft")
+
+# link types, see https://www.tcpdump.org/linktypes.html
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6),
+    b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9),
+    b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+}
+PCAPNG_SHB = 0x0A0D0D0A
+
+SIP_PORTS = (5060, 5061)
+SIP_START = (
+    b"SIP/2.0 ",
+    b"INVITE ",
+    b"ACK ",
+    b"BYE ",
+    b"CANCEL ",
+    b"REGISTER ",
+    b"OPTIONS ",
+    b"PRACK ",
+    b"SUBSCRIBE ",
+    b"NOTIFY ",
+    b"PUBLISH ",
+    b"INFO ",
+    b"REFER ",
+    b"MESSAGE ",
+    b"UPDATE ",
+)
+APP_PORTS = {53: "dns", 67: "dhcp", 68: "dhcp", 546: "dhcpv6", 547: "dhcpv6"}
+# an RTP stream has at least this many sequence number steps forward, of at
+# most RTP_MAX_SEQ_STEP (lost packets), and at least half of its steps are
+RTP_MIN_STEPS = 2
+RTP_MAX_SEQ_STEP = 100
+
+COLUMNS = (
+    "time",
+    "length",
+    "ip_version",
+    "src",
+    "dst",
+    "proto",
+    "sport",
+    "dport",
+    "tcp_flags",
+    "icmp_type",
+    "icmp_code",
+    "app",
+    "info",
+    "rtp_pt",
+    "rtp_seq",
+    "rtp_ssrc",
+)
+INT_COLUMNS = (
+    "ip_version",
+    "proto",
+    "sport",
+    "dport",
+    "tcp_flags",
+    "icmp_type",
+    "icmp_code",
+    "rtp_pt",
+    "rtp_seq",
+    "rtp_ssrc",
+)
+
+Packet = Tuple[float, int, int, bytes]
+
+
+def iter_packets(file: BinaryIO) -> Iterator[Packet]:
+    """Read the packets of a pcap or pcapng file, one at a time.
+
+    :param file: capture file, opened in binary mode
+    :type file: BinaryIO
+    :raises ValueError: if the file is neither pcap nor pcapng
+    :return: time, link type, original length and captured bytes of each packet
+    :rtype: iterator
+    """
+    magic = file.read(4)
+    if magic in PCAP_MAGIC:
+        yield from _iter_pcap(file, *PCAP_MAGIC[magic])
+    elif len(magic) == 4 and struct.unpack("<I", magic)[0] == PCAPNG_SHB:
+        yield from _iter_pcapng(file, magic)
+    elif magic:
+        raise ValueError("Not a pcap or pcapng file")
+
+
+def _iter_pcap(file: BinaryIO, order: str, resolution: float) -> Iterator[Packet]:
+    header = file.read(20)
+    linktype = struct.unpack(order + "I", header[16:20])[0] & 0x0FFFFFFF
+    record = struct.Struct(order + "IIII")
+    while True:
+        head = file.read(16)
+        if len(head) < 16:
+            return
+        sec, frac, caplen, length = record.unpack(head)
+        data = file.read(caplen)
+        if len(data) < caplen:
+            logger.warning("Capture file truncated, ignoring its last packet")
+            return
+        yield sec + frac * resolution, linktype, length, data
+
+
+def _iter_pcapng(file: BinaryIO, magic: bytes) -> Iterator[Packet]:
+    order = "<"
+    # link type and timestamp resolution of each interface of the section
+    interfaces: List[Tuple[int, float]] = []
+    while True:
+        head = magic + file.read(8 - len(magic)) if magic else file.read(8)
+        magic = b""
+        if len(head) < 8:
+            return
+        if struct.unpack("<I", head[:4])[0] == PCAPNG_SHB:
+            order = "<" if file.read(4) == b"\x4d\x3c\x2b\x1a" else ">"
+            size = struct.unpack(order + "I", head[4:])[0]
+            file.read(size - 12)
+            interfaces = []
+            continue
+        btype, size = struct.unpack(order + "II", head)
+        body = file.read(size - 8)
+        if len(body) < size - 8:
+            return
+        if btype == 1:
+            interfaces.append(
+                (struct.unpack_from(order + "H", body)[0], _tsresol(body, order))
+            )
+        elif btype == 6:
+            iface, high, low, caplen, length = struct.unpack_from(order + "IIIII", body)
+            linktype, resolution = interfaces[iface]
+            ts = ((high << 32) | low) * resolution
+            yield ts, linktype, length, body[20 : 20 + caplen]
+        elif btype == 3:
+            length = struct.unpack_from(order + "I", body)[0]
+            linktype, _ = interfaces[0]
+            yield 0.0, linktype, length, body[4 : 4 + min(length, len(body) - 8)]
+
+
+def _tsresol(body: bytes, order: str) -> float:
+    """Return the timestamp resolution of an interface description block."""
+    offset = 8
+    while offset + 4 <= len(body) - 4:
+        code, size = struct.unpack_from(order + "HH", body, offset)
+        if code == 0:
+            break
+        if code == 9:
+            value = body[offset + 4]
+            return 2 ** -(value & 0x7F) if value & 0x80 else 10**-value
+        offset += 4 + (size + 3) // 4 * 4
+    return 1e-6
+
+
+def decode(linktype: int, data: bytes) -> Dict[str, Any]:
+    """Decode the headers of a packet.
+
+    :param linktype: link type of the capture
+    :type linktype: int
+    :param data: captured bytes
+    :type data: bytes
+    :return: values of the columns the packet has, see COLUMNS
+    :rtype: dict
+    """
+    row: Dict[str, Any] = {}
+    if linktype == LINKTYPE_ETHERNET:
+        ethertype, offset = struct.unpack_from("!H", data, 12)[0], 14
+        while ethertype in (0x8100, 0x88A8) and len(data) >= offset + 4:
+            ethertype, offset = (
+                struct.unpack_from("!H", data, offset + 2)[0],
+                offset + 4,
+            )
+    elif linktype == LINKTYPE_LINUX_SLL:
+        ethertype, offset = struct.unpack_from("!H", data, 14)[0], 16
+    elif linktype == LINKTYPE_LINUX_SLL2:
+        ethertype, offset = struct.unpack_from("!H", data, 0)[0], 20
+    elif linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6):
+        ethertype = 0x86DD if data[:1] and data[0] >> 4 == 6 else 0x0800
+        offset = 0
+    else:
+        return row
+    if ethertype == 0x0800 and len(data) >= offset + 20:
+        row["ip_version"] = 4
+        proto = data[offset + 9]
+        row["src"] = str(ipaddress.IPv4Address(data[offset + 12 : offset + 16]))
+        row["dst"] = str(ipaddress.IPv4Address(data[offset + 16 : offset + 20]))
+        offset += (data[offset] & 0x0F) * 4
+    elif ethertype == 0x86DD and len(data) >= offset + 40:
+        row["ip_version"] = 6
+        proto = data[offset + 6]
+        row["src"] = str(ipaddress.IPv6Address(data[offset + 8 : offset + 24]))
+        row["dst"] = str(ipaddress.IPv6Address(data[offset + 24 : offset + 40]))
+        offset += 40
+        # skip the extension headers: hop-by-hop, routing, destination options
+        while proto in (0, 43, 60) and len(data) >= offset + 2:
+            proto, offset = data[offset], offset + (data[offset + 1] + 1) * 8
+    else:
+        return row
+    row["proto"] = proto
+    if proto in (1, 58) and len(data) >= offset + 2:
+        row["icmp_type"], row["icmp_code"] = data[offset], data[offset + 1]
+    elif proto in (6, 17) and len(data) >= offset + 4:
+        row["sport"], row["dport"] = struct.unpack_from("!HH", data, offset)
+        if proto == 6 and len(data) >= offset + 14:
+            row["tcp_flags"] = data[offset + 13]
+            offset += (data[offset + 12] >> 4) * 4
+        else:
+            offset += 8
+        _decode_app(row, data[offset:])
+    return row
+
+
+def _decode_app(row: Dict[str, Any], payload: bytes) -> None:
+    ports = (row["sport"], row["dport"])
+    if payload.startswith(SIP_START) or (
+        payload and any(p in SIP_PORTS for p in ports)
+    ):
+        row["app"] = "sip"
+        row["info"] = payload.split(b"\r\n", 1)[0].decode(errors="replace")
+        return
+    for port in ports:
+        if port in APP_PORTS:
+            row["app"] = APP_PORTS[port]
+            return
+    # RTP version 2, audio/video or dynamic payload type, on unprivileged
+    # ports: only a candidate, see _confirm_rtp
+    if (
+        row["proto"] == 17
+        and len(payload) >= 12
+        and payload[0] >> 6 == 2
+        and min(ports) >= 1024
+        and ((payload[1] & 0x7F) <= 34 or 96 <= (payload[1] & 0x7F) <= 127)
+    ):
+        row["app"] = "rtp"
+        row["rtp_pt"] = payload[1] & 0x7F
+        row["rtp_seq"], _, row["rtp_ssrc"] = struct.unpack_from("!HII", payload, 2)
+
+
+def read_pcap(path: str) -> "PcapTable":
+    """Read a capture file into a table of its packets.
+
+    :param path: local pcap or pcapng file
+    :type path: str
+    :return: one row per packet, in capture order
+    :rtype: PcapTable
+    """
+    columns: Dict[str, List[Any]] = {name: [] for name in COLUMNS}
+    with open(path, "rb") as file:
+        for count, (ts, linktype, length, data) in enumerate(iter_packets(file)):
+            try:
+                row = decode(linktype, data)
+            except (struct.error, IndexError, ValueError):
+                # truncated by the snap length
+                row = {}
+            row["time"], row["length"] = ts, length
+            for name in COLUMNS:
+                columns[name].append(row.get(name))
+    frame = pandas.DataFrame(columns)
+    for name in INT_COLUMNS:
+        frame[name] = frame[name].astype("Int64")
+    frame["time"] = frame["time"].astype(float)
+    _confirm_rtp(frame)
+    logger.debug(f"Read {len(frame)} packets from {path}")
+    return PcapTable(frame)
+
+
+def _confirm_rtp(frame: pandas.DataFrame) -> None:
+    """Clear the RTP columns of the candidates not part of an RTP stream.
+
+    A stream is a flow of candidates with the same SSRC, whose sequence
+    numbers mostly increase by small steps.
+    """
+    rtp = frame[frame["app"] == "rtp"]
+    if rtp.empty:
+        return
+    keys = ["src", "sport", "dst", "dport", "rtp_ssrc"]
+    steps = rtp.groupby(keys, sort=False)["rtp_seq"].diff() % 65536
+    rtp = rtp.assign(forward=steps.between(1, RTP_MAX_SEQ_STEP).fillna(False))
+    groups = rtp.groupby(keys, sort=False)["forward"]
+    forward = groups.transform("sum")
+    stream = (forward >= RTP_MIN_STEPS) & (forward * 2 >= groups.transform("size") - 1)
+    frame.loc[rtp.index[~stream], ["app", "rtp_pt", "rtp_seq", "rtp_ssrc"]] = None
+
+
+Condition = Union[Any, List[Any], Tuple[Any, ...], set, frozenset]
+
+
+class PcapTable:
+    """Packets of a capture, one row each, and queries over them."""
+
+    def __init__(self, frame: pandas.DataFrame) -> None:
+        """Instance initialization.
+
+        :param frame: packets, with the COLUMNS of :func:`read_pcap`
+        :type frame: pandas.DataFrame
+        """
+        self.frame = frame
+
+    def __len__(self) -> int:
+        """Return the number of packets."""
+        return len(self.frame)
+
+    def __iter__(self) -> Iterator[Any]:
+        """Iterate over the packets, as named tuples."""
+        return self.frame.itertuples(index=False)
+
+    def _mask(self, conditions: Dict[str, Condition]) -> numpy.ndarray:
+        mask = numpy.ones(len(self.frame), dtype=bool)
+        for column, value in conditions.items():
+            series = self.frame[column]
+            if callable(value):
+                match = value(series)
+            elif isinstance(value, (list, tuple, set, frozenset)):
+                match = series.isin(list(value))
+            else:
+                match = series == value
+            mask &= numpy.asarray(match.fillna(False), dtype=bool)
+        return mask
+
+    def filter(self, **conditions: Condition) -> "PcapTable":
+        """Return the packets matching all conditions.
+
+        A condition is a value the column must be equal to, a list, tuple or
+        set of values it must be in, or a callable taking the column (a
+        pandas Series) and returning a boolean Series, e.g.
+        ``table.filter(proto=17, dport={5060, 5061}, length=lambda c: c > 100)``.
+
+        :param conditions: column name to condition
+        :type conditions: dict
+        :return: the matching packets, in capture order
+        :rtype: PcapTable
+        """
+        return PcapTable(self.frame[self._mask(conditions)])
+
+    def query(self, expr: str) -> "PcapTable":
+        """Return the packets matching a pandas query expression.
+
+        :param expr: e.g. "proto == 6 and tcp_flags & 2 != 0"
+        :type expr: str
+        :return: the matching packets, in capture order
+        :rtype: PcapTable
+        """
+        return PcapTable(self.frame.query(expr))
+
+    def match_sequence(
+        self, expected: List[Dict[str, Condition]]
+    ) -> Optional[List[int]]:
+        """Find packets matching expected conditions, in that order.
+
+        Each step matches the first packet after the packet matched by the
+        previous step, other packets may be in between.
+
+        :param expected: conditions of each packet, as for :meth:`filter`
+        :type expected: list
+        :return: positions of the matched packets, None if a step is not matched
+        :rtype: list, optional
+        """
+        positions: List[int] = []
+        last = -1
+        for step in expected:
+            candidates = numpy.flatnonzero(self._mask(step))
+            found = numpy.searchsorted(candidates, last, side="right")
+            if found == len(candidates):
+                logger.debug(f"No packet matching {step} after packet {last}")
+                return None
+            last = int(candidates[found])
+            positions.append(last)
+        return positions
+
+    def flows(self) -> pandas.DataFrame:
+        """Return statistics of each flow, i.e. of each 5-tuple.
+
+        :return: packets, bytes, first and last time, duration and
+            bits_per_second of each (proto, src, sport, dst, dport)
+        :rtype: pandas.DataFrame
+        """
+        keys = ["proto", "src", "sport", "dst", "dport"]
+        stats = (
+            self.frame.dropna(subset=["src"])
+            .groupby(keys, dropna=False, sort=False)
+            .agg(
+                packets=("length", "size"),
+                bytes=("length", "sum"),
+                first=("time", "min"),
+                last=("time", "max"),
+            )
+            .reset_index()
+        )
+        stats["duration"] = stats["last"] - stats["first"]
+        stats["bits_per_second"] = numpy.where(
+            stats["duration"] > 0,
+            stats["bytes"] * 8 / stats["duration"].where(stats["duration"] > 0, 1),
+            numpy.nan,
+        )
+        return stats
@@ -9,8 +9,13 @@ class __MetaSignatureChecker(abc.ABCMeta):  # noqa: B024
             for meth_name in getattr(base_cls, "__abstractmethods__", ()):
                 if not callable(getattr(base_cls, meth_name)):
                     continue
-                orig_argspec = inspect.getfullargspec(getattr(base_cls, meth_name))
-                target_argspec = inspect.getfullargspec(getattr(cls, meth_name))
+                # decorated methods are checked with the signature they wrap
+                orig_argspec = inspect.getfullargspec(
+                    inspect.unwrap(getattr(base_cls, meth_name))
+                )
+                target_argspec = inspect.getfullargspec(
+                    inspect.unwrap(getattr(cls, meth_name))
+                )
                 if orig_argspec != target_argspec:
                     errors.append(
                         f"Abstract method {meth_name!r}  not implemented"
@@ -0,0 +1,770 @@
+"""In-process asyncio SNMPv2c engine.
+
+The SNMP helpers in :mod:`boardfarm.lib.SNMPv2` and :mod:`boardfarm.lib.common`
+build net-snmp command lines, run them on a device console and regex-parse
+their output, one command (and one round trip over the console) per object.
+:class:`SnmpEngine` talks SNMP directly from the boardfarm host instead: the
+PDUs are built and parsed with the pysnmp protocol layer and sent over an
+asyncio UDP endpoint, either to the agent itself or to a per-device
+:class:`SnmpRelay` when the agent is only reachable from a device (e.g. a
+cable modem seen from the WAN container).
+
+Many requests can be outstanding at once, they are matched to their responses
+by request-id. GET requests are batched up to ``max_oids`` objects per PDU and
+a walk fetches several subtrees with the same GETBULK request, so a walk of
+the docsis subtree takes a few dozens of round trips instead of one
+``snmpget`` per object.
+
+The varbinds returned are typed (:class:`VarBind`) and the object names are
+resolved through :class:`boardfarm.lib.SnmpHelper.SnmpMibs` when one is given.
+
+The pysnmp asyncio hlapi is not used, it does not work with recent Python
+versions (it relies on ``asyncio.coroutine``).
+
+Usage::
+
+    engine = SnmpEngine(cm_ip, community="private", mibs=SnmpMibs.default_mibs)
+    varbinds = engine.run(engine.walk(["docsDevBase", "docsIfBaseObjects"]))
+    sysdescr = engine.run(engine.get(["sysDescr.0"]))[0].text
+"""
+import asyncio
+import ipaddress
+import itertools
+import logging
+import os
+import random
+import re
+import socket
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from pyasn1.codec.ber import decoder, encoder
+from pyasn1.error import PyAsn1Error
+from pysnmp.proto import api, rfc1902
+
+from boardfarm.exceptions import CodeError, SNMPError
+
+from .installers import install_socat
+
+logger = logging.getLogger("bft")
+
+# maximum number of objects per GET/GETBULK PDU
+MAX_OIDS = int(os.environ.get("BFT_SNMP_MAX_OIDS", "32"))
+# maximum number of requests waiting for a response at the same time
+MAX_INFLIGHT = int(os.environ.get("BFT_SNMP_MAX_INFLIGHT", "16"))
+
+OID_REGEX = re.compile(r"^\.?\d+(\.\d+)+$")
+
+# sysUpTime.0, answered by any agent
+SYS_UPTIME = "1.3.6.1.2.1.1.3.0"
+
+_V2C = api.protoModules[api.protoVersion2c]
+
+# net-snmp set types (as in snmpset), see SNMPv2.snmpset
+SET_TYPES = {
+    "i": rfc1902.Integer32,
+    "u": rfc1902.Unsigned32,
+    "c": rfc1902.Counter32,
+    "C": rfc1902.Counter64,
+    "t": rfc1902.TimeTicks,
+    "a": rfc1902.IpAddress,
+    "o": rfc1902.ObjectIdentifier,
+    "s": rfc1902.OctetString,
+    "x": rfc1902.OctetString,
+    "d": rfc1902.OctetString,
+    "b": rfc1902.Bits,
+}
+
+# varbind values telling that there is no such object
+NO_VALUE_TYPES = ("NoSuchObject", "NoSuchInstance", "EndOfMibView", "Null")
+
+
+@dataclass
+class VarBind:
+    """An object returned by the agent.
+
+    :param oid: numeric object identifier, without the leading dot
+    :param type: SMI type of the value, the pysnmp class name (``Integer``,
+        ``OctetString``, ``Counter32``, ``TimeTicks``, ``NoSuchObject``...)
+    :param value: the value as a Python object: int for the numeric types,
+        bytes for the strings, str for the IP addresses and object
+        identifiers, None when there is no such object
+    :param text: printable value, as shown by pysnmp
+    :param name: MIB object name, None if not resolved
+    :param index: the rest of the oid after the MIB object (e.g. ``0``)
+    """
+
+    oid: str
+    type: str
+    value: Any
+    text: str
+    name: Optional[str] = None
+    index: str = ""
+
+    @property
+    def ok(self) -> bool:
+        """Return whether the agent returned a value for this object."""
+        return self.type not in NO_VALUE_TYPES
+
+    @property
+    def label(self) -> str:
+        """Return ``name.index`` if the name is known, the oid otherwise."""
+        if self.name is None:
+            return self.oid
+        return f"{self.name}.{self.index}" if self.index else self.name
+
+
+def _oid_tuple(oid: str) -> Tuple[int, ...]:
+    return tuple(int(i) for i in oid.strip(".").split("."))
+
+
+def _in_subtree(oid: str, root: str) -> bool:
+    return oid == root or oid.startswith(root + ".")
+
+
+def _ip_address(address: str) -> str:
+    address = str(address).strip("[]")
+    try:
+        return str(ipaddress.ip_address(address))
+    except ValueError:
+        try:
+            return socket.getaddrinfo(address, None, type=socket.SOCK_DGRAM)[0][4][0]
+        except OSError as exc:
+            raise SNMPError(f"Cannot resolve {address}: {exc}") from exc
+
+
+def _python_value(value) -> Any:
+    type_name = type(value).__name__
+    if type_name in NO_VALUE_TYPES:
+        return None
+    if type_name in ("IpAddress", "ObjectIdentifier", "ObjectName"):
+        return value.prettyPrint()
+    if type_name in ("OctetString", "Opaque", "Bits"):
+        return bytes(value)
+    return int(value)
+
+
+def typed_value(value: Any, stype: str):
+    """Build an SMI value from a net-snmp set type and a value.
+
+    :param value: the value, e.g. ``1``, ``"text"``, ``"0x0A0B"``
+    :type value: Any
+    :param stype: net-snmp type: one of i, u, c, C, t, a, o, s, x, d, b
+    :type stype: str
+    :raises SNMPError: on unsupported type or invalid value
+    :return: the typed value
+    :rtype: pyasn1 object
+    """
+    if stype not in SET_TYPES:
+        raise SNMPError(f"Unsupported SNMP type {stype!r}")
+    value = str(value).strip()
+    try:
+        if stype == "x":
+            hex_value = re.sub(r"^0x|[\s:]", "", value, flags=re.I)
+            return rfc1902.OctetString(hexValue=hex_value)
+        if stype == "d":
+            return rfc1902.OctetString(bytes(int(i) for i in value.split()))
+        if stype == "b":
+            bits = [int(i) for i in value.replace(",", " ").split()]
+            octets = bytearray(max(bits, default=0) // 8 + 1)
+            for bit in bits:
+                octets[bit // 8] |= 0x80 >> (bit % 8)
+            return rfc1902.Bits(bytes(octets))
+        if stype in ("s", "a", "o"):
+            if stype == "s" and value.lower().startswith("0x"):
+                return rfc1902.OctetString(hexValue=value[2:])
+            return SET_TYPES[stype](value.strip('"'))
+        return SET_TYPES[stype](int(value, 0))
+    except (ValueError, PyAsn1Error) as exc:
+        raise SNMPError(f"Invalid {stype!r} value {value!r}: {exc}") from exc
+
+
+class _Protocol(asyncio.DatagramProtocol):
+    """Dispatch the responses to the requests waiting for them."""
+
+    def __init__(self, pending: Dict[int, asyncio.Future]):
+        self.pending = pending
+
+    def datagram_received(self, data, addr):
+        try:
+            msg, _ = decoder.decode(data, asn1Spec=_V2C.Message())
+            pdu = _V2C.apiMessage.getPDU(msg)
+            request_id = int(_V2C.apiPDU.getRequestID(pdu))
+        except PyAsn1Error as exc:
+            logger.debug(f"SNMP: dropped an invalid packet from {addr}: {exc}")
+            return
+        future = self.pending.get(request_id)
+        if future is None or future.done():
+            # a late answer to a retransmitted request
+            return
+        future.set_result(pdu)
+
+    def error_received(self, exc):
+        logger.debug(f"SNMP: {exc}")
+
+
+class SnmpEngine:
+    """Asynchronous SNMPv2c client.
+
+    All the request methods are coroutines, :meth:`run` runs one from
+    synchronous code.
+
+    :param address: IP address (or host name) of the agent, or of the relay
+    :type address: str
+    :param community: SNMP community, defaults to "private"
+    :type community: str
+    :param port: UDP port of the agent or the relay, defaults to 161
+    :type port: int
+    :param timeout: time to wait for each response in seconds, defaults to 2
+    :type timeout: float
+    :param retries: number of retransmissions on timeout, defaults to 3
+    :type retries: int
+    :param max_oids: maximum number of objects per PDU, defaults to
+        BFT_SNMP_MAX_OIDS (32)
+    :type max_oids: int
+    :param max_inflight: maximum number of outstanding requests, defaults to
+        BFT_SNMP_MAX_INFLIGHT (16)
+    :type max_inflight: int
+    :param mibs: MIB objects used to resolve the names, e.g.
+        SnmpMibs.default_mibs, defaults to None (numeric oids only)
+    :type mibs: SnmpMibs
+    """
+
+    def __init__(
+        self,
+        address: str,
+        community: str = "private",
+        port: int = 161,
+        timeout: float = 2,
+        retries: int = 3,
+        max_oids: int = MAX_OIDS,
+        max_inflight: int = MAX_INFLIGHT,
+        mibs=None,
+    ):
+        self.address = _ip_address(address)
+        self.port = port
+        self.community = community
+        self.timeout = timeout
+        self.retries = retries
+        self.max_oids = max_oids
+        self.max_inflight = max_inflight
+        self.mibs = mibs
+        self.requests_sent = 0
+        self._names = None
+        self._request_ids = itertools.count(random.randint(1, 1 << 30))
+        self._pending = {}
+        self._transport = None
+        self._loop = None
+        self._semaphore = None
+
+    def __repr__(self):
+        return f"SnmpEngine({self.address}:{self.port})"
+
+    async def open(self):
+        """Open the UDP endpoint on the running event loop.
+
+        It is opened on the first request if needed.
+        """
+        loop = asyncio.get_running_loop()
+        if self._transport is not None and self._loop is loop:
+            return
+        self.close()
+        family = ipaddress.ip_address(self.address).version
+        self._transport, _ = await loop.create_datagram_endpoint(
+            lambda: _Protocol(self._pending),
+            remote_addr=(self.address, self.port),
+            family=socket.AF_INET6 if family == 6 else socket.AF_INET,
+        )
+        self._loop = loop
+        self._semaphore = asyncio.Semaphore(self.max_inflight)
+
+    def close(self):
+        """Close the UDP endpoint."""
+        if self._transport is not None:
+            self._transport.close()
+        self._transport = None
+        self._loop = None
+        self._pending.clear()
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def run(self, coro):
+        """Run a request coroutine from synchronous code.
+
+        :param coro: e.g. ``engine.get(["sysDescr.0"])``
+        :type coro: coroutine
+        :return: the result of the coroutine
+        """
+
+        async def _main():
+            try:
+                return await coro
+            finally:
+                self.close()
+
+        return asyncio.run(_main())
+
+    def reachable(self, timeout: float = 1) -> bool:
+        """Return True if the agent (or the relay) answers a GET of sysUpTime.0.
+
+        Sent once, without retransmission. Any response counts, an error
+        status included. An SNMPv2c agent does not answer a request with a
+        wrong community, which then looks unreachable too.
+
+        :param timeout: time to wait for the response in seconds, defaults to 1
+        :type timeout: float
+        :return: True if a response was received in time
+        :rtype: bool
+        """
+        probe = SnmpEngine(
+            self.address, self.community, self.port, timeout=timeout, retries=0
+        )
+        pdu = _V2C.GetRequestPDU()
+        _V2C.apiPDU.setDefaults(pdu)
+        _V2C.apiPDU.setVarBinds(pdu, [(SYS_UPTIME, _V2C.null)])
+        try:
+            probe.run(probe._request(pdu))
+        except _Timeout:
+            return False
+        except _ErrorStatus:
+            pass
+        return True
+
+    # name resolution
+
+    def _name_index(self) -> Dict[str, str]:
+        if self._names is None:
+            self._names = {}
+            mib_dict = getattr(self.mibs, "mib_dict", None) or {}
+            for name, mib in mib_dict.items():
+                self._names.setdefault(mib["oid"], name)
+        return self._names
+
+    def resolve(self, oid: str) -> Tuple[Optional[str], str]:
+        """Return the MIB object name and the index of an oid.
+
+        :param oid: numeric oid, e.g. "1.3.6.1.2.1.1.1.0"
+        :type oid: str
+        :return: name and index, e.g. ("sysDescr", "0"), (None, "") if unknown
+        :rtype: tuple
+        """
+        names = self._name_index()
+        parts = oid.split(".")
+        for i in range(len(parts), 0, -1):
+            name = names.get(".".join(parts[:i]))
+            if name is not None:
+                return name, ".".join(parts[i:])
+        return None, ""
+
+    def to_oid(self, name: str) -> str:
+        """Return the numeric oid of ``name`` or ``name.index``.
+
+        :param name: oid or MIB object name with an optional index
+        :type name: str
+        :raises SNMPError: when the MIB object is not known
+        :return: the numeric oid
+        :rtype: str
+        """
+        name = str(name).strip()
+        if OID_REGEX.match(name):
+            return name.lstrip(".")
+        mib_name, _, index = name.partition(".")
+        try:
+            oid = self.mibs.get_mib_oid(mib_name)
+        except Exception as exc:
+            raise SNMPError(f"MIB not available, Error: {exc}") from exc
+        return f"{oid}.{index}" if index else oid
+
+    def _varbind(self, oid, value) -> VarBind:
+        oid = str(oid)
+        name, index = self.resolve(oid)
+        return VarBind(
+            oid=oid,
+            type=type(value).__name__,
+            value=_python_value(value),
+            text=value.prettyPrint(),
+            name=name,
+            index=index,
+        )
+
+    # transport
+
+    async def _request(self, pdu) -> Any:
+        """Send a request PDU, retransmit it on timeout and return the response."""
+        await self.open()
+        request_id = next(self._request_ids) & 0x7FFFFFFF
+        _V2C.apiPDU.setRequestID(pdu, request_id)
+        msg = _V2C.Message()
+        _V2C.apiMessage.setDefaults(msg)
+        _V2C.apiMessage.setCommunity(msg, self.community)
+        _V2C.apiMessage.setPDU(msg, pdu)
+        data = encoder.encode(msg)
+
+        future = self._loop.create_future()
+        self._pending[request_id] = future
+        try:
+            async with self._semaphore:
+                for _ in range(self.retries + 1):
+                    self.requests_sent += 1
+                    self._transport.sendto(data)
+                    try:
+                        response = await asyncio.wait_for(
+                            asyncio.shield(future), self.timeout
+                        )
+                    except asyncio.TimeoutError:
+                        continue
+                    break
+                else:
+                    raise _Timeout(f"Timeout: No Response from {self.address}")
+        finally:
+            self._pending.pop(request_id, None)
+
+        status = int(_V2C.apiPDU.getErrorStatus(response))
+        if status:
+            err_index = int(_V2C.apiPDU.getErrorIndex(response))
+            raise _ErrorStatus(
+                _V2C.apiPDU.getErrorStatus(response).prettyPrint(), err_index
+            )
+        return _V2C.apiPDU.getVarBinds(response)
+
+    # requests
+
+    async def _get_chunk(self, oids: Sequence[str]) -> List[VarBind]:
+        pdu = _V2C.GetRequestPDU()
+        _V2C.apiPDU.setDefaults(pdu)
+        _V2C.apiPDU.setVarBinds(pdu, [(oid, _V2C.null) for oid in oids])
+        try:
+            varbinds = await self._request(pdu)
+        except _ErrorStatus as exc:
+            if exc.status == "tooBig" and len(oids) > 1:
+                half = len(oids) // 2
+                first, second = await asyncio.gather(
+                    self._get_chunk(oids[:half]), self._get_chunk(oids[half:])
+                )
+                return first + second
+            raise exc.error(oids) from None
+        return [self._varbind(oid, value) for oid, value in varbinds]
+
+    async def get(self, names: Iterable[str]) -> List[VarBind]:
+        """Get objects, ``max_oids`` per PDU, the PDUs are sent concurrently.
+
+        The objects the agent does not have are returned with a
+        ``NoSuchObject`` or ``NoSuchInstance`` type.
+
+        :param names: oids or MIB object names with their index
+            (e.g. "sysDescr.0")
+        :type names: Iterable[str]
+        :raises SNMPError: on timeout or error status
+        :return: the varbinds, in the order of the names
+        :rtype: List[VarBind]
+        """
+        oids = [self.to_oid(name) for name in names]
+        chunks = [
+            oids[i : i + self.max_oids] for i in range(0, len(oids), self.max_oids)
+        ]
+        results = await asyncio.gather(*(self._get_chunk(c) for c in chunks))
+        return [vb for result in results for vb in result]
+
+    async def get_bulk(
+        self,
+        names: Iterable[str],
+        non_repeaters: int = 0,
+        max_repetitions: int = 10,
+    ) -> List[VarBind]:
+        """Send a single GETBULK request.
+
+        :param names: oids or MIB object names
+        :type names: Iterable[str]
+        :param non_repeaters: number of names fetched once, defaults to 0
+        :type non_repeaters: int
+        :param max_repetitions: number of successors of the other names,
+            defaults to 10
+        :type max_repetitions: int
+        :raises SNMPError: on timeout or error status
+        :return: the varbinds, as returned by the agent
+        :rtype: List[VarBind]
+        """
+        oids = [self.to_oid(name) for name in names]
+        try:
+            varbinds = await self._request(
+                self._bulk_pdu(oids, non_repeaters, max_repetitions)
+            )
+        except _ErrorStatus as exc:
+            raise exc.error(oids) from None
+        return [self._varbind(oid, value) for oid, value in varbinds]
+
+    @staticmethod
+    def _bulk_pdu(oids, non_repeaters, max_repetitions):
+        pdu = _V2C.GetBulkRequestPDU()
+        _V2C.apiBulkPDU.setDefaults(pdu)
+        _V2C.apiBulkPDU.setNonRepeaters(pdu, non_repeaters)
+        _V2C.apiBulkPDU.setMaxRepetitions(pdu, max_repetitions)
+        _V2C.apiBulkPDU.setVarBinds(pdu, [(oid, _V2C.null) for oid in oids])
+        return pdu
+
+    async def _walk_chunk(
+        self, roots: Sequence[str], max_repetitions: int
+    ) -> Dict[str, List[VarBind]]:
+        """Walk subtrees with GETBULK requests for all of them at once."""
+        result = {root: [] for root in roots}
+        # the subtrees not finished yet, with the last oid seen in each
+        active = {root: root for root in roots}
+        while active:
+            columns = list(active.items())
+            try:
+                varbinds = await self._request(
+                    self._bulk_pdu([c[1] for c in columns], 0, max_repetitions)
+                )
+            except _ErrorStatus as exc:
+                if exc.status == "tooBig" and max_repetitions > 1:
+                    max_repetitions //= 2
+                    continue
+                raise exc.error([c[1] for c in columns]) from None
+            if not varbinds:
+                raise SNMPError(f"Empty GETBULK response from {self.address}")
+            done = set()
+            # the response holds max_repetitions rows of one varbind per column
+            for i, (oid, value) in enumerate(varbinds):
+                root, last = columns[i % len(columns)]
+                if root in done:
+                    continue
+                oid = str(oid)
+                if (
+                    type(value).__name__ == "EndOfMibView"
+                    or not _in_subtree(oid, root)
+                    or _oid_tuple(oid) <= _oid_tuple(last)
+                ):
+                    done.add(root)
+                    continue
+                result[root].append(self._varbind(oid, value))
+                columns[i % len(columns)] = (root, oid)
+            for root, last in columns:
+                if root in done:
+                    active.pop(root)
+                elif last != active[root]:
+                    active[root] = last
+                elif len(varbinds) >= len(columns):
+                    # the agent returned nothing for this subtree
+                    active.pop(root)
+        return result
+
+    async def walk(
+        self,
+        names: Union[str, Iterable[str]],
+        max_repetitions: int = 25,
+    ) -> List[VarBind]:
+        """Walk one or more subtrees with GETBULK requests.
+
+        Up to ``max_oids`` subtrees are fetched by the same requests, the
+        other ones by concurrent requests.
+
+        :param names: oid or MIB object name of the subtree(s) to walk
+        :type names: Union[str, Iterable[str]]
+        :param max_repetitions: number of objects fetched per subtree and per
+            request, defaults to 25
+        :type max_repetitions: int
+        :raises SNMPError: on timeout or error status
+        :return: the varbinds of each subtree, in the order of the names
+        :rtype: List[VarBind]
+        """
+        if isinstance(names, str):
+            names = [names]
+        roots = list(dict.fromkeys(self.to_oid(name) for name in names))
+        chunks = [
+            roots[i : i + self.max_oids] for i in range(0, len(roots), self.max_oids)
+        ]
+        start = time.time()
+        results = await asyncio.gather(
+            *(self._walk_chunk(c, max_repetitions) for c in chunks)
+        )
+        walked = {}
+        for result in results:
+            walked.update(result)
+        varbinds = [vb for root in roots for vb in walked[root]]
+        logger.debug(
+            f"SNMP walk of {len(roots)} subtree(s) on {self.address}:"
+            f" {len(varbinds)} objects in {time.time() - start:.2f}s"
+        )
+        return varbinds
+
+    async def set(self, values: Sequence[Tuple[str, Any, str]]) -> List[VarBind]:
+        """Set objects with a single SET request.
+
+        :param values: (name, value, stype) of each object, stype being a
+            net-snmp type (see :func:`typed_value`), e.g.
+            ``[("docsDevResetNow.0", 1, "i")]``
+        :type values: Sequence[Tuple[str, Any, str]]
+        :raises SNMPError: on timeout, invalid value or error status
+        :return: the varbinds returned by the agent
+        :rtype: List[VarBind]
+        """
+        oids = [self.to_oid(name) for name, _, _ in values]
+        pdu = _V2C.SetRequestPDU()
+        _V2C.apiPDU.setDefaults(pdu)
+        _V2C.apiPDU.setVarBinds(
+            pdu,
+            [
+                (oid, typed_value(value, stype))
+                for oid, (_, value, stype) in zip(oids, values)
+            ],
+        )
+        try:
+            varbinds = await self._request(pdu)
+        except _ErrorStatus as exc:
+            raise exc.error(oids) from None
+        return [self._varbind(oid, value) for oid, value in varbinds]
+
+
+class _Timeout(SNMPError):
+    """No response to a request, after all the retransmissions."""
+
+
+class _ErrorStatus(Exception):
+    """Error status of a response, handled by the engine before raising SNMPError."""
+
+    def __init__(self, status: str, index: int):
+        super().__init__(status)
+        self.status = status
+        self.index = index
+
+    def error(self, oids: Sequence[str]) -> SNMPError:
+        oid = oids[self.index - 1] if 0 < self.index <= len(oids) else ""
+        return SNMPError(f"Error in packet: {self.status} {oid}".strip())
+
+
+class SnmpRelay:
+    """UDP relay to an SNMP agent, running on a device with socat.
+
+    Used when the agent is not reachable from the boardfarm host, e.g. the
+    management IP of a cable modem behind the WAN device. The relay listens
+    on ``port`` of the device management address and forwards the requests
+    to the agent, :meth:`engine` returns an engine sending its requests
+    through it::
+
+        with SnmpRelay(wan, cm_ip) as relay:
+            varbinds = relay.engine(community="private").run(...)
+
+    :param device: device running the relay, with a shell console and
+        ``ipaddr`` reachable from the boardfarm host
+    :type device: LinuxDevice
+    :param target: IP address of the agent
+    :type target: str
+    :param port: UDP port of the relay on the device, defaults to
+        BFT_SNMP_RELAY_PORT or a random one
+    :type port: int
+    :param target_port: UDP port of the agent, defaults to 161
+    :type target_port: int
+    :param idle_timeout: the relay of a request stops after this many seconds
+        without traffic, defaults to 60
+    :type idle_timeout: int
+    :param lifetime: the relay exits after this many seconds even if it is
+        not stopped, defaults to BFT_SNMP_RELAY_LIFETIME (3600)
+    :type lifetime: int
+    """
+
+    def __init__(
+        self,
+        device,
+        target,
+        port=None,
+        target_port=161,
+        idle_timeout=60,
+        lifetime=None,
+    ):
+        self.device = device
+        self.target = _ip_address(target)
+        self.port = port or int(
+            os.environ.get("BFT_SNMP_RELAY_PORT", random.randint(40000, 59999))
+        )
+        self.target_port = target_port
+        self.idle_timeout = idle_timeout
+        self.lifetime = lifetime or int(
+            os.environ.get("BFT_SNMP_RELAY_LIFETIME", "3600")
+        )
+        self.pid = None
+
+    @property
+    def address(self) -> str:
+        """Return the address of the relay, the management IP of the device."""
+        address = getattr(self.device, "ipaddr", None)
+        if not address:
+            raise CodeError(f"{self.device} has no management ipaddr for the relay")
+        return address
+
+    def running(self) -> bool:
+        """Return True if the relay is running on the device."""
+        if not self.pid:
+            return False
+        self.device.sendline(f"kill -0 {self.pid} 2>/dev/null; echo RELAY''_UP:$?")
+        self.device.expect(r"RELAY_UP:(\d+)")
+        status = self.device.match.group(1)
+        self.device.expect_prompt()
+        return status == "0"
+
+    def start(self):
+        """Start the relay in the background on the device, if not running."""
+        if self.running():
+            return
+        install_socat(self.device)
+        if ipaddress.ip_address(self.target).version == 6:
+            dest = f"UDP6:[{self.target}]:{self.target_port}"
+        else:
+            dest = f"UDP4:{self.target}:{self.target_port}"
+        # -T only applies to the forked relays, the listener itself is
+        # bounded by lifetime in case stop() is never called
+        self.device.sendline(
+            f"timeout {self.lifetime} socat -T {self.idle_timeout}"
+            f" UDP-LISTEN:{self.port},fork,reuseaddr {dest} > /dev/null 2>&1 &"
+        )
+        self.device.expect_prompt()
+        self.device.sendline("echo RELAY_PID:$!")
+        self.device.expect(r"RELAY_PID:(\d+)")
+        self.pid = self.device.match.group(1)
+        self.device.expect_prompt()
+        logger.debug(
+            f"SNMP relay {self.address}:{self.port} -> {self.target} started"
+            f" on {self.device}"
+        )
+
+    def stop(self):
+        """Stop the relay."""
+        if not self.pid:
+            return
+        self.device.sendline(f"kill {self.pid}")
+        self.device.expect_prompt()
+        self.pid = None
+
+    def engine(self, **kwargs) -> SnmpEngine:
+        """Return an engine sending its requests through the relay.
+
+        The relay is stopped if it does not answer, e.g. when the UDP port
+        is not reachable from the boardfarm host (a container with only its
+        ssh port published).
+
+        :param kwargs: SnmpEngine arguments, except address and port
+        :raises SNMPError: if the relay does not answer
+        :return: the engine
+        :rtype: SnmpEngine
+        """
+        self.start()
+        engine = SnmpEngine(self.address, port=self.port, **kwargs)
+        if not engine.reachable():
+            self.stop()
+            raise SNMPError(
+                f"SNMP relay {self.address}:{self.port} on {self.device} to"
+                f" {self.target} does not answer, is its UDP port reachable?"
+            )
+        return engine
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,173 @@
+"""Disk cache of the WSDL and XSD documents loaded by zeep clients.
+
+zeep downloads the WSDL of a SOAP server, and the schemas it imports, each
+time a client is created. :class:`CachingTransport` keeps these documents on
+disk across runs: within the TTL they are used as they are, after it they are
+revalidated with a conditional request (ETag / Last-Modified) so unchanged
+documents are not downloaded again.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import closing
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from zeep.transports import Transport
+
+logger = logging.getLogger("bft")
+
+# cache directory, an empty BFT_SOAP_CACHE disables it
+SOAP_CACHE = os.environ.get(
+    "BFT_SOAP_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "boardfarm", "soap"),
+)
+# seconds a document is used without being revalidated
+SOAP_CACHE_TTL = float(os.environ.get("BFT_SOAP_CACHE_TTL", 3600 * 3))
+
+
+class DiskCache:
+    """Documents and their validators, one file per URL."""
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        """Instance initialization.
+
+        :param path: directory of the cache, defaults to SOAP_CACHE
+        :type path: str, optional
+        """
+        self.path = SOAP_CACHE if path is None else path
+        self._lock = threading.Lock()
+        self._memory: Dict[str, Tuple[Dict[str, Any], bytes]] = {}
+
+    def _files(self, url: str) -> Tuple[str, str]:
+        name = hashlib.sha256(url.encode()).hexdigest()
+        base = os.path.join(self.path, name)
+        return f"{base}.json", f"{base}.xml"
+
+    def get(self, url: str) -> Optional[Tuple[Dict[str, Any], bytes]]:
+        """Return the metadata and content stored for a URL.
+
+        :param url: document URL
+        :type url: str
+        :return: metadata (time, etag, last_modified) and content, None if missing
+        :rtype: tuple, optional
+        """
+        with self._lock:
+            if url in self._memory:
+                return self._memory[url]
+        meta_file, content_file = self._files(url)
+        try:
+            with open(meta_file) as f:
+                meta = json.load(f)
+            with open(content_file, "rb") as f:
+                content = f.read()
+        except (OSError, ValueError):
+            return None
+        if meta.get("url") != url or meta.get("size") != len(content):
+            return None
+        with self._lock:
+            self._memory[url] = meta, content
+        return meta, content
+
+    def add(self, url: str, content: bytes, **validators: Optional[str]) -> None:
+        """Store the content of a URL, replacing the files atomically.
+
+        :param url: document URL
+        :type url: str
+        :param content: document
+        :type content: bytes
+        :param validators: etag and last_modified headers of the response
+        """
+        meta = {"url": url, "time": time.time(), "size": len(content), **validators}
+        with self._lock:
+            self._memory[url] = meta, content
+        meta_file, content_file = self._files(url)
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            # content first, the size in the metadata detects a mismatch
+            for fname, data in [
+                (content_file, content),
+                (meta_file, json.dumps(meta).encode()),
+            ]:
+                fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, fname)
+        except OSError as e:
+            logger.debug(f"Could not write SOAP cache {self.path}: {e!r}")
+
+    def touch(self, url: str) -> None:
+        """Mark the document of a URL as revalidated now.
+
+        :param url: document URL
+        :type url: str
+        """
+        entry = self.get(url)
+        if entry:
+            meta, content = entry
+            validators = {k: meta.get(k) for k in ["etag", "last_modified"]}
+            self.add(url, content, **validators)
+
+
+class CachingTransport(Transport):
+    """zeep transport loading documents through a :class:`DiskCache`."""
+
+    def __init__(
+        self,
+        disk_cache: Optional[DiskCache] = None,
+        ttl: float = SOAP_CACHE_TTL,
+        **kwargs: Any,
+    ) -> None:
+        """Instance initialization.
+
+        :param disk_cache: cache of the documents, defaults to one in SOAP_CACHE
+        :type disk_cache: DiskCache, optional
+        :param ttl: seconds a document is used without being revalidated
+        :type ttl: float
+        :param kwargs: arguments of zeep.transports.Transport
+        """
+        super().__init__(**kwargs)
+        self.disk_cache = disk_cache or DiskCache()
+        self.ttl = ttl
+
+    def load(self, url: str) -> bytes:
+        """Load the content of a URL, from the cache if it is still valid.
+
+        :param url: document URL
+        :type url: str
+        :return: document
+        :rtype: bytes
+        """
+        if not self.disk_cache.path or urlparse(url).scheme not in ("http", "https"):
+            return super().load(url)
+
+        entry = self.disk_cache.get(url)
+        headers = {}
+        if entry:
+            meta, content = entry
+            if time.time() - meta["time"] < self.ttl:
+                return content
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        self.logger.debug("Loading remote data from: %s", url)
+        response = self.session.get(url, timeout=self.load_timeout, headers=headers)
+        with closing(response):
+            if entry and response.status_code == 304:
+                self.disk_cache.touch(url)
+                return entry[1]
+            response.raise_for_status()
+            self.disk_cache.add(
+                url,
+                response.content,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+            )
+            return response.content
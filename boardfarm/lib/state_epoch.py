@@ -0,0 +1,68 @@
+"""Epoch of the state of the devices under test.
+
+The epoch is bumped whenever the devices may have left the state the
+contingency checks verified: a reboot or power-cycle, a reprovisioning, a
+failed test or service check. Results computed in an epoch stay valid until
+the next bump. The ``reset`` methods of the devices and board templates bump
+it through :class:`BumpOnReset`, device classes changing the state in other
+ways should call :func:`bump`.
+"""
+
+import functools
+import inspect
+import logging
+import threading
+
+logger = logging.getLogger("bft")
+
+_lock = threading.Lock()
+_epoch = 0
+
+
+def current() -> int:
+    """Return the current epoch.
+
+    :return: number of bumps since the start of the run
+    :rtype: int
+    """
+    return _epoch
+
+
+def bump(reason: str) -> int:
+    """Start a new epoch, invalidating the results of the previous ones.
+
+    :param reason: what changed the state, logged
+    :type reason: str
+    :return: the new epoch
+    :rtype: int
+    """
+    global _epoch
+    with _lock:
+        _epoch += 1
+        epoch = _epoch
+    logger.debug(f"Device state epoch {epoch}: {reason}")
+    return epoch
+
+
+class BumpOnReset:
+    """Mixin bumping the epoch on every call of ``reset``.
+
+    The ``reset`` of each subclass is wrapped when the class is defined, so
+    the implementations not calling ``super().reset()`` (e.g. a board of a
+    plugin) bump it too.
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        reset = vars(cls).get("reset")
+        if inspect.isfunction(reset):
+            cls.reset = BumpOnReset.__wrap(reset)
+
+    @staticmethod
+    def __wrap(func):
+        @functools.wraps(func)
+        def reset(self, *args, **kwargs):
+            bump(f"{getattr(self, 'name', None) or type(self).__name__} reset")
+            return func(self, *args, **kwargs)
+
+        return reset
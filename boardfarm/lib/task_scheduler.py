@@ -0,0 +1,288 @@
+"""Run callables concurrently on a bounded number of threads.
+
+Tasks may depend on other tasks, in which case they are only started once
+all their dependencies have completed successfully. Most of the work done
+this way in boardfarm (connecting to devices, configuring clients) blocks
+on a remote console, so threads are good enough to overlap it.
+"""
+
+import contextvars
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from tabulate import tabulate
+
+from boardfarm.exceptions import CodeError
+
+logger = logging.getLogger("bft")
+
+_FAILED = ("failed", "timeout", "skipped")
+
+
+@dataclass
+class TaskResult:
+    """Outcome and timing of a task run by :func:`run_tasks`."""
+
+    name: str
+    depends_on: List[str] = field(default_factory=list)
+    status: str = "pending"
+    start: Optional[float] = None
+    end: Optional[float] = None
+    value: Any = None
+    error: Optional[BaseException] = None
+
+    @property
+    def duration(self) -> float:
+        """Return the seconds the task ran for (0 if it never started)."""
+        if self.start is None:
+            return 0.0
+        return (self.end or time.time()) - self.start
+
+    @property
+    def ok(self) -> bool:
+        """Return True if the task completed without raising."""
+        return self.status == "done"
+
+
+def check_dependencies(depends_on: Dict[str, Iterable[str]]) -> None:
+    """Validate a task dependency mapping.
+
+    :param depends_on: task name to the names of the tasks it depends on
+    :type depends_on: dict
+    :raises CodeError: on a dependency to an unknown task or a cycle
+    """
+    for name, deps in depends_on.items():
+        for dep in deps:
+            if dep not in depends_on:
+                raise CodeError(f"Task {name!r} depends on unknown task {dep!r}")
+
+    visited = set()
+
+    def _visit(name, path):
+        if name in path:
+            cycle = " -> ".join(path[path.index(name) :] + [name])
+            raise CodeError(f"Dependency cycle detected: {cycle}")
+        if name in visited:
+            return
+        for dep in depends_on[name]:
+            _visit(dep, path + [name])
+        visited.add(name)
+
+    for name in depends_on:
+        _visit(name, [])
+
+
+def run_tasks(
+    tasks: Dict[str, Callable[[], Any]],
+    depends_on: Optional[Dict[str, Iterable[str]]] = None,
+    max_workers: int = 8,
+    timeout: Optional[float] = None,
+    timeouts: Optional[Dict[str, float]] = None,
+    on_done: Optional[Callable[[TaskResult], None]] = None,
+) -> Dict[str, TaskResult]:
+    """Run tasks concurrently, honouring their dependencies.
+
+    Tasks are started in insertion order as soon as a worker is free and all
+    their dependencies are done. A task whose dependency failed is skipped.
+    A task running past its timeout is marked as timed out and its thread is
+    abandoned (python threads cannot be killed), its dependents are skipped.
+    Exceptions raised by a task are stored in its result, never propagated.
+    Each task runs in a copy of the context variables of the caller.
+
+    on_done is called from the calling thread with the result of each task
+    which completed, failed or timed out, before any of its dependents is
+    started. An exception it raises fails the task.
+
+    :param tasks: task name to a callable taking no arguments
+    :type tasks: dict
+    :param depends_on: task name to the names of the tasks it depends on
+    :type depends_on: dict, optional
+    :param max_workers: maximum number of tasks running at the same time
+    :type max_workers: int
+    :param timeout: default timeout in seconds of each task, None for no timeout
+    :type timeout: float, optional
+    :param timeouts: per task timeout overriding the default one
+    :type timeouts: dict, optional
+    :param on_done: called with the result of each task as it ends
+    :type on_done: callable, optional
+    :raises CodeError: on invalid dependencies
+    :return: task name to its result, in the same order as tasks
+    :rtype: dict
+    """
+    depends_on = depends_on or {}
+    timeouts = timeouts or {}
+    graph = {name: list(depends_on.get(name, [])) for name in tasks}
+    check_dependencies(graph)
+    max_workers = max(1, max_workers)
+
+    results = {name: TaskResult(name, graph[name]) for name in tasks}
+    pending = list(tasks)
+    running: Dict[str, float] = {}  # name -> deadline (inf if none)
+    completed: "queue.Queue" = queue.Queue()
+
+    def _worker(name, func):
+        try:
+            completed.put((name, func(), None))
+        except BaseException as e:  # pylint: disable=broad-except
+            completed.put((name, None, e))
+
+    def _done(result):
+        if on_done is None:
+            return
+        try:
+            on_done(result)
+        except Exception as e:  # pylint: disable=broad-except
+            result.status = "failed"
+            result.error = e
+
+    def _skip_unreachable():
+        changed = True
+        while changed:
+            changed = False
+            for name in list(pending):
+                failed = [d for d in graph[name] if results[d].status in _FAILED]
+                if failed:
+                    pending.remove(name)
+                    results[name].status = "skipped"
+                    results[name].error = CodeError(
+                        f"Dependencies of {name!r} failed: {', '.join(failed)}"
+                    )
+                    changed = True
+
+    while pending or running:
+        _skip_unreachable()
+        for name in list(pending):
+            if len(running) >= max_workers:
+                break
+            if all(results[d].ok for d in graph[name]):
+                pending.remove(name)
+                result = results[name]
+                result.status = "running"
+                result.start = time.time()
+                tout = timeouts.get(name, timeout)
+                running[name] = float("inf") if tout is None else result.start + tout
+                # the task runs in a copy of the caller's context variables
+                threading.Thread(
+                    target=contextvars.copy_context().run,
+                    args=(_worker, name, tasks[name]),
+                    name=f"bft-task-{name}",
+                    daemon=True,
+                ).start()
+
+        if not running:
+            break
+
+        wait_for = min(running.values()) - time.time()
+        try:
+            name, value, error = completed.get(
+                timeout=None if wait_for == float("inf") else max(0, wait_for)
+            )
+        except queue.Empty:
+            name = None
+
+        now = time.time()
+        if name is not None and name in running:
+            running.pop(name)
+            result = results[name]
+            result.end = now
+            result.value = value
+            result.error = error
+            result.status = "failed" if error is not None else "done"
+            _done(result)
+        elif name is not None:
+            logger.debug(f"Task {name!r} completed after it timed out, ignoring")
+
+        for name, deadline in list(running.items()):
+            if now >= deadline:
+                running.pop(name)
+                result = results[name]
+                result.end = now
+                result.status = "timeout"
+                result.error = TimeoutError(
+                    f"Task {name!r} did not complete in {result.duration:.1f}s"
+                )
+                logger.error(result.error)
+                _done(result)
+
+    return results
+
+
+def timing_report(results: Dict[str, TaskResult], title: str = "Task") -> str:
+    """Return a table with status, start offset and duration of each task.
+
+    :param results: as returned by :func:`run_tasks`
+    :type results: dict
+    :param title: header of the task name column
+    :type title: str
+    :return: table as text
+    :rtype: str
+    """
+    started = [r.start for r in results.values() if r.start is not None]
+    origin = min(started) if started else 0.0
+    rows = [
+        [
+            r.name,
+            r.status,
+            "-" if r.start is None else f"{r.start - origin:.1f}",
+            f"{r.duration:.1f}",
+            ", ".join(r.depends_on),
+        ]
+        for r in sorted(
+            results.values(), key=lambda r: (r.start is None, r.start or 0.0)
+        )
+    ]
+    return tabulate(
+        rows, headers=[title, "Status", "Start (s)", "Duration (s)", "Depends on"]
+    )
+
+
+def critical_path(results: Dict[str, TaskResult]) -> List[str]:
+    """Return the chain of tasks which determined the total run time.
+
+    Starting from the task that ended last, follow back the dependency that
+    completed last, i.e. the one the task had to wait for.
+
+    :param results: as returned by :func:`run_tasks`
+    :type results: dict
+    :return: task names, first to last
+    :rtype: list
+    """
+    finished = [r for r in results.values() if r.end is not None]
+    if not finished:
+        return []
+    task = max(finished, key=lambda r: r.end)
+    path = [task.name]
+    while True:
+        deps = [results[d] for d in task.depends_on if results[d].end is not None]
+        if not deps:
+            break
+        task = max(deps, key=lambda r: r.end)
+        path.append(task.name)
+    return path[::-1]
+
+
+def critical_path_report(results: Dict[str, TaskResult], title: str = "Task") -> str:
+    """Return the timing report followed by the critical path.
+
+    :param results: as returned by :func:`run_tasks`
+    :type results: dict
+    :param title: header of the task name column
+    :type title: str
+    :return: report as text
+    :rtype: str
+    """
+    path = critical_path(results)
+    started = [r.start for r in results.values() if r.start is not None]
+    ended = [r.end for r in results.values() if r.end is not None]
+    total = max(ended) - min(started) if started and ended else 0.0
+    chain = " -> ".join(f"{name} ({results[name].duration:.1f}s)" for name in path)
+    return (
+        f"{timing_report(results, title)}\n"
+        f"Critical path: {chain or '-'}\n"
+        f"Total: {total:.1f}s, "
+        f"{sum(r.duration for r in results.values()):.1f}s of work"
+    )
@@ -0,0 +1,477 @@
+"""Run a matrix of concurrent iperf3 flows and collect their results.
+
+Each flow of the matrix is an iperf3 client on a sender device and a one-off
+iperf3 server on its own port on a receiver device, any LAN, WAN or WLAN
+device with a shell console. All the clients of the matrix are started at
+once in the background with ``--json-stream``, which makes iperf3 (3.13 and
+later) write one JSON event per line: the test start, every interval, the
+end summary or an error. The event files are read from all the senders
+concurrently while the flows run, so the interval records are available
+(and passed to ``on_interval``) as they come, instead of being scraped from
+the text output of each flow once it is over.
+
+Older iperf3 versions (Debian bullseye and bookworm ship 3.9 and 3.12) have
+no ``--json-stream``, their clients are run with ``-J --forceflush`` and
+the whole JSON document is parsed once the flow is over, see
+:func:`parse_iperf3_json`: the interval records of these flows are only
+available at the end.
+"""
+
+import functools
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from boardfarm.exceptions import CodeError
+from boardfarm.lib.task_scheduler import run_tasks
+
+logger = logging.getLogger("bft")
+
+IPERF3_BASE_PORT = 5201
+
+
+@dataclass
+class Flow:
+    """One iperf3 flow of a traffic matrix."""
+
+    sender: Any
+    receiver: Any
+    # defaults to the address of the receiver's iface_dut
+    dest_ip: Optional[str] = None
+    protocol: str = "tcp"
+    # target bitrate (-b), e.g. "10M"
+    bitrate: Optional[str] = None
+    # parallel streams (-P)
+    parallel: int = 1
+    # reverse mode (-R), the receiver sends
+    reverse: bool = False
+    # any other iperf3 client options
+    options: str = ""
+    # defaults to a port of its own, see run_traffic_matrix
+    port: Optional[int] = None
+    name: Optional[str] = None
+
+
+@dataclass
+class IntervalRecord:
+    """Sum of the streams of a flow over one reporting interval."""
+
+    start: float
+    end: float
+    bytes: int
+    bits_per_second: float
+    retransmits: Optional[int] = None
+    # only measured by the receiving side, i.e. in reverse UDP flows
+    jitter_ms: Optional[float] = None
+    lost_percent: Optional[float] = None
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "IntervalRecord":
+        """Create a record from the "sum" of an iperf3 interval.
+
+        :param data: interval as in the iperf3 JSON output
+        :type data: dict
+        :rtype: IntervalRecord
+        """
+        total = data["sum"]
+        return cls(
+            start=total["start"],
+            end=total["end"],
+            bytes=total["bytes"],
+            bits_per_second=total["bits_per_second"],
+            retransmits=total.get("retransmits"),
+            jitter_ms=total.get("jitter_ms"),
+            lost_percent=total.get("lost_percent"),
+        )
+
+
+@dataclass
+class FlowResult:
+    """Interval records and end summary of a flow."""
+
+    flow: Flow
+    intervals: List[IntervalRecord] = field(default_factory=list)
+    # throughput seen by the receiver, from the end summary
+    bits_per_second: Optional[float] = None
+    retransmits: Optional[int] = None
+    jitter_ms: Optional[float] = None
+    lost_percent: Optional[float] = None
+    error: Optional[str] = None
+    # True once the end summary or an error was seen
+    done: bool = False
+
+    @property
+    def ok(self) -> bool:
+        """Return True if the flow completed without error."""
+        return self.done and self.error is None
+
+    def add_event(self, event: str, data: Any) -> Optional[IntervalRecord]:
+        """Add an iperf3 JSON event to the result.
+
+        :param event: "start", "interval", "end" or "error"
+        :type event: str
+        :param data: data of the event
+        :type data: any
+        :return: the record of an interval event
+        :rtype: IntervalRecord, optional
+        """
+        if event == "interval":
+            record = IntervalRecord.from_json(data)
+            self.intervals.append(record)
+            return record
+        if event == "end":
+            received = data.get("sum_received") or data.get("sum", {})
+            udp = data.get("sum", {})
+            self.bits_per_second = received.get("bits_per_second")
+            self.retransmits = data.get("sum_sent", {}).get("retransmits")
+            self.jitter_ms = udp.get("jitter_ms")
+            self.lost_percent = udp.get("lost_percent")
+            self.done = True
+        elif event == "error":
+            self.error = str(data)
+            self.done = True
+        return None
+
+
+@dataclass
+class MatrixResult:
+    """Results of all the flows of a traffic matrix."""
+
+    flows: List[FlowResult]
+
+    @property
+    def ok(self) -> bool:
+        """Return True if all flows completed without error."""
+        return all(flow.ok for flow in self.flows)
+
+    @property
+    def bits_per_second(self) -> float:
+        """Return the aggregate throughput of the flows that completed."""
+        return sum(flow.bits_per_second or 0 for flow in self.flows if flow.ok)
+
+    def interval_percentiles(
+        self, metric: str, percentiles: Sequence[float] = (50, 90, 99)
+    ) -> Dict[float, Optional[float]]:
+        """Return percentiles of a metric over the intervals of all flows.
+
+        :param metric: IntervalRecord attribute, e.g. "bits_per_second"
+        :type metric: str
+        :param percentiles: percentiles to compute, from 0 to 100
+        :type percentiles: sequence
+        :return: percentile to value, None if no interval has the metric
+        :rtype: dict
+        """
+        values = [
+            getattr(record, metric)
+            for flow in self.flows
+            for record in flow.intervals
+            if getattr(record, metric) is not None
+        ]
+        return {p: percentile(values, p) for p in percentiles}
+
+    def flow_percentiles(
+        self, metric: str, percentiles: Sequence[float] = (50, 90, 99)
+    ) -> Dict[float, Optional[float]]:
+        """Return percentiles of a metric over the end summaries of the flows.
+
+        :param metric: FlowResult attribute, e.g. "jitter_ms" or "lost_percent"
+        :type metric: str
+        :param percentiles: percentiles to compute, from 0 to 100
+        :type percentiles: sequence
+        :return: percentile to value, None if no flow has the metric
+        :rtype: dict
+        """
+        values = [
+            getattr(flow, metric)
+            for flow in self.flows
+            if getattr(flow, metric) is not None
+        ]
+        return {p: percentile(values, p) for p in percentiles}
+
+
+def percentile(values: Sequence[float], p: float) -> Optional[float]:
+    """Return a percentile of values, interpolated between the closest ranks.
+
+    :param values: values, in any order
+    :type values: sequence
+    :param p: percentile, from 0 to 100
+    :type p: float
+    :return: the percentile, None if there are no values
+    :rtype: float, optional
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def parse_iperf3_json(text: str, result: FlowResult) -> int:
+    """Add the events of iperf3 JSON output to a flow result.
+
+    The output is either a whole ``-J`` document, or ``--json-stream``
+    lines of which only the complete ones are parsed.
+
+    :param text: iperf3 output
+    :type text: str
+    :param result: result the events are added to
+    :type result: FlowResult
+    :return: number of lines parsed, all of them for a whole document
+    :rtype: int
+    """
+    lines = text.splitlines()
+    try:
+        doc = json.loads(text)
+    except ValueError:
+        doc = None
+    if isinstance(doc, dict) and "event" not in doc:
+        for interval in doc.get("intervals", []):
+            result.add_event("interval", interval)
+        if doc.get("error"):
+            result.add_event("error", doc["error"])
+        elif doc.get("end"):
+            result.add_event("end", doc["end"])
+        return len(lines)
+
+    parsed = 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            pass
+        elif line.startswith("iperf3:"):
+            # not a JSON option error, e.g. --json-stream is not supported
+            result.add_event("error", line)
+        else:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                # incomplete line, read again once complete
+                break
+            result.add_event(event.get("event"), event.get("data"))
+        parsed += 1
+    return parsed
+
+
+def _flow_file(flow: Flow) -> str:
+    return f"/tmp/bft-iperf3-{flow.port}.json"
+
+
+def _client_cmd(
+    flow: Flow, duration: int, interval: float, json_stream: bool = True
+) -> str:
+    opts = [f"-c {flow.dest_ip}", f"-p {flow.port}", f"-t {duration}"]
+    # iperf3 older than 3.13 has no --json-stream, it writes a JSON document
+    # (only complete once the flow is over) instead
+    opts += [f"-i {interval}", "--json-stream" if json_stream else "-J --forceflush"]
+    if flow.protocol == "udp":
+        opts.append("-u")
+    if flow.bitrate:
+        opts.append(f"-b {flow.bitrate}")
+    if flow.parallel > 1:
+        opts.append(f"-P {flow.parallel}")
+    if flow.reverse:
+        opts.append("-R")
+    if flow.options:
+        opts.append(flow.options)
+    # in a subshell, so that no job notifications are printed on the console
+    return f"(iperf3 {' '.join(opts)} > {_flow_file(flow)} 2>&1 & echo $!)"
+
+
+def _start_servers(device: Any, flows: List[Flow]) -> None:
+    cmds = [f"iperf3 -s -1 -p {flow.port} > /dev/null 2>&1 &" for flow in flows]
+    for flow in flows:
+        cmds.append(
+            "for i in $(seq 50); do (ss -ltn || netstat -ltn) 2>/dev/null"
+            f" | grep -q ':{flow.port} ' && break; sleep 0.1; done"
+        )
+    device.run_batch(cmds)
+
+
+def _start_clients(
+    device: Any, flows: List[Flow], duration: int, interval: float
+) -> Dict[int, Tuple[str, bool]]:
+    """Start the clients, return the pid of each and if it uses --json-stream."""
+    probe = device.run_batch(["iperf3 --help 2>&1 | grep -q -- --json-stream"])
+    json_stream = probe[0].ok
+    if not json_stream:
+        name = getattr(device, "name", device)
+        logger.debug(f"iperf3 on {name} has no --json-stream, using -J")
+    results = device.run_batch(
+        [_client_cmd(flow, duration, interval, json_stream) for flow in flows]
+    )
+    return {
+        flow.port: (result.output.split()[-1], json_stream)
+        for flow, result in zip(flows, results)
+    }
+
+
+def _poll_clients(
+    device: Any,
+    flows: List[Flow],
+    results: Dict[int, FlowResult],
+    pids: Dict[int, str],
+    streams: Dict[int, bool],
+    lines: Dict[int, int],
+    on_interval: Optional[Callable[[FlowResult, IntervalRecord], None]],
+) -> None:
+    running = [results[flow.port] for flow in flows if not results[flow.port].done]
+    if not running:
+        return
+    cmds = []
+    for result in running:
+        flow = result.flow
+        pid = pids[flow.port]
+        # checked first, so that the lines written before it exited are read
+        cmds.append(f"kill -0 {pid} 2>/dev/null")
+        if streams[flow.port]:
+            cmds.append(f"tail -n +{lines[flow.port] + 1} {_flow_file(flow)}")
+        else:
+            # the -J document is read once complete, when iperf3 exited
+            cmds.append(f"kill -0 {pid} 2>/dev/null || cat {_flow_file(flow)}")
+    outputs = device.run_batch(cmds)
+    for result, alive, tail in zip(running, outputs[0::2], outputs[1::2]):
+        seen = len(result.intervals)
+        lines[result.flow.port] += parse_iperf3_json(tail.output, result)
+        if on_interval:
+            for record in result.intervals[seen:]:
+                on_interval(result, record)
+        if not alive.ok and not result.done:
+            result.add_event("error", "iperf3 exited without a result")
+
+
+def _stop_flows(device: Any, flows: List[Flow], pids: Dict[int, str]) -> None:
+    cmds = []
+    for flow in flows:
+        if flow.port in pids:
+            cmds.append(f"kill {pids[flow.port]} 2>/dev/null")
+        cmds.append(f"rm -f {_flow_file(flow)}")
+    device.run_batch(cmds)
+
+
+def _stop_servers(device: Any, flows: List[Flow]) -> None:
+    device.run_batch([f"pkill -x -f 'iperf3 -s -1 -p {flow.port}'" for flow in flows])
+
+
+def _by_device(flows: List[Flow], role: str) -> Dict[str, List[Flow]]:
+    """Group the flows by sender or receiver, keyed by task name."""
+    groups: Dict[int, List[Flow]] = {}
+    for flow in flows:
+        groups.setdefault(id(getattr(flow, role)), []).append(flow)
+    return {
+        f"{getattr(getattr(group[0], role), 'name', role)}-{i}": group
+        for i, group in enumerate(groups.values())
+    }
+
+
+def _run_per_device(
+    groups: Dict[str, List[Flow]], role: str, func: Callable, *args: Any
+) -> Dict[str, Any]:
+    """Run func(device, flows, *args) concurrently for each device."""
+    tasks = {
+        name: functools.partial(func, getattr(group[0], role), group, *args)
+        for name, group in groups.items()
+    }
+    results = run_tasks(tasks, max_workers=max(len(tasks), 1))
+    errors = [f"{name}: {r.error!r}" for name, r in results.items() if not r.ok]
+    if errors:
+        raise CodeError(f"iperf3 {func.__name__} failed on " + ", ".join(errors))
+    return {name: r.value for name, r in results.items()}
+
+
+def run_traffic_matrix(
+    flows: List[Flow],
+    duration: int = 10,
+    interval: float = 1,
+    base_port: int = IPERF3_BASE_PORT,
+    on_interval: Optional[Callable[[FlowResult, IntervalRecord], None]] = None,
+    poll_interval: float = 1.0,
+    timeout: Optional[float] = None,
+) -> MatrixResult:
+    """Run iperf3 flows concurrently and collect their interval records.
+
+    The flows without a port get base_port + their index in flows. The
+    iperf3 servers are started on all the receivers and the clients on all
+    the senders, each device in its own thread, then the event files of the
+    clients are read every poll_interval until all flows are done.
+
+    :param flows: sender/receiver pairs, see :class:`Flow`
+    :type flows: list
+    :param duration: seconds the flows run for (-t)
+    :type duration: int
+    :param interval: seconds between interval records (-i)
+    :type interval: float
+    :param base_port: first iperf3 port
+    :type base_port: int
+    :param on_interval: called with each flow result and interval record,
+        as soon as the record is read
+    :type on_interval: callable, optional
+    :param poll_interval: seconds between reads of the event files
+    :type poll_interval: float
+    :param timeout: seconds to wait for the flows, defaults to duration + 30
+    :type timeout: float, optional
+    :raises CodeError: if iperf3 could not be started on a device
+    :return: results of the flows, in order; the flows still running at the
+        timeout are stopped and have an error
+    :rtype: MatrixResult
+    """
+    for i, flow in enumerate(flows):
+        if flow.port is None:
+            flow.port = base_port + i
+        if flow.dest_ip is None:
+            flow.dest_ip = flow.receiver.get_interface_ipaddr(flow.receiver.iface_dut)
+        if flow.name is None:
+            flow.name = "{}->{}:{}".format(
+                getattr(flow.sender, "name", "sender"),
+                getattr(flow.receiver, "name", "receiver"),
+                flow.port,
+            )
+    results = [FlowResult(flow) for flow in flows]
+    by_port = {flow.port: result for flow, result in zip(flows, results)}
+    senders = _by_device(flows, "sender")
+    receivers = _by_device(flows, "receiver")
+    lines = {flow.port: 0 for flow in flows}
+    pids: Dict[int, str] = {}
+    streams: Dict[int, bool] = {}
+
+    _run_per_device(receivers, "receiver", _start_servers)
+    try:
+        for started in _run_per_device(
+            senders, "sender", _start_clients, duration, interval
+        ).values():
+            for port, (pid, json_stream) in started.items():
+                pids[port] = pid
+                streams[port] = json_stream
+        logger.info(f"Started {len(flows)} iperf3 flows for {duration}s")
+
+        deadline = time.time() + (timeout or duration + 30)
+        while not all(result.done for result in results):
+            if time.time() > deadline:
+                for result in results:
+                    if not result.done:
+                        result.add_event("error", "timed out")
+                break
+            time.sleep(poll_interval)
+            _run_per_device(
+                senders,
+                "sender",
+                _poll_clients,
+                by_port,
+                pids,
+                streams,
+                lines,
+                on_interval,
+            )
+    finally:
+        _run_per_device(senders, "sender", _stop_flows, pids)
+        _run_per_device(receivers, "receiver", _stop_servers)
+
+    matrix = MatrixResult(results)
+    for result in results:
+        if result.error:
+            logger.error(f"iperf3 flow {result.flow.name} failed: {result.error}")
+    logger.info(f"iperf3 matrix: {matrix.bits_per_second / 1e6:.2f} Mbits/s aggregate")
+    return matrix
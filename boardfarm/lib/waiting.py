@@ -0,0 +1,144 @@
+"""Wait for a condition, polling with exponential backoff until a deadline.
+
+The time each named wait took to succeed (time-to-ready) is recorded, so the
+distribution across runs can be looked at with :func:`time_to_ready_report`.
+"""
+
+import json
+import logging
+import random
+import statistics
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+from tabulate import tabulate
+
+from boardfarm.exceptions import WaitTimeout
+
+logger = logging.getLogger("bft")
+
+# time-to-ready records of this run, not saved yet
+_records: List[Dict[str, Any]] = []
+
+
+def wait_until(
+    condition: Callable[[], Any],
+    timeout: float,
+    name: Optional[str] = None,
+    delay: float = 1.0,
+    max_delay: float = 30.0,
+    backoff: float = 2.0,
+    jitter: float = 0.1,
+    exceptions: Tuple[Type[BaseException], ...] = (Exception,),
+    exc: Optional[BaseException] = None,
+) -> Any:
+    """Call condition until it returns a true value or the deadline passes.
+
+    The first call is immediate, the delay before the next ones is multiplied
+    by backoff after every attempt, up to max_delay, plus or minus a random
+    jitter. The last attempt happens at the deadline.
+
+    :param condition: callable taking no arguments
+    :type condition: callable
+    :param timeout: seconds after which to give up
+    :type timeout: float
+    :param name: name under which the time-to-ready is recorded, None to not record it
+    :type name: str, optional
+    :param delay: seconds to wait after the first attempt
+    :type delay: float
+    :param max_delay: maximum seconds between two attempts
+    :type max_delay: float
+    :param backoff: factor applied to the delay after each attempt
+    :type backoff: float
+    :param jitter: fraction of the delay randomly added or removed
+    :type jitter: float
+    :param exceptions: exceptions raised by condition meaning "not ready yet",
+        others are propagated
+    :type exceptions: tuple
+    :param exc: exception to raise on timeout, defaults to WaitTimeout
+    :type exc: Exception, optional
+    :raises WaitTimeout: or exc, if the condition is still false at the deadline
+    :return: the value returned by condition
+    :rtype: any
+    """
+    label = name or getattr(condition, "__name__", "condition")
+    start = time.monotonic()
+    deadline = start + timeout
+    attempts = 0
+    error = None
+    while True:
+        attempts += 1
+        try:
+            value = condition()
+        except exceptions as e:
+            value, error = None, e
+            logger.debug(f"{label}: attempt {attempts} failed: {e!r}")
+        if value:
+            elapsed = time.monotonic() - start
+            logger.info(f"{label} ready after {elapsed:.1f}s ({attempts} attempts)")
+            if name:
+                _records.append(
+                    {
+                        "name": name,
+                        "seconds": round(elapsed, 3),
+                        "attempts": attempts,
+                        "time": time.time(),
+                    }
+                )
+            return value
+        now = time.monotonic()
+        if now >= deadline:
+            break
+        sleep = min(delay * backoff ** (attempts - 1), max_delay)
+        sleep *= 1 + random.uniform(-jitter, jitter)
+        time.sleep(max(0.0, min(sleep, deadline - now)))
+
+    msg = f"{label} not ready after {timeout}s ({attempts} attempts)"
+    logger.error(msg)
+    raise (exc or WaitTimeout(msg)) from error
+
+
+def save_time_to_ready(fname: str) -> None:
+    """Append the time-to-ready records of this run to a JSON lines file.
+
+    :param fname: file shared by the runs, e.g. in the results directory
+    :type fname: str
+    """
+    if not _records:
+        return
+    with open(fname, "a") as f:
+        for record in _records:
+            f.write(json.dumps(record) + "\n")
+    _records.clear()
+
+
+def time_to_ready_report(fname: str) -> str:
+    """Return a table of the time-to-ready distribution of each wait.
+
+    :param fname: file written by :func:`save_time_to_ready`
+    :type fname: str
+    :return: table with count, min, median, 90th percentile and max seconds
+    :rtype: str
+    """
+    samples = defaultdict(list)
+    with open(fname) as f:
+        for line in f:
+            record = json.loads(line)
+            samples[record["name"]].append(record["seconds"])
+
+    rows = []
+    for name, values in sorted(samples.items()):
+        values.sort()
+        p90 = values[min(len(values) - 1, int(0.9 * len(values)))]
+        rows.append(
+            [
+                name,
+                len(values),
+                f"{values[0]:.1f}",
+                f"{statistics.median(values):.1f}",
+                f"{p90:.1f}",
+                f"{values[-1]:.1f}",
+            ]
+        )
+    return tabulate(rows, headers=["Wait", "Runs", "Min", "Median", "P90", "Max"])
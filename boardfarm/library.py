@@ -10,6 +10,7 @@ import ipaddress
 import json
 import logging
 import os
+import time
 import traceback
 
 import boardfarm
@@ -136,6 +137,94 @@ def check_devices(devices, func_name="check_status"):
     return ret
 
 
+def add_test_result(full_results, cls, golden=None, prefix=""):
+    """Grade a single test and add it to the processed results.
+
+    :param full_results: results as returned by process_test_results, updated
+    :type full_results: dict
+    :param cls: test (or subtest) instance
+    :type cls: object
+    :param golden: golden master results to compare against
+    :type golden: dict, optional
+    :param prefix: prefix of the test name, used for subtests
+    :type prefix: str
+    """
+    if golden is None:
+        golden = {}
+
+    name = prefix + getattr(cls, "name", cls.__class__.__name__)
+    grade = getattr(cls, "result_grade", None)
+    try:
+        if hasattr(cls, "elapsed_time"):
+            elapsed_time = cls.elapsed_time
+        else:
+            start_time = cls.start_time
+            stop_time = cls.stop_time
+            elapsed_time = stop_time - start_time
+    except Exception as error:
+        logger.error(error)
+        elapsed_time = 0
+
+    unexpected = None
+    if "_source" in golden:
+        if name + "-result" in golden["_source"]:
+            if golden["_source"][name + "-result"] != grade:
+                unexpected = True
+            else:
+                unexpected = False
+
+    if grade == "Unexp OK" or (grade == "OK" and unexpected is True):
+        grade = "Unexp OK"
+        full_results["unexpected_pass"] += 1
+    elif grade == "Exp FAIL" or (grade == "FAIL" and unexpected is False):
+        grade = "Exp FAIL"
+        full_results["unexpected_fail"] += 1
+    elif grade == "OK":
+        full_results["tests_pass"] += 1
+    elif grade == "FAIL":
+        full_results["tests_fail"] += 1
+    elif grade == "TD FAIL":
+        full_results["tests_teardown_fail"] += 1
+    elif grade == "CC FAIL":
+        full_results["tests_contingency_fail"] += 1
+    elif grade == "SKIP" or grade is None:
+        full_results["tests_skip"] += 1
+
+    message = getattr(cls, "result_message", None)
+
+    if message is None:
+        try:
+            message = cls.__doc__.split("\n")[0]
+        except Exception as error:
+            logger.error(error)
+            message = "Missing description of class (no docstring)"
+            print_bold(f"WARN: Please add docstring to {cls}.")
+
+    long_message = getattr(cls, "long_result_message", "")
+
+    full_results["test_results"].append(
+        {
+            "name": name,
+            "message": message,
+            "long_message": long_message,
+            "grade": grade,
+            "elapsed_time": elapsed_time,
+        }
+    )
+
+
+def _add_test_and_subtests(full_results, test, golden):
+    try:
+        add_test_result(full_results, test, golden)
+
+        for subtest in test.subtests:
+            add_test_result(
+                full_results, subtest, golden, prefix=test.__class__.__name__ + "-"
+            )
+    except Exception as e:
+        logger.error(f"Failed to parse test result: {e}")
+
+
 def process_test_results(raw_test_results, golden=None):
     """Process the test results."""
 
@@ -154,80 +243,84 @@ def process_test_results(raw_test_results, golden=None):
         "tests_contingency_fail": 0,
     }
 
-    def parse_and_add_results(cls, prefix=""):
-        name = prefix + getattr(cls, "name", cls.__class__.__name__)
-        grade = getattr(cls, "result_grade", None)
-        try:
-            if hasattr(cls, "elapsed_time"):
-                elapsed_time = cls.elapsed_time
-            else:
-                start_time = cls.start_time
-                stop_time = cls.stop_time
-                elapsed_time = stop_time - start_time
-        except Exception as error:
-            logger.error(error)
-            elapsed_time = 0
-
-        unexpected = None
-        if "_source" in golden:
-            if name + "-result" in golden["_source"]:
-                if golden["_source"][name + "-result"] != grade:
-                    unexpected = True
-                else:
-                    unexpected = False
-
-        if grade == "Unexp OK" or (grade == "OK" and unexpected is True):
-            grade = "Unexp OK"
-            full_results["unexpected_pass"] += 1
-        elif grade == "Exp FAIL" or (grade == "FAIL" and unexpected is False):
-            grade = "Exp FAIL"
-            full_results["unexpected_fail"] += 1
-        elif grade == "OK":
-            full_results["tests_pass"] += 1
-        elif grade == "FAIL":
-            full_results["tests_fail"] += 1
-        elif grade == "TD FAIL":
-            full_results["tests_teardown_fail"] += 1
-        elif grade == "CC FAIL":
-            full_results["tests_contingency_fail"] += 1
-        elif grade == "SKIP" or grade is None:
-            full_results["tests_skip"] += 1
-
-        message = getattr(cls, "result_message", None)
-
-        if message is None:
-            try:
-                message = cls.__doc__.split("\n")[0]
-            except Exception as error:
-                logger.error(error)
-                message = "Missing description of class (no docstring)"
-                print_bold(f"WARN: Please add docstring to {cls}.")
-
-        long_message = getattr(cls, "long_result_message", "")
-
-        full_results["test_results"].append(
-            {
-                "name": name,
-                "message": message,
-                "long_message": long_message,
-                "grade": grade,
-                "elapsed_time": elapsed_time,
-            }
-        )
-
-    for _i, x in enumerate(raw_test_results):
-        try:
-            parse_and_add_results(x)
-
-            for subtest in x.subtests:
-                parse_and_add_results(subtest, prefix=x.__class__.__name__ + "-")
-        except Exception as e:
-            logger.error(f"Failed to parse test result: {e}")
+    for x in raw_test_results:
+        _add_test_and_subtests(full_results, x, golden)
 
     full_results["tests_total"] = len(raw_test_results)
     return full_results
 
 
+class TestResultsWriter:
+    """Write the results of a test run incrementally, while tests are running.
+
+    Each finished test is graded once, added to the counters and appended to
+    the ``test_results.jsonl`` JSON Lines file. ``test_results.json`` and
+    ``results.html`` (which also list the tests still to run) are re-rendered
+    at most every ``interval`` seconds, instead of after every test.
+    """
+
+    def __init__(self, config, tests_to_run, interval=60):
+        """Instance initialisation.
+
+        :param config: boardfarm config, with output_dir and golden_master_results
+        :type config: module
+        :param tests_to_run: all the tests of the run, in execution order
+        :type tests_to_run: list
+        :param interval: minimum seconds between two renderings of the results
+        :type interval: int
+        """
+        self.config = config
+        self.tests = tests_to_run
+        self.golden = getattr(config, "golden_master_results", None) or {}
+        self.interval = interval
+        self.results = process_test_results([], self.golden)
+        self.finished = 0
+        self.last_flush = None
+        self.jsonl_path = os.path.join(config.output_dir + "test_results.jsonl")
+        self.json_path = os.path.join(config.output_dir + "test_results.json")
+        open(self.jsonl_path, "w").close()
+
+    def add(self, test):
+        """Add the result of a finished test, flush if the interval elapsed.
+
+        :param test: test that has just finished (run by bft in order)
+        :type test: object
+        """
+        start = len(self.results["test_results"])
+        _add_test_and_subtests(self.results, test, self.golden)
+        self.finished += 1
+        self.results["tests_total"] = self.finished
+
+        with open(self.jsonl_path, "a") as fout:
+            for record in self.results["test_results"][start:]:
+                fout.write(json.dumps(record, sort_keys=True, cls=HelperEncoder))
+                fout.write("\n")
+
+        if self.last_flush is None or time.time() - self.last_flush >= self.interval:
+            self.flush()
+
+    def snapshot(self):
+        """Return the results so far, tests not run yet are listed as pending.
+
+        :return: results in the same format as process_test_results
+        :rtype: dict
+        """
+        pending = process_test_results(self.tests[self.finished :], self.golden)
+        snapshot = {k: v + pending[k] for k, v in self.results.items()}
+        snapshot["test_results"] = [
+            dict(r) for r in self.results["test_results"]
+        ] + pending["test_results"]
+        return snapshot
+
+    def flush(self):
+        """Write test_results.json and results.html with the results so far."""
+        full_results = self.snapshot()
+        create_results_html(full_results, self.config, logger)
+        with open(self.json_path, "w") as fout:
+            json.dump(full_results, fout, indent=4, sort_keys=True)
+        self.last_flush = time.time()
+
+
 def create_results_html(full_results, config, logger):
     """Create results.html from config and test results."""
     from boardfarm import make_human_readable
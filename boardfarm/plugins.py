@@ -2,20 +2,31 @@
 
 import inspect
 import pkgutil
+import sys
 from importlib import import_module, util
 
 import pluggy
 
+from . import registry
 from .exceptions import CodeError
 
 
 def find_plugins():
-    """Return a dictionary of all boardfarm plugins."""
-    return {
-        name: import_module(name)
-        for _finder, name, _ispkg in pkgutil.iter_modules()
-        if name.startswith("boardfarm_")
-    }
+    """Return a dictionary of all boardfarm plugins.
+
+    The names are cached in the registry, the packages on sys.path are only
+    scanned again when one of its entries changed.
+    """
+    key = registry.path_fingerprint(sys.path)
+    names = registry.load("plugins", key)
+    if names is None:
+        names = sorted(
+            name
+            for _finder, name, _ispkg in pkgutil.iter_modules()
+            if name.startswith("boardfarm_")
+        )
+        registry.save("plugins", key, names)
+    return {name: import_module(name) for name in names}
 
 
 def walk_library(module, filter_pkgs=None):
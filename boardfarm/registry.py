@@ -0,0 +1,135 @@
+"""module: boardfarm.registry: persistent index of plugins, tests and devices.
+
+Finding the boardfarm plugins scans every package on sys.path, and finding
+the tests and devices imports every module of every plugin. The registry keeps
+the result of these scans in a JSON file, each section stored under a key
+fingerprinting what it was computed from (plugin versions, file mtimes), so
+the next runs only import the modules they need.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger("bft")
+
+# registry file, an empty BFT_REGISTRY_CACHE disables it
+REGISTRY_CACHE = os.environ.get(
+    "BFT_REGISTRY_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "boardfarm", "registry.json"),
+)
+# bumped when the layout of the file changes
+VERSION = 1
+
+
+def _read(path: str) -> Dict[str, Any]:
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("version") != VERSION:
+        return {}
+    return data
+
+
+def load(section: str, key: str, path: Optional[str] = None) -> Optional[Any]:
+    """Return the value stored in a section of the registry.
+
+    :param section: name of the section, e.g. "tests"
+    :type section: str
+    :param key: fingerprint the value was stored with
+    :type key: str
+    :param path: registry file, defaults to REGISTRY_CACHE
+    :type path: str, optional
+    :return: the value, None if missing or stored with another key
+    :rtype: any
+    """
+    path = REGISTRY_CACHE if path is None else path
+    if not path:
+        return None
+    entry = _read(path).get(section)
+    if not entry or entry.get("key") != key:
+        return None
+    return entry["value"]
+
+
+def save(section: str, key: str, value: Any, path: Optional[str] = None) -> None:
+    """Store a value in a section of the registry, replacing the file atomically.
+
+    :param section: name of the section, e.g. "tests"
+    :type section: str
+    :param key: fingerprint of what the value was computed from
+    :type key: str
+    :param value: JSON serialisable value
+    :type value: any
+    :param path: registry file, defaults to REGISTRY_CACHE
+    :type path: str, optional
+    """
+    path = REGISTRY_CACHE if path is None else path
+    if not path:
+        return
+    data = _read(path)
+    data["version"] = VERSION
+    data[section] = {"key": key, "value": value}
+    try:
+        dirname = os.path.dirname(os.path.abspath(path))
+        os.makedirs(dirname, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=dirname, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.debug(f"Could not write registry {path}: {e!r}")
+
+
+def path_fingerprint(paths: Iterable[str]) -> str:
+    """Return a fingerprint of the entries of sys.path.
+
+    Installing or removing a package changes the mtime of the directory
+    it is installed in.
+
+    :param paths: directories or archives, e.g. sys.path
+    :type paths: list(str)
+    :return: hex digest
+    :rtype: str
+    """
+    h = hashlib.sha256()
+    for p in paths:
+        try:
+            mtime = os.stat(p or ".").st_mtime_ns
+        except OSError:
+            mtime = None
+        h.update(f"{p}:{mtime}\n".encode())
+    return h.hexdigest()
+
+
+def fingerprint(packages: Dict[str, Any], subpackage: str) -> str:
+    """Return a fingerprint of a subpackage of every boardfarm package.
+
+    It covers the name and version of each package and the path and mtime of
+    each python file below ``<package>/<subpackage>``.
+
+    :param packages: boardfarm and its plugins, name to module
+    :type packages: dict
+    :param subpackage: e.g. "tests" or "devices"
+    :type subpackage: str
+    :return: hex digest
+    :rtype: str
+    """
+    h = hashlib.sha256()
+    for name, module in sorted(packages.items()):
+        h.update(f"{name}={getattr(module, '__version__', '')}\n".encode())
+        if not getattr(module, "__file__", None):
+            continue
+        root = os.path.join(os.path.dirname(module.__file__), subpackage)
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for fname in sorted(filenames):
+                if fname.endswith(".py"):
+                    fpath = os.path.join(dirpath, fname)
+                    h.update(f"{fpath}:{os.stat(fpath).st_mtime_ns}\n".encode())
+    return h.hexdigest()
@@ -12,48 +12,57 @@ import pkgutil
 import traceback
 
 import boardfarm
+from boardfarm import registry
 
 available_tests = {}
 
 
-def init(config=None):
-    """Dynamically find all test classes across all boardfarm projects.
-
-    This creates a dictionary of "test names" to "python object of test class".
-    """
-    # This will be a dictionary where:
-    #   key = filename (without '.py')
-    # value = list of classes
-    test_mappings = {}
-
-    # Create a dictionary of all boardfarm modules
+def _all_boardfarm_modules():
+    """Return a dictionary of boardfarm and its plugins."""
     all_boardfarm_modules = dict(
         boardfarm.plugins
     )  # use dict() to create a copy instead of a reference
     all_boardfarm_modules["boardfarm"] = importlib.import_module("boardfarm")
+    return all_boardfarm_modules
+
 
+def _all_test_modules():
+    """Import and return the test modules of boardfarm and all its plugins."""
     all_mods = []
 
     # Loop over all modules to import their tests
-    for modname in all_boardfarm_modules:
-        bf_module = all_boardfarm_modules[modname]
+    for bf_module in _all_boardfarm_modules().values():
         test_module = pkgutil.get_loader(".".join([bf_module.__name__, "tests"]))
         if test_module:
             all_mods += boardfarm.walk_library(
                 test_module.load_module(), filter_pkgs=["lib"]
             )
+    return all_mods
+
+
+def _load_tests(all_mods, config=None):
+    """Add the test classes of the given modules to available_tests.
+
+    :return: test name to name of the module it was found in
+    :rtype: dict
+    """
+    # This will be a dictionary where:
+    #   key = filename (without '.py')
+    # value = module, list of classes
+    test_mappings = {}
+    index = {}
 
     for module in all_mods:
         fname = module.__name__.split(".")[-1]
-        test_mappings[fname] = []
+        test_mappings[fname] = (module, [])
         for thing_name in dir(module):
             thing = getattr(module, thing_name)
             if inspect.isclass(thing) and hasattr(thing, "run"):
-                test_mappings[fname].append(thing)
+                test_mappings[fname][1].append(thing)
 
     # Loop over all test classes in all test files, and
     # run their 'parse' function if they have one.
-    for test_file, tests in test_mappings.items():
+    for module, tests in test_mappings.values():
         for test in tests:
             if not hasattr(test, "parse"):
                 continue
@@ -62,6 +71,7 @@ def init(config=None):
                     new_tests = test.parse(config) or []
                     for new_test in new_tests:
                         available_tests[new_test.__name__] = new_test
+                        index[new_test.__name__] = module.__name__
             except Exception:
                 if "BFT_DEBUG" in os.environ:
                     traceback.print_exc()
@@ -73,6 +83,34 @@ def init(config=None):
     # Build dictionary where
     #   key = test name
     #   value = reference to test class
-    for key in test_mappings:
-        for item in test_mappings[key]:
+    for module, tests in test_mappings.values():
+        for item in tests:
             available_tests[item.__name__] = item
+            index[item.__name__] = module.__name__
+    return index
+
+
+def init(config=None, names=None):
+    """Dynamically find all test classes across all boardfarm projects.
+
+    This creates a dictionary of "test names" to "python object of test class".
+
+    When names are given, the registry index is used to import only the
+    modules defining these tests. All test modules are imported (and the
+    index rebuilt) if the index is out of date or does not know a name.
+
+    :param config: configuration passed to the parse function of the tests
+    :type config: boardfarm.config, optional
+    :param names: names of the tests needed, defaults to all tests
+    :type names: list(str), optional
+    """
+    key = registry.fingerprint(_all_boardfarm_modules(), "tests")
+    index = registry.load("tests", key) or {}
+    if names is not None:
+        modules = {index[name] for name in names if name in index}
+        _load_tests([importlib.import_module(m) for m in sorted(modules)], config)
+        if all(name in available_tests for name in names):
+            return
+
+    index.update(_load_tests(_all_test_modules(), config))
+    registry.save("tests", key, index)
@@ -21,7 +21,9 @@ import boardfarm.lib.DeviceManager
 import boardfarm.lib.env_helper
 import boardfarm.lib.test_configurator
 from boardfarm import lib
-from boardfarm.lib.bft_logging import now_short
+from boardfarm.dbclients import influx_writer
+from boardfarm.lib import state_epoch
+from boardfarm.lib.bft_logging import BufferedLog, now_short
 from boardfarm.library import check_devices
 from boardfarm.orchestration import TearDown
 
@@ -54,7 +56,7 @@ else:
 
 class BftBaseTest(inherit_class):
     _testMethodName = "UNDEFINED"
-    log = ""
+    log = BufferedLog()
     log_calls = ""
     _format = "%a %d %b %Y %H:%M:%S"
     start_time = 0
@@ -171,6 +173,8 @@ class BftBaseTest(inherit_class):
             self.endMarker()
             self.skipTest(self.result_grade)
 
+        # samples logged by the test are written in the background
+        influx_writer.flush_all()
         self.endMarker()
 
         if exc_to_raise:
@@ -321,6 +325,7 @@ class BftBaseTest(inherit_class):
             return
         except Exception as e:
             self.stop_time = time.time()
+            state_epoch.bump(f"{self.__class__.__name__} failed")
 
             print(
                 "\n\n=========== Test: %s failed! running Device status check! Time: %s ==========="
@@ -380,40 +380,43 @@ def parse_icmp_trace(
 
     Source, Destinationa and Code of Query Type
 
+    With the default args the capture is read locally (see
+    ``LinuxDevice.read_pcap``), other args are passed to tshark on the device
+    and its output lines are returned.
+
     :param device: Object of the device class where tcpdump is captured
     :type device: Union[DebianLAN, DebianWAN, DebianWifi]
     :param fname: Name of the captured pcap file
     :type fname: str
     :param args: Arguments to be used for the filter
     :type args: str, defaults to "-Y icmp -T fields -e ip.src -e ip.dst -e icmp.type"
+    :raises UseCaseFailure: if the fields of an ICMP packet are missing
     :return: Sequence of ICMP packets filtered from captured pcap file
     :rtype: List[ICMPPacketData]
     """
-    out = (
+    if args == "-Y icmp -T fields -e ip.src -e ip.dst -e icmp.type":
+        # read locally, only the ICMP (v4) packets as tshark's "icmp" filter
+        packets = device.read_pcap(fname).filter(proto=1).frame
+        if packets[["src", "dst", "icmp_type"]].isna().any(axis=None):
+            raise UseCaseFailure("ICMP packets not found")
+        return [
+            ICMPPacketData(_ip_addresses(src), _ip_addresses(dst), int(query_code))
+            for src, dst, query_code in zip(
+                packets["src"], packets["dst"], packets["icmp_type"]
+            )
+        ]
+    return (
         device.tshark_read_pcap(fname, args)
         .split("This could be dangerous.")[-1]
         .splitlines()[1:]
     )
-    output: List[ICMPPacketData] = []
-    if args == "-Y icmp -T fields -e ip.src -e ip.dst -e icmp.type":
-        for line in out:
-            try:
-                (src, dst, query_code) = line.split("\t")
-            except ValueError:
-                raise UseCaseFailure("ICMP packets not found")
-            output.append(
-                ICMPPacketData(
-                    IPAddresses(ip_address(src), None, None)
-                    if type(ip_address(src)) == IPv4Address
-                    else IPAddresses(None, ip_address(src), None),
-                    IPAddresses(ip_address(dst), None, None)
-                    if type(ip_address(dst)) == IPv4Address
-                    else IPAddresses(None, ip_address(dst), None),
-                    int(query_code),
-                )
-            )
-        return output
-    return out
+
+
+def _ip_addresses(address: str) -> IPAddresses:
+    ip = ip_address(address)
+    if isinstance(ip, IPv4Address):
+        return IPAddresses(ip, None, None)
+    return IPAddresses(None, ip, None)
 
 
 def is_icmp_packet_present(
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""Time AxirosACS._parse_soap_response against the minidom/xmltodict parsing."""
+import argparse
+import timeit
+import xml.dom.minidom
+
+from boardfarm.devices.axiros_acs import AxirosACS
+
+ENVELOPE = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n<SOAP-ENV:Envelope\n'
+    '  xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/"\n'
+    '  xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/"\n'
+    '  xmlns:xsd3="http://www.w3.org/2001/XMLSchema"\n'
+    '  xmlns:xsi3="http://www.w3.org/2001/XMLSchema-instance"\n>\n'
+    "<SOAP-ENV:Body >\n"
+    '<ns1:GetParameterValuesResponse xmlns:ns1="urn:AxessInterface">\n<Result>\n'
+    '<code xsi3:type="xsd3:int">200</code>\n'
+    '<details SOAP-ENC:arrayType="ns1:KeyValueStruct[{n}]"'
+    ' xsi3:type="SOAP-ENC:Array">\n{items}</details>\n'
+    '<message xsi3:type="xsd3:string">OK</message>\n'
+    '<ticketid xsi3:type="xsd3:int">85614</ticketid>\n</Result>\n'
+    "</ns1:GetParameterValuesResponse>\n</SOAP-ENV:Body>\n</SOAP-ENV:Envelope>\n"
+)
+ITEM = (
+    '<item>\n<key xsi3:type="xsd3:string">Device.X.{i}.Name</key>\n'
+    '<value xsi3:type="xsd3:string">InstanceNumber{i}</value>\n</item>\n'
+)
+
+
+class Response:
+    def __init__(self, text):
+        self.text = text
+        self.content = text.encode("utf-8")
+
+
+def gpv_response(n):
+    """Return a GPV reply with n parameters, like one of a Device. subtree."""
+    items = "".join(ITEM.format(i=i) for i in range(n))
+    return Response(ENVELOPE.format(n=n, items=items))
+
+
+def legacy_parse(response):
+    """Parse the reply as done before, with minidom and xmltodict."""
+    AxirosACS._replace_non_ascii_and_control_chars_with_hex(response.text)
+    xml.dom.minidom.parseString(response.text).toprettyxml()
+    result = AxirosACS._get_xml_key(response)[0]
+    return AxirosACS._parse_xml_response(result["details"]["item"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare the SOAP reply parsing of AxirosACS with the previous one"
+    )
+    parser.add_argument(
+        "-n", "--num", type=int, default=5000, help="parameters in the reply"
+    )
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="runs of each")
+    args = parser.parse_args()
+
+    response = gpv_response(args.num)
+    before = min(
+        timeit.repeat(lambda: legacy_parse(response), number=1, repeat=args.repeat)
+    )
+    after = min(
+        timeit.repeat(
+            lambda: AxirosACS._parse_soap_response(response),
+            number=1,
+            repeat=args.repeat,
+        )
+    )
+    print(
+        f"GPV of {args.num} parameters: {before * 1000:.0f}ms -> {after * 1000:.0f}ms"
+    )
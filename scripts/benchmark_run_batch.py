@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+"""Time commands run one prompt at a time against bft_pexpect_helper.run_batch."""
+import argparse
+import time
+
+from boardfarm.lib.bft_pexpect_helper import bft_pexpect_helper
+
+
+def local_bash():
+    console = bft_pexpect_helper(
+        "bash", ["--norc", "--noprofile"], env={"PS1": "bft-prompt# ", "TERM": "dumb"}
+    )
+    console.name = "bash"
+    console.prompt = ["bft-prompt# "]
+    console.expect(console.prompt)
+    return console
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare sequential commands with run_batch on a local bash"
+    )
+    parser.add_argument(
+        "-n", "--num", type=int, default=50, help="number of commands (default 50)"
+    )
+    args = parser.parse_args()
+    cmds = [f"echo {i}" for i in range(args.num)]
+
+    bash = local_bash()
+    try:
+        start = time.perf_counter()
+        for cmd in cmds:
+            bash.sendline(cmd)
+            bash.expect(bash.prompt)
+        sequential = time.perf_counter() - start
+
+        start = time.perf_counter()
+        bash.run_batch(cmds)
+        batched = time.perf_counter() - start
+    finally:
+        bash.close()
+
+    print(f"{args.num} commands: sequential {sequential:.3f}s, batched {batched:.3f}s")
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+"""Unit tests for boardfarm.analysis.analysis.py."""
+import io
+
+import pytest
+
+from boardfarm.analysis import analysis, benchmark, classes
+from boardfarm.analysis.oom import OOMAnalysis
+from boardfarm.analysis.ps import PSAnalysis
+from boardfarm.analysis.vmstat import VmStatAnalysis
+
+PROMPT = "root@OpenWrt:/# "
+LOG = "".join(
+    [
+        f"[1.0]{PROMPT}ps\r\n",
+        "[1.0]  PID VSZ STAT COMMAND\r\n",
+        "[1.0]  1 1000 S /sbin/procd\r\n",
+        "[1.0]  2 0 SW [kthreadd]\r\n",
+        f"[1.5]{PROMPT}cat /proc/vmstat\r\n",
+        "[1.5]nr_free_pages 100\r\n",
+        "[1.5]nr_inactive_file 10\r\n",
+        f"[2.0]{PROMPT}ps\r\n",
+        "[2.0]  PID VSZ STAT COMMAND\r\n",
+        "[2.0]  1 1200 S /sbin/procd\r\n",
+        f"[2.5]{PROMPT}cat /proc/sys/net/netfilter/nf_conntrack_count\r\n",
+        "[2.5]42\r\n",
+        f"[3.0]{PROMPT}cat /proc/vmstat\r\n",
+        "[3.0]nr_free_pages 90\r\n",
+        "[3.0]nr_inactive_file 30\r\n",
+        "[3.1]Out of memory: kill process 1\r\n",
+        f"[3.2]{PROMPT}\r\n",
+    ]
+)
+
+
+@pytest.fixture
+def graphs(mocker):
+    """Record the graphs instead of plotting them."""
+    graphs = []
+
+    def make_graph(self, data, ylabel, fname, ts=None, **kwargs):
+        graphs.append((type(self).__name__, fname, list(data), ts))
+
+    mocker.patch.object(analysis.Analysis, "make_graph", make_graph)
+    return graphs
+
+
+@pytest.mark.parametrize("size", [7, 64, 1 << 20])
+def test_read_blocks(size):
+    """Blocks hold complete lines and add up to the whole file."""
+    blocks = list(analysis.read_blocks(io.StringIO(LOG, newline=""), size))
+    assert "".join(blocks) == LOG
+    assert all(b.endswith("\r\n") for b in blocks)
+
+
+def test_analyze_string(graphs, capsys):
+    """Streaming classes still analyze a log given as a string."""
+    PSAnalysis().analyze(LOG, "out")
+    VmStatAnalysis().analyze(LOG, "out")
+    OOMAnalysis().analyze(LOG, "out")
+    assert graphs == [
+        ("PSAnalysis", "1-procd", ["1000", "1200"], [1.0, 2.0]),
+        ("VmStatAnalysis", "free_pages", [100, 90], [1.5, 3.0]),
+        ("VmStatAnalysis", "inactive_file", [10, 30], [1.5, 3.0]),
+        ("VmStatAnalysis", "free_pages+inactive_file", [110, 120], [1.5, 3.0]),
+    ]
+    assert "out of memory" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("size", [16, 100, 1 << 20])
+def test_run_analysis_single_pass(tmp_path, mocker, graphs, size):
+    """One pass over the file gives the same results as analyzing the string."""
+    fname = tmp_path / "console-combined.log"
+    fname.write_bytes(LOG.encode())
+    classes = {c.__name__: c for c in (PSAnalysis, VmStatAnalysis, OOMAnalysis)}
+    for c in classes.values():
+        c().analyze(LOG, "out")
+    expected = list(graphs)
+    graphs.clear()
+
+    mocker.patch.object(analysis, "chunk_size", size)
+    read = mocker.spy(analysis, "read_blocks")
+    assert analysis.run_analysis(fname, classes, "out") == []
+    assert sorted(graphs) == sorted(expected)
+    read.assert_called_once()
+
+
+def test_run_analysis_failure(tmp_path, graphs):
+    """A failing analysis is reported and does not stop the others."""
+
+    class Broken(analysis.Analysis):
+        def feed(self, text):
+            raise ValueError("boom")
+
+    fname = tmp_path / "console-combined.log"
+    fname.write_bytes(LOG.encode())
+    failed = analysis.run_analysis(
+        fname, {"Broken": Broken, "VmStatAnalysis": VmStatAnalysis}, "out"
+    )
+    assert failed == ["Broken"]
+    assert [g[1] for g in graphs][0] == "free_pages"
+
+
+def test_command_value_across_blocks():
+    """A value printed at the start of the next block is still collected."""
+    value = analysis.CommandValue("nf_conntrack_count", r"(\d+)")
+    lines = LOG.split("\r\n")
+    idx = next(i for i, line in enumerate(lines) if "nf_conntrack" in line) + 1
+    value.feed("\r\n".join(lines[:idx]) + "\r\n")
+    value.feed("\r\n".join(lines[idx:]))
+    assert value.results == [("2.5", "42")]
+
+
+def test_benchmark_legacy_scans(tmp_path, graphs):
+    """The benchmark times the previous scans, which find the same data."""
+    assert set(benchmark.LEGACY_SCANS) <= set(classes)
+    data, timestamps = benchmark.LEGACY_SCANS["PSAnalysis"](LOG)
+    PSAnalysis().analyze(LOG, "out")
+    legacy = [(v, timestamps[k]) for k, v in data.items() if len(v) > 1]
+    assert legacy == [(g[2], g[3]) for g in graphs]
+    assert legacy == [(["1000", "1200"], [1.0, 2.0])]
+
+    fname = tmp_path / "console-combined.log"
+    fname.write_bytes(LOG.encode())
+    single_pass, legacy_scans = benchmark.benchmark(fname, classes)
+    assert single_pass > 0 and legacy_scans > 0
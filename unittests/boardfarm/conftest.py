@@ -0,0 +1,296 @@
+"""Fixtures shared by the boardfarm unit tests."""
+import hashlib
+import json
+import os
+import socketserver
+import struct
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import pytest
+
+WSDL_PATH = "/live/CPEManager/DMInterfaces/soap/getWSDL"
+
+WSDL = """<?xml version="1.0" encoding="UTF-8"?>
+<definitions xmlns="http://schemas.xmlsoap.org/wsdl/"
+  xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/"
+  xmlns:xsd="http://www.w3.org/2001/XMLSchema"
+  xmlns:tns="urn:AxessInterface" targetNamespace="urn:AxessInterface">
+<types>
+<xsd:schema targetNamespace="urn:AxessInterface">
+<xsd:include schemaLocation="types.xsd"/>
+</xsd:schema>
+</types>
+<message name="GetRequest"><part name="cpeid" type="tns:CPEIdentifierClassStruct"/></message>
+<message name="GetResponse"><part name="Result" type="xsd:string"/></message>
+<portType name="AxessPort">
+<operation name="Get"><input message="tns:GetRequest"/><output message="tns:GetResponse"/></operation>
+</portType>
+<binding name="AxessBinding" type="tns:AxessPort">
+<soap:binding style="rpc" transport="http://schemas.xmlsoap.org/soap/http"/>
+<operation name="Get"><soap:operation soapAction="Get"/>
+<input><soap:body use="literal" namespace="urn:AxessInterface"/></input>
+<output><soap:body use="literal" namespace="urn:AxessInterface"/></output>
+</operation>
+</binding>
+<service name="AxessService">
+<port name="AxessPort" binding="tns:AxessBinding"><soap:address location="http://127.0.0.1/soap"/></port>
+</service>
+</definitions>
+"""
+
+XSD = """<?xml version="1.0" encoding="UTF-8"?>
+<xsd:schema xmlns:xsd="http://www.w3.org/2001/XMLSchema" targetNamespace="urn:AxessInterface">
+<xsd:complexType name="CPEIdentifierClassStruct">
+<xsd:sequence><xsd:element name="cpeid" type="xsd:string"/></xsd:sequence>
+</xsd:complexType>
+<xsd:complexType name="CommandOptionsTypeStruct">
+<xsd:sequence>
+<xsd:element name="Sync" type="xsd:boolean"/>
+<xsd:element name="Lifetime" type="xsd:int"/>
+</xsd:sequence>
+</xsd:complexType>
+</xsd:schema>
+"""
+
+
+class SoapServer:
+    """Serve a stub ACS WSDL, with ETag revalidation and a per request delay."""
+
+    documents = {WSDL_PATH: WSDL, "/live/CPEManager/DMInterfaces/soap/types.xsd": XSD}
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.hits = Counter()  # (path, status) -> count
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(server.delay)
+                path = self.path.split("?")[0]
+                body = server.documents.get(path)
+                if body is None:
+                    status = 404
+                else:
+                    body = body.encode()
+                    etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+                    status = 304 if self.headers.get("If-None-Match") == etag else 200
+                server.hits[(path, status)] += 1
+                self.send_response(status)
+                if status == 200:
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                else:
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.port = self.httpd.server_address[1]
+        self.url = f"http://127.0.0.1:{self.port}{WSDL_PATH}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def downloads(self):
+        return sum(n for (_, status), n in self.hits.items() if status == 200)
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def soap_server():
+    server = SoapServer()
+    yield server
+    server.close()
+
+
+class DockerEngine:
+    """Serve a stub Docker Engine API on a unix socket.
+
+    Containers become healthy ``health_delay`` seconds after they start.
+    """
+
+    def __init__(self, path, health_delay=0.1):
+        self.socket = os.path.join(path, "docker.sock")
+        self.health_delay = health_delay
+        self.containers = {}  # name -> {"id", "networks", "port", "execs"}
+        self.events = []
+        self.requests = []
+        self.lock = threading.Lock()
+        engine = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def address_string(self):
+                return "docker"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body=b"", content_type="application/json"):
+                if body is None:
+                    body = b""
+                elif not isinstance(body, bytes):
+                    body = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _handle(self, method):
+                url = urlparse(self.path)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"null")
+                parts = unquote(url.path).split("/")[2:]  # drop the API version
+                engine.requests.append((method, "/".join(parts)))
+                if parts == ["events"]:
+                    return self._events(query)
+                status, answer = engine.handle(method, parts, query, body)
+                if isinstance(answer, bytes):
+                    return self._send(
+                        status, answer, "application/vnd.docker.raw-stream"
+                    )
+                self._send(status, answer)
+
+            def _events(self, query):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    sent = 0
+                    while time.time() < float(query["until"]):
+                        with engine.lock:
+                            events = engine.events[sent:]
+                        for event in events:
+                            line = json.dumps(event).encode() + b"\n"
+                            self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                        sent += len(events)
+                        self.wfile.flush()
+                        time.sleep(0.02)
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client stops reading once it has the events it waits for
+                    self.close_connection = True
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+        class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+            block_on_close = False
+
+        self.httpd = Server(self.socket, Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def _event(self, name, action):
+        with self.lock:
+            self.events.append(
+                {
+                    "Type": "container",
+                    "Action": action,
+                    "Actor": {"Attributes": {"name": name}},
+                }
+            )
+
+    def _healthy(self, name, healthcheck):
+        test = (healthcheck or {}).get("Test", [])
+        if test[:1] == ["CMD-SHELL"] and "/dev/tcp" in test[1]:
+            # run by /bin/sh, dash on the images, which has no /dev/tcp
+            return
+        time.sleep(self.health_delay)
+        self._event(name, "health_status: healthy")
+
+    def handle(self, method, parts, query, body):
+        """Answer a request, return the status code and the body."""
+        if parts == ["_ping"]:
+            return 200, b"OK"
+        if parts[0] == "images":
+            return (200, {"Id": "sha256:1"}) if parts[1] == "bft:node" else (404, {})
+        if parts == ["containers", "create"]:
+            with self.lock:
+                port = 32768 + len(self.containers)
+                self.containers[query["name"]] = {
+                    "id": query["name"],
+                    "networks": {},
+                    "port": str(port),
+                    "execs": [],
+                    "healthcheck": body.get("Healthcheck"),
+                }
+            return 201, {"Id": query["name"]}
+        if parts[:2] == ["networks", "bridge"]:
+            return 200, {
+                "IPAM": {
+                    "Config": [{"Gateway": "172.17.0.1", "Subnet": "172.17.0.0/16"}]
+                }
+            }
+        if parts[0] == "networks":
+            self.containers[body["Container"]]["networks"][parts[1]] = {
+                "IPAddress": "192.168.1.2",
+                "IPPrefixLen": 24,
+                "GlobalIPv6Address": "",
+                "GlobalIPv6PrefixLen": 0,
+                "Gateway": "192.168.1.1",
+            }
+            return 200, None
+        if parts[0] == "exec":
+            if parts[2] == "json":
+                return 200, {"ExitCode": 0}
+            return 200, struct.pack(">BxxxI", 1, 2) + b"ok"
+        container = self.containers.get(parts[1])
+        if container is None:
+            return 404, {"message": f"No such container: {parts[1]}"}
+        action = parts[2]
+        if action == "start":
+            threading.Thread(
+                target=self._healthy, args=(parts[1], container["healthcheck"])
+            ).start()
+            return 204, None
+        if action == "json":
+            return 200, {
+                "NetworkSettings": {
+                    "Networks": container["networks"],
+                    "Ports": {
+                        "22/tcp": [{"HostIp": "0.0.0.0", "HostPort": container["port"]}]
+                    },
+                }
+            }
+        if action == "exec":
+            container["execs"].append(body["Cmd"])
+            return 201, {"Id": parts[1]}
+        if action == "rename":
+            with self.lock:
+                self.containers[query["name"]] = self.containers.pop(parts[1])
+            return 204, None
+        if action == "stop":
+            with self.lock:
+                del self.containers[parts[1]]
+            return 204, None
+        return 404, {"message": "unknown"}
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def docker_engine(tmp_path):
+    engine = DockerEngine(str(tmp_path))
+    yield engine
+    engine.close()
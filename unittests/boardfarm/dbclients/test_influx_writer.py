@@ -0,0 +1,69 @@
+"""Unit tests for boardfarm.dbclients.influx_writer.py."""
+import json
+
+from boardfarm.dbclients.influx_writer import InfluxBatchWriter
+
+
+class Client:
+    def __init__(self, fail=0):
+        self.fail = fail
+        self.batches = []
+
+    def write_points(self, points):
+        if self.fail:
+            self.fail -= 1
+            raise ConnectionError("DB down")
+        self.batches.append(points)
+        return True
+
+
+def _points(n):
+    return [{"measurement": "cpu", "fields": {"value": i}} for i in range(n)]
+
+
+def test_points_written_in_batches(tmp_path):
+    """Points are batched by size, and written on flush."""
+    client = Client()
+    writer = InfluxBatchWriter(
+        client, batch_size=4, flush_interval=60, spill_path=str(tmp_path / "spill")
+    )
+    for point in _points(10):
+        writer.write([point])
+    assert writer.flush(timeout=5)
+    assert [len(b) for b in client.batches] == [4, 4, 2]
+    assert all(p["time"] for b in client.batches for p in b)
+
+
+def test_points_stamped_distinct_times(tmp_path):
+    """Rows queued together do not overwrite each other in the same series."""
+    client = Client()
+    writer = InfluxBatchWriter(
+        client, flush_interval=60, spill_path=str(tmp_path / "spill")
+    )
+    writer.write(_points(5))
+    writer.write(_points(5) + [dict(_points(1)[0], time="2020-01-01T00:00:00Z")])
+    assert writer.flush(timeout=5)
+    times = [p["time"] for b in client.batches for p in b]
+    assert times[-1] == "2020-01-01T00:00:00Z"
+    assert times[:-1] == sorted(set(times[:-1]))
+    assert len(times) == 11
+
+
+def test_spilled_while_db_unreachable(tmp_path):
+    """Batches failing all retries are spilled, then replayed."""
+    spill = tmp_path / "spill.jsonl"
+    client = Client(fail=2)
+    writer = InfluxBatchWriter(
+        client, flush_interval=60, spill_path=str(spill), retries=2, backoff=0.01
+    )
+    writer.write(_points(3))
+    assert writer.flush(timeout=5)
+    assert not client.batches
+    assert [json.loads(line)["fields"] for line in spill.read_text().splitlines()] == [
+        {"value": i} for i in range(3)
+    ]
+
+    writer.write(_points(1))
+    assert writer.flush(timeout=5)
+    assert [len(b) for b in client.batches] == [1, 3]
+    assert not spill.exists()
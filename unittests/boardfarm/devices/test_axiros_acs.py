@@ -1,3 +1,6 @@
+import threading
+import time
+
 import pytest
 from requests import HTTPError
 
@@ -172,15 +175,293 @@ def test_retry_intercept(mocker):
     def func_called():
         func_call.append("called")
 
-    def GPV(param):
-        func_called()
-        raise (HTTPError("507"))
+    # methods are wrapped when the class is created
+    class _AxirosACS(AxirosACS):
+        def GPV(self, param):
+            func_called()
+            raise (HTTPError("507"))
 
     mocker.patch.object(AxirosACS, "__init__", return_value=None, autospec=True)
     mocker.patch.object(AxirosACS, "expect", return_value=None, autospec=True)
-    axiros = AxirosACS()
+    axiros = _AxirosACS()
     axiros.session_connected = False
-    axiros.GPV = GPV
     with pytest.raises(HTTPError):
         axiros.GPV("dummy_param")
     assert len(func_call) == 2, "GPV not called twice"
+
+
+def test_intercept_wraps_rpc_methods_only(mocker):
+    """Private helpers and non RPC methods are not retried on a 507."""
+    calls = []
+
+    class _AxirosACS(AxirosACS):
+        def get(self, cpeid, param, wait=8):
+            calls.append("get")
+            raise HTTPError("507")
+
+        def _helper(self):
+            calls.append("_helper")
+            raise HTTPError("507")
+
+        def block_traffic(self, unblock=False):
+            calls.append("block_traffic")
+            raise HTTPError("507")
+
+    mocker.patch.object(AxirosACS, "__init__", return_value=None, autospec=True)
+    expect = mocker.patch.object(AxirosACS, "expect", autospec=True)
+    axiros = _AxirosACS()
+    axiros.session_connected = False
+    for method in [axiros._helper, axiros.block_traffic]:
+        with pytest.raises(HTTPError):
+            method()
+    with pytest.raises(HTTPError):
+        axiros.get("cpe1", "Device.X.")
+    assert not hasattr(AxirosACS._batch_rpc, "__wrapped__")
+    assert hasattr(AxirosACS.GPV_batch, "__wrapped__")
+    assert calls == ["_helper", "block_traffic", "get", "get"]
+    expect.assert_called_once()
+
+
+def test_rolling_capture_saved_on_failure(mocker):
+    class _AxirosACS(AxirosACS):
+        def GPV(self, param):
+            if param == "Device.Bad":
+                raise TR069FaultCode("9005 Invalid Parameter Name")
+            return []
+
+    mocker.patch.object(AxirosACS, "__init__", return_value=None, autospec=True)
+    tcpdump = mocker.patch(
+        "boardfarm.devices.axiros_acs.tcpdump_capture", return_value="1234"
+    )
+    kill = mocker.patch("boardfarm.devices.axiros_acs.kill_process")
+    scp = mocker.patch("boardfarm.devices.axiros_acs.scp_from")
+    mocker.patch.object(AxirosACS, "sendline", autospec=True)
+    mocker.patch.object(AxirosACS, "expect", autospec=True)
+    axiros = _AxirosACS()
+    axiros.session_connected = True
+    axiros.skip_capture = False
+    axiros.tcpdump_filter = ""
+    axiros.prompt = ["#"]
+    axiros.ipaddr, axiros.cli_port = "10.0.0.1", "22"
+    axiros.cli_username = axiros.cli_password = "root"
+    axiros.dev = mocker.Mock(spec=["board"])
+    axiros.dev.board = object()
+
+    for _ in range(3):
+        axiros.GPV("Device.X.1.Name")
+    with pytest.raises(TR069FaultCode):
+        axiros.GPV("Device.Bad")
+
+    # a single capture for the session, only saved on failure
+    tcpdump.assert_called_once()
+    assert tcpdump.call_args.kwargs["filecount"] == axiros.capture_ring_files
+    scp.assert_called_once()
+    assert scp.call_args.args[-1].endswith(".tgz")
+    kill.assert_not_called()
+
+    axiros.disable_capture()
+    kill.assert_called_once()
+
+
+def _gpv_response(n, value="InstanceNumber"):
+    """Return a GPV reply with n parameters, like one of a Device. subtree."""
+    item = (
+        '<item>\n<key xsi3:type="xsd3:string">Device.X.{i}.Name</key>\n'
+        '<value xsi3:type="xsd3:string">{value}{i}</value>\n</item>\n'
+    )
+    items = "".join(item.format(i=i, value=value) for i in range(n))
+    text = text_1.replace("ns1:KeyValueStruct[1]", f"ns1:KeyValueStruct[{n}]")
+    start, end = text.index("<item>"), text.index("</details>")
+    text = text[:start] + items + text[end:]
+    return Response(text.encode("utf-8"), text)
+
+
+def _legacy_parse_soap_response(response):
+    """Parse of the details items as done with xmltodict."""
+    result = AxirosACS._get_xml_key(response)[0]
+    return AxirosACS._parse_xml_response(result["details"]["item"])
+
+
+def test_parse_soap_response_matches_xmltodict():
+    """Records are the same as with the xmltodict based parsing."""
+    for response in [response_1, response_6, response_8, _gpv_response(50)]:
+        expected = _legacy_parse_soap_response(response)
+        assert AxirosACS._parse_soap_response(response) == expected
+
+    # control characters are escaped as before
+    response = _gpv_response(3, value="a\x01b\x85")
+    assert (
+        AxirosACS._parse_soap_response(response)[2]["value"] == "a\\x01b\\xc285" + "2"
+    )
+
+
+def test_parse_soap_response_large_reply():
+    """A GPV reply of a large subtree is parsed as with xmltodict."""
+    response = _gpv_response(5000)
+    records = AxirosACS._parse_soap_response(response)
+    assert records == _legacy_parse_soap_response(response)
+    assert records[-1] == {
+        "key": "Device.X.4999.Name",
+        "type": "string",
+        "value": "InstanceNumber4999",
+    }
+
+
+class _FakeACS:
+    """Answer batched GPV/SPV requests from a parameter tree per cpe."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.tree = {
+            cpe: {f"Device.X.{i}.Name": f"{cpe}-{i}" for i in range(5)}
+            for cpe in ["cpe1", "cpe2"]
+        }
+        self.requests = []
+        self.running = self.max_running = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, action, param, timeout, cpe_id):
+        with self.lock:
+            self.requests.append((action, cpe_id, param))
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.delay)
+        with self.lock:
+            self.running -= 1
+        tree = self.tree[cpe_id]
+        if action == "SPV":
+            if any("Bad" in k for d in param for k in d):
+                raise TR069FaultCode("9005 Invalid Parameter Name")
+            for d in param:
+                tree.update(d)
+            return [{"key": "Status", "type": "int", "value": "0"}]
+        paths = [param] if isinstance(param, str) else param
+        if any("Bad" in p for p in paths):
+            raise TR069FaultCode("9005 Invalid Parameter Name")
+        return [
+            {"key": k, "type": "string", "value": v}
+            for p in paths
+            for k, v in tree.items()
+            if k == p or (p.endswith(".") and k.startswith(p))
+        ]
+
+
+@pytest.fixture
+def batch_acs(mocker):
+    mocker.patch.object(AxirosACS, "__init__", return_value=None, autospec=True)
+    fake = _FakeACS()
+    mocker.patch.object(AxirosACS, "_batch_rpc", fake)
+    acs = AxirosACS()
+    acs.session_connected = False
+    acs.cpeid = "cpe1"
+    acs.batch_size = 3
+    return acs, fake
+
+
+def test_gpv_batch_coalesces_and_keeps_call_order(batch_acs):
+    acs, fake = batch_acs
+    calls = [
+        "Device.X.1.Name",
+        ["Device.X.2.Name", "Device.X.1.Name"],
+        "Device.X.",
+        "Device.X.3.Name",
+        ["Device.X.4.Name", "Device.X.0.Name"],
+    ]
+    result = acs.GPV_batch(calls)
+    assert [[r["value"] for r in records] for records in result] == [
+        ["cpe1-1"],
+        ["cpe1-2", "cpe1-1"],
+        ["cpe1-1", "cpe1-2", "cpe1-0", "cpe1-3", "cpe1-4"],
+        ["cpe1-3"],
+        ["cpe1-4", "cpe1-0"],
+    ]
+    # paths below Device.X. are not requested again, 3 parameters per request
+    assert sorted(p for _, _, ps in fake.requests for p in ps) == [
+        "Device.X.",
+        "Device.X.1.Name",
+        "Device.X.2.Name",
+    ]
+    assert len(fake.requests) == 1
+
+
+def test_gpv_batch_runs_requests_concurrently(batch_acs):
+    acs, fake = batch_acs
+    calls = [f"Device.X.{i}.Name" for i in range(5)] * 2
+    result = acs.GPV_batch(calls, cpe_id=["cpe1"] * 5 + ["cpe2"] * 5)
+    assert [r[0]["value"] for r in result] == [f"cpe1-{i}" for i in range(5)] + [
+        f"cpe2-{i}" for i in range(5)
+    ]
+    assert len(fake.requests) == 4
+    assert fake.max_running > 1
+
+
+def test_gpv_batch_reports_fault_of_its_call(batch_acs):
+    acs, fake = batch_acs
+    result = acs.GPV_batch(
+        ["Device.X.1.Name", "Device.Bad", "Device.X.2.Name"], return_exceptions=True
+    )
+    assert result[0][0]["value"] == "cpe1-1"
+    assert isinstance(result[1], TR069FaultCode)
+    assert result[2][0]["value"] == "cpe1-2"
+    with pytest.raises(TR069FaultCode):
+        acs.GPV_batch(["Device.X.1.Name", "Device.Bad"])
+
+
+def test_batch_rpc_backs_off_without_console(mocker):
+    """A batch request getting a 507 sleeps and is retried, the console is not used."""
+    mocker.patch.object(AxirosACS, "__init__", return_value=None, autospec=True)
+    mocker.patch.object(
+        AxirosACS, "_build_input_structs", return_value=("p", "cmd", "cpe1")
+    )
+    expect = mocker.patch.object(AxirosACS, "expect", autospec=True)
+    sleep = mocker.patch("boardfarm.devices.axiros_acs.time").sleep
+    acs = AxirosACS()
+    acs.client = mocker.MagicMock()
+    acs.client.service.GetParameterValues.side_effect = [response_3, response_1]
+
+    assert acs._batch_rpc("GPV", ["Device.X."], 10, "cpe1") == out_1
+    sleep.assert_called_once_with(10)
+    expect.assert_not_called()
+
+    acs.client.service.GetParameterValues.side_effect = [response_3, response_3]
+    with pytest.raises(HTTPError):
+        acs._batch_rpc("GPV", ["Device.X."], 10, "cpe1")
+
+
+def test_spv_batch_orders_conflicting_calls(batch_acs):
+    acs, fake = batch_acs
+    calls = [
+        {"Device.X.1.Name": "a"},
+        [{"Device.X.2.Name": "b"}, {"Device.X.1.Name": "a"}],
+        {"Device.X.1.Name": "c"},
+        {"Device.Bad": "d"},
+    ]
+    result = acs.SPV_batch(calls, return_exceptions=True)
+    assert result[:3] == [0, 0, 0]
+    assert isinstance(result[3], TR069FaultCode)
+    assert fake.tree["cpe1"]["Device.X.1.Name"] == "c"
+    # the conflicting call is sent after the first request
+    assert fake.requests[0][2] == [{"Device.X.1.Name": "a"}, {"Device.X.2.Name": "b"}]
+    assert fake.requests[1][2][0] == {"Device.X.1.Name": "c"}
+
+
+def test_setup_warm_run(soap_server, tmp_path, mocker):
+    """With the WSDL cached, setting up the ACS does not contact it."""
+    mocker.patch("boardfarm.lib.soap_cache.SOAP_CACHE", str(tmp_path))
+    kwargs = dict(
+        username="admin",
+        password="admin",
+        ipaddr="127.0.0.1",
+        port=str(soap_server.port),
+    )
+
+    def setup():
+        acs = AxirosACS(**kwargs)
+        acs._get_cmd_data(Sync=True, Lifetime=10)
+        acs._get_class_data(cpeid="DEAP815610DA")
+
+    setup()
+    assert sum(soap_server.hits.values()) == 2
+    for _ in range(3):
+        setup()
+    assert sum(soap_server.hits.values()) == 2
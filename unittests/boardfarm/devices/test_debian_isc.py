@@ -0,0 +1,58 @@
+import hashlib
+from unittest import mock
+
+import pytest
+
+from boardfarm.devices.debian_isc import DebianISCProvisioner
+from boardfarm.exceptions import CodeError
+
+
+@pytest.fixture
+def prov():
+    dev = DebianISCProvisioner.__new__(DebianISCProvisioner)
+    dev.prompt = ["#"]
+    dev.sendline = mock.Mock()
+    dev.expect = mock.Mock()
+    dev.copy_file_to_server = mock.Mock()
+    return dev
+
+
+def test_push_file_skips_unchanged(prov):
+    """A file is uploaded to a hidden temp file and moved, only if it changed."""
+    txt = "host cm-wan-1 {\n}\n"
+    digest = hashlib.sha256(txt.encode()).hexdigest()
+    prov._remote_file_info = mock.Mock(return_value=(len(txt), digest))
+    assert not prov._push_file("/etc/dhcp/dhcpd.conf.wan-1", txt)
+    prov.copy_file_to_server.assert_not_called()
+
+    prov._remote_file_info.return_value = (None, None)
+    assert prov._push_file("/etc/dhcp/dhcpd.conf.wan-1", txt)
+    tmp = "/etc/dhcp/.dhcpd.conf.wan-1.new"
+    assert prov.copy_file_to_server.call_args[0][1] == tmp
+    prov.sendline.assert_called_with(f"mv -f {tmp} /etc/dhcp/dhcpd.conf.wan-1")
+
+
+@pytest.mark.parametrize(
+    "out, changed", [("DHCP_UNCHANGED", False), ("DHCP_UPDATED", True)]
+)
+def test_install_dhcp_conf(prov, out, changed):
+    prov.check_output = mock.Mock(return_value=out)
+    assert prov._install_dhcp_conf("6", "cat base") is changed
+    cmd = prov.check_output.call_args[0][0]
+    assert "dhcpd -6 -t -cf /etc/dhcp/.dhcpd6.conf.new" in cmd
+
+
+def test_install_dhcp_conf_invalid(prov):
+    prov.check_output = mock.Mock(return_value="syntax error\nDHCP_INVALID")
+    with pytest.raises(CodeError, match="syntax error"):
+        prov._install_dhcp_conf("", "cat base")
+
+
+def test_render_host_entries():
+    hosts = DebianISCProvisioner._render_host_entries(
+        {"cm": {"hardware ethernet": "00:01", "options": {"bootfile-name": '"a"'}}},
+        "wan-1",
+    )
+    assert hosts == (
+        'host cm-wan-1 {\n   hardware ethernet 00:01;\n   option bootfile-name "a";\n}\n'
+    )
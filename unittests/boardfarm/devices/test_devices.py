@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+"""Unit tests for the device creation in boardfarm/devices/__init__.py."""
+import types
+
+import pytest
+
+from boardfarm import devices
+from boardfarm.lib.DeviceManager import clean_device_manager, device_manager
+
+
+class FakeBox:
+    model = "fake_box"
+
+    def __init__(self, *args, **kwargs):
+        self.name = kwargs["name"]
+        self.kwargs = kwargs
+
+
+@pytest.fixture
+def fake_module(mocker):
+    module = types.ModuleType("boardfarm_fake.devices.fake_box")
+    module.FakeBox = FakeBox
+    mocker.patch.dict(devices.device_mappings, {module: [FakeBox]})
+    mocker.patch.object(devices, "_device_index", None)
+    clean_device_manager()
+    yield module
+    clean_device_manager()
+
+
+def test_get_device_registers_device(fake_module):
+    mgr = device_manager()
+    dev = devices.get_device("fake_box", device_mgr=mgr, name="wan", ipaddr="1.2.3.4")
+    assert isinstance(dev, FakeBox)
+    assert dev.kwargs["ipaddr"] == "1.2.3.4"
+    assert dev.target == {"name": "wan", "ipaddr": "1.2.3.4"}
+    assert mgr.devices[0].obj is dev
+
+
+def test_get_device_unknown_model(fake_module):
+    with pytest.raises(devices.BftNotSupportedDevice):
+        devices.get_device("no_such_box", device_mgr=None, name="lan")
@@ -0,0 +1,128 @@
+import subprocess
+from unittest import mock
+
+import pytest
+
+from boardfarm.devices import docker_factory
+from boardfarm.devices.docker_factory import DockerFactory
+from boardfarm.lib.docker_api import DockerEngineAPI
+
+# containers are files named after them, renamed by "docker rename"
+FAKE_DOCKER = """#!/bin/bash
+state={state}
+case $1 in
+run) name=${{4#--name=}}; touch $state/$name; echo $name ;;
+rename) mv $state/$2 $state/$3 2>/dev/null || exit 1 ;;
+exec|network) [ -e $state/$2 ] || [ -e $state/$4 ] || exit 1 ;;
+port) n=$(cat $state.port 2>/dev/null || echo 32768); echo $((n + 1)) > $state.port
+      echo 0.0.0.0:$n ;;
+esac
+"""
+
+
+class Console:
+    """Run the commands sent to the factory in bash, with a fake docker."""
+
+    def __init__(self, dev, bindir):
+        self.dev = dev
+        self.bindir = bindir
+
+    def sendline(self, cmd):
+        self.dev.before = subprocess.run(
+            ["bash", "-c", cmd],
+            capture_output=True,
+            text=True,
+            env={"PATH": f"{self.bindir}:/usr/bin:/bin", "uniq_id": "u"},
+            timeout=30,
+        ).stdout
+
+    def expect(self, *args, **kwargs):
+        return 0
+
+
+@pytest.fixture
+def factory(tmp_path):
+    state = tmp_path / "containers"
+    state.mkdir()
+    docker = tmp_path / "docker"
+    docker.write_text(FAKE_DOCKER.format(state=state))
+    docker.chmod(0o755)
+
+    dev = DockerFactory.__new__(DockerFactory)
+    console = Console(dev, tmp_path)
+    dev.name = "lan_factory"
+    dev.dev = mock.Mock()
+    dev.ipaddr = "localhost"
+    dev.docker_engine = None
+    dev.docker_network = "net"
+    dev.network_options = ""
+    dev.device_counter = docker_factory.defaultdict(int)
+    dev.extra_devices = []
+    dev.target_cname = []
+    dev.pool_size = 2
+    dev._pool = []
+    dev._pool_counter = 0
+    dev._gateway = ("172.17.0.1", "172.17.0.0/16")
+    dev.sendline = console.sendline
+    dev.expect = console.expect
+    dev.configure_docker_image = mock.Mock()
+    dev.state = state
+    return dev
+
+
+def test_targets_claimed_from_pool(factory):
+    """Pool containers are renamed to the targets, the rest started at once."""
+    factory.fill_pool()
+    assert sorted(p.name for p in factory.state.iterdir()) == [
+        "lan_factory-pool-u1",
+        "lan_factory-pool-u2",
+    ]
+
+    targets = [
+        {"name": n, "type": "debian", "img": img}
+        for n, img in [("lan", "bft:node"), ("lan", "bft:node"), ("wan", "other")]
+    ]
+    with mock.patch.object(docker_factory, "get_device") as get_device:
+        factory.add_targets(targets)
+
+    containers = [p.name for p in factory.state.iterdir() if "pool" not in p.name]
+    assert sorted(containers) == ["lan-u1", "lan-u2", "wan-u1"]
+    assert get_device.call_count == 3
+    assert len({t["port"] for t in targets}) == 3
+    # the claimed containers are replaced in the background
+    assert factory._pool == [
+        "lan_factory-pool-${uniq_id}3",
+        "lan_factory-pool-${uniq_id}4",
+    ]
+
+
+def test_start_waits_for_own_jobs(factory):
+    """Background jobs of the console shell (pool refills) are not waited for."""
+    sendline = factory.sendline
+    factory.sendline = lambda cmd: sendline(f"sleep 120 > /dev/null 2>&1 & {cmd}")
+    started = factory._start_containers(
+        [("lan_factory-u1", "bft:node", "lan-u1"), ("lan_factory-u2", "other", None)]
+    )
+    assert started == {0, 1}
+    assert sorted(p.name for p in factory.state.iterdir()) == [
+        "lan-u1",
+        "lan_factory-u2",
+    ]
+
+
+def test_api_backend(factory, docker_engine):
+    """The same targets are created through the Docker Engine API."""
+    factory.api = DockerEngineAPI(f"unix://{docker_engine.socket}")
+    factory.dev.env = {"uniq_id": "u"}
+    factory.fill_pool()
+
+    targets = [{"name": "lan", "type": "debian", "img": "bft:node"} for _ in range(3)]
+    with mock.patch.object(docker_factory, "get_device") as get_device:
+        factory.add_targets(targets)
+
+    assert get_device.call_count == 3
+    assert len({t["port"] for t in targets}) == 3
+    assert {"lan-u1", "lan-u2", "lan-u3"} <= set(docker_engine.containers)
+    # the console was not used
+    assert "before" not in vars(factory)
+    factory.clean_docker()
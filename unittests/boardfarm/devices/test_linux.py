@@ -1,10 +1,12 @@
 import ipaddress
+import os
 import re
 
 import pytest
 
-from boardfarm.devices.linux import LinuxDevice
+from boardfarm.devices.linux import LinuxDevice, LinuxInterface
 from boardfarm.exceptions import BftIfaceNoIpV6Addr
+from boardfarm.lib.bft_pexpect_helper import bft_pexpect_helper
 from boardfarm.lib.regexlib import ValidIpv4AddressRegex
 
 test1_1 = """# ifconfig erouter0
@@ -256,3 +258,61 @@ def test_get_interface_mask(mocker, output, expected_mask):
     dev.match = max((re.search(i, output) for i in regex), key=bool)
     print(dev.match)
     assert expected_mask == dev.get_interface_mask("erouter0")
+
+
+class _LocalShell(LinuxInterface, bft_pexpect_helper):
+    """Local bash session standing in for a device console."""
+
+    name = "local"
+    prompt = [r"PROMPT\$ "]
+
+    def __init__(self):
+        env = {"PS1": "PROMPT$ ", "PATH": os.environ["PATH"]}
+        bft_pexpect_helper.__init__(
+            self, "bash", ["--norc", "--noprofile"], env=env, timeout=10
+        )
+        self.expect(self.prompt)
+
+
+@pytest.fixture
+def shell():
+    shell = _LocalShell()
+    yield shell
+    shell.close()
+
+
+def test_copy_file_to_server_resumes(shell, tmp_path, mocker):
+    """Only the chunks missing from an intact partial copy are sent again."""
+    data = os.urandom(40_000)
+    src, dst = tmp_path / "src.bin", tmp_path / "dst.bin"
+    src.write_bytes(data)
+    send_chunk = mocker.spy(shell, "_send_chunk")
+
+    shell.copy_file_to_server(str(src), str(dst), chunk_size=12_000)
+    assert dst.read_bytes() == data
+    assert send_chunk.call_count == 4
+
+    (tmp_path / "dst.bin.part").write_bytes(data[:24_000])
+    send_chunk.reset_mock()
+    shell.copy_file_to_server(str(src), str(dst), chunk_size=12_000)
+    assert dst.read_bytes() == data
+    assert [len(c.args[0]) for c in send_chunk.call_args_list] == [12_000, 4_000]
+
+    # a corrupted partial copy is started over
+    (tmp_path / "dst.bin.part").write_bytes(b"x" * 24_000)
+    send_chunk.reset_mock()
+    shell.copy_file_to_server(str(src), str(dst), chunk_size=12_000)
+    assert dst.read_bytes() == data
+    assert send_chunk.call_count == 4
+
+
+def test_copy_file_from_server(shell, tmp_path):
+    """Without an ssh address the file is read from the console."""
+    data = os.urandom(100_000)
+    src, dst = tmp_path / "src.bin", tmp_path / "dst.bin"
+    src.write_bytes(data)
+    shell.copy_file_from_server(str(src), str(dst))
+    assert dst.read_bytes() == data
+
+    with pytest.raises(FileNotFoundError):
+        shell.copy_file_from_server(str(tmp_path / "missing"), str(dst))
@@ -0,0 +1,61 @@
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+from boardfarm import registry
+from boardfarm.devices import power
+
+
+@pytest.fixture
+def pdu_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(registry, "REGISTRY_CACHE", str(tmp_path / "registry.json"))
+
+
+def test_fingerprint_cached_by_ip(pdu_cache):
+    """The PDU page is fetched once, then the cached model is used."""
+    page = mock.Mock()
+    page.read.return_value = b"<html><title>APC Switched Rack PDU</title>"
+    with mock.patch.object(
+        power, "urlopen", return_value=page
+    ) as urlopen, mock.patch.object(power, "APCPower") as apc:
+        power.get_power_device("10.0.0.1", outlet="1")
+        power.get_power_device("10.0.0.1", outlet="2")
+        assert urlopen.call_count == 1
+        assert apc.call_count == 2
+
+        # a cached model failing to connect is probed again
+        apc.side_effect = [Exception("refused"), mock.Mock()]
+        power.get_power_device("10.0.0.1", outlet="3")
+        assert urlopen.call_count == 2
+
+
+def test_power_all_in_parallel_per_pdu():
+    """PDUs are switched at the same time, outlets of a PDU one at a time."""
+    active = {}
+    lock = threading.Lock()
+    overlap = []
+
+    class Outlet:
+        def __init__(self, ip_address, outlet):
+            self.ip_address = ip_address
+            self.outlet = outlet
+
+        def turn_off(self):
+            with lock:
+                active[self.ip_address] = active.get(self.ip_address, 0) + 1
+                overlap.append(dict(active))
+            time.sleep(0.1)
+            with lock:
+                active[self.ip_address] -= 1
+            if self.outlet == "bad":
+                raise Exception("outlet not found")
+
+    outlets = [Outlet(ip, o) for ip in ["a", "b"] for o in ["1", "2"]]
+    power.power_all(outlets)
+    assert max(n for state in overlap for n in state.values()) == 1
+    assert any(len([n for n in state.values() if n]) == 2 for state in overlap)
+
+    with pytest.raises(Exception, match="outlet bad"):
+        power.power_all(outlets + [Outlet("c", "bad")])
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""Unit tests for boardfarm.lib.hooks.contingency_checks.py."""
+import threading
+import time
+
+import pytest
+
+from boardfarm.exceptions import ContingencyCheckError
+from boardfarm.lib import state_epoch
+from boardfarm.lib.hooks import contingency_checks
+from boardfarm.lib.hooks.contingency_checks import ContingencyCheck
+from boardfarm.plugins import BFPluginManager
+
+
+@pytest.fixture
+def check(mocker):
+    mocker.patch.object(ContingencyCheck, "_feature_pm", None)
+    mocker.patch.object(ContingencyCheck, "_passed", {})
+    mocker.patch.object(contingency_checks, "check_prompts")
+    specs = mocker.spy(BFPluginManager, "load_hook_specs")
+    dev_mgr, env_helper = mocker.MagicMock(), mocker.MagicMock()
+    env_helper.get_prov_mode.return_value = "dual"
+    cc = ContingencyCheck()
+
+    def run(env_req):
+        return cc.contingency_check(env_req, dev_mgr, env_helper)
+
+    yield run, dev_mgr, specs
+    BFPluginManager.remove_plugin_manager("contingency")
+
+
+def test_service_checks_skipped_within_epoch(check):
+    run, dev_mgr, specs = check
+    env_req = {"environment_def": {"board": {"model": "x"}}}
+    first = run(env_req)
+    assert run(dict(env_req)) == first
+    assert dev_mgr.lan.start_ipv4_lan_client.call_count == 1
+
+    # a new epoch or another env_req runs the checks again
+    state_epoch.bump("test")
+    run(env_req)
+    run({"environment_def": {}})
+    assert dev_mgr.lan.start_ipv4_lan_client.call_count == 3
+    # the feature plugin manager is only built once
+    assert specs.call_count == 1
+
+
+def test_failed_service_check_bumps_epoch(check):
+    run, dev_mgr, _ = check
+    dev_mgr.lan.start_ipv4_lan_client.return_value = None
+    epoch = state_epoch.current()
+    with pytest.raises(ContingencyCheckError):
+        run({"environment_def": {}})
+    assert state_epoch.current() == epoch + 1
+
+    dev_mgr.lan.start_ipv4_lan_client.side_effect = ContingencyCheckError("dhcp")
+    with pytest.raises(ContingencyCheckError):
+        run({"environment_def": {}})
+    assert state_epoch.current() == epoch + 2
+
+
+def test_run_per_device_is_concurrent_and_merges_failures():
+    class Dev:
+        def __init__(self, name):
+            self.name = name
+
+    devices = [Dev(f"lan{i}") for i in range(4)]
+    barrier = threading.Barrier(len(devices), timeout=5)
+
+    def work(dev):
+        # every device must be worked on at the same time to pass the barrier
+        barrier.wait()
+        if dev.name in ("lan1", "lan3"):
+            raise AssertionError(f"no prompt on {dev.name}")
+        return dev.name.upper()
+
+    # a device listed twice is only worked on once
+    ok = contingency_checks.run_per_device("check", devices[::2] * 2, lambda d: d.name)
+    assert ok == {"lan0": "lan0", "lan2": "lan2"}
+
+    with pytest.raises(ContingencyCheckError) as exc:
+        contingency_checks.run_per_device("check_prompts", devices, work)
+    assert "lan1" in str(exc.value) and "lan3" in str(exc.value)
+    assert "lan0" not in str(exc.value)
+
+
+def test_service_checks_failures_merged_with_deadline(check, mocker):
+    run, dev_mgr, _ = check
+    mocker.patch.object(ContingencyCheck, "service_check_timeout", 0.5)
+    contingency_checks.check_prompts.side_effect = AssertionError("no prompt")
+    dev_mgr.lan.start_ipv4_lan_client.side_effect = lambda **kw: time.sleep(2)
+    start = time.monotonic()
+    with pytest.raises(ContingencyCheckError) as exc:
+        run({"environment_def": {}})
+    assert time.monotonic() - start < 1.5
+    assert "DefaultChecks" in str(exc.value)
+    assert "CheckInterface" in str(exc.value)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+"""Unit tests for boardfarm.lib.DeviceManager.py."""
+import time
+from copy import deepcopy
+
+import pytest
+
+from boardfarm.lib import task_scheduler
+from boardfarm.lib.DeviceManager import (
+    DeviceNone,
+    PendingDevices,
+    device_feature,
+    device_location,
+    device_manager,
+    device_type,
+)
+
+
+class _FakeDevice:
+    legacy_add = False
+
+    def __init__(self, name):
+        self.name = name
+
+
+def _linear_get(mgr, t, feature, location):
+    """device_manager.get_device as implemented before the indexes."""
+    matching = mgr.devices[:]
+    if t is not None:
+        matching[:] = [d for d in matching if d.type == t]
+    if feature is not None:
+        matching[:] = [d for d in matching if feature in d.features]
+    if location is not None:
+        matching[:] = [d for d in matching if d.location == location]
+    return matching[0].obj if matching else DeviceNone()
+
+
+@pytest.fixture
+def mgr():
+    mgr = deepcopy(device_manager())
+    for name in ["board", "wan", "lan", "lan2", "lan", "wifi"]:
+        mgr._add_device(_FakeDevice(name))
+    locations = [device_location.DUT, device_location.WAN] + [device_location.LAN] * 4
+    for d, location in zip(mgr.devices, locations):
+        d.location = location
+    mgr.devices[-1].features = [device_feature.Wifi2G, device_feature.Wifi5G]
+    mgr._reindex()
+    return mgr
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        (device_type.lan, None, None),
+        (device_type.DUT, None, None),
+        (None, device_feature.Wifi5G, None),
+        (None, None, device_location.LAN),
+        (device_type.lan2, None, device_location.LAN),
+        (device_type.wan, None, device_location.LAN),
+        (None, device_feature.Wifi2G, device_location.LAN),
+        (device_type.fax_modem, None, None),
+        (None, None, None),
+    ],
+)
+def test_get_device_matches_linear_scan(mgr, query):
+    """Indexed lookups return the same device as filtering the device list."""
+    expected = _linear_get(mgr, *query)
+    if isinstance(expected, DeviceNone):
+        assert isinstance(mgr.get_device(*query), DeviceNone)
+    else:
+        assert mgr.get_device(*query) is expected
+
+
+def test_get_device_num(mgr):
+    """num > 1 returns a list of at most num devices, None all of them."""
+    lans = mgr.by_location(device_location.LAN, num=None)
+    assert [d.name for d in lans] == ["lan", "lan2", "lan", "wifi"]
+    assert mgr.by_location(device_location.LAN, num=2) == lans[:2]
+    assert mgr.by_type(device_type.lan, num=5) == [lans[0], lans[2]]
+    assert mgr.by_type(device_type.fax_modem, num=2) == []
+    with pytest.raises(ValueError):
+        mgr.by_type(device_type.lan, num=0)
+
+    mgr.close_all()
+    assert mgr.by_location(device_location.LAN, num=None) == []
+
+
+class _NoScan(list):
+    """A device list that cannot be scanned."""
+
+    def __iter__(self):
+        raise AssertionError("linear scan of the devices")
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        (device_type.wifi, None, None),
+        (None, device_feature.Wifi5G, None),
+        (device_type.lan2, None, device_location.LAN),
+    ],
+)
+def test_get_device_uses_indexes(mgr, query):
+    """Lookups with a criterion only look at the indexed candidates."""
+    for i in range(2000):
+        mgr._add_device(_FakeDevice(f"dev{i}"))
+    expected = _linear_get(mgr, *query)
+    mgr.devices = _NoScan(mgr.devices)
+    assert mgr.get_device(*query) is expected
+
+
+def test_pending_devices_committed_as_tasks_complete():
+    """A task's devices are in the manager before its dependents start."""
+    mgr = deepcopy(device_manager())
+    mgr._add_device(_FakeDevice("board"))
+    names = ["wan", "lan", "provisioner"]
+    delays = {"wan": 0.2, "lan": 0.1, "provisioner": 0}
+    pending = {name: PendingDevices() for name in names}
+    seen = {}
+
+    def create(name):
+        time.sleep(delays[name])
+        seen[name] = [d.obj.name for d in mgr.devices]
+        mgr._add_device(_FakeDevice(name))
+
+    task_scheduler.run_tasks(
+        {name: lambda name=name: pending[name].run(create, name) for name in names},
+        depends_on={"lan": ["provisioner"]},
+        on_done=lambda result: pending[result.name].commit(),
+    )
+    assert seen["lan"] == ["board", "provisioner"]
+    assert mgr.devices[1].obj.name == "provisioner"
+
+    mgr._reorder([dev for name in names for dev in pending[name].committed])
+    assert [d.obj.name for d in mgr.devices] == ["board"] + names
+    assert mgr.devices[0].type == device_type.DUT
+    assert mgr.by_type(device_type.wan).name == "wan"
+
+
+def test_reorder_device_arrays():
+    """The devices and device arrays are put back in the order requested."""
+    mgr = deepcopy(device_manager())
+    mgr.lan_clients = []
+    board = _FakeDevice("board")
+    mgr._add_device(board)
+    lans = [_FakeDevice(f"lan{i}") for i in range(3)]
+    for i, dev in enumerate(lans):
+        dev.dev_array = "lan_clients"
+        dev.ipaddr, dev.port = "10.0.0.1", 5000 + i
+    for dev in [lans[2], lans[0], lans[1]]:
+        mgr._add_device(dev)
+
+    mgr._reorder(lans)
+    assert mgr.data == [board] + lans
+    assert mgr.lan_clients == lans
+
+
+def test_pending_devices_discarded_after_timeout():
+    """A timed out task adding its device later does not reach the manager."""
+    mgr = deepcopy(device_manager())
+    pending = PendingDevices()
+
+    def create():
+        time.sleep(0.3)
+        mgr._add_device(_FakeDevice("wan"))
+
+    results = task_scheduler.run_tasks(
+        {"wan": lambda: pending.run(create)}, timeout=0.1
+    )
+    assert results["wan"].status == "timeout"
+    pending.discard()
+    time.sleep(0.4)
+    pending.commit()
+    assert mgr.devices == []
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""Unit tests for the MIB cache of boardfarm.lib.SnmpHelper.py."""
+import json
+import os
+
+import pytest
+
+from boardfarm.lib import SnmpHelper
+from boardfarm.lib.SnmpHelper import MibCache, SnmpMibs
+
+MIB_DICT = {"sysDescr": {"name": "sysDescr", "oid": "1.3.6.1.2.1.1.1"}}
+
+
+@pytest.fixture
+def mib_dir(tmp_path):
+    d = tmp_path / "mibs"
+    d.mkdir()
+    (d / "SNMPv2-MIB.txt").write_text("SNMPv2-MIB DEFINITIONS ::= BEGIN\nEND\n")
+    (d / "miblist.txt").write_text("ignored")
+    return d
+
+
+@pytest.fixture
+def cache(tmp_path, mib_dir):
+    cache = MibCache(["SNMPv2-MIB"], [str(mib_dir)], str(tmp_path / "c" / "mibs.json"))
+    cache.save(MIB_DICT)
+    return cache
+
+
+def test_mib_cache_roundtrip(cache, mib_dir):
+    """A saved mib_dict is loaded back while the MIB files are unchanged."""
+    assert cache.load() == MIB_DICT
+    with open(cache.path) as f:
+        files = json.load(f)["files"]
+    assert list(files) == [str(mib_dir / "SNMPv2-MIB.txt")]
+
+
+def test_mib_cache_invalidation(cache, mib_dir):
+    """The cache is out of date when a MIB changes, is added, or MIBs differ."""
+    mib = mib_dir / "SNMPv2-MIB.txt"
+    mib.write_text("SNMPv2-MIB DEFINITIONS ::= BEGIN\n-- changed\nEND\n")
+    assert cache.load() is None
+
+    cache.save(MIB_DICT)
+    (mib_dir / "IF-MIB.txt").write_text("IF-MIB DEFINITIONS ::= BEGIN\nEND\n")
+    assert cache.load() is None
+
+    cache.save(MIB_DICT)
+    other = MibCache(["IF-MIB"], cache.src_dir_list, cache.path)
+    assert other.load() is None
+
+
+def test_mib_cache_touch(cache, mib_dir, mocker):
+    """Only a new mtime keeps the cache valid, the file is hashed once."""
+    mib = mib_dir / "SNMPv2-MIB.txt"
+    st = os.stat(mib)
+    os.utime(mib, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    sha = mocker.spy(MibCache, "_sha256")
+    assert cache.load() == MIB_DICT
+    assert cache.load() == MIB_DICT
+    assert sha.call_count == 1
+
+
+def test_mib_cache_corrupted(cache):
+    """A broken cache file is ignored."""
+    with open(cache.path, "w") as f:
+        f.write("{not json")
+    assert cache.load() is None
+
+
+def test_snmp_mibs_uses_cache(cache, mocker):
+    """SnmpMibs does not run the MIB compiler when the cache is valid."""
+    compiler = mocker.patch.object(SnmpHelper, "MibCompiler")
+    mocker.patch.object(SnmpMibs, "mib_dict", {})
+    obj = SnmpMibs(cache.mib_list, cache.src_dir_list, cache=cache.path)
+    compiler.assert_not_called()
+    assert obj.get_mib_oid("sysDescr") == "1.3.6.1.2.1.1.1"
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""Unit tests for boardfarm.lib.bft_logging.py."""
+import re
+import time
+
+import pytest
+
+from boardfarm.lib import bft_logging
+from boardfarm.lib.bft_logging import BufferedLog, LogBuffer, o_helper
+
+CHUNKS = ["\r\nboot", "ing\r", "\nkernel\r\n[ 0.1] eth0 up\r\n", "", "# ", "\r\n[x"]
+
+
+class _Device:
+    log = BufferedLog()
+
+
+class _Test:
+    log = BufferedLog()
+
+
+class _LegacyDevice:
+    log = ""
+
+
+def _legacy_write(parent, string, current_time):
+    """o_helper.write as implemented with string concatenation."""
+    if len(parent.log) > 1 and parent.log[-1] == "\r" and string[0] == "\n":
+        string = f"\n{current_time} {string[1:]}"
+    to_log = re.sub("\r\n", f"\r\n{current_time} ", string)
+    parent.log += to_log
+    parent.test_log += re.sub(r"\r\n\[", f"\r\n{parent.test_prefix}: [", to_log)
+
+
+@pytest.fixture
+def frozen_time(mocker):
+    mocker.patch.object(bft_logging.time, "time", return_value=1700000000.0)
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(1700000000))
+
+
+def test_log_buffer_append_and_read():
+    """Content read back is the concatenation of all appended strings."""
+    buf = LogBuffer("start")
+    buf.block_size = 3
+    pieces = [str(i) for i in range(10)]
+    for p in pieces:
+        buf.append(p)
+    assert buf.getvalue() == "start" + "".join(pieces)
+    assert len(buf) == len("start") + 10
+    assert buf.endswith("9")
+    buf.append("\r")
+    assert buf.endswith("\r")
+
+
+def test_buffered_log_reads_as_string():
+    """The descriptor returns a plain str and assignment resets the buffer."""
+    dev = _Device()
+    assert dev.log == "" and _Device.log == ""
+    dev.log += "abc"
+    bft_logging.get_log_buffer(dev).append("def")
+    assert isinstance(dev.log, str)
+    assert dev.log == "abcdef"
+    dev.log = ""
+    assert dev.log == ""
+
+
+@pytest.mark.parametrize("parent_cls", [_Device, _LegacyDevice])
+def test_o_helper_matches_string_concatenation(frozen_time, parent_cls):
+    """Device and test logs read the same as with the old implementation."""
+    parent, test = parent_cls(), _Test()
+    parent.test_to_log, parent.test_prefix = test, "wan"
+    helper = o_helper(parent, None, None)
+
+    ref = _LegacyDevice()
+    ref.test_log, ref.test_prefix = "", "wan"
+
+    for chunk in [c for c in CHUNKS if c]:
+        helper.write(chunk)
+        _legacy_write(ref, chunk, frozen_time)
+
+    assert parent.log == ref.log
+    assert test.log == ref.test_log
@@ -0,0 +1,42 @@
+import pytest
+
+from boardfarm.lib.bft_pexpect_helper import bft_pexpect_helper
+
+
+@pytest.fixture
+def bash():
+    console = bft_pexpect_helper(
+        "bash", ["--norc", "--noprofile"], env={"PS1": "bft-prompt# ", "TERM": "dumb"}
+    )
+    console.name = "bash"
+    console.prompt = ["bft-prompt# "]
+    console.expect(console.prompt)
+    yield console
+    console.close()
+
+
+def test_run_batch(bash):
+    """Outputs and exit codes of each command, in the console's shell."""
+    results = bash.run_batch(["cd /", "pwd", "printf 'a\\nb'", "false", "X=1; echo $X"])
+    assert [r.exit_code for r in results] == [0, 0, 0, 1, 0]
+    assert [r.output for r in results] == ["", "/", "a\nb", "", "1"]
+    assert bash.check_output("pwd") == "/"
+
+
+def test_run_batch_stop_on_error(bash):
+    results = bash.run_batch(
+        ["true", "exit_code() { return 3; }; exit_code", "pwd"], True
+    )
+    assert [r.exit_code for r in results] == [0, 3, None]
+    assert not results[2].ok
+    # the console is still usable
+    assert bash.check_output("echo ok") == "ok"
+
+
+def test_run_batch_single_round_trip(bash, mocker):
+    """The whole batch is sent at once, instead of one command per prompt."""
+    cmds = [f"echo {i}" for i in range(50)]
+    sendline = mocker.spy(bash, "sendline")
+    results = bash.run_batch(cmds)
+    assert [r.output for r in results] == [str(i) for i in range(50)]
+    assert sendline.call_count == 1
@@ -0,0 +1,28 @@
+"""Unit tests for boardfarm.lib.docker_api.py."""
+import time
+
+import pytest
+
+from boardfarm.exceptions import DockerAPIError
+from boardfarm.lib.docker_api import DockerEngineAPI
+
+
+def test_container_lifecycle(docker_engine):
+    """Containers are started, waited for and run commands over one client."""
+    api = DockerEngineAPI(f"unix://{docker_engine.socket}")
+    assert api.image_exists("bft:node")
+    assert not api.image_exists("missing:img")
+
+    since = time.time()
+    for name in ["a", "b"]:
+        api.run(name, "bft:node", ["/usr/sbin/sshd", "-D"])
+    assert api.wait_healthy(["a", "b", "never"], since, timeout=1) == {"a", "b"}
+
+    assert api.exec_run("a", ["true"]) == (0, "ok")
+    assert api.inspect("b")["NetworkSettings"]["Ports"]["22/tcp"][0]["HostPort"]
+    api.rename("a", "c")
+    with pytest.raises(DockerAPIError, match="No such container"):
+        api.inspect("a")
+    api.stop("c")
+    api.stop("c")
+    api.close()
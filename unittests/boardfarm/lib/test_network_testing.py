@@ -1,6 +1,10 @@
+from unittest import mock
+
+import pandas
 import pytest
 
 from boardfarm.lib import network_testing
+from boardfarm.lib.pcap_analysis import PcapTable
 
 
 @pytest.mark.parametrize("mac", ["68:02:B8:47:FC:5D", "68:02:B8:47:FC:5e"])
@@ -12,3 +16,23 @@ def test_mac_to_eui64_with_valid_mac(mac):
 def test_mac_to_eui64_with_invalid_mac(mac):
     with pytest.raises(TypeError):
         assert network_testing.mac_to_eui64(mac)
+
+
+def test_rtp_read_verify():
+    frame = pandas.DataFrame(
+        {"src": ["10.0.0.1", "10.0.0.2"], "dst": ["10.0.0.2", "10.0.0.1"]}
+    )
+    frame["app"] = ["rtp", "sip"]
+    device = mock.Mock()
+    device.read_pcap.return_value = PcapTable(frame)
+
+    msg = network_testing.rtp_msg
+    assert network_testing.rtp_read_verify(device, "f.pcap")
+    assert network_testing.rtp_read_verify(
+        device, "f.pcap", [msg("10.0.0.1", "10.0.0.2")]
+    )
+    # the packet from .2 to .1 is SIP, not RTP
+    assert not network_testing.rtp_read_verify(
+        device, "f.pcap", [msg("10.0.0.2", "10.0.0.1")]
+    )
+    device.read_pcap.assert_called_with("f.pcap", rm_pcap=True)
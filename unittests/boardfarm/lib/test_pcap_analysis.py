@@ -0,0 +1,149 @@
+import ipaddress
+import struct
+
+import pytest
+
+from boardfarm.lib.pcap_analysis import read_pcap
+
+
+def _ipv4(src, dst, proto, payload):
+    header = struct.pack(
+        "!BBHHHBBH4s4s",
+        0x45,
+        0,
+        20 + len(payload),
+        0,
+        0,
+        64,
+        proto,
+        0,
+        ipaddress.IPv4Address(src).packed,
+        ipaddress.IPv4Address(dst).packed,
+    )
+    return header + payload
+
+
+def _ether(ip_packet):
+    return b"\x00" * 12 + b"\x08\x00" + ip_packet
+
+
+def _udp(sport, dport, payload):
+    return struct.pack("!HHHH", sport, dport, 8 + len(payload), 0) + payload
+
+
+PACKETS = [
+    _ether(_ipv4("10.0.0.1", "10.0.0.2", 1, b"\x08\x00" + b"\x00" * 6)),
+    _ether(
+        _ipv4(
+            "10.0.0.1", "10.0.0.2", 17, _udp(5060, 5060, b"INVITE sip:1@x SIP/2.0\r\n")
+        )
+    ),
+    _ether(_ipv4("10.0.0.2", "10.0.0.1", 1, b"\x00\x00" + b"\x00" * 6)),
+    _ether(_ipv4("10.0.0.2", "10.0.0.1", 17, _udp(5060, 5060, b"SIP/2.0 200 OK\r\n"))),
+]
+PACKETS += [
+    _ether(
+        _ipv4(
+            "10.0.0.1",
+            "10.0.0.2",
+            17,
+            _udp(
+                20000,
+                30000,
+                bytes([0x80, 0]) + struct.pack("!HII", seq, 0, 7) + b"\x00" * 160,
+            ),
+        )
+    )
+    for seq in range(4)
+]
+
+
+def _rtp_header(seq, ssrc):
+    return bytes([0x80, 0]) + struct.pack("!HII", seq, 0, ssrc)
+
+
+def _pcap(path, packets=PACKETS):
+    with open(path, "wb") as f:
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1))
+        for i, data in enumerate(packets):
+            f.write(struct.pack("<IIII", 100 + i, 0, len(data), len(data)))
+            f.write(data)
+
+
+def _block(btype, body):
+    body += b"\x00" * (-len(body) % 4)
+    size = len(body) + 12
+    return struct.pack("<II", btype, size) + body + struct.pack("<I", size)
+
+
+def _pcapng(path):
+    with open(path, "wb") as f:
+        f.write(_block(0x0A0D0D0A, struct.pack("<IHHq", 0x1A2B3C4D, 1, 0, -1)))
+        # if_tsresol: milliseconds
+        options = struct.pack("<HHB3xHH", 9, 1, 3, 0, 0)
+        f.write(_block(1, struct.pack("<HHI", 1, 0, 65535) + options))
+        for i, data in enumerate(PACKETS):
+            ts = (100 + i) * 1000
+            epb = struct.pack(
+                "<IIIII", 0, ts >> 32, ts & 0xFFFFFFFF, len(data), len(data)
+            )
+            f.write(_block(6, epb + data))
+
+
+@pytest.fixture(params=[_pcap, _pcapng])
+def table(request, tmp_path):
+    path = tmp_path / "capture"
+    request.param(path)
+    return read_pcap(str(path))
+
+
+def test_read_pcap(table):
+    assert len(table) == 8
+    assert list(table.frame["time"]) == [100.0 + i for i in range(8)]
+    assert list(table.filter(proto=1).frame["icmp_type"]) == [8, 0]
+    sip = table.filter(app="sip")
+    assert list(sip.frame["info"]) == ["INVITE sip:1@x SIP/2.0", "SIP/2.0 200 OK"]
+    rtp = table.filter(app="rtp", src="10.0.0.1")
+    assert list(rtp.frame["rtp_seq"]) == [0, 1, 2, 3]
+    assert len(table.filter(length=lambda c: c > 100)) == 4
+
+
+def test_match_sequence(table):
+    request = {"proto": 1, "icmp_type": 8, "src": "10.0.0.1"}
+    reply = {"proto": 1, "icmp_type": 0, "src": "10.0.0.2"}
+    assert table.match_sequence([request, {"app": "sip"}, reply]) == [0, 1, 2]
+    # in order only
+    assert table.match_sequence([reply, request]) is None
+
+
+def test_flows(table):
+    flows = table.flows()
+    rtp = flows[flows["sport"] == 20000].iloc[0]
+    assert (rtp["src"], rtp["dst"], rtp["dport"]) == ("10.0.0.1", "10.0.0.2", 30000)
+    assert rtp["packets"] == 4
+    assert rtp["duration"] == 3.0
+    assert rtp["bits_per_second"] == rtp["bytes"] * 8 / 3
+
+
+def test_rtp_streams_only(tmp_path):
+    """UDP payloads looking like RTP headers are RTP in streams only."""
+    path = tmp_path / "capture"
+
+    def udp(sport, payload):
+        return _ether(_ipv4("10.0.0.3", "10.0.0.4", 17, _udp(sport, 4000, payload)))
+
+    _pcap(
+        path,
+        PACKETS
+        # changing SSRC
+        + [udp(40000, _rtp_header(i, i)) for i in range(4)]
+        # sequence numbers not increasing
+        + [udp(40001, _rtp_header(seq, 9)) for seq in (7, 31000, 2, 52000)]
+        # too short
+        + [udp(40002, _rtp_header(seq, 9)) for seq in (1, 2)]
+        # wrapping around, with a lost packet
+        + [udp(40003, _rtp_header(seq, 9)) for seq in (65534, 65535, 2)],
+    )
+    rtp = read_pcap(str(path)).filter(app="rtp").frame
+    assert list(rtp["sport"]) == [20000] * 4 + [40003] * 3
+    assert list(rtp["rtp_seq"][-3:]) == [65534, 65535, 2]
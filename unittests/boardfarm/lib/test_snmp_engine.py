@@ -0,0 +1,332 @@
+#!/usr/bin/env python
+"""Unit tests for boardfarm.lib.snmp_engine.py, against a pure Python agent."""
+import bisect
+import re
+import socketserver
+import threading
+import time
+
+import pytest
+from pyasn1.codec.ber import decoder, encoder
+from pysnmp.proto import api, rfc1902, rfc1905
+
+from boardfarm.exceptions import SNMPError
+from boardfarm.lib import SNMPv2, snmp_engine
+from boardfarm.lib.snmp_engine import SnmpEngine, SnmpRelay
+
+V2C = api.protoModules[api.protoVersion2c]
+
+
+def _key(oid):
+    return tuple(int(i) for i in oid.split("."))
+
+
+class Agent(socketserver.ThreadingUDPServer):
+    """SNMPv2c agent serving a dict of oid: value, with GET/GETNEXT/GETBULK/SET."""
+
+    def __init__(self, objects, delay=0, drop=0, max_varbinds=None):
+        self.objects = objects
+        self.delay = delay
+        self.drop = drop
+        self.max_varbinds = max_varbinds
+        self.requests = []
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+        super().__init__(("127.0.0.1", 0), AgentHandler)
+
+    def successor(self, oid):
+        keys = sorted(self.objects, key=_key)
+        pos = bisect.bisect_right([_key(k) for k in keys], _key(oid))
+        if pos == len(keys):
+            return oid, rfc1905.endOfMibView
+        return keys[pos], self.objects[keys[pos]]
+
+    def respond(self, pdu):
+        varbinds = [(str(o), v) for o, v in V2C.apiPDU.getVarBinds(pdu)]
+        kind = type(pdu).__name__
+        out = []
+        error = 0
+        if kind == "GetRequestPDU":
+            out = [(o, self.objects.get(o, rfc1905.noSuchObject)) for o, _ in varbinds]
+        elif kind == "SetRequestPDU":
+            for o, v in varbinds:
+                if o not in self.objects:
+                    error = len(out) + 1
+                self.objects[o] = v
+                out.append((o, v))
+        elif kind == "GetBulkRequestPDU":
+            non_rep = int(V2C.apiBulkPDU.getNonRepeaters(pdu))
+            reps = int(V2C.apiBulkPDU.getMaxRepetitions(pdu))
+            out = [self.successor(o) for o, _ in varbinds[:non_rep]]
+            last = [o for o, _ in varbinds[non_rep:]]
+            for _ in range(reps):
+                row = [self.successor(o) for o in last]
+                out.extend(row)
+                last = [o for o, _ in row]
+        if self.max_varbinds and len(out) > self.max_varbinds:
+            if kind == "GetBulkRequestPDU":
+                out = out[: self.max_varbinds]
+            else:
+                return True, 0, varbinds
+        return False, error, out
+
+
+class AgentHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        data, sock = self.request
+        agent = self.server
+        msg, _ = decoder.decode(data, asn1Spec=V2C.Message())
+        pdu = V2C.apiMessage.getPDU(msg)
+        agent.requests.append(pdu)
+        if agent.drop:
+            agent.drop -= 1
+            return
+        with agent.lock:
+            agent.running += 1
+            agent.max_running = max(agent.max_running, agent.running)
+        time.sleep(agent.delay)
+        too_big, error, varbinds = agent.respond(pdu)
+        with agent.lock:
+            agent.running -= 1
+        rsp = V2C.apiPDU.getResponse(pdu)
+        V2C.apiPDU.setVarBinds(rsp, varbinds)
+        if too_big:
+            V2C.apiPDU.setErrorStatus(rsp, "tooBig")
+        elif error:
+            V2C.apiPDU.setErrorStatus(rsp, "noCreation")
+            V2C.apiPDU.setErrorIndex(rsp, error)
+        V2C.apiMessage.setPDU(msg, rsp)
+        sock.sendto(encoder.encode(msg), self.client_address)
+
+
+class Mibs:
+    """The SnmpMibs attributes used by the engine."""
+
+    mib_dict = {
+        "sysDescr": {"oid": "1.3.6.1.2.1.1.1"},
+        "ifTable": {"oid": "1.3.6.1.2.1.2.2"},
+        "ifDescr": {"oid": "1.3.6.1.2.1.2.2.1.2"},
+        "ifInOctets": {"oid": "1.3.6.1.2.1.2.2.1.10"},
+    }
+
+    def get_mib_oid(self, name):
+        return self.mib_dict[name]["oid"]
+
+
+OBJECTS = {
+    "1.3.6.1.2.1.1.1.0": rfc1902.OctetString("test agent"),
+    "1.3.6.1.2.1.1.3.0": rfc1902.TimeTicks(1234),
+    **{
+        f"1.3.6.1.2.1.2.2.1.2.{i}": rfc1902.OctetString(f"eth{i}") for i in range(1, 41)
+    },
+    **{f"1.3.6.1.2.1.2.2.1.10.{i}": rfc1902.Counter32(i * 100) for i in range(1, 41)},
+    "1.3.6.1.2.1.4.1.0": rfc1902.Integer32(1),
+}
+
+
+@pytest.fixture
+def agent():
+    def _agent(**kwargs):
+        server = Agent(dict(OBJECTS), **kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    servers = []
+    yield _agent
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _engine(server, **kwargs):
+    kwargs.setdefault("timeout", 0.5)
+    return SnmpEngine("127.0.0.1", port=server.server_address[1], mibs=Mibs(), **kwargs)
+
+
+def test_get_typed_and_resolved(agent):
+    server = agent()
+    engine = _engine(server)
+    sysdescr, uptime, missing = engine.run(
+        engine.get(["sysDescr.0", "1.3.6.1.2.1.1.3.0", "1.3.6.1.2.1.1.9.0"])
+    )
+    assert (sysdescr.name, sysdescr.index, sysdescr.label) == (
+        "sysDescr",
+        "0",
+        "sysDescr.0",
+    )
+    assert (sysdescr.type, sysdescr.value, sysdescr.text) == (
+        "OctetString",
+        b"test agent",
+        "test agent",
+    )
+    assert (uptime.type, uptime.value, uptime.name) == ("TimeTicks", 1234, None)
+    assert missing.type == "NoSuchObject" and not missing.ok
+
+
+def test_get_batched_and_concurrent(agent):
+    """80 objects are fetched by 8 PDUs of 10, sent at the same time."""
+    server = agent(delay=0.2)
+    engine = _engine(server, max_oids=10)
+    oids = [f"ifDescr.{i}" for i in range(1, 41)] + [
+        f"ifInOctets.{i}" for i in range(1, 41)
+    ]
+    varbinds = engine.run(engine.get(oids))
+    assert server.max_running > 1
+    assert [vb.label for vb in varbinds] == oids
+    assert varbinds[-1].value == 4000
+    assert len(server.requests) == 8
+
+
+def test_get_too_big_split(agent):
+    server = agent(max_varbinds=10)
+    engine = _engine(server)
+    varbinds = engine.run(engine.get([f"ifDescr.{i}" for i in range(1, 41)]))
+    assert [vb.value for vb in varbinds] == [f"eth{i}".encode() for i in range(1, 41)]
+
+
+def test_walk_batches_subtrees(agent):
+    """The columns of a table are walked with the same GETBULK requests."""
+    server = agent()
+    engine = _engine(server)
+    varbinds = engine.run(engine.walk(["ifDescr", "ifInOctets"], max_repetitions=15))
+    assert [vb.label for vb in varbinds] == [
+        f"{col}.{i}" for col in ("ifDescr", "ifInOctets") for i in range(1, 41)
+    ]
+    assert all(isinstance(pdu, V2C.GetBulkRequestPDU) for pdu in server.requests)
+    assert len(server.requests) == 3
+
+
+def test_walk_truncated_responses(agent):
+    """Responses holding less than a row do not end the walk early."""
+    server = agent(max_varbinds=1)
+    engine = _engine(server)
+    varbinds = engine.run(engine.walk(["ifDescr", "ifInOctets", "1.3.6.1.2.1.4"]))
+    assert len(varbinds) == 81
+    assert varbinds[-1].oid == "1.3.6.1.2.1.4.1.0"
+
+
+def test_walk_end_of_mib(agent):
+    server = agent()
+    engine = _engine(server)
+    varbinds = engine.run(engine.walk("1.3.6.1.2.1.4"))
+    assert [(vb.oid, vb.value) for vb in varbinds] == [("1.3.6.1.2.1.4.1.0", 1)]
+    assert engine.run(engine.walk("1.3.6.1.2.1.5")) == []
+
+
+def test_get_bulk(agent):
+    server = agent()
+    engine = _engine(server)
+    varbinds = engine.run(
+        engine.get_bulk(["sysDescr", "ifDescr"], non_repeaters=1, max_repetitions=3)
+    )
+    assert [vb.label for vb in varbinds] == [
+        "sysDescr.0",
+        "ifDescr.1",
+        "ifDescr.2",
+        "ifDescr.3",
+    ]
+
+
+def test_set(agent):
+    server = agent()
+    engine = _engine(server)
+    varbinds = engine.run(
+        engine.set([("sysDescr.0", "new descr", "s"), ("1.3.6.1.2.1.4.1.0", 2, "i")])
+    )
+    assert [vb.value for vb in varbinds] == [b"new descr", 2]
+    assert server.objects["1.3.6.1.2.1.1.1.0"] == b"new descr"
+    with pytest.raises(SNMPError, match="noCreation 1.3.6.1.2.1.4.9"):
+        engine.run(engine.set([("1.3.6.1.2.1.4.9", "0x0a0b", "x")]))
+
+
+def test_typed_value():
+    assert snmp_engine.typed_value("0x0A:0B", "x") == b"\n\x0b"
+    assert snmp_engine.typed_value("1 2", "d") == b"\x01\x02"
+    assert snmp_engine.typed_value("0 9", "b") == b"\x80\x40"
+    assert type(snmp_engine.typed_value("7", "u")).__name__ == "Unsigned32"
+    with pytest.raises(SNMPError):
+        snmp_engine.typed_value("abc", "i")
+    with pytest.raises(SNMPError):
+        snmp_engine.typed_value("1.0", "F")
+
+
+def test_retries_and_timeout(agent):
+    server = agent(drop=2)
+    engine = _engine(server, timeout=0.2, retries=2)
+    assert engine.run(engine.get(["sysDescr.0"]))[0].value == b"test agent"
+    assert engine.requests_sent == 3
+
+    server.drop = 10
+    with pytest.raises(SNMPError, match="Timeout: No Response"):
+        engine.run(engine.get(["sysDescr.0"]))
+
+
+def test_unknown_mib(agent):
+    engine = _engine(agent())
+    with pytest.raises(SNMPError, match="MIB not available"):
+        engine.run(engine.get(["docsDevResetNow.0"]))
+
+
+def test_reachable(agent):
+    server = agent()
+    assert _engine(server).reachable()
+    server.drop = 10
+    assert not _engine(server).reachable(timeout=0.2)
+
+
+class Shell:
+    """The console methods used by SnmpRelay, the relay is never running."""
+
+    ipaddr = "127.0.0.1"
+
+    def __init__(self):
+        self.lines = []
+        self.match = None
+
+    def sendline(self, line):
+        self.lines.append(line)
+
+    def expect(self, pattern):
+        output = {"RELAY_PID": "RELAY_PID:4242", "RELAY_UP": "RELAY_UP:1"}
+        self.match = re.search(pattern, output[pattern.split(":")[0]])
+
+    def expect_prompt(self):
+        pass
+
+
+def test_relay_unreachable_stopped(agent, mocker):
+    mocker.patch.object(snmp_engine, "install_socat")
+    server = agent(drop=10)
+    shell = Shell()
+    relay = SnmpRelay(shell, "192.168.100.1", port=server.server_address[1])
+    mocker.patch.object(SnmpEngine, "reachable", return_value=False)
+    with pytest.raises(SNMPError, match="does not answer"):
+        relay.engine()
+    assert shell.lines[0].startswith(f"timeout {relay.lifetime} socat -T 60 ")
+    assert shell.lines[-1] == "kill 4242"
+    assert relay.pid is None
+
+
+def test_snmpv2_engine_falls_back_and_closes(agent, mocker):
+    mocker.patch.object(SNMPv2, "install_snmp")
+    mocker.patch.object(SNMPv2, "SnmpMibs", mocker.Mock(default_mibs=Mibs()))
+    server = agent()
+    shell = Shell()
+    relay = mocker.patch.object(SNMPv2, "SnmpRelay")
+    relay.return_value.engine.side_effect = SNMPError("relay does not answer")
+    with SNMPv2.SNMPv2(shell, "127.0.0.1") as snmp:
+        engine = snmp.engine(port=server.server_address[1], timeout=0.5)
+        assert engine.address == "127.0.0.1" and snmp.relay is None
+        assert engine.run(engine.get(["sysDescr.0"]))[0].value == b"test agent"
+
+        server.drop = 10
+        with pytest.raises(SNMPError, match="does not answer, directly"):
+            snmp.engine(port=server.server_address[1], timeout=0.2)
+
+        relay.return_value.engine.side_effect = None
+        snmp.engine()
+        assert snmp.relay is relay.return_value
+    relay.return_value.stop.assert_called_once_with()
+    assert snmp.relay is None
@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+"""Unit tests for boardfarm.lib.soap_cache.py."""
+from zeep import Client
+
+from boardfarm.lib.soap_cache import CachingTransport, DiskCache
+
+
+def _client(url, path, ttl=3600):
+    return Client(wsdl=url, transport=CachingTransport(DiskCache(str(path)), ttl=ttl))
+
+
+def test_wsdl_and_xsd_cached_across_runs(soap_server, tmp_path):
+    """Documents are downloaded once, then revalidated after the TTL."""
+    client = _client(soap_server.url, tmp_path)
+    assert client.get_type("ns0:CPEIdentifierClassStruct")(cpeid="x").cpeid == "x"
+    assert soap_server.downloads() == 2
+
+    # another run within the TTL does not contact the server
+    _client(soap_server.url, tmp_path).get_type("ns0:CommandOptionsTypeStruct")
+    assert sum(soap_server.hits.values()) == 2
+
+    # after the TTL unchanged documents are revalidated, not downloaded
+    _client(soap_server.url, tmp_path, ttl=0)
+    assert soap_server.downloads() == 2
+    assert sum(n for (_, s), n in soap_server.hits.items() if s == 304) == 2
+
+
+def test_corrupt_entry_is_downloaded_again(soap_server, tmp_path):
+    """A content file not matching its metadata is not used."""
+    _client(soap_server.url, tmp_path)
+    for f in tmp_path.glob("*.xml"):
+        f.write_bytes(b"<truncated")
+    _client(soap_server.url, tmp_path)
+    assert soap_server.downloads() == 4
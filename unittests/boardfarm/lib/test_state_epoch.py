@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+"""Unit tests for boardfarm.lib.state_epoch.py."""
+from boardfarm.lib import state_epoch
+
+
+def test_bump():
+    epoch = state_epoch.current()
+    assert state_epoch.bump("test") == epoch + 1
+    assert state_epoch.current() == epoch + 1
+
+
+def test_reset_without_super_bumps():
+    class Board(state_epoch.BumpOnReset):
+        name = "board"
+
+        def reset(self, method=None):
+            """Reset."""
+            return method
+
+    class Derived(Board):
+        def reset(self, method=None):
+            return super().reset(method)
+
+    epoch = state_epoch.current()
+    assert Board().reset("sw") == "sw"
+    assert state_epoch.current() == epoch + 1
+    assert Board.reset.__doc__ == "Reset."
+    Derived().reset()
+    assert state_epoch.current() == epoch + 3
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+"""Unit tests for boardfarm.lib.task_scheduler.py."""
+import threading
+import time
+
+import pytest
+
+from boardfarm.exceptions import CodeError
+from boardfarm.lib import task_scheduler
+
+
+def test_run_tasks_concurrently():
+    """Independent tasks overlap instead of running one after the other."""
+    tasks = {f"dev{i}": lambda: time.sleep(0.2) for i in range(5)}
+    start = time.time()
+    results = task_scheduler.run_tasks(tasks, max_workers=5)
+    assert time.time() - start < 0.8
+    assert all(r.ok for r in results.values())
+    assert list(results) == list(tasks)
+
+
+def test_run_tasks_bounded_workers():
+    """No more than max_workers tasks run at the same time."""
+    lock = threading.Lock()
+    active = []
+    peak = []
+
+    def task():
+        with lock:
+            active.append(1)
+            peak.append(len(active))
+        time.sleep(0.05)
+        with lock:
+            active.pop()
+
+    task_scheduler.run_tasks({f"t{i}": task for i in range(6)}, max_workers=2)
+    assert max(peak) == 2
+
+
+def test_run_tasks_dependency_order():
+    """A task is started only after its dependencies completed."""
+    order = []
+    tasks = {
+        "lan": lambda: order.append("lan"),
+        "wan": lambda: (time.sleep(0.1), order.append("wan")),
+        "provisioner": lambda: order.append("provisioner"),
+    }
+    results = task_scheduler.run_tasks(
+        tasks, depends_on={"lan": ["wan"], "provisioner": ["wan"]}
+    )
+    assert order[0] == "wan"
+    assert results["lan"].start >= results["wan"].end
+
+
+def test_run_tasks_failure_skips_dependents():
+    """Exceptions are captured and dependents of a failed task are skipped."""
+
+    def fail():
+        raise ValueError("boom")
+
+    results = task_scheduler.run_tasks(
+        {"wan": fail, "lan": lambda: 1, "other": lambda: 2},
+        depends_on={"lan": ["wan"]},
+    )
+    assert results["wan"].status == "failed"
+    assert isinstance(results["wan"].error, ValueError)
+    assert results["lan"].status == "skipped"
+    assert results["other"].value == 2
+
+
+def test_run_tasks_timeout():
+    """A task running past its timeout is reported and does not block others."""
+    results = task_scheduler.run_tasks(
+        {"slow": lambda: time.sleep(2), "fast": lambda: 1},
+        timeouts={"slow": 0.1},
+    )
+    assert results["slow"].status == "timeout"
+    assert results["slow"].duration < 1
+    assert results["fast"].ok
+
+
+def test_run_tasks_on_done():
+    """on_done sees each task end before its dependents start, and can fail it."""
+    ended = []
+
+    def on_done(result):
+        ended.append((result.name, result.status, sorted(started)))
+        if result.name == "lan":
+            raise ValueError("rejected")
+
+    started = set()
+    tasks = {
+        name: lambda name=name: started.add(name)
+        for name in ("wan", "lan", "wifi", "provisioner")
+    }
+    results = task_scheduler.run_tasks(
+        tasks,
+        depends_on={"lan": ["wan"], "wifi": ["lan"], "provisioner": ["wan"]},
+        on_done=on_done,
+        max_workers=1,
+    )
+    assert ended[0] == ("wan", "done", ["wan"])
+    assert ("lan", "done", ["lan", "wan"]) in ended
+    assert results["lan"].status == "failed"
+    assert isinstance(results["lan"].error, ValueError)
+    assert results["wifi"].status == "skipped"
+    assert results["provisioner"].ok
+
+
+@pytest.mark.parametrize(
+    "depends_on",
+    [{"a": ["missing"]}, {"a": ["b"], "b": ["a"]}],
+    ids=["unknown", "cycle"],
+)
+def test_run_tasks_invalid_dependencies(depends_on):
+    """Unknown dependencies and cycles are rejected before running anything."""
+    with pytest.raises(CodeError):
+        task_scheduler.run_tasks({"a": lambda: 1, "b": lambda: 2}, depends_on)
+
+
+def test_timing_report():
+    """The timing report lists every task."""
+    results = task_scheduler.run_tasks({"wan": lambda: 1, "lan": lambda: 2})
+    report = task_scheduler.timing_report(results, title="Device")
+    assert "Device" in report
+    assert "wan" in report and "lan" in report
+
+
+def test_critical_path():
+    """The critical path follows the dependencies that gated each task."""
+    results = task_scheduler.run_tasks(
+        {
+            "wan": lambda: time.sleep(0.1),
+            "lan": lambda: 1,
+            "flash": lambda: time.sleep(0.2),
+            "post": lambda: 1,
+        },
+        depends_on={"flash": ["wan"], "post": ["flash", "lan"]},
+    )
+    assert task_scheduler.critical_path(results) == ["wan", "flash", "post"]
+    report = task_scheduler.critical_path_report(results, title="Action")
+    assert "Critical path: wan (0.1s) -> flash (0.2s) -> post (0.0s)" in report
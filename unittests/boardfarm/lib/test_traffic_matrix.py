@@ -0,0 +1,182 @@
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from boardfarm.lib.bft_pexpect_helper import bft_pexpect_helper
+from boardfarm.lib.traffic_matrix import (
+    Flow,
+    FlowResult,
+    parse_iperf3_json,
+    run_traffic_matrix,
+)
+
+
+def _interval(start, bps, **extra):
+    total = dict(start=start, end=start + 1, bytes=bps // 8, bits_per_second=bps)
+    return {"streams": [], "sum": dict(total, **extra)}
+
+
+END_UDP = {
+    "sum": {"bits_per_second": 9e6, "jitter_ms": 0.5, "lost_percent": 1.0},
+    "sum_sent": {"bits_per_second": 1e7},
+}
+
+# iperf3 --json-stream, one event per line, slowly
+FAKE_IPERF3 = """#!/bin/bash
+[ "$1" = -s ] && exit 0
+[ "$1" = --help ] && echo '  --json-stream             output in line-delimited JSON format' && exit 0
+for i in 0 1 2; do
+  echo '{{"event": "interval", "data": {{"sum": {{"start": '$i', "end": '$((i+1))', \
+"bytes": 125000, "bits_per_second": 1000000}}}}}}'
+  sleep 0.2
+done
+echo '{end}'
+"""
+
+# iperf3 < 3.13: no --json-stream, -J writes a document complete at the end
+FAKE_IPERF3_J = """#!/bin/bash
+[ "$1" = -s ] && exit 0
+[ "$1" = --help ] && echo '  -J, --json                output in JSON format' && exit 0
+case "$*" in
+*--json-stream*) echo "iperf3: unrecognized option '--json-stream'"; exit 1 ;;
+esac
+echo '{{'
+sleep 0.6
+echo '{doc}' | tail -c +2
+"""
+
+
+def test_parse_json_stream():
+    result = FlowResult(Flow(None, None))
+    lines = [
+        json.dumps({"event": "start", "data": {}}),
+        json.dumps({"event": "interval", "data": _interval(0, 8000, jitter_ms=0.2)}),
+        '{"event": "interval", "da',
+    ]
+    # the incomplete line is left to the next read
+    assert parse_iperf3_json("\n".join(lines), result) == 2
+    assert result.intervals[0].jitter_ms == 0.2
+    assert not result.done
+
+    parse_iperf3_json(json.dumps({"event": "end", "data": END_UDP}), result)
+    assert result.ok
+    assert (result.bits_per_second, result.lost_percent) == (9e6, 1.0)
+
+
+def test_parse_json_document():
+    result = FlowResult(Flow(None, None))
+    doc = {"intervals": [_interval(0, 8000)], "end": {}, "error": "refused"}
+    parse_iperf3_json(json.dumps(doc, indent=2), result)
+    assert len(result.intervals) == 1
+    assert result.done and not result.ok
+
+
+def _console(name, env):
+    console = bft_pexpect_helper(
+        "bash", ["--norc", "--noprofile"], env=dict(env, PS1="bft# ", TERM="dumb")
+    )
+    console.name = name
+    console.prompt = ["bft# "]
+    console.expect(console.prompt)
+    return console
+
+
+@pytest.mark.parametrize("json_stream", [True, False])
+def test_run_traffic_matrix(tmp_path, json_stream):
+    """Concurrent flows on local consoles, with a fake iperf3."""
+    if json_stream:
+        end = json.dumps({"event": "end", "data": END_UDP})
+        fake = FAKE_IPERF3.format(end=end)
+    else:
+        intervals = [_interval(i, 1000000) for i in range(3)]
+        doc = json.dumps({"start": {}, "intervals": intervals, "end": END_UDP})
+        fake = FAKE_IPERF3_J.format(doc=doc)
+    (tmp_path / "iperf3").write_text(fake)
+    (tmp_path / "iperf3").chmod(0o755)
+    # the servers are listening at once
+    (tmp_path / "ss").write_text("#!/bin/bash\necho '*:5201 *:5202 *:5203 '\n")
+    (tmp_path / "ss").chmod(0o755)
+    env = {"PATH": f"{tmp_path}:/usr/bin:/bin"}
+    lan, wan = _console("lan", env), _console("wan", env)
+    records = []
+    try:
+        flows = [
+            Flow(lan, wan, dest_ip="127.0.0.1", protocol="udp", bitrate="10M"),
+            Flow(lan, wan, dest_ip="127.0.0.1", protocol="udp", bitrate="10M"),
+            Flow(wan, lan, dest_ip="127.0.0.1", reverse=True),
+        ]
+        matrix = run_traffic_matrix(
+            flows,
+            duration=1,
+            poll_interval=0.1,
+            on_interval=lambda flow, record: records.append(record),
+        )
+    finally:
+        lan.close()
+        wan.close()
+
+    assert matrix.ok
+    assert [f.flow.port for f in matrix.flows] == [5201, 5202, 5203]
+    assert [len(f.intervals) for f in matrix.flows] == [3, 3, 3]
+    assert len(records) == 9
+    assert matrix.bits_per_second == 27e6
+    assert matrix.interval_percentiles("bits_per_second")[50] == 1e6
+    assert matrix.flow_percentiles("lost_percent") == {50: 1.0, 90: 1.0, 99: 1.0}
+
+
+def _netns_available():
+    if not shutil.which("iperf3") or os.geteuid() != 0:
+        return False
+    ok = subprocess.run(["ip", "netns", "add", "bft-probe"], capture_output=True)
+    subprocess.run(["ip", "netns", "del", "bft-probe"], capture_output=True)
+    return ok.returncode == 0
+
+
+@pytest.fixture
+def netns_pair():
+    cmds = [
+        "ip netns add bft-a",
+        "ip netns add bft-b",
+        "ip link add bft-va netns bft-a type veth peer name bft-vb netns bft-b",
+        "ip -n bft-a addr add 10.99.0.1/24 dev bft-va",
+        "ip -n bft-b addr add 10.99.0.2/24 dev bft-vb",
+        "ip -n bft-a link set bft-va up",
+        "ip -n bft-b link set bft-vb up",
+    ]
+    for cmd in cmds:
+        subprocess.run(cmd.split(), check=True)
+    consoles = []
+    for ns in ("bft-a", "bft-b"):
+        console = bft_pexpect_helper(
+            "ip",
+            ["netns", "exec", ns, "bash", "--norc", "--noprofile"],
+            env={"PS1": "bft# ", "TERM": "dumb", "PATH": os.environ["PATH"]},
+        )
+        console.name = ns
+        console.prompt = ["bft# "]
+        console.expect(console.prompt)
+        consoles.append(console)
+    yield consoles
+    for console in consoles:
+        console.close()
+    subprocess.run(["ip", "netns", "del", "bft-a"])
+    subprocess.run(["ip", "netns", "del", "bft-b"])
+
+
+@pytest.mark.skipif(not _netns_available(), reason="needs root, netns and iperf3")
+def test_run_traffic_matrix_netns(netns_pair):
+    """Real iperf3 flows both ways between two network namespaces."""
+    a, b = netns_pair
+    flows = [
+        Flow(a, b, dest_ip="10.99.0.2"),
+        Flow(b, a, dest_ip="10.99.0.1", protocol="udp", bitrate="5M"),
+        Flow(a, b, dest_ip="10.99.0.2", protocol="udp", bitrate="5M", reverse=True),
+    ]
+    matrix = run_traffic_matrix(flows, duration=3)
+    assert matrix.ok, [f.error for f in matrix.flows]
+    assert all(len(f.intervals) >= 3 for f in matrix.flows)
+    assert matrix.flows[2].intervals[0].jitter_ms is not None
+    assert matrix.bits_per_second > 0
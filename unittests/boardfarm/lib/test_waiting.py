@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""Unit tests for boardfarm.lib.waiting.py."""
+import time
+import types
+
+import pytest
+
+from boardfarm.exceptions import BootFail, WaitTimeout
+from boardfarm.lib import waiting
+
+
+@pytest.fixture
+def sleeps(mocker):
+    """Record the sleeps instead of sleeping, advancing a fake clock."""
+    clock = [0.0]
+    slept = []
+
+    def sleep(seconds):
+        slept.append(seconds)
+        clock[0] += seconds
+
+    # a namespace of its own, the time module is shared with other threads
+    fake_time = types.SimpleNamespace(
+        monotonic=lambda: clock[0], sleep=sleep, time=time.time
+    )
+    mocker.patch.object(waiting, "time", fake_time)
+    mocker.patch.object(waiting, "_records", [])
+    return slept
+
+
+def test_wait_until_backoff(sleeps):
+    """The delay between attempts grows exponentially up to max_delay."""
+    answers = iter([False, None, 0, "", "ready"])
+    value = waiting.wait_until(
+        lambda: next(answers), 100, delay=1, max_delay=5, jitter=0
+    )
+    assert value == "ready"
+    assert sleeps == [1, 2, 4, 5]
+
+
+def test_wait_until_jitter(sleeps):
+    """The jitter keeps each delay within the configured fraction."""
+    answers = iter([False] * 20 + [True])
+    waiting.wait_until(lambda: next(answers), 1000, delay=10, max_delay=10, jitter=0.2)
+    assert all(8 <= s <= 12 for s in sleeps)
+    assert len(set(sleeps)) > 1
+
+
+def test_wait_until_deadline(sleeps):
+    """The last attempt happens at the deadline, then the wait times out."""
+    calls = []
+    with pytest.raises(WaitTimeout):
+        waiting.wait_until(lambda: calls.append(1), 10, delay=4, jitter=0)
+    assert sleeps == [4, 6]
+    assert len(calls) == 3
+
+
+def test_wait_until_exceptions(sleeps):
+    """Listed exceptions mean not ready, the last one is chained on timeout."""
+
+    def fail():
+        raise ConnectionError("refused")
+
+    with pytest.raises(BootFail) as error:
+        waiting.wait_until(fail, 3, exc=BootFail("not online"))
+    assert isinstance(error.value.__cause__, ConnectionError)
+
+    with pytest.raises(ConnectionError):
+        waiting.wait_until(fail, 3, exceptions=())
+
+
+def test_time_to_ready_report(sleeps, tmp_path):
+    """Time-to-ready of named waits is saved and summarised across runs."""
+    fname = tmp_path / "time_to_ready.jsonl"
+    for seconds in (1, 3, 7):
+        answers = iter([False, True])
+        waiting.wait_until(
+            lambda: next(answers), 60, name="board", delay=seconds, jitter=0
+        )
+        waiting.save_time_to_ready(fname)
+    waiting.wait_until(lambda: True, 60)
+    waiting.save_time_to_ready(fname)
+
+    assert len(fname.read_text().splitlines()) == 3
+    report = waiting.time_to_ready_report(fname)
+    assert "board" in report and "condition" not in report
+    name, *stats = report.splitlines()[-1].split()
+    assert name == "board"
+    assert [float(x) for x in stats] == [3, 1, 3, 7, 7]
+
+
+def test_wait_until_real_clock():
+    """Without mocks the wait returns as soon as the condition is met."""
+    start = time.monotonic()
+    ready_at = start + 0.2
+    waiting.wait_until(lambda: time.monotonic() >= ready_at, 5, delay=0.05)
+    assert time.monotonic() - start < 1
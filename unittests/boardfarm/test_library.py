@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""Unit tests for boardfarm.library.py."""
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from boardfarm import library
+
+
+class _FakeTest:
+    """Fake test."""
+
+    def __init__(self, name, grade=None, subtests=()):
+        self.name = name
+        self.result_grade = grade
+        self.start_time = 0
+        self.stop_time = 1.5
+        self.subtests = list(subtests)
+
+
+@pytest.fixture
+def config(tmp_path):
+    return SimpleNamespace(output_dir=f"{tmp_path}/", golden_master_results={})
+
+
+@pytest.fixture
+def html(mocker):
+    return mocker.patch.object(library, "create_results_html")
+
+
+def test_writer_matches_process_test_results(config, html):
+    """Snapshots are the same as re-processing every test after each one."""
+    tests = [
+        _FakeTest("t1"),
+        _FakeTest("t2", subtests=[_FakeTest("s1"), _FakeTest("s2")]),
+        _FakeTest("t3"),
+    ]
+    writer = library.TestResultsWriter(config, tests, interval=0)
+    for test, grade in zip(tests, ["OK", "FAIL", "SKIP"]):
+        test.result_grade = grade
+        writer.add(test)
+        expected = library.process_test_results(tests)
+        assert writer.snapshot() == expected
+        with open(writer.json_path) as fin:
+            assert json.load(fin)["tests_fail"] == expected["tests_fail"]
+
+    with open(writer.jsonl_path) as fin:
+        records = [json.loads(line) for line in fin]
+    assert [r["name"] for r in records] == [
+        "t1",
+        "t2",
+        "_FakeTest-s1",
+        "_FakeTest-s2",
+        "t3",
+    ]
+    assert html.call_count == 3
+
+
+def test_writer_throttles_rendering(config, html):
+    """results.html is not re-rendered before the interval elapsed."""
+    tests = [_FakeTest(f"t{i}", "OK") for i in range(5)]
+    writer = library.TestResultsWriter(config, tests, interval=3600)
+    for test in tests:
+        writer.add(test)
+
+    html.assert_called_once()
+    assert writer.results["tests_pass"] == 5
+    assert writer.results["tests_total"] == 5
+    with open(writer.jsonl_path) as fin:
+        assert len(fin.readlines()) == 5
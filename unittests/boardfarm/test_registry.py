@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""Unit tests for boardfarm.registry.py."""
+import os
+import pkgutil
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+from boardfarm import registry, tests
+from boardfarm.plugins import find_plugins
+
+
+@pytest.fixture
+def cache(tmp_path, mocker):
+    path = str(tmp_path / "cache" / "registry.json")
+    mocker.patch.object(registry, "REGISTRY_CACHE", path)
+    return path
+
+
+@pytest.fixture
+def plugin(tmp_path):
+    site = tmp_path / "site"
+    root = site / "boardfarm_fake"
+    (root / "tests").mkdir(parents=True)
+    (root / "__init__.py").write_text("__version__ = '1.0'\n")
+    (root / "tests" / "__init__.py").write_text("")
+    (root / "tests" / "fake_test.py").write_text(
+        "class FakeTest:\n    def run(self):\n        pass\n"
+    )
+    sys.path.insert(0, str(site))
+    yield root
+    sys.path.remove(str(site))
+    for name in [m for m in sys.modules if m.startswith("boardfarm_fake")]:
+        del sys.modules[name]
+
+
+def test_sections_are_keyed(cache):
+    """A section is returned only for the key it was stored with."""
+    registry.save("tests", "k1", {"a": "mod.a"})
+    registry.save("devices", "k2", {"m": ["mod.m"]})
+    assert registry.load("tests", "k1") == {"a": "mod.a"}
+    assert registry.load("tests", "k2") is None
+    assert registry.load("devices", "k2") == {"m": ["mod.m"]}
+    assert registry.load("plugins", "k1") is None
+    assert registry.load("tests", "k1", path="") is None
+
+
+def test_fingerprint_changes(plugin):
+    """The fingerprint changes with the version and the files of a package."""
+    module = SimpleNamespace(__file__=str(plugin / "__init__.py"), __version__="1.0")
+    key = registry.fingerprint({"boardfarm_fake": module}, "tests")
+    assert key == registry.fingerprint({"boardfarm_fake": module}, "tests")
+    assert key != registry.fingerprint({"boardfarm_fake": module}, "devices")
+
+    module.__version__ = "1.1"
+    assert key != registry.fingerprint({"boardfarm_fake": module}, "tests")
+    module.__version__ = "1.0"
+
+    test_file = plugin / "tests" / "fake_test.py"
+    st = os.stat(test_file)
+    os.utime(test_file, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+    assert key != registry.fingerprint({"boardfarm_fake": module}, "tests")
+
+
+def test_find_plugins_is_cached(cache, plugin, mocker):
+    """sys.path is only scanned again when one of its entries changed."""
+    assert "boardfarm_fake" in find_plugins()
+    scan = mocker.spy(pkgutil, "iter_modules")
+    assert "boardfarm_fake" in find_plugins()
+    scan.assert_not_called()
+
+    (plugin.parent / "boardfarm_other.py").write_text("")
+    assert "boardfarm_other" in find_plugins()
+    scan.assert_called_once()
+    del sys.modules["boardfarm_other"]
+
+
+def test_init_imports_selected_tests(cache, plugin, mocker):
+    """Once indexed, only the modules of the requested tests are imported."""
+    import boardfarm_fake.tests.fake_test as fake_test
+
+    mocker.patch.dict(tests.available_tests, clear=True)
+    mocker.patch("boardfarm.plugins", {"boardfarm_fake": sys.modules["boardfarm_fake"]})
+    walk = mocker.patch.object(tests, "_all_test_modules", return_value=[fake_test])
+
+    tests.init(names=["FakeTest"])
+    walk.assert_called_once()
+    key = registry.fingerprint(tests._all_boardfarm_modules(), "tests")
+    assert registry.load("tests", key)["FakeTest"] == fake_test.__name__
+
+    tests.available_tests.clear()
+    walk.reset_mock()
+    tests.init(names=["FakeTest"])
+    walk.assert_not_called()
+    assert tests.available_tests["FakeTest"] is fake_test.FakeTest
+
+    tests.init(names=["Missing"])
+    walk.assert_called_once()